@@ -19,6 +19,7 @@ export default defineConfig({
       '/logs': 'http://127.0.0.1:9007',
       '/migration': 'http://127.0.0.1:9007',
       '/system': 'http://127.0.0.1:9007',
+      '/jobs': 'http://127.0.0.1:9007',
     },
   },
 })
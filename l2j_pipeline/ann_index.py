@@ -0,0 +1,379 @@
+"""
+Índices ANN do RLCoder (FAISS)
+Tipos de índice semântico para repositórios grandes: busca exata (flat), IVF-Flat, HNSW e IVF-PQ.
+
+    flat      -> IndexIDMap2(IndexFlatIP): exato, float32 completo em RAM (padrão em repos pequenos)
+    ivf_flat  -> IndexIVFFlat: visita `nprobe` de `nlist` listas; remove_ids suportado
+    hnsw      -> IndexIDMap2(IndexHNSWFlat): grafo, `efSearch` controla recall; sem remove_ids
+    ivf_pq    -> IndexIVFPQ: vetores comprimidos (pq_m bytes por vetor com pq_nbits=8)
+
+Os parâmetros escolhidos (incluindo nprobe/efSearch ajustados para um recall alvo
+contra a busca exata) são gravados nos metadados do índice e reaplicados na carga.
+"""
+import time
+import random
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# "auto": busca exata até este número de vetores, IVF-Flat acima
+AUTO_ANN_MIN_VECTORS = 100_000
+AUTO_ANN_TYPE = "ivf_flat"
+
+DEFAULT_TARGET_RECALL = 0.95
+TUNE_QUERIES = 200
+TUNE_K = 10
+
+# k-means do FAISS: < 39 pontos por centróide gera aviso, > 256 não melhora
+MIN_TRAIN_PER_CENTROID = 39
+MAX_TRAIN_PER_CENTROID = 256
+
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_PQ_NBITS = 8
+
+# Valores testados no ajuste (do mais barato ao mais caro)
+EF_SEARCH_CANDIDATES = (16, 32, 64, 128, 256, 512)
+
+
+def search_param_name(index_type: str) -> Optional[str]:
+    """Parâmetro de busca que troca recall por latência em cada tipo."""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return "nprobe"
+    if index_type == "hnsw":
+        return "efSearch"
+    return None
+
+
+def resolve_index_type(index_type: str, num_vectors: int) -> str:
+    """Resolve "auto" para um tipo concreto conforme o tamanho do índice."""
+    if index_type == "auto":
+        return AUTO_ANN_TYPE if num_vectors >= AUTO_ANN_MIN_VECTORS else "flat"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice inválido: {index_type} (use auto, {', '.join(INDEX_TYPES)})")
+    return index_type
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Maior divisor de dimension que deixa ao menos 4 dimensões por subquantizador."""
+    for m in range(max(1, dimension // 4), 0, -1):
+        if dimension % m == 0 and m <= 64:
+            return m
+    return 1
+
+
+def default_params(index_type: str, num_vectors: int, dimension: int) -> Dict:
+    """Parâmetros de construção/busca padrão para o tamanho do repositório."""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # ~4 * sqrt(N) listas, limitado pelo mínimo de pontos de treino por centróide
+        nlist = max(1, min(int(4 * num_vectors ** 0.5), num_vectors // MIN_TRAIN_PER_CENTROID))
+        params = {"nlist": nlist, "nprobe": max(1, nlist // 16)}
+        if index_type == "ivf_pq":
+            params["pq_m"] = _pq_subquantizers(dimension)
+            params["pq_nbits"] = DEFAULT_PQ_NBITS
+        return params
+    if index_type == "hnsw":
+        return {"M": DEFAULT_HNSW_M, "efConstruction": DEFAULT_EF_CONSTRUCTION, "efSearch": 64}
+    return {}
+
+
+def min_training_vectors(index_type: str, params: Dict) -> int:
+    """Mínimo de vetores para treinar o índice (0 = não precisa de treino)."""
+    if index_type == "ivf_flat":
+        return params["nlist"] * MIN_TRAIN_PER_CENTROID
+    if index_type == "ivf_pq":
+        return max(params["nlist"], 2 ** params["pq_nbits"]) * MIN_TRAIN_PER_CENTROID
+    return 0
+
+
+def select_training_sample(embeddings: np.ndarray, num_samples: int, seed: int = 0) -> np.ndarray:
+    """
+    Amostra uniforme (sem reposição) de vetores para o treino do k-means.
+
+    Usa no máximo MAX_TRAIN_PER_CENTROID pontos por centróide: mais que isso só
+    aumenta o tempo de treino.
+    """
+    if num_samples >= len(embeddings):
+        return embeddings
+    rows = random.Random(seed).sample(range(len(embeddings)), num_samples)
+    rows.sort()
+    return np.ascontiguousarray(embeddings[rows])
+
+
+def training_sample_size(index_type: str, params: Dict, num_vectors: int) -> int:
+    if index_type == "ivf_flat":
+        return min(num_vectors, params["nlist"] * MAX_TRAIN_PER_CENTROID)
+    if index_type == "ivf_pq":
+        centroids = max(params["nlist"], 2 ** params["pq_nbits"])
+        return min(num_vectors, centroids * MAX_TRAIN_PER_CENTROID)
+    return 0
+
+
+def _create_index(index_type: str, params: Dict, dimension: int):
+    if index_type == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, params["nlist"], params["pq_m"],
+                                 params["pq_nbits"], faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dimension, params["M"], faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = params["efConstruction"]
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    return index
+
+
+def create_ann_index(index_type: str, num_vectors: int, dimension: int,
+                     params: Optional[Dict] = None) -> Tuple[object, str, Dict]:
+    """
+    Cria um índice FAISS vazio (ainda não treinado) para num_vectors vetores.
+
+    Returns:
+        (index, index_type, params) - o tipo pode cair para "flat" se não houver
+        vetores suficientes para treinar o IVF/PQ
+    """
+    index_type = resolve_index_type(index_type, num_vectors)
+    merged = default_params(index_type, num_vectors, dimension)
+    merged.update({k: v for k, v in (params or {}).items() if k in merged and v is not None})
+    params = merged
+
+    required = min_training_vectors(index_type, params)
+    if required and num_vectors < required:
+        print(f"⚠️  {index_type}: {num_vectors} vetores < {required} necessários para o treino. Usando flat.")
+        index_type, params = "flat", {}
+
+    return _create_index(index_type, params, dimension), index_type, params
+
+
+def train_ann_index(index, index_type: str, sample: np.ndarray):
+    """Treina o quantizador IVF/PQ com a amostra (no-op para flat/HNSW)."""
+    if index.is_trained:
+        return
+    start = time.perf_counter()
+    index.train(sample)
+    print(f"   • Treino {index_type}: {len(sample)} vetores em {time.perf_counter() - start:.1f}s")
+
+
+def build_ann_index(embeddings: np.ndarray, ids: np.ndarray, index_type: str,
+                    params: Optional[Dict] = None, seed: int = 0) -> Tuple[object, str, Dict]:
+    """
+    Constrói um índice FAISS (produto interno; vetores já normalizados).
+
+    Args:
+        embeddings: Matriz float32 (N x d)
+        ids: ids int64 dos vetores
+        index_type: "auto" ou um de INDEX_TYPES
+        params: Sobrescreve os parâmetros padrão (nlist, nprobe, M, ...)
+        seed: Semente da amostra de treino
+
+    Returns:
+        (index, index_type, params) - o tipo pode cair para "flat" se não houver
+        vetores suficientes para treinar o IVF/PQ
+    """
+    num_vectors, dimension = embeddings.shape
+    index, index_type, params = create_ann_index(index_type, num_vectors, dimension, params)
+    if not index.is_trained:
+        sample = select_training_sample(embeddings, training_sample_size(index_type, params, num_vectors), seed)
+        train_ann_index(index, index_type, sample)
+    index.add_with_ids(embeddings, ids)
+    apply_search_params(index, params)
+    return index, index_type, params
+
+
+def apply_search_params(index, params: Optional[Dict]):
+    """Aplica nprobe/efSearch salvos (funciona também através do IndexIDMap)."""
+    if not params:
+        return
+    space = faiss.ParameterSpace()
+    for name in ("nprobe", "efSearch"):
+        if name in params:
+            space.set_index_parameter(index, name, params[name])
+
+
+def supports_removal(index) -> bool:
+    """HNSW não suporta remove_ids: atualizações com remoções exigem reconstrução."""
+    wrapped = isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+    inner = faiss.downcast_index(index.index) if wrapped else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+
+def supports_incremental(index) -> bool:
+    """Índices com ids próprios (IDMap/IVF) aceitam add_with_ids por arquivo."""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def exact_neighbours(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Vizinhos exatos (posições em embeddings) para medir o recall."""
+    flat = faiss.IndexFlatIP(embeddings.shape[1])
+    flat.add(embeddings)
+    _, positions = flat.search(queries, k)
+    return positions
+
+
+def drop_self_matches(neighbour_ids: np.ndarray, query_ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    Remove de cada linha o id da própria consulta e mantém os k primeiros.
+
+    As consultas do ajuste são vetores do índice: o vizinho mais próximo de cada uma
+    é ela mesma, que qualquer nprobe/efSearch encontra, e inflaria o recall.
+    """
+    rows = np.full((len(query_ids), k), -1, dtype='int64')
+    for i, (row, query_id) in enumerate(zip(neighbour_ids, query_ids)):
+        kept = [found for found in row.tolist() if found != query_id][:k]
+        rows[i, :len(kept)] = kept
+    return rows
+
+
+class StreamingExactNeighbours:
+    """
+    Vizinhos exatos de um conjunto fixo de consultas, acumulados lote a lote.
+
+    Permite medir o recall sem manter todos os vetores do índice em memória
+    (indexação em streaming): cada lote é comparado com as consultas e só os
+    k melhores ids por consulta são mantidos. Com query_ids (consultas tiradas do
+    próprio índice), a consulta não conta como vizinha de si mesma.
+    """
+
+    def __init__(self, queries: np.ndarray, k: int, query_ids: Optional[np.ndarray] = None):
+        self.queries = queries
+        self.k = k
+        self.query_ids = query_ids
+        self._scores = np.full((len(queries), k), -np.inf, dtype='float32')
+        self._ids = np.full((len(queries), k), -1, dtype='int64')
+
+    def update(self, embeddings: np.ndarray, ids: np.ndarray):
+        if len(embeddings) == 0 or len(self.queries) == 0:
+            return
+        scores = self.queries @ embeddings.T
+        if self.query_ids is not None:
+            scores[self.query_ids[:, None] == ids[None, :]] = -np.inf
+        all_scores = np.concatenate([self._scores, scores], axis=1)
+        all_ids = np.concatenate([self._ids, np.broadcast_to(ids, scores.shape)], axis=1)
+        best = np.argsort(-all_scores, axis=1, kind='stable')[:, :self.k]
+        self._scores = np.take_along_axis(all_scores, best, axis=1)
+        self._ids = np.take_along_axis(all_ids, best, axis=1)
+
+    def truth_ids(self) -> np.ndarray:
+        """ids dos k vizinhos exatos de cada consulta (colunas -1 se houver < k vetores)."""
+        return self._ids
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Fração dos k vizinhos exatos que o índice aproximado retornou."""
+    hits = 0
+    for found_row, truth_row in zip(found, truth):
+        hits += len(set(found_row.tolist()) & set(truth_row.tolist()))
+    return hits / truth.size if truth.size else 1.0
+
+
+def measure(index, queries: np.ndarray, truth_ids: np.ndarray, k: int,
+            query_ids: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """
+    (recall@k, latência média por consulta em ms) com os parâmetros atuais.
+
+    query_ids: ids das consultas no índice; busca k + 1 e descarta a própria consulta
+    """
+    start = time.perf_counter()
+    _, found = index.search(queries, k + 1 if query_ids is not None else k)
+    elapsed = time.perf_counter() - start
+    if query_ids is not None:
+        found = drop_self_matches(found, query_ids, k)
+    return recall_at_k(found, truth_ids), elapsed * 1000 / max(1, len(queries))
+
+
+def search_param_candidates(index_type: str, params: Dict) -> List[int]:
+    if index_type in ("ivf_flat", "ivf_pq"):
+        values, value = [], 1
+        while value < params["nlist"]:
+            values.append(value)
+            value *= 2
+        return values + [params["nlist"]]
+    if index_type == "hnsw":
+        return list(EF_SEARCH_CANDIDATES)
+    return []
+
+
+def tune_search_params(index, index_type: str, params: Dict, embeddings: np.ndarray, ids: np.ndarray,
+                       target_recall: float = DEFAULT_TARGET_RECALL, num_queries: int = TUNE_QUERIES,
+                       k: int = TUNE_K, seed: int = 0) -> Dict:
+    """
+    Escolhe o menor nprobe/efSearch que atinge target_recall@k contra a busca exata.
+
+    Se nenhum valor atinge o alvo (ex.: IVF-PQ, limitado pela quantização), usa o
+    menor valor a 0.005 do melhor recall medido. As consultas são vetores do próprio
+    índice (amostra), excluídos dos seus próprios resultados (exatos e aproximados);
+    o resultado e o recall medido ficam em params ("nprobe"/"efSearch",
+    "recall_at_k", "tune_k").
+    """
+    name = search_param_name(index_type)
+    if name is None or len(embeddings) < 2:
+        return params
+
+    k = min(k, len(embeddings) - 1)
+    rows = sorted(random.Random(seed + 1).sample(range(len(embeddings)), min(num_queries, len(embeddings))))
+    queries = np.ascontiguousarray(embeddings[rows])
+    query_ids = ids[rows]
+    truth = drop_self_matches(ids[exact_neighbours(embeddings, queries, k + 1)], query_ids, k)
+    return tune_search_params_with_truth(index, index_type, params, queries, truth, target_recall, query_ids)
+
+
+def tune_search_params_with_truth(index, index_type: str, params: Dict, queries: np.ndarray,
+                                  truth: np.ndarray, target_recall: float = DEFAULT_TARGET_RECALL,
+                                  query_ids: Optional[np.ndarray] = None) -> Dict:
+    """
+    Ajuste de nprobe/efSearch (ver tune_search_params) com vizinhos exatos já calculados.
+
+    truth: ids (len(queries) x k) dos vizinhos exatos, ex.: de StreamingExactNeighbours
+    query_ids: ids das consultas quando elas estão no índice (truth sem a própria consulta)
+    """
+    name = search_param_name(index_type)
+    if name is None or len(queries) == 0:
+        return params
+    k = truth.shape[1]
+
+    measured = []
+    for value in search_param_candidates(index_type, params):
+        apply_search_params(index, {name: value})
+        recall, latency = measure(index, queries, truth, k, query_ids)
+        measured.append((value, recall, latency))
+        if recall >= target_recall:
+            break
+
+    best_recall = max(recall for _, recall, _ in measured)
+    if best_recall < target_recall:
+        print(f"⚠️  {index_type}: recall máximo {best_recall:.3f} < alvo {target_recall:.2f}")
+    chosen, recall, latency = next(m for m in measured if m[1] >= min(target_recall, best_recall - 0.005))
+
+    params = dict(params)
+    params[name] = chosen
+    params["recall_at_k"] = round(recall, 4)
+    params["tune_k"] = k
+    apply_search_params(index, params)
+    print(f"   • {name}={chosen}: recall@{k}={recall:.3f} | {latency:.3f} ms/consulta")
+    return params
+
+
+def describe_index(index, index_type: str, params: Dict, requested: Optional[str] = None) -> Dict:
+    """
+    Entrada "semantic_index" dos metadados do índice.
+
+    requested guarda o tipo pedido quando ele caiu para "flat" por falta de
+    vetores de treino (evita reconstruir a cada indexação incremental).
+    """
+    return {
+        "type": index_type,
+        "requested": requested or index_type,
+        "params": params,
+        "vectors": int(index.ntotal),
+        "dimension": int(index.d)
+    }
@@ -3,16 +3,33 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import subprocess
 import os
+import asyncio
 import signal
 import torch
 import psutil
 from typing import List, Optional
 
 import json
+from contextlib import asynccontextmanager
 from l2j_pipeline.migration_api import router as migration_router
+from l2j_pipeline.jobs_api import router as jobs_router
+from l2j_pipeline.job_queue import get_job_queue, start_worker_pool, stop_worker_pool
 
-app = FastAPI(title="HRM-Forge: Universal Training Hub")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Sobe o pool de workers da fila de jobs (L2J_JOB_WORKERS; 0 = workers externos) e o encerra na saída."""
+    pid = start_worker_pool()
+    if pid:
+        print(f"[*] Pool de workers de jobs iniciado (pid {pid})")
+    yield
+    if pid:
+        # Só o pool que esta API subiu; um pool externo continua rodando
+        stopped = await asyncio.to_thread(stop_worker_pool, pid)
+        print(f"[*] Pool de workers de jobs {'encerrado' if stopped else 'não encerrou a tempo'} (pid {pid})")
+
+app = FastAPI(title="HRM-Forge: Universal Training Hub", lifespan=lifespan)
 app.include_router(migration_router)
+app.include_router(jobs_router)
 
 # Project management
 PROJECTS_FILE = "hrm_projects.json"
@@ -180,44 +197,19 @@ async def list_repos():
     return manager.list_repos()
 
 @app.post("/rlcoder/repos/add")
-async def add_repo(req: AddRepoRequest, background_tasks: BackgroundTasks):
-    """Adiciona e clona um novo repositório."""
-    try:
-        from l2j_pipeline.repo_manager import RepositoryManager
-    except ImportError:
-        from repo_manager import RepositoryManager
-    
-    def clone_repo():
-        try:
-            manager = RepositoryManager()
-            result = manager.add_repo(req.name, req.url)
-            print(f"[✅] Repositório {req.name} adicionado com sucesso!")
-            return result
-        except Exception as e:
-            print(f"[❌] Erro ao adicionar repositório: {e}")
-    
-    background_tasks.add_task(clone_repo)
-    return {"message": f"Clonando repositório {req.name} em background", "status": "processing"}
+async def add_repo(req: AddRepoRequest):
+    """Enfileira o clone de um novo repositório; acompanhar em /jobs/{job_id}."""
+    job_id = get_job_queue().enqueue("repo_add", {"name": req.name, "url": req.url})
+    return {"message": f"Clone do repositório {req.name} enfileirado", "status": "queued", "job_id": job_id}
 
 @app.post("/rlcoder/repos/{name}/index")
-async def index_repo(name: str, background_tasks: BackgroundTasks):
-    """Indexa um repositório específico."""
-    try:
-        from l2j_pipeline.repo_manager import RepositoryManager
-    except ImportError:
-        from repo_manager import RepositoryManager
-    
-    def run_indexing():
-        try:
-            manager = RepositoryManager()
-            stats = manager.index_repo(name)
-            print(f"[✅] Repositório {name} indexado com sucesso!")
-            print(f"   Stats: {stats}")
-        except Exception as e:
-            print(f"[❌] Erro ao indexar: {e}")
-    
-    background_tasks.add_task(run_indexing)
-    return {"message": f"Indexando repositório {name} em background", "status": "processing"}
+async def index_repo(name: str, ann_type: Optional[str] = None, streaming: Optional[bool] = None):
+    """
+    Enfileira a indexação de um repositório específico (ann_type: auto, flat, ivf_flat,
+    hnsw ou ivf_pq; streaming: memória limitada para repositórios grandes).
+    """
+    job_id = get_job_queue().enqueue("repo_index", {"name": name, "ann_type": ann_type, "streaming": streaming})
+    return {"message": f"Indexação do repositório {name} enfileirada", "status": "queued", "job_id": job_id}
 
 @app.post("/rlcoder/repos/{name}/activate")
 async def activate_repo(name: str):
@@ -241,40 +233,44 @@ async def delete_repo(name: str):
     manager.delete_repo(name)
     return {"message": f"Repositório {name} removido"}
 
+@app.get("/rlcoder/cache-stats")
+async def rlcoder_cache_stats():
+    """Contadores do cache de índices/encoders/embeddings do RLCoder neste processo."""
+    try:
+        from l2j_pipeline.retriever_registry import get_registry
+    except ImportError:
+        from retriever_registry import get_registry
+    return get_registry().stats()
+
 # =====================================================================
 @app.get("/status")
 async def get_status():
     return {"status": "online", "cuda_available": torch.cuda.is_available()}
 
 @app.post("/index-l2j")
-async def index_l2j_repo(background_tasks: BackgroundTasks):
-    """Executa indexação do repositório L2J para RLCoder."""
-    def run_indexing():
-        try:
-            cmd = [".venv/bin/python", "l2j_pipeline/index_l2j_repo.py"]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            print("[✅] Indexação concluída!")
-            print(result.stdout)
-        except subprocess.CalledProcessError as e:
-            print(f"[❌] Erro na indexação: {e.stderr}")
-    
-    background_tasks.add_task(run_indexing)
-    return {"message": "Indexação iniciada em background", "status": "processing"}
+async def index_l2j_repo():
+    """Enfileira a indexação do repositório L2J para RLCoder."""
+    job_id = get_job_queue().enqueue("index_l2j")
+    return {"message": "Indexação enfileirada", "status": "queued", "job_id": job_id}
 
 @app.get("/index-status")
 async def get_index_status():
     """Verifica se o índice RLCoder existe."""
+    try:
+        from l2j_pipeline.index_store import load_index_metadata
+    except ImportError:
+        from index_store import load_index_metadata
+    
     index_path = "data/rlcoder_index/l2j_index.json"
-    if os.path.exists(index_path):
-        with open(index_path, 'r') as f:
-            import json
-            index = json.load(f)
-            return {
-                "exists": True,
-                "total_files": index["metadata"]["total_files"],
-                "total_lines": index["metadata"]["total_lines"],
-                "classes": len(index["class_map"])
-            }
+    # Formato v2: só o JSON de metadados (tamanho constante) é lido
+    metadata = load_index_metadata(index_path)
+    if metadata:
+        return {
+            "exists": True,
+            "total_files": metadata["total_files"],
+            "total_lines": metadata["total_lines"],
+            "classes": metadata["classes"]
+        }
     return {"exists": False}
 
 @app.post("/transcribe")
@@ -302,7 +298,10 @@ async def run_transcribe(req: TranscriptionRequest):
         from l2j_pipeline.hybrid_migration_engine import HybridMigrationEngine
         
         print(f"[API] Initializing HybridEngine for single file: {req.model}")
-        engine = HybridMigrationEngine(
+        # Engine e pipeline são bloqueantes (RLCoder, LLM, compilador): rodam em thread
+        # para não travar o event loop; as chamadas ao LLM passam pelo cliente compartilhado
+        engine = await asyncio.to_thread(
+            HybridMigrationEngine,
             target_lang=req.target_lang,
             model=req.model,
             use_hrm_guidance=True
@@ -312,7 +311,7 @@ async def run_transcribe(req: TranscriptionRequest):
         file_path = req.file_path or "StudioExperiment.java"
         
         # Gerar código
-        result = engine.generate_code(req.java_code, file_path)
+        result = await asyncio.to_thread(engine.generate_code, req.java_code, file_path)
         
         if not result["success"]:
              raise HTTPException(status_code=500, detail=result.get("error", "Generation failed"))
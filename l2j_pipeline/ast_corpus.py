@@ -0,0 +1,310 @@
+"""
+Corpus de AST do Repositório
+Extração em lote do AST de todos os arquivos Java de um repositório (pool de
+processos, um Parser tree-sitter por worker), gravada em um corpus JSONL compacto
+que os demais estágios leem em vez de reparsear:
+
+    linha 1 -> cabeçalho {"corpus": "l2j-ast", "schema", "repo", "created"}
+    demais  -> um arquivo por linha, em ordem de path:
+               {"path", "sha256", "mtime", "size",
+                "package", "imports", "c_structure",   <- EnterpriseJavaParser.parse_source
+                "chunks"}                              <- EnterpriseJavaParser.extract_chunks
+
+Consumidores: map_dependencies (--ast-corpus), DomainOrchestrator
+(generate_domain_map_from_corpus), o indexador (--ast-corpus: chunks prontos) e os
+geradores de dataset (generate_synth_dataset / prepare_guidance_dataset, --ast-corpus).
+Registros são casados pelo sha256 do arquivo: conteúdo alterado depois da extração
+cai no parse normal.
+
+Uso:
+    python l2j_pipeline/ast_parser.py --parse-repo temp_repos/l2j-server-game
+    python l2j_pipeline/ast_parser.py --parse-repo REPO --output data/ast_corpus/game.jsonl --workers 8
+"""
+import os
+import copy
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from tqdm import tqdm
+
+try:
+    from ast_parser import EnterpriseJavaParser
+    from parse_cache import AST_SCHEMA_VERSION
+except ImportError:
+    from l2j_pipeline.ast_parser import EnterpriseJavaParser
+    from l2j_pipeline.parse_cache import AST_SCHEMA_VERSION
+
+CORPUS_FORMAT = "l2j-ast"
+DEFAULT_CORPUS_DIR = "data/ast_corpus"
+# Arquivos por lote enviado a um worker (lotes pequenos: parse é CPU, não I/O)
+DEFAULT_PARSE_CHUNK_SIZE = 64
+# Campos do registro que formam o resultado de parse_source
+PARSE_FIELDS = ("package", "imports", "c_structure")
+
+_worker_parser = None
+
+
+def default_parse_workers() -> int:
+    """Número padrão de processos do parse em lote (1 = serial)."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def default_corpus_path(repo_path: str) -> str:
+    """data/ast_corpus/<nome do repositório>.jsonl"""
+    name = os.path.basename(os.path.normpath(repo_path)) or "repo"
+    return os.path.join(DEFAULT_CORPUS_DIR, f"{name}.jsonl")
+
+
+def list_java_paths(repo_path: str) -> List[str]:
+    """Paths relativos (posix) dos arquivos Java do repositório, ordenados."""
+    repo = Path(repo_path)
+    return sorted(p.relative_to(repo).as_posix() for p in repo.rglob("*.java"))
+
+
+def _parse_batch(job: Tuple[str, List[str]]) -> List[Dict]:
+    """
+    Worker: lê e parseia um lote de arquivos com o parser do processo.
+
+    Roda no processo principal (serial) ou em um processo do pool; recebe/retorna
+    apenas tipos serializáveis.
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        # Um Parser por processo; sem cache: cada arquivo é parseado uma única vez
+        _worker_parser = EnterpriseJavaParser(cache=False)
+
+    repo_path, rel_paths = job
+    records = []
+    for rel_path in rel_paths:
+        try:
+            full_path = os.path.join(repo_path, rel_path)
+            stat = os.stat(full_path)
+            with open(full_path, 'rb') as f:
+                data = f.read()
+            records.append({
+                "path": rel_path,
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                **_worker_parser.parse_with_chunks(data)
+            })
+        except Exception as e:
+            records.append({"path": rel_path, "error": str(e)})
+    return records
+
+
+def iter_parse_paths(repo_path: str, rel_paths: List[str], workers: int = 1,
+                     chunk_size: int = DEFAULT_PARSE_CHUNK_SIZE) -> Iterator[List[Dict]]:
+    """
+    Parseia os arquivos em lotes, produzindo um lote de registros por vez, em ordem.
+
+    No pool, no máximo `2 * workers` lotes ficam em voo (memória limitada).
+    """
+    chunk_size = max(1, chunk_size)
+    jobs = ((repo_path, rel_paths[i:i + chunk_size]) for i in range(0, len(rel_paths), chunk_size))
+
+    if workers <= 1 or len(rel_paths) <= chunk_size:
+        yield from map(_parse_batch, jobs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Fila FIFO de futures preserva a ordem dos lotes -> corpus idêntico ao serial
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(_parse_batch, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _load_previous(output_path: str) -> Dict[str, Dict]:
+    """Registros do corpus anterior por path (vazio se ausente, ilegível ou de outro schema)."""
+    if not os.path.exists(output_path):
+        return {}
+    try:
+        return {record["path"]: record for record in iter_ast_corpus(output_path)}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Corpus anterior ignorado ({e}). Parseando todos os arquivos.")
+        return {}
+
+
+def parse_repo(repo_path: str, output_path: str, workers: int = None,
+               chunk_size: int = DEFAULT_PARSE_CHUNK_SIZE, reuse: bool = True) -> Dict:
+    """
+    Extrai o AST de todos os arquivos Java de repo_path para um corpus JSONL.
+
+    Args:
+        repo_path: Raiz do repositório
+        output_path: Corpus de saída (substituído atomicamente)
+        workers: Processos do pool (padrão cpu_count - 1; <= 1 executa em série)
+        chunk_size: Arquivos por lote enviado a cada worker
+        reuse: Reaproveita registros do corpus anterior com mesmo mtime/tamanho
+
+    Returns:
+        {"files", "parsed", "reused", "errors", "seconds", "files_per_sec", "output"}
+    """
+    workers = default_parse_workers() if workers is None else workers
+    started = time.perf_counter()
+
+    previous = _load_previous(output_path) if reuse else {}
+    all_paths = list_java_paths(repo_path)
+    to_parse = []
+    for rel_path in all_paths:
+        old = previous.get(rel_path)
+        try:
+            stat = os.stat(os.path.join(repo_path, rel_path))
+        except OSError:
+            to_parse.append(rel_path)  # o worker registra o erro
+            continue
+        if not (old and old["mtime"] == stat.st_mtime_ns and old["size"] == stat.st_size):
+            to_parse.append(rel_path)
+
+    print(f"[*] Parse em lote: {len(all_paths)} arquivos Java em {repo_path} "
+          f"({len(to_parse)} a parsear, {workers} worker(s))")
+    parsed = (record for batch in iter_parse_paths(repo_path, to_parse, workers, chunk_size)
+              for record in batch)
+    next_parsed = next(parsed, None)
+
+    stats = {"files": 0, "parsed": 0, "reused": 0, "errors": 0}
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f, tqdm(total=len(all_paths), desc="Parseando") as progress:
+            header = {
+                "corpus": CORPUS_FORMAT,
+                "schema": AST_SCHEMA_VERSION,
+                "repo": os.path.abspath(repo_path),
+                "created": time.time()
+            }
+            f.write(json.dumps(header, separators=(',', ':')) + '\n')
+            # Mescla na ordem de all_paths: to_parse é uma subsequência dela
+            for rel_path in all_paths:
+                if next_parsed is not None and next_parsed["path"] == rel_path:
+                    record = next_parsed
+                    next_parsed = next(parsed, None)
+                    if "error" in record:
+                        print(f"⚠️  Erro ao parsear {os.path.join(repo_path, rel_path)}: {record['error']}")
+                        stats["errors"] += 1
+                        progress.update(1)
+                        continue
+                    stats["parsed"] += 1
+                else:
+                    record = previous[rel_path]
+                    stats["reused"] += 1
+                f.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n')
+                stats["files"] += 1
+                progress.update(1)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["files_per_sec"] = len(all_paths) / elapsed if elapsed > 0 else 0.0
+    stats["output"] = output_path
+    print(f"✅ Corpus AST salvo em: {output_path}")
+    print(f"   • {stats['files']} arquivos | parseados: {stats['parsed']} | "
+          f"reaproveitados: {stats['reused']} | erros: {stats['errors']}")
+    print(f"   • {elapsed:.2f}s -> {stats['files_per_sec']:.0f} arquivos/s")
+    return stats
+
+
+def iter_ast_corpus(path: str) -> Iterator[Dict]:
+    """
+    Registros de arquivo do corpus, em ordem (sem o cabeçalho).
+
+    Raises:
+        ValueError: se não for um corpus AST ou se o schema for de outra versão
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        _check_header(header, path)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _check_header(header: Optional[Dict], path: str):
+    if not isinstance(header, dict) or header.get("corpus") != CORPUS_FORMAT:
+        raise ValueError(f"{path} não é um corpus AST")
+    if header.get("schema") != AST_SCHEMA_VERSION:
+        raise ValueError(
+            f"{path}: corpus AST v{header.get('schema')}, esperado v{AST_SCHEMA_VERSION} "
+            f"(regenere com ast_parser.py --parse-repo)"
+        )
+
+
+class AstCorpus:
+    """
+    Corpus AST carregado em memória, indexado por path relativo e por sha256.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            self.header = json.loads(f.readline() or 'null')
+        _check_header(self.header, path)
+        self.repo = self.header.get("repo", "")
+        self.records: List[Dict] = list(iter_ast_corpus(path))
+        self._by_path = {record["path"]: record for record in self.records}
+        self._by_sha = {record["sha256"]: record for record in self.records}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records)
+
+    def get(self, rel_path: str) -> Optional[Dict]:
+        """Registro de um path relativo à raiz do repositório."""
+        return self._by_path.get(rel_path.replace(os.sep, '/'))
+
+    def lookup(self, source: Union[bytes, str]) -> Optional[Dict]:
+        """Registro com exatamente este conteúdo (qualquer path), ou None."""
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        return self.lookup_sha(hashlib.sha256(source).hexdigest())
+
+    def lookup_sha(self, digest: str) -> Optional[Dict]:
+        """Registro pelo sha256 do conteúdo, ou None."""
+        return self._by_sha.get(digest)
+
+    def parse(self, parser: EnterpriseJavaParser, source: Union[bytes, str],
+              file_path: Optional[str] = None) -> Dict:
+        """
+        Mesmo resultado de parser.parse_source(source, file_path), vindo do corpus
+        quando o conteúdo bate (senão, parse normal).
+        """
+        record = self.lookup(source)
+        if record is None:
+            return parser.parse_source(source, file_path)
+        return parse_result(record, file_path)
+
+    def packages(self) -> Dict[str, str]:
+        """path relativo -> pacote."""
+        return {record["path"]: record["package"] for record in self.records}
+
+    def chunk_hints(self) -> Dict[str, Tuple[str, List[Dict]]]:
+        """path relativo -> (sha256, chunks), para o scanner do indexador."""
+        return {record["path"]: (record["sha256"], record["chunks"]) for record in self.records}
+
+
+def parse_result(record: Dict, file_path: Optional[str] = None) -> Dict:
+    """Registro do corpus no formato de EnterpriseJavaParser.parse_source (cópia)."""
+    return {"file_path": file_path, **copy.deepcopy({k: record[k] for k in PARSE_FIELDS})}
+
+
+def load_ast_corpus(path: Optional[str]) -> Optional[AstCorpus]:
+    """AstCorpus de `path` (None se path vazio). Propaga erros de leitura/schema."""
+    if not path:
+        return None
+    corpus = AstCorpus(path)
+    print(f"[*] Corpus AST carregado: {path} ({len(corpus)} arquivos)")
+    return corpus
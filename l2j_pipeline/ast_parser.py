@@ -7,12 +7,48 @@ from tree_sitter import Language, Parser
 import os
 import json
 import argparse
-from typing import Dict, List, Any
+import threading
+from typing import Dict, List, Any, Optional, Union
+
+try:
+    from parse_cache import ParseCache, get_parse_cache, source_key
+except ImportError:
+    from l2j_pipeline.parse_cache import ParseCache, get_parse_cache, source_key
+
+# Declarações de tipo que geram um chunk de cabeçalho (assinatura + campos)
+CHUNK_TYPE_DECLARATIONS = (
+    'class_declaration', 'interface_declaration', 'enum_declaration',
+    'record_declaration', 'annotation_type_declaration'
+)
+# Declarações de tipo -> "type" no AST estruturado (c_structure)
+STRUCTURE_TYPE_KINDS = {
+    'class_declaration': 'class',
+    'interface_declaration': 'interface',
+    'enum_declaration': 'enum',
+    'record_declaration': 'record',
+    'annotation_type_declaration': 'annotation'
+}
+TYPE_BODIES = ('class_body', 'interface_body', 'enum_body', 'annotation_type_body')
+# Tipos de referência de extract_references
+REFERENCE_KINDS = ("extends", "implements", "type", "static", "annotation")
+# Membros que geram um chunk próprio (corpo completo)
+CHUNK_MEMBER_KINDS = {
+    'method_declaration': 'method',
+    'constructor_declaration': 'constructor',
+    'compact_constructor_declaration': 'constructor'
+}
 
 class EnterpriseJavaParser:
-    def __init__(self):
+    def __init__(self, cache: Union[ParseCache, bool, None] = None):
+        """
+        cache: ParseCache a usar; None = cache compartilhado do processo
+               (get_parse_cache), False = sem cache.
+        """
         self.JAVA_LANGUAGE = Language(tsjava.language())
         self.parser = Parser(self.JAVA_LANGUAGE)
+        self.cache = get_parse_cache() if cache is None else (cache or None)
+        # tree-sitter Parser não é thread-safe
+        self._parse_lock = threading.Lock()
 
     def parse_file(self, file_path: str) -> Dict[str, Any]:
         """Parses a Java file and returns structured metadata."""
@@ -22,169 +58,471 @@ class EnterpriseJavaParser:
         with open(file_path, "rb") as f:
             source_code = f.read()
 
-        tree = self.parser.parse(source_code)
+        return self.parse_source(source_code, file_path)
+
+    def parse_source(self, source: Union[bytes, str], file_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Parses Java source already in memory (same result as parse_file).
+
+        c_structure lists the top-level types; each type carries its fields, methods,
+        constructors, initializers, enum constants, record components and nested
+        types (inner_classes), and every entry has byte/line spans (start_byte,
+        end_byte, start_line, end_line) into `source`. Methods and constructors also
+        carry the span of their body.
+
+        Results are cached by content hash: parsing the same source again (from
+        any path or caller) skips tree-sitter entirely.
+        """
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+
+        key = source_key(source) if self.cache is not None else None
+        data = self.cache.get(key) if key else None
+        if data is None:
+            with self._parse_lock:
+                tree = self.parser.parse(source)
+            data = self._visit_program(tree.root_node)
+            if key:
+                self.cache.put(key, data)
+
+        return {"file_path": file_path, **data}
+
+    def parse_with_chunks(self, source: bytes) -> Dict[str, Any]:
+        """
+        parse_source + extract_chunks over a single tree-sitter parse (no cache).
+
+        Used by the bulk extraction (ast_corpus.parse_repo), where each file is
+        parsed exactly once.
+        """
+        with self._parse_lock:
+            tree = self.parser.parse(source)
+        data = self._visit_program(tree.root_node)
+        # Chunks saem dos spans do visitor: sem segunda caminhada na árvore
+        chunks = []
+        self._chunks_from_structure(data["c_structure"], chunks)
+        return {**data, "chunks": chunks, **self._collect_references(tree.root_node)}
+
+    def extract_references(self, source: Union[bytes, str]) -> Dict[str, Any]:
+        """
+        Package, imports and type references of a Java source (no cache).
+
+        references maps each referenced name (simple "Foo", nested "Outer.Inner" or
+        qualified "a.b.Foo") to {kind: count}, kind being one of REFERENCE_KINDS.
+        local_types lists the types and type parameters declared in the file, which
+        shadow same-named project classes.
+        """
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        with self._parse_lock:
+            tree = self.parser.parse(source)
         root_node = tree.root_node
+        package = ""
+        imports = []
+        for child in root_node.children:
+            if child.type == 'import_declaration':
+                name = self._import_name(child)
+                if name is not None:
+                    imports.append(name)
+            elif child.type == 'package_declaration' and not package:
+                package = self._package_name(child)
+        return {"package": package, "imports": imports, **self._collect_references(root_node)}
+
+    def extract_chunks(self, source: bytes) -> List[Dict]:
+        """
+        Splits a Java source into retrieval chunks with byte/line spans.
+
+        One "type" chunk per class/interface/enum/record (header: signature, fields and
+        initializers up to the first method or nested type) and one chunk per method or
+        constructor. Nested types are visited recursively; names are qualified
+        (Outer.Inner.method). Lines are 1-based and inclusive.
+        """
+        with self._parse_lock:
+            tree = self.parser.parse(source)
+        chunks = []
+        self._collect_chunks(tree.root_node.children, None, chunks)
+        return chunks
 
+    def _collect_chunks(self, nodes, owner, chunks: List[Dict]):
+        for node in nodes:
+            if node.type not in CHUNK_TYPE_DECLARATIONS:
+                continue
+            name_node = node.child_by_field_name('name')
+            name = name_node.text.decode('utf-8') if name_node else "Anonymous"
+            qualified = f"{owner}.{name}" if owner else name
+
+            members = self._body_members(node.child_by_field_name('body'))
+            first_member = next(
+                (m for m in members if m.type in CHUNK_MEMBER_KINDS or m.type in CHUNK_TYPE_DECLARATIONS),
+                None
+            )
+            if first_member is not None:
+                header_end, header_end_line = first_member.start_byte, first_member.start_point[0]
+            else:
+                header_end, header_end_line = node.end_byte, node.end_point[0] + 1
+            chunks.append(self._make_chunk("type", qualified, node.start_byte, header_end,
+                                           node.start_point[0] + 1, max(node.start_point[0] + 1, header_end_line)))
+
+            for member in members:
+                kind = CHUNK_MEMBER_KINDS.get(member.type)
+                if kind:
+                    member_name = member.child_by_field_name('name')
+                    label = member_name.text.decode('utf-8') if member_name else name
+                    chunks.append(self._make_chunk(kind, f"{qualified}.{label}", member.start_byte,
+                                                   member.end_byte, member.start_point[0] + 1,
+                                                   member.end_point[0] + 1))
+            self._collect_chunks(members, qualified, chunks)
+
+    def _chunks_from_structure(self, types: List[Dict], chunks: List[Dict]):
+        """Same chunks as _collect_chunks, built from the spans in c_structure."""
+        for data in types:
+            members = [m for m in data["methods"] if "default" not in m] + data["constructors"]
+            members.sort(key=lambda m: m["start_byte"])
+            # Header ends at the first method, constructor or nested type
+            first_start = [members[0]] if members else []
+            first_start += data["inner_classes"][:1]
+            first = min(first_start, key=lambda m: m["start_byte"], default=None)
+            if first is not None:
+                header_end, header_end_line = first["start_byte"], first["start_line"] - 1
+            else:
+                header_end, header_end_line = data["end_byte"], data["end_line"]
+            qualified = data["qualified_name"]
+            chunks.append(self._make_chunk("type", qualified, data["start_byte"], header_end,
+                                           data["start_line"], max(data["start_line"], header_end_line)))
+            constructors = {id(c) for c in data["constructors"]}
+            for member in members:
+                kind = "constructor" if id(member) in constructors else "method"
+                chunks.append(self._make_chunk(kind, f"{qualified}.{member['name']}", member["start_byte"],
+                                               member["end_byte"], member["start_line"], member["end_line"]))
+            self._chunks_from_structure(data["inner_classes"], chunks)
+
+    def _body_members(self, body) -> List:
+        """Direct members of a class/interface/enum/record body."""
+        if body is None:
+            return []
+        members = []
+        for child in body.children:
+            if child.type == 'enum_body_declarations':
+                members.extend(child.children)
+            else:
+                members.append(child)
+        return members
+
+    @staticmethod
+    def _make_chunk(kind: str, name: str, start_byte: int, end_byte: int,
+                    start_line: int, end_line: int) -> Dict:
         return {
-            "file_path": file_path,
-            "package": self._find_package(root_node),
-            "imports": self._find_imports(root_node),
-            "c_structure": self._extract_structure(root_node, source_code)
+            "kind": kind,
+            "name": name,
+            "start_byte": start_byte,
+            "end_byte": end_byte,
+            "start_line": start_line,
+            "end_line": end_line
         }
 
-    def _find_package(self, node) -> str:
+    def _visit_program(self, root) -> Dict[str, Any]:
+        """
+        Single pass over the compilation unit: package, imports and every type
+        declaration (recursively, see _visit_type).
+        """
+        package = ""
+        imports = []
+        types = []
+        for child in root.children:
+            kind = child.type
+            if kind in STRUCTURE_TYPE_KINDS:
+                types.append(self._visit_type(child, None))
+            elif kind == 'import_declaration':
+                name = self._import_name(child)
+                if name is not None:
+                    imports.append(name)
+            elif kind == 'package_declaration' and not package:
+                package = self._package_name(child)
+        return {"package": package, "imports": imports, "c_structure": types}
+
+    def _collect_references(self, root) -> Dict[str, Any]:
+        """Single walk over the whole tree collecting type references (see extract_references)."""
+        references: Dict[str, Dict[str, int]] = {}
+        local_types = set()
+
+        def add(name: str, kind: str):
+            kinds = references.setdefault(name, {})
+            kinds[kind] = kinds.get(kind, 0) + 1
+
+        stack = [(child, "type") for child in root.children
+                 if child.type not in ('package_declaration', 'import_declaration')]
+        while stack:
+            node, kind = stack.pop()
+            node_type = node.type
+            if node_type in ('type_identifier', 'scoped_type_identifier'):
+                add(node.text.decode('utf-8'), kind)
+                continue
+            if node_type in STRUCTURE_TYPE_KINDS:
+                name_node = node.child_by_field_name('name')
+                if name_node is not None:
+                    local_types.add(name_node.text.decode('utf-8'))
+            elif node_type == 'type_parameter':
+                # <T extends Bound>: T é local; o bound é referência
+                children = node.children
+                if children and children[0].type == 'type_identifier':
+                    local_types.add(children[0].text.decode('utf-8'))
+                    stack.extend((child, kind) for child in children[1:])
+                    continue
+            elif node_type == 'superclass':
+                kind = "extends"
+            elif node_type in ('super_interfaces', 'extends_interfaces'):
+                kind = "implements"
+            elif node_type in ('marker_annotation', 'annotation'):
+                name_node = node.child_by_field_name('name')
+                if name_node is not None:
+                    add(name_node.text.decode('utf-8'), "annotation")
+            elif node_type in ('method_invocation', 'field_access', 'method_reference'):
+                # Config.load() / Config.MAX / Foo::bar -> uso estático de Config
+                obj = node.child_by_field_name('object') if node_type != 'method_reference' else node.children[0]
+                qualifier = obj.text.decode('utf-8') if obj is not None else ""
+                if obj is not None and obj.type == 'identifier' and qualifier[:1].isupper():
+                    add(qualifier, "static")
+                elif node_type == 'field_access' and obj is not None and obj.type in ('identifier', 'field_access'):
+                    # a.b.Config (nome qualificado em expressão): pacote em minúsculas + tipo
+                    field = node.child_by_field_name('field')
+                    if field is not None:
+                        field_name = field.text.decode('utf-8')
+                        if field_name[:1].isupper() and qualifier.islower():
+                            add(f"{qualifier}.{field_name}", "static")
+            stack.extend((child, kind) for child in node.children)
+
+        return {"local_types": sorted(local_types), "references": references}
+
+    @staticmethod
+    def _package_name(node) -> str:
+        # package com.l2j; -> [package, com.l2j, ;]
         for child in node.children:
-            if child.type == 'package_declaration':
-                # child.children[1] is usually the identifier
-                # package com.l2j; -> [package, com.l2j, ;]
-                for grandchild in child.children:
-                    if grandchild.type in ('scoped_identifier', 'identifier'):
-                        return grandchild.text.decode('utf-8')
+            if child.type in ('scoped_identifier', 'identifier'):
+                return child.text.decode('utf-8')
         return ""
 
-    def _find_imports(self, node) -> List[str]:
-        imports = []
+    @staticmethod
+    def _import_name(node) -> Optional[str]:
+        # import java.util.List; / import java.util.*; (keeps the ".*")
+        name = None
         for child in node.children:
-            if child.type == 'import_declaration':
-                # import java.util.List;
-                for grandchild in child.children:
-                    if grandchild.type in ('scoped_identifier', 'identifier', 'dotted_identifier'):
-                        imports.append(grandchild.text.decode('utf-8'))
-        return imports
-
-    def _extract_structure(self, node, source: bytes) -> List[Dict]:
-        classes = []
-        for child in node.children:
-            if child.type == 'class_declaration':
-                classes.append(self._parse_class(child, source))
-            elif child.type == 'interface_declaration':
-                classes.append(self._parse_interface(child, source))
-        return classes
+            if child.type in ('scoped_identifier', 'identifier', 'dotted_identifier'):
+                name = child.text.decode('utf-8')
+            elif child.type == 'asterisk' and name is not None:
+                name += ".*"
+        return name
 
-    def _parse_class(self, node, source: bytes) -> Dict:
+    @staticmethod
+    def _span(node) -> Dict[str, int]:
+        """Byte span (end exclusive) and 1-based, inclusive line span of a node."""
+        return {
+            "start_byte": node.start_byte,
+            "end_byte": node.end_byte,
+            "start_line": node.start_point[0] + 1,
+            "end_line": node.end_point[0] + 1
+        }
+
+    def _visit_type(self, node, owner: Optional[str]) -> Dict:
+        """
+        Class, interface, enum, record or @interface declaration, with all of its
+        members and nested types (inner_classes). Interfaces list the interfaces
+        they extend under "implements".
+        """
         name = "Anonymous"
+        modifiers = []
+        type_parameters = []
         extends = None
         implements = []
-        
-        # Extract Header Info
+        record_components = []
+        body = None
+
         for child in node.children:
-            if child.type == 'identifier':
+            kind = child.type
+            if kind == 'identifier':
                 name = child.text.decode('utf-8')
-            elif child.type == 'superclass':
-                # superclass -> type_identifier
+            elif kind == 'modifiers':
+                modifiers = self._modifiers(child)
+            elif kind == 'type_parameters':
+                type_parameters = [tp.text.decode('utf-8') for tp in child.named_children]
+            elif kind == 'superclass':
+                # extends Base<T> -> [extends, type]
                 if len(child.children) > 1:
-                     extends = child.children[1].text.decode('utf-8')
-            elif child.type == 'super_interfaces':
-                # implements A, B
-                # interfaces -> type_list -> type_identifier...
-                for grandchild in child.children:
-                    if grandchild.type == 'type_list':
-                         for iface in grandchild.children:
-                            if iface.type == 'type_identifier':
-                                implements.append(iface.text.decode('utf-8'))
-        
-        # Extract Body Info
-        methods = []
-        fields = []
-        
-        body = node.child_by_field_name('body')
-        if body:
-            for member in body.children:
-                if member.type == 'method_declaration':
-                    m_data = self._parse_method(member)
-                    if m_data: methods.append(m_data)
-                elif member.type == 'field_declaration':
-                    f_data = self._parse_field(member)
-                    if f_data: fields.extend(f_data)
+                    extends = child.children[1].text.decode('utf-8')
+            elif kind in ('super_interfaces', 'extends_interfaces'):
+                implements = self._type_list(child)
+            elif kind == 'formal_parameters':
+                record_components = self._parameters(child)
+            elif kind in TYPE_BODIES:
+                body = child
 
-        return {
-            "type": "class",
+        qualified = f"{owner}.{name}" if owner else name
+        data = {
+            "type": STRUCTURE_TYPE_KINDS[node.type],
             "name": name,
+            "qualified_name": qualified,
+            "modifiers": modifiers,
+            "type_parameters": type_parameters,
             "extends": extends,
             "implements": implements,
-            "methods": methods,
-            "fields": fields
+            "fields": [],
+            "methods": [],
+            "constructors": [],
+            "initializers": [],
+            "enum_constants": [],
+            "record_components": record_components,
+            "inner_classes": [],
+            **self._span(node)
         }
+        if body is not None:
+            self._visit_body(body, data, qualified)
+        return data
 
-    def _parse_interface(self, node, source: bytes) -> Dict:
-        name = "Anonymous"
-        for child in node.children:
-            if child.type == 'identifier':
-                name = child.text.decode('utf-8')
-        return {"type": "interface", "name": name}
+    def _visit_body(self, body, data: Dict, qualified: str):
+        for member in body.children:
+            kind = member.type
+            if kind in ('field_declaration', 'constant_declaration'):
+                data["fields"].extend(self._visit_field(member))
+            elif kind in ('method_declaration', 'annotation_type_element_declaration'):
+                data["methods"].append(self._visit_method(member))
+            elif kind in ('constructor_declaration', 'compact_constructor_declaration'):
+                data["constructors"].append(self._visit_method(member, constructor=True))
+            elif kind in STRUCTURE_TYPE_KINDS:
+                data["inner_classes"].append(self._visit_type(member, qualified))
+            elif kind == 'enum_constant':
+                name_node = member.child_by_field_name('name')
+                data["enum_constants"].append({
+                    "name": name_node.text.decode('utf-8') if name_node else "?",
+                    **self._span(member)
+                })
+            elif kind == 'enum_body_declarations':
+                self._visit_body(member, data, qualified)
+            elif kind in ('static_initializer', 'block'):
+                data["initializers"].append({"static": kind == 'static_initializer', **self._span(member)})
 
-    def _parse_method(self, node) -> Dict:
+    def _visit_method(self, node, constructor: bool = False) -> Dict:
+        """Method, constructor or annotation element; "body" is the span of the block (None if abstract)."""
         name = "?"
-        ret_type = "void"
         modifiers = []
-        
-        # Modifiers
-        mods_node = node.child_by_field_name('modifiers')
-        if mods_node:
-            for m in mods_node.children:
-                modifiers.append(m.text.decode('utf-8'))
-        
-        # Type
-        type_node = node.child_by_field_name('type')
-        if type_node:
-            ret_type = type_node.text.decode('utf-8')
-            
-        # Name
-        name_node = node.child_by_field_name('name')
-        if name_node:
-            name = name_node.text.decode('utf-8')
-            
-        return {
-            "name": name,
-            "return_type": ret_type,
-            "modifiers": modifiers
-        }
+        type_parameters = []
+        parameters = []
+        throws = []
+        body = None
 
-    def _parse_field(self, node) -> List[Dict]:
-        # public int x, y;
-        fields = []
+        for child in node.children:
+            kind = child.type
+            if kind == 'identifier':
+                name = child.text.decode('utf-8')
+            elif kind == 'modifiers':
+                modifiers = self._modifiers(child)
+            elif kind == 'type_parameters':
+                type_parameters = [tp.text.decode('utf-8') for tp in child.named_children]
+            elif kind == 'formal_parameters':
+                parameters = self._parameters(child)
+            elif kind == 'throws':
+                throws = [t.text.decode('utf-8') for t in child.named_children]
+            elif kind in ('block', 'constructor_body'):
+                body = self._span(child)
+
+        data = {"name": name}
+        if not constructor:
+            type_node = node.child_by_field_name('type')
+            data["return_type"] = type_node.text.decode('utf-8') if type_node else "void"
+        data.update({
+            "modifiers": modifiers,
+            "type_parameters": type_parameters,
+            "parameters": parameters,
+            "throws": throws,
+            "body": body,
+            **self._span(node)
+        })
+        if node.type == 'annotation_type_element_declaration':
+            default = node.child_by_field_name('value')
+            data["default"] = default.text.decode('utf-8') if default else None
+        return data
+
+    def _visit_field(self, node) -> List[Dict]:
+        # public int x, y; -> one entry per declarator, all with the declaration span
         type_str = "var"
         modifiers = []
-        
-        mods_node = node.child_by_field_name('modifiers')
-        if mods_node:
-            for m in mods_node.children:
-                modifiers.append(m.text.decode('utf-8'))
-                
+        names = []
+        for child in node.children:
+            kind = child.type
+            if kind == 'modifiers':
+                modifiers = self._modifiers(child)
+            elif kind == 'variable_declarator':
+                name_node = child.child_by_field_name('name')
+                names.append(name_node.text.decode('utf-8') if name_node else "?")
         type_node = node.child_by_field_name('type')
         if type_node:
             type_str = type_node.text.decode('utf-8')
-            
-        declarator_node = node.child_by_field_name('declarator')
-        if declarator_node:
-             # This handles simpler cases.
-             # In full grammar, field_declaration children might be variable_declarator
-             name_node = declarator_node.child_by_field_name('name')
-             name = name_node.text.decode('utf-8') if name_node else "?"
-             fields.append({
-                 "name": name,
-                 "type": type_str,
-                 "modifiers": modifiers
-             })
-        else:
-             # Iterate to find variable_declarator children directly in field_declaration
-             for child in node.children:
-                 if child.type == 'variable_declarator':
-                     name_node = child.child_by_field_name('name')
-                     name = name_node.text.decode('utf-8') if name_node else "?"
-                     fields.append({
-                        "name": name,
-                        "type": type_str,
-                        "modifiers": modifiers
-                     })
-                     
-        return fields
+
+        span = self._span(node)
+        return [{"name": name, "type": type_str, "modifiers": modifiers, **span} for name in names]
+
+    @staticmethod
+    def _modifiers(node) -> List[str]:
+        """Modifiers and annotations, in source order (e.g. ["@Override", "public"])."""
+        return [m.text.decode('utf-8') for m in node.children]
+
+    @staticmethod
+    def _type_list(node) -> List[str]:
+        # implements A, B<C> / extends A, B -> [keyword, type_list]
+        for child in node.children:
+            if child.type == 'type_list':
+                return [t.text.decode('utf-8') for t in child.named_children]
+        return []
+
+    @staticmethod
+    def _parameters(node) -> List[Dict]:
+        """formal_parameters -> [{"name", "type"}] (varargs: "String...")."""
+        parameters = []
+        for param in node.named_children:
+            if param.type == 'formal_parameter':
+                type_node = param.child_by_field_name('type')
+                name_node = param.child_by_field_name('name')
+                parameters.append({
+                    "name": name_node.text.decode('utf-8') if name_node else "?",
+                    "type": type_node.text.decode('utf-8') if type_node else "var"
+                })
+            elif param.type == 'spread_parameter':
+                type_str, name = "var", "?"
+                for child in param.named_children:
+                    if child.type == 'variable_declarator':
+                        name_node = child.child_by_field_name('name')
+                        name = name_node.text.decode('utf-8') if name_node else "?"
+                    elif child.type != 'modifiers':
+                        type_str = child.text.decode('utf-8')
+                parameters.append({"name": name, "type": f"{type_str}..."})
+        return parameters
 
 def main():
     parser = argparse.ArgumentParser(description="Tree-sitter AST Extractor (Robust)")
-    parser.add_argument("file", help="Java file to parse")
+    parser.add_argument("file", nargs="?", help="Java file to parse")
+    parser.add_argument("--parse-repo", metavar="REPO",
+                        help="Parse every .java file of REPO into an AST corpus (JSONL)")
+    parser.add_argument("--output", help="--parse-repo: corpus path (default data/ast_corpus/<repo>.jsonl)")
+    parser.add_argument("--workers", type=int, help="--parse-repo: worker processes (default cpu_count - 1)")
+    parser.add_argument("--chunk-size", type=int, help="--parse-repo: files per batch sent to a worker")
+    parser.add_argument("--full", action="store_true",
+                        help="--parse-repo: ignore the previous corpus (reparse every file)")
     args = parser.parse_args()
 
+    if args.parse_repo:
+        try:
+            from ast_corpus import parse_repo, default_corpus_path
+        except ImportError:
+            from l2j_pipeline.ast_corpus import parse_repo, default_corpus_path
+        output = args.output or default_corpus_path(args.parse_repo)
+        kwargs = {"reuse": not args.full}
+        if args.workers is not None:
+            kwargs["workers"] = args.workers
+        if args.chunk_size is not None:
+            kwargs["chunk_size"] = args.chunk_size
+        stats = parse_repo(args.parse_repo, output, **kwargs)
+        return 0 if stats["files"] else 1
+
+    if not args.file:
+        parser.error("a Java file or --parse-repo REPO is required")
+
     try:
         ts = EnterpriseJavaParser()
         data = ts.parse_file(args.file)
@@ -193,4 +531,4 @@ def main():
         print(f"Error parsing file: {e}")
 
 if __name__ == "__main__":
-    main()
+    exit(main() or 0)
@@ -0,0 +1,109 @@
+"""
+Benchmark recall x latência dos índices ANN do RLCoder
+Constrói flat, IVF-Flat, HNSW e IVF-PQ sobre embeddings sintéticos agrupados (como
+chunks de código de um repositório grande) e mede, para cada valor de nprobe/efSearch,
+o recall@k contra a busca exata e a latência p50/p99 por consulta.
+
+Uso:
+    python l2j_pipeline/bench_ann_index.py --vectors 200000 --dim 384 --queries 500
+"""
+import os
+import sys
+import time
+import argparse
+from typing import List
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ann_index import (
+    INDEX_TYPES, build_ann_index, apply_search_params, search_param_name,
+    search_param_candidates, tune_search_params, recall_at_k
+)
+
+
+def make_embeddings(num_vectors: int, dim: int, clusters: int, spread: float,
+                    rng: np.random.Generator) -> np.ndarray:
+    """Vetores normalizados em torno de centros aleatórios (spread = desvio relativo ao centro)."""
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    labels = rng.integers(0, clusters, num_vectors)
+    vectors = centers[labels] + spread * rng.standard_normal((num_vectors, dim)).astype('float32')
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def query_latencies(index, queries: np.ndarray, k: int):
+    """Uma consulta por vez (como no retrieval); retorna (ids, latências em ms)."""
+    found = np.empty((len(queries), k), dtype='int64')
+    latencies = []
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = ids[0]
+    return found, latencies
+
+
+def report(label: str, index, queries: np.ndarray, truth: np.ndarray, k: int):
+    found, latencies = query_latencies(index, queries, k)
+    print(f"   {label:<16} recall@{k}: {recall_at_k(found, truth):.3f} | "
+          f"p50: {percentile(latencies, 50):7.3f} ms | p99: {percentile(latencies, 99):7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall x latência dos índices FAISS (vs. flat)")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384, help="Dimensão (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=1.0, help="Dispersão em torno dos centros")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Tipos (separados por vírgula)")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--threads", type=int, default=1, help="Threads do FAISS (1 = latência por consulta)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(args.seed)
+    data = make_embeddings(args.vectors + args.queries, args.dim, args.clusters, args.spread, rng)
+    embeddings, queries = data[:args.vectors], data[args.vectors:]
+    ids = np.arange(args.vectors, dtype='int64')
+
+    exact = faiss.IndexFlatIP(args.dim)
+    exact.add(embeddings)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"=== {args.vectors} vetores x {args.dim} dims | {args.queries} consultas | k={args.k} ===")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index, built_type, params = build_ann_index(embeddings, ids, index_type, seed=args.seed)
+        build_time = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2 ** 20
+        print(f"\n[{built_type}] build: {build_time:.1f}s | tamanho: {size_mb:.1f} MB | {params}")
+
+        name = search_param_name(built_type)
+        if name is None:
+            report("exato", index, queries, truth, args.k)
+            continue
+        for value in search_param_candidates(built_type, params):
+            apply_search_params(index, {name: value})
+            report(f"{name}={value}", index, queries, truth, args.k)
+
+        # Ajuste como na indexação (consultas amostradas do próprio índice)
+        tuned = tune_search_params(index, built_type, params, embeddings, ids,
+                                   target_recall=args.target_recall, k=args.k, seed=args.seed)
+        report(f"ajustado {name}={tuned[name]}", index, queries, truth, args.k)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark do parse em lote (corpus AST)
+Compara o caminho por arquivo usado hoje pelos estágios (parse_file + extract_chunks,
+dois parses tree-sitter por arquivo, em série) com ast_corpus.parse_repo serial e em
+pool de processos, e verifica que o corpus traz exatamente o mesmo AST.
+
+Uso:
+    python l2j_pipeline/bench_ast_corpus.py --files 10000 --workers 8
+    python l2j_pipeline/bench_ast_corpus.py --repo l2j_pipeline/temp_repos/l2j-server-game
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ast_parser import EnterpriseJavaParser
+from ast_corpus import parse_repo, iter_ast_corpus, list_java_paths, default_parse_workers, PARSE_FIELDS
+from bench_index_scan import generate_synthetic_repo
+
+
+def per_file(repo: str):
+    """Caminho atual: um parse_file + um extract_chunks por arquivo."""
+    parser = EnterpriseJavaParser(cache=False)
+    results = {}
+    start = time.perf_counter()
+    for rel_path in list_java_paths(repo):
+        full_path = os.path.join(repo, rel_path)
+        data = parser.parse_file(full_path)
+        with open(full_path, 'rb') as f:
+            data["chunks"] = parser.extract_chunks(f.read())
+        results[rel_path] = data
+    return results, time.perf_counter() - start
+
+
+def timed_parse_repo(repo: str, output: str, workers: int):
+    stats = parse_repo(repo, output, workers=workers, reuse=False)
+    return stats["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: parse por arquivo vs. corpus AST em lote")
+    parser.add_argument("--repo", help="Repositório real (se omitido, gera um sintético)")
+    parser.add_argument("--files", type=int, default=5000, help="Arquivos do repositório sintético")
+    parser.add_argument("--workers", type=int, default=default_parse_workers())
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_ast_")
+    repo = args.repo
+    if not repo:
+        repo = os.path.join(tmp_dir, "repo")
+        print(f"[*] Gerando repositório sintético com {args.files} arquivos em {repo}...")
+        generate_synthetic_repo(repo, args.files)
+    output = os.path.join(tmp_dir, "corpus.jsonl")
+
+    try:
+        # Aquecer o cache de páginas do SO para comparar CPU, não disco frio
+        list(map(os.path.getsize, (os.path.join(repo, p) for p in list_java_paths(repo))))
+
+        reference, per_file_time = per_file(repo)
+        serial_time = timed_parse_repo(repo, output, 1)
+        pool_time = timed_parse_repo(repo, output, args.workers)
+
+        identical = True
+        for record in iter_ast_corpus(output):
+            expected = reference.pop(record["path"], None)
+            fields = PARSE_FIELDS + ("chunks",)
+            if expected is None or any(record[k] != expected[k] for k in fields):
+                identical = False
+                break
+        identical = identical and not reference
+
+        n = len(list_java_paths(repo))
+        corpus_mb = os.path.getsize(output) / (1 << 20)
+        print("\n=== Resultado ===")
+        print(f"   • Arquivos: {n} | corpus: {corpus_mb:.1f} MiB")
+        print(f"   • Por arquivo (parse_file + extract_chunks): {per_file_time:8.2f}s  ({n / per_file_time:,.0f} arquivos/s)")
+        print(f"   • parse_repo serial:            {serial_time:8.2f}s  ({n / serial_time:,.0f} arquivos/s)")
+        print(f"   • parse_repo ({args.workers} workers):       {pool_time:8.2f}s  ({n / pool_time:,.0f} arquivos/s)")
+        print(f"   • Speedup vs. por arquivo: {per_file_time / pool_time:.2f}x")
+        print(f"   • AST idêntico: {'✅' if identical else '❌'}")
+        return 0 if identical else 1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    exit(main())
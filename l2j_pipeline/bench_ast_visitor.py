@@ -0,0 +1,231 @@
+"""
+Benchmark do visitor de AST
+Compara a vazão do visitor completo (EnterpriseJavaParser._visit_program: tipos
+aninhados, enums, records, anotações, construtores, spans) com o extrator anterior
+(só classes/interfaces de topo, sem construtores), sobre as mesmas árvores
+tree-sitter, e mostra quanto cada um captura.
+
+O extrator anterior está copiado abaixo (LegacyExtractor) apenas como referência.
+
+Uso:
+    python l2j_pipeline/bench_ast_visitor.py --files 2000
+    python l2j_pipeline/bench_ast_visitor.py --repo l2j_pipeline/temp_repos/l2j-server-game
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ast_parser import EnterpriseJavaParser
+from ast_corpus import list_java_paths
+from bench_index_scan import generate_synthetic_repo
+
+
+class LegacyExtractor:
+    """Extrator anterior ao visitor completo (package, imports, classes/interfaces de topo)."""
+
+    def extract(self, root) -> Dict:
+        return {
+            "package": self._find_package(root),
+            "imports": self._find_imports(root),
+            "c_structure": self._extract_structure(root)
+        }
+
+    def _find_package(self, node) -> str:
+        for child in node.children:
+            if child.type == 'package_declaration':
+                for grandchild in child.children:
+                    if grandchild.type in ('scoped_identifier', 'identifier'):
+                        return grandchild.text.decode('utf-8')
+        return ""
+
+    def _find_imports(self, node) -> List[str]:
+        imports = []
+        for child in node.children:
+            if child.type == 'import_declaration':
+                name = None
+                for grandchild in child.children:
+                    if grandchild.type in ('scoped_identifier', 'identifier', 'dotted_identifier'):
+                        name = grandchild.text.decode('utf-8')
+                    elif grandchild.type == 'asterisk' and name is not None:
+                        name += ".*"
+                if name is not None:
+                    imports.append(name)
+        return imports
+
+    @staticmethod
+    def _line_span(node) -> Dict[str, int]:
+        return {"start_line": node.start_point[0] + 1, "end_line": node.end_point[0] + 1}
+
+    def _extract_structure(self, node) -> List[Dict]:
+        classes = []
+        for child in node.children:
+            if child.type == 'class_declaration':
+                classes.append(self._parse_class(child))
+            elif child.type == 'interface_declaration':
+                name = "Anonymous"
+                for grandchild in child.children:
+                    if grandchild.type == 'identifier':
+                        name = grandchild.text.decode('utf-8')
+                classes.append({"type": "interface", "name": name, **self._line_span(child)})
+        return classes
+
+    def _parse_class(self, node) -> Dict:
+        name, extends, implements = "Anonymous", None, []
+        for child in node.children:
+            if child.type == 'identifier':
+                name = child.text.decode('utf-8')
+            elif child.type == 'superclass':
+                if len(child.children) > 1:
+                    extends = child.children[1].text.decode('utf-8')
+            elif child.type == 'super_interfaces':
+                for grandchild in child.children:
+                    if grandchild.type == 'type_list':
+                        for iface in grandchild.children:
+                            if iface.type == 'type_identifier':
+                                implements.append(iface.text.decode('utf-8'))
+        methods, fields = [], []
+        body = node.child_by_field_name('body')
+        if body:
+            for member in body.children:
+                if member.type == 'method_declaration':
+                    methods.append(self._parse_method(member))
+                elif member.type == 'field_declaration':
+                    fields.extend(self._parse_field(member))
+        return {"type": "class", "name": name, "extends": extends, "implements": implements,
+                "methods": methods, "fields": fields, **self._line_span(node)}
+
+    def _parse_method(self, node) -> Dict:
+        modifiers = []
+        mods_node = node.child_by_field_name('modifiers')
+        if mods_node:
+            modifiers = [m.text.decode('utf-8') for m in mods_node.children]
+        type_node = node.child_by_field_name('type')
+        name_node = node.child_by_field_name('name')
+        return {
+            "name": name_node.text.decode('utf-8') if name_node else "?",
+            "return_type": type_node.text.decode('utf-8') if type_node else "void",
+            "modifiers": modifiers,
+            **self._line_span(node)
+        }
+
+    def _parse_field(self, node) -> List[Dict]:
+        modifiers = []
+        mods_node = node.child_by_field_name('modifiers')
+        if mods_node:
+            modifiers = [m.text.decode('utf-8') for m in mods_node.children]
+        type_node = node.child_by_field_name('type')
+        type_str = type_node.text.decode('utf-8') if type_node else "var"
+        declarator = node.child_by_field_name('declarator')
+        if declarator is None:
+            return []
+        name_node = declarator.child_by_field_name('name')
+        return [{"name": name_node.text.decode('utf-8') if name_node else "?", "type": type_str,
+                 "modifiers": modifiers, **self._line_span(node)}]
+
+
+def count_members(structure: List[Dict]) -> Dict[str, int]:
+    """Tipos (incluindo aninhados), métodos, construtores e campos capturados."""
+    counts = {"tipos": 0, "métodos": 0, "construtores": 0, "campos": 0}
+    stack = list(structure)
+    while stack:
+        item = stack.pop()
+        counts["tipos"] += 1
+        counts["métodos"] += len(item.get("methods", []))
+        counts["construtores"] += len(item.get("constructors", []))
+        counts["campos"] += len(item.get("fields", []))
+        stack.extend(item.get("inner_classes", []))
+    return counts
+
+
+def timed(label: str, fn, roots: list, repeat: int):
+    best = None
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(root) for root in roots]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: visitor completo vs. extrator anterior")
+    parser.add_argument("--repo", help="Repositório real (se omitido, gera um sintético)")
+    parser.add_argument("--files", type=int, default=2000, help="Arquivos do repositório sintético")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições (vale a melhor)")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    repo = args.repo
+    if not repo:
+        tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_visitor_")
+        print(f"[*] Gerando repositório sintético com {args.files} arquivos em {tmp_dir}...")
+        generate_synthetic_repo(tmp_dir, args.files)
+        repo = tmp_dir
+
+    try:
+        java = EnterpriseJavaParser(cache=False)
+        sources = []
+        for rel_path in list_java_paths(repo):
+            with open(os.path.join(repo, rel_path), 'rb') as f:
+                sources.append(f.read())
+
+        # Parse tree-sitter (comum aos dois) medido à parte; as árvores ficam vivas para os extratores
+        start = time.perf_counter()
+        trees = [java.parser.parse(source) for source in sources]
+        parse_time = time.perf_counter() - start
+        roots = [tree.root_node for tree in trees]
+
+        legacy = LegacyExtractor()
+        legacy_results, legacy_time = timed("anterior", legacy.extract, roots, args.repeat)
+        visitor_results, visitor_time = timed("visitor", java._visit_program, roots, args.repeat)
+
+        # Caminho do corpus (parse_with_chunks): antes estrutura + caminhada de chunks,
+        # agora os chunks saem dos spans do visitor
+        def legacy_with_chunks(root):
+            chunks = []
+            java._collect_chunks(root.children, None, chunks)
+            return legacy.extract(root), chunks
+
+        def visitor_with_chunks(root):
+            data = java._visit_program(root)
+            chunks = []
+            java._chunks_from_structure(data["c_structure"], chunks)
+            return data, chunks
+
+        legacy_chunked, legacy_chunk_time = timed("anterior + chunks", legacy_with_chunks, roots, args.repeat)
+        visitor_chunked, visitor_chunk_time = timed("visitor + chunks", visitor_with_chunks, roots, args.repeat)
+        same_chunks = all(old[1] == new[1] for old, new in zip(legacy_chunked, visitor_chunked))
+
+        legacy_counts = {"tipos": 0, "métodos": 0, "construtores": 0, "campos": 0}
+        visitor_counts = dict(legacy_counts)
+        for old, new in zip(legacy_results, visitor_results):
+            for key, value in count_members(old["c_structure"]).items():
+                legacy_counts[key] += value
+            for key, value in count_members(new["c_structure"]).items():
+                visitor_counts[key] += value
+
+        n = len(sources)
+        print("\n=== Resultado ===")
+        print(f"   • Arquivos: {n} | parse tree-sitter: {parse_time:.2f}s ({n / parse_time:,.0f} arquivos/s)")
+        print(f"   • Extrator anterior: {legacy_time:8.3f}s  ({n / legacy_time:,.0f} arquivos/s)")
+        print(f"   • Visitor completo:  {visitor_time:8.3f}s  ({n / visitor_time:,.0f} arquivos/s)")
+        print(f"   • Parse + extração:  anterior {n / (parse_time + legacy_time):,.0f} arquivos/s | "
+              f"visitor {n / (parse_time + visitor_time):,.0f} arquivos/s")
+        print(f"   • Com chunks (corpus): anterior {n / legacy_chunk_time:,.0f} arquivos/s | "
+              f"visitor {n / visitor_chunk_time:,.0f} arquivos/s | chunks idênticos: {'✅' if same_chunks else '❌'}")
+        print("   • Capturado (anterior -> visitor): " + ", ".join(
+            f"{key} {legacy_counts[key]} -> {visitor_counts[key]}" for key in legacy_counts))
+        return 0 if same_chunks else 1
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    exit(main())
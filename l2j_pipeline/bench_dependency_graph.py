@@ -0,0 +1,161 @@
+"""
+Benchmark do grafo de dependências (map_dependencies)
+Mede build_dependency_graph em repositórios sintéticos com imports explícitos,
+estáticos, wildcard e referências ao próprio pacote, e compara com a versão
+anterior (scan duplo + wildcard por varredura de todos os nós), copiada abaixo
+como referência e limitada a --legacy-max classes por ser quadrática.
+
+Com tree-sitter, mede também o modo referências do AST: análise completa,
+replanejamento com o cache por hash intacto e após alterar --changed arquivos.
+
+Uso:
+    python l2j_pipeline/bench_dependency_graph.py --classes 2000 20000
+    python l2j_pipeline/bench_dependency_graph.py --classes 20000 --package-size 200 --legacy-max 0
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from map_dependencies import build_dependency_graph, scan_imports, HAS_AST
+
+JAVA_TEMPLATE = """package com.l2jserver.bench.p{pkg};
+
+import java.util.List;
+import com.l2jserver.bench.p{other}.C{other_cls};
+import com.l2jserver.bench.p{wild}.*;
+import static com.l2jserver.bench.p{static_pkg}.C{static_cls}.helper;
+
+/**
+ * Synthetic class {idx}.
+ */
+public class C{idx} extends C{parent}
+{{
+    private final C{sibling} _sibling = null;
+
+    public static int helper()
+    {{
+        return {idx};
+    }}
+}}
+"""
+
+
+def generate_repo(root: str, num_classes: int, package_size: int):
+    """Classes C<i> em pacotes p<i // package_size>; cada uma referencia outros pacotes e o próprio."""
+    num_packages = max(1, (num_classes + package_size - 1) // package_size)
+    for idx in range(num_classes):
+        pkg = idx // package_size
+        first = pkg * package_size
+        last = min(num_classes, first + package_size) - 1
+
+        def in_package(offset):
+            return first + (idx - first + offset) % (last - first + 1)
+
+        other = (pkg + 1) % num_packages
+        pkg_dir = os.path.join(root, "src", "com", "l2jserver", "bench", f"p{pkg}")
+        os.makedirs(pkg_dir, exist_ok=True)
+        with open(os.path.join(pkg_dir, f"C{idx}.java"), "w", encoding="utf-8") as f:
+            f.write(JAVA_TEMPLATE.format(
+                idx=idx, pkg=pkg,
+                other=other, other_cls=min(num_classes - 1, other * package_size),
+                wild=(pkg + 2) % num_packages,
+                static_pkg=(pkg + 3) % num_packages,
+                static_cls=min(num_classes - 1, ((pkg + 3) % num_packages) * package_size),
+                parent=in_package(1), sibling=in_package(2)
+            ))
+
+
+def legacy_build_dependency_graph(repo_path: str) -> nx.DiGraph:
+    """build_dependency_graph anterior (apenas para comparação)."""
+    G = nx.DiGraph()
+    class_map = {}
+    java_files = list(Path(repo_path).rglob("*.java"))
+    for file_path in java_files:
+        package, _ = scan_imports(file_path)
+        full_name = f"{package}.{file_path.stem}" if package else file_path.stem
+        class_map[full_name] = str(file_path)
+        G.add_node(full_name, file_path=str(file_path))
+    for file_path in java_files:
+        package, imports = scan_imports(file_path)
+        current = f"{package}.{file_path.stem}" if package else file_path.stem
+        for imp in imports:
+            if imp in class_map:
+                G.add_edge(current, imp)
+            elif imp.endswith(".*"):
+                base_pkg = imp[:-2]
+                for node in G.nodes():
+                    if node.startswith(base_pkg) and node != current:
+                        G.add_edge(current, node)
+    return G
+
+
+def timed(fn, *args, **kwargs):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        G = fn(*args, **kwargs)
+    return G, time.perf_counter() - start
+
+
+def bench_references(repo: str, cache_path: str, changed: int, workers: int):
+    """Modo referências: (arestas, s completo, s com cache, s após alterar `changed` arquivos, reanalisados)."""
+    G, full = timed(build_dependency_graph, repo, references=True, cache_path=cache_path, workers=workers)
+    _, warm = timed(build_dependency_graph, repo, references=True, cache_path=cache_path, workers=workers)
+    java_files = sorted(Path(repo).rglob("*.java"))[:changed]
+    for file_path in java_files:
+        with open(file_path, "a", encoding="utf-8") as f:
+            f.write("// alterado\n")
+    stats = {}
+    _, incremental = timed(build_dependency_graph, repo, references=True, cache_path=cache_path,
+                           workers=workers, stats=stats)
+    return G.number_of_edges(), full, warm, incremental, stats["analyzed"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: construção do grafo de dependências")
+    parser.add_argument("--classes", type=int, nargs="+", default=[2000, 20000])
+    parser.add_argument("--package-size", type=int, default=100, help="Classes por pacote")
+    parser.add_argument("--legacy-max", type=int, default=5000,
+                        help="Roda a versão anterior só até este número de classes (0 = nunca)")
+    parser.add_argument("--changed", type=int, default=10, help="Arquivos alterados no replanejamento incremental")
+    parser.add_argument("--workers", type=int, default=1, help="Processos da análise de referências")
+    args = parser.parse_args()
+
+    references = []
+    print(f"{'classes':>8} {'arestas':>9} {'imports (s)':>12} {'anterior (s)':>13} {'arestas ant.':>13}")
+    for num_classes in args.classes:
+        tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_deps_")
+        try:
+            generate_repo(tmp_dir, num_classes, args.package_size)
+            G, elapsed = timed(build_dependency_graph, tmp_dir, references=False)
+            legacy = "-"
+            legacy_edges = "-"
+            if num_classes <= args.legacy_max:
+                G_old, old_elapsed = timed(legacy_build_dependency_graph, tmp_dir)
+                legacy = f"{old_elapsed:.2f}"
+                legacy_edges = str(G_old.number_of_edges())
+            print(f"{num_classes:>8} {G.number_of_edges():>9} {elapsed:>12.2f} {legacy:>13} {legacy_edges:>13}")
+            if HAS_AST:
+                cache_path = os.path.join(tmp_dir, "refs_cache.json")
+                references.append((num_classes,) + bench_references(tmp_dir, cache_path, args.changed, args.workers))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if references:
+        print(f"\n=== Referências do AST (cache por hash, {args.changed} arquivo(s) alterado(s)) ===")
+        print(f"{'classes':>8} {'arestas':>9} {'completo (s)':>13} {'com cache (s)':>14} "
+              f"{'incremental (s)':>16} {'reanalisados':>13}")
+        for num_classes, edges, full, warm, incremental, analyzed in references:
+            print(f"{num_classes:>8} {edges:>9} {full:>13.2f} {warm:>14.2f} {incremental:>16.2f} {analyzed:>13}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,161 @@
+"""
+Benchmark do GoCompiler: validações por minuto
+Compara, para os mesmos N candidatos:
+    - legado: como o validate_code antigo (arquivo gen_<uuid>.go na raiz do sandbox,
+      `go fmt` e `go build` separados, nada é apagado, cache padrão do ambiente)
+    - workspace: GoCompiler atual (workspace reutilizável por worker, GOCACHE/
+      GOMODCACHE persistentes no sandbox, gofmt + um único `go build`)
+    - lote: GoCompiler.validate_many (cada candidato vira um pacote; um único
+      `go build ./...` por lote, diagnósticos mapeados de volta ao candidato)
+    - agrupado: BatchingCompiler com --batch-workers threads chamando validate_code
+      (como o estágio compile do pipeline de migração)
+Para o workspace mostra a primeira passada (cache frio) e a segunda (cache quente);
+lote e agrupado rodam com o cache já quente.
+Uma a cada --fail-every candidatos não compila (import faltando).
+
+Requer go no PATH. Usa sandboxes temporários (data/compiler_sandbox não é tocado).
+
+Uso:
+    python l2j_pipeline/bench_go_compiler.py --candidates 60 --workers 4
+    python l2j_pipeline/bench_go_compiler.py --cold-legacy   # legado com GOCACHE vazio (ex.: container sem HOME)
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from compiler_service import GoCompiler, BatchingCompiler
+
+GOOD_CODE = """package main
+
+import (
+\t"fmt"
+\t"strings"
+)
+
+type Item%d struct {
+\tID   int
+\tName string
+}
+
+func (i *Item%d) Describe() string {
+\treturn fmt.Sprintf("%%d:%%s", i.ID, strings.ToUpper(i.Name))
+}
+
+func main() {
+\titem := &Item%d{ID: %d, Name: "potion"}
+\tfmt.Println(item.Describe())
+}
+"""
+
+BAD_CODE = """package main
+
+func main() {
+\tfmt.Println("missing import %d")
+}
+"""
+
+
+class LegacyCompiler:
+    """Reprodução do validate_code antigo, para comparação."""
+
+    def __init__(self, working_dir: str, env=None):
+        self.working_dir = working_dir
+        self.env = env
+        subprocess.run(["go", "mod", "init", "l2j_migration_sandbox"], cwd=working_dir, env=env, capture_output=True)
+
+    def validate_code(self, go_code: str):
+        filename = f"gen_{uuid.uuid4().hex[:8]}.go"
+        with open(os.path.join(self.working_dir, filename), "w") as f:
+            f.write(go_code)
+        subprocess.run(["go", "fmt", filename], cwd=self.working_dir, env=self.env, capture_output=True)
+        result = subprocess.run(["go", "build", "-o", os.devnull, filename], cwd=self.working_dir,
+                                env=self.env, capture_output=True, text=True)
+        return {"success": result.returncode == 0, "stdout": result.stdout, "stderr": result.stderr}
+
+
+def make_candidates(count: int, fail_every: int):
+    return [BAD_CODE % i if fail_every and (i + 1) % fail_every == 0 else GOOD_CODE % (i, i, i, i)
+            for i in range(count)]
+
+
+def run(compiler, candidates, workers: int):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(compiler.validate_code, candidates))
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(result["success"] for result in results)
+
+
+def report(label: str, elapsed: float, ok: int, total: int):
+    print(f"   • {label:22s} {total:4d} validações em {elapsed:7.2f}s "
+          f"({60 * total / elapsed:7.1f}/min) | ok: {ok}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: validações por minuto do GoCompiler")
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4, help="Threads validando ao mesmo tempo (estágio compile)")
+    parser.add_argument("--fail-every", type=int, default=4, help="1 a cada N candidatos não compila (0 = nenhum)")
+    parser.add_argument("--batch-workers", type=int, default=16, help="Threads no modo agrupado")
+    parser.add_argument("--cold-legacy", action="store_true", help="Legado com um GOCACHE vazio e descartável")
+    args = parser.parse_args()
+
+    if shutil.which("go") is None:
+        print("[!] go não encontrado no PATH; o benchmark precisa da toolchain Go")
+        return 1
+
+    candidates = make_candidates(args.candidates, args.fail_every)
+    expected_ok = sum(candidate.startswith("package main\n\nimport") for candidate in candidates)
+    print(f"[*] {len(candidates)} candidatos | {args.workers} workers | esperados ok: {expected_ok}")
+
+    root = tempfile.mkdtemp(prefix="bench_go_compiler_")
+    try:
+        legacy_dir = os.path.join(root, "legacy")
+        os.makedirs(legacy_dir)
+        env = None
+        if args.cold_legacy:
+            env = dict(os.environ, GOCACHE=os.path.join(root, "legacy_cache"))
+        legacy = LegacyCompiler(legacy_dir, env)
+        legacy_time, legacy_ok = run(legacy, candidates, args.workers)
+
+        compiler = GoCompiler(working_dir=os.path.join(root, "workspace"))
+        cold_time, cold_ok = run(compiler, candidates, args.workers)
+        warm_time, warm_ok = run(compiler, candidates, args.workers)
+
+        start = time.perf_counter()
+        batch_results = compiler.validate_many(candidates)
+        batch_time = time.perf_counter() - start
+        batch_ok = sum(result["success"] for result in batch_results)
+        # Cada candidato ruim deve receber o seu próprio diagnóstico (e só ele)
+        mapped = all(("undefined: fmt" in result["stderr"]) == (candidate == BAD_CODE % i)
+                     for i, (candidate, result) in enumerate(zip(candidates, batch_results)))
+
+        grouped_time, grouped_ok = run(BatchingCompiler(compiler), candidates, args.batch_workers)
+        leftover = len([name for name in os.listdir(legacy_dir) if name.endswith(".go")])
+
+        print("\n=== Resultado ===")
+        report("legado", legacy_time, legacy_ok, len(candidates))
+        report("workspace (frio)", cold_time, cold_ok, len(candidates))
+        report("workspace (quente)", warm_time, warm_ok, len(candidates))
+        report("lote (validate_many)", batch_time, batch_ok, len(candidates))
+        report("agrupado", grouped_time, grouped_ok, len(candidates))
+        print(f"   • Speedup (quente vs. legado): {legacy_time / warm_time:.1f}x | "
+              f"lote vs. legado: {legacy_time / batch_time:.1f}x | agrupado vs. legado: {legacy_time / grouped_time:.1f}x")
+        print(f"   • Custo por arquivo: legado {1000 * legacy_time / len(candidates):.0f}ms | "
+              f"lote {1000 * batch_time / len(candidates):.0f}ms | diagnósticos mapeados: {'ok' if mapped else 'ERRO'}")
+        print(f"   • Arquivos deixados pelo legado: {leftover} | arquivados pelo workspace: "
+              f"{len(os.listdir(os.path.join(compiler.working_dir, 'failed'))) if args.fail_every else 0}")
+        return 0 if legacy_ok == cold_ok == warm_ok == batch_ok == grouped_ok == expected_ok and mapped else 1
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,126 @@
+"""
+Benchmark de memória do indexador RLCoder
+Mede o pico de RSS da indexação em memória vs. em streaming (--streaming) para
+repositórios sintéticos de tamanhos crescentes. No modo em memória o pico cresce
+com o volume de código; no streaming ele não depende do conteúdo, só da tabela de
+arquivos (alguns KiB por arquivo).
+
+Cada medição roda index_l2j_repo.py em um processo separado (workers=1, para que
+todo o trabalho conte no RSS do processo medido) e sem cache de embeddings.
+
+Uso:
+    python l2j_pipeline/bench_index_memory.py --files 2000 8000 32000
+    python l2j_pipeline/bench_index_memory.py --files 5000 --methods 80 --ann ivf_pq
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_index_scan import generate_synthetic_repo
+
+INDEXER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_l2j_repo.py")
+
+# Executa o indexador no processo filho e informa o pico de RSS (ru_maxrss)
+CHILD_SCRIPT = """
+import os, sys, json, runpy, resource
+sys.argv = json.loads(sys.argv[1])
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+code = 0
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit as e:
+    code = e.code or 0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# Linux reporta KiB, macOS bytes
+peak_kb = peak // 1024 if sys.platform == 'darwin' else peak
+print('BENCH_RESULT ' + json.dumps({'code': code, 'peak_rss_kb': peak_kb}))
+"""
+
+
+def measure(repo: str, output: str, streaming: bool, ann: str, embed_batch: int) -> dict:
+    """Indexa repo em um processo novo e retorna {'code', 'peak_rss_kb'}."""
+    argv = [INDEXER, "--repo", repo, "--output", output, "--workers", "1",
+            "--ann", ann, "--no-embedding-cache"]
+    if streaming:
+        argv += ["--streaming", "--embed-batch", str(embed_batch)]
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, json.dumps(argv)],
+        capture_output=True, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    print(result.stdout[-2000:], result.stderr[-2000:])
+    raise RuntimeError("Indexador não reportou o resultado")
+
+
+def repo_size_mb(repo: str) -> float:
+    total = 0
+    for root, _, files in os.walk(repo):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1 << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: pico de RSS da indexação em memória vs. streaming")
+    parser.add_argument("--files", type=int, nargs="+", default=[2000, 8000, 32000],
+                        help="Tamanhos (arquivos) dos repositórios sintéticos")
+    parser.add_argument("--methods", type=int, default=40, help="Métodos por arquivo sintético")
+    parser.add_argument("--ann", default="auto", choices=["auto", "flat", "ivf_flat", "hnsw", "ivf_pq"])
+    parser.add_argument("--embed-batch", type=int, default=1024)
+    parser.add_argument("--skip-in-memory", action="store_true", help="Mede apenas o modo streaming")
+    args = parser.parse_args()
+
+    rows = []
+    for num_files in args.files:
+        tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_mem_")
+        try:
+            repo = os.path.join(tmp_dir, "repo")
+            print(f"[*] Gerando repositório sintético com {num_files} arquivos...")
+            generate_synthetic_repo(repo, num_files, args.methods)
+            size = repo_size_mb(repo)
+
+            in_memory = None
+            if not args.skip_in_memory:
+                in_memory = measure(repo, os.path.join(tmp_dir, "mem", "idx.json"), False,
+                                    args.ann, args.embed_batch)
+            streaming = measure(repo, os.path.join(tmp_dir, "stream", "idx.json"), True,
+                                args.ann, args.embed_batch)
+            rows.append((num_files, size, in_memory, streaming))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def fmt(result):
+        if result is None:
+            return "       -"
+        if result["code"]:
+            return "   falhou"
+        return f"{result['peak_rss_kb'] / 1024:8.0f}"
+
+    print("\n=== Pico de RSS (MiB) ===")
+    print(f"{'arquivos':>9} {'repo MiB':>9} {'memória':>9} {'streaming':>10}")
+    for num_files, size, in_memory, streaming in rows:
+        print(f"{num_files:>9} {size:>9.1f} {fmt(in_memory):>9} {fmt(streaming):>10}")
+
+    # Inclinação entre o menor e o maior repositório: no streaming sobra só a tabela de
+    # arquivos (manifesto, class_map, postings BM25), sem conteúdo nem embeddings
+    first, last = rows[0], rows[-1]
+    if len(rows) > 1:
+        print()
+        for label, column in (("memória", 2), ("streaming", 3)):
+            a, b = first[column], last[column]
+            if a is None or b is None or a["code"] or b["code"]:
+                continue
+            slope = (b["peak_rss_kb"] - a["peak_rss_kb"]) / 1024 / ((last[0] - first[0]) / 1000)
+            per_mb = (b["peak_rss_kb"] - a["peak_rss_kb"]) / 1024 / (last[1] - first[1])
+            print(f"   • {label}: +{slope:.1f} MiB por 1000 arquivos | +{per_mb:.2f} MiB por MiB de código")
+    return 0 if all(not r[3]["code"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark do scanner do indexador RLCoder
+Compara o scan serial com o scan em pool de processos e verifica que os resultados são idênticos.
+
+Uso:
+    python l2j_pipeline/bench_index_scan.py --files 10000 --workers 8
+    python l2j_pipeline/bench_index_scan.py --repo l2j_pipeline/temp_repos/l2j-server-login
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from index_l2j_repo import scan_java_files, default_scan_workers, DEFAULT_SCAN_CHUNK_SIZE
+
+
+JAVA_TEMPLATE = """/*
+ * Copyright (C) 2004-2025 L2J Server
+ * This file is part of L2J Server (synthetic benchmark file {idx}).
+ */
+package com.l2jserver.gameserver.bench.pkg{pkg};
+
+import java.util.List;
+import java.util.concurrent.ConcurrentHashMap;
+
+public class Bench{idx} extends BaseBench implements Runnable
+{{
+    private final ConcurrentHashMap<Integer, String> _cache = new ConcurrentHashMap<>();
+{body}
+    private static class Holder{idx}
+    {{
+        protected static final Bench{idx} INSTANCE = new Bench{idx}();
+    }}
+}}
+"""
+
+METHOD_TEMPLATE = """
+    public int method{m}(int value)
+    {{
+        if (value > {m})
+        {{
+            _cache.put(value, "v" + value);
+        }}
+        return value * {m};
+    }}
+"""
+
+
+def generate_synthetic_repo(root: str, num_files: int, methods_per_file: int = 20):
+    """Cria um repositório Java sintético com num_files arquivos."""
+    body = "".join(METHOD_TEMPLATE.format(m=m) for m in range(methods_per_file))
+    for idx in range(num_files):
+        pkg = idx % 64
+        pkg_dir = os.path.join(root, "src", "com", "l2jserver", "gameserver", "bench", f"pkg{pkg}")
+        os.makedirs(pkg_dir, exist_ok=True)
+        with open(os.path.join(pkg_dir, f"Bench{idx}.java"), "w", encoding="utf-8") as f:
+            f.write(JAVA_TEMPLATE.format(idx=idx, pkg=pkg, body=body))
+
+
+def timed_scan(repo: str, workers: int, chunk_size: int):
+    start = time.perf_counter()
+    files = scan_java_files(repo, workers=workers, chunk_size=chunk_size)
+    return files, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: scan serial vs pool de processos")
+    parser.add_argument("--repo", help="Repositório real (se omitido, gera um sintético)")
+    parser.add_argument("--files", type=int, default=10000, help="Arquivos do repositório sintético")
+    parser.add_argument("--workers", type=int, default=default_scan_workers())
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_SCAN_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    repo = args.repo
+    if not repo:
+        tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_scan_")
+        print(f"[*] Gerando repositório sintético com {args.files} arquivos em {tmp_dir}...")
+        generate_synthetic_repo(tmp_dir, args.files)
+        repo = tmp_dir
+
+    try:
+        # Aquecer o cache de páginas do SO para comparar CPU, não disco frio
+        scan_java_files(repo, workers=1, chunk_size=args.chunk_size)
+
+        serial_files, serial_time = timed_scan(repo, 1, args.chunk_size)
+        parallel_files, parallel_time = timed_scan(repo, args.workers, args.chunk_size)
+
+        identical = serial_files == parallel_files
+        n = len(serial_files)
+
+        print("\n=== Resultado ===")
+        print(f"   • Arquivos: {n}")
+        print(f"   • Serial:            {serial_time:8.2f}s  ({n / serial_time:,.0f} arquivos/s)")
+        print(f"   • Pool ({args.workers} workers): {parallel_time:8.2f}s  ({n / parallel_time:,.0f} arquivos/s)")
+        print(f"   • Speedup: {serial_time / parallel_time:.2f}x")
+        print(f"   • Resultados idênticos: {'✅' if identical else '❌'}")
+        return 0 if identical else 1
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,118 @@
+"""
+Microbenchmark do retrieval por keywords (BM25)
+Mede latência p50/p99 de consultas no índice invertido para repositórios sintéticos
+de tamanhos diferentes e compara com o scan linear (content.count) sobre todos os arquivos.
+
+Uso:
+    python l2j_pipeline/bench_keyword_retrieval.py --sizes 2000,20000 --queries 500
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from keyword_index import build_keyword_index, KeywordIndex
+
+
+def make_vocabulary(size: int, rng: random.Random) -> List[str]:
+    prefixes = ["L2", "Skill", "Item", "Npc", "Player", "Clan", "Quest", "Packet", "Zone", "Siege"]
+    suffixes = ["Manager", "Holder", "Handler", "Instance", "Table", "Data", "Task", "Listener", "Template", "Info"]
+    vocab = []
+    for i in range(size):
+        vocab.append(f"{rng.choice(prefixes)}{rng.choice(suffixes)}{i}")
+    return vocab
+
+
+def make_documents(num_docs: int, vocab: List[str], tokens_per_doc: int, rng: random.Random) -> List[str]:
+    """Documentos com identificadores em distribuição de Zipf (como código real)."""
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    docs = []
+    for _ in range(num_docs):
+        words = rng.choices(vocab, weights=weights, k=tokens_per_doc)
+        lines = [" ".join(words[i:i + 8]) + ";" for i in range(0, len(words), 8)]
+        docs.append("public class Synthetic {\n" + "\n".join(lines) + "\n}\n")
+    return docs
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def linear_scan(docs: List[str], query: str, top_k: int):
+    """Equivalente ao _keyword_retrieval antigo, mas sobre todos os arquivos."""
+    keywords = {w.strip('();{}[].,') for w in query.split()}
+    keywords = {w for w in keywords if w and w[0].isupper()}
+    scored = []
+    for idx, content in enumerate(docs):
+        score = 0.0
+        for keyword in keywords:
+            if keyword in content:
+                score += content.count(keyword) / len(content)
+        if score > 0:
+            scored.append((score, idx))
+    scored.sort(reverse=True)
+    return scored[:top_k]
+
+
+def run_size(num_docs: int, args, tmp_dir: str):
+    rng = random.Random(args.seed)
+    vocab = make_vocabulary(args.vocab, rng)
+    docs = make_documents(num_docs, vocab, args.tokens, rng)
+
+    path = os.path.join(tmp_dir, f"bench_{num_docs}.bm25")
+    start = time.perf_counter()
+    stats = build_keyword_index(enumerate(docs), path)
+    build_time = time.perf_counter() - start
+
+    index = KeywordIndex(path)
+    queries = [docs[rng.randrange(num_docs)][:1024] for _ in range(args.queries)]
+
+    latencies = []
+    for query in queries:
+        t0 = time.perf_counter()
+        index.search(query, args.top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    index.close()
+
+    linear = []
+    for query in queries[:args.linear_queries]:
+        t0 = time.perf_counter()
+        linear_scan(docs, query, args.top_k)
+        linear.append((time.perf_counter() - t0) * 1000)
+
+    print(f"\n=== {num_docs} arquivos ===")
+    print(f"   • Build: {build_time:.1f}s | termos: {stats['terms']} | postings: {stats['postings']}")
+    print(f"   • BM25   p50: {percentile(latencies, 50):7.2f} ms | p99: {percentile(latencies, 99):7.2f} ms  ({len(latencies)} consultas)")
+    if linear:
+        print(f"   • Linear p50: {percentile(linear, 50):7.2f} ms | p99: {percentile(linear, 99):7.2f} ms  ({len(linear)} consultas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark BM25 vs scan linear")
+    parser.add_argument("--sizes", default="20000", help="Tamanhos de repositório (separados por vírgula)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--linear-queries", type=int, default=20, help="Consultas do scan linear (lento)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--tokens", type=int, default=400, help="Identificadores por arquivo")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="l2j_bench_bm25_")
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            run_size(size, args, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,176 @@
+"""
+Benchmark do cliente LLM compartilhado (llm_client)
+Sobe um servidor stub compatível com a API da OpenAI (/chat/completions com latência
+fixa e uma fração de respostas 429) e compara:
+    - serial: um arquivo por vez, como os engines faziam
+    - threads: N threads chamando chat() (como os estágios em threads do pipeline)
+    - async: asyncio.gather de achat()
+    - cache: as mesmas requisições duas vezes com o cache de respostas (llm_cache);
+      a segunda passada não chega ao stub
+Todas as requisições devem terminar com sucesso apesar dos 429 (retries com backoff).
+
+Uso:
+    python l2j_pipeline/bench_llm_client.py --requests 200 --latency 0.2 --concurrency 32
+    python l2j_pipeline/bench_llm_client.py --error-rate 0.2 --rpm 600
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from llm_client import LLMClient
+from llm_cache import LLMCache, format_stats
+
+
+def make_stub_handler(latency: float, error_rate: float, respond=None):
+    """Handler do stub; respond(mensagens) -> conteúdo (padrão: última mensagem invertida)."""
+    counters = {"requests": 0, "rate_limited": 0, "max_in_flight": 0, "in_flight": 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b'{}')
+            with lock:
+                counters["requests"] += 1
+                counters["in_flight"] += 1
+                counters["max_in_flight"] = max(counters["max_in_flight"], counters["in_flight"])
+            try:
+                time.sleep(latency)
+                if random.random() < error_rate:
+                    with lock:
+                        counters["rate_limited"] += 1
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"Retry-After": "0.05"})
+                    return
+                content = respond(body["messages"]) if respond else body["messages"][-1]["content"][::-1]
+                self._send(200, {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+                })
+            finally:
+                with lock:
+                    counters["in_flight"] -= 1
+
+    return StubHandler, counters
+
+
+def new_client(base_url: str, args, concurrency: int) -> LLMClient:
+    rate_limits = {"*": args.rpm} if args.rpm else {}
+    return LLMClient("stub-key", base_url, max_concurrency=concurrency, rate_limits=rate_limits,
+                     max_retries=args.retries)
+
+
+def messages_for(i: int):
+    return [{"role": "user", "content": f"request-{i}"}]
+
+
+def check(results) -> bool:
+    return all(content == f"request-{i}"[::-1] for i, content in enumerate(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: cliente LLM compartilhado contra um stub local")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência do stub por requisição (s)")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="Fração de respostas 429")
+    parser.add_argument("--concurrency", type=int, default=16, help="LLM_MAX_CONCURRENCY")
+    parser.add_argument("--rpm", type=float, default=0, help="Rate limit por modelo (0 = sem limite)")
+    parser.add_argument("--retries", type=int, default=8)
+    parser.add_argument("--serial-max", type=int, default=50, help="Requisições no modo serial")
+    args = parser.parse_args()
+
+    handler, counters = make_stub_handler(args.latency, args.error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    print(f"[*] Stub em {base_url} (latência {args.latency}s, {args.error_rate:.0%} de 429)")
+
+    try:
+        rows = []
+
+        # Serial: um chat() por vez
+        client = new_client(base_url, args, 1)
+        n = min(args.requests, args.serial_max)
+        start = time.perf_counter()
+        results = [client.chat("stub/model", messages_for(i)) for i in range(n)]
+        rows.append(("serial", n, time.perf_counter() - start, check(results), client.stats()))
+
+        # Threads: uma requisição por thread, cliente compartilhado
+        client = new_client(base_url, args, args.concurrency)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency * 2) as executor:
+            results = list(executor.map(lambda i: client.chat("stub/model", messages_for(i)), range(args.requests)))
+        rows.append(("threads", args.requests, time.perf_counter() - start, check(results), client.stats()))
+
+        # Async: gather de achat() em outro event loop
+        client = new_client(base_url, args, args.concurrency)
+
+        async def run_async():
+            return await asyncio.gather(*(client.achat("stub/model", messages_for(i)) for i in range(args.requests)))
+
+        start = time.perf_counter()
+        results = asyncio.run(run_async())
+        rows.append(("async", args.requests, time.perf_counter() - start, check(results), client.stats()))
+
+        # Cache: primeira passada grava, segunda (como um rerun após queda) só lê
+        cache_dir = tempfile.mkdtemp(prefix="l2j_bench_llm_cache_")
+        try:
+            cache = LLMCache(os.path.join(cache_dir, "responses.sqlite"))
+            for label in ("cache (1ª)", "cache (2ª)"):
+                client = new_client(base_url, args, args.concurrency)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency * 2) as executor:
+                    results = list(executor.map(
+                        lambda i: client.chat("stub/model", messages_for(i), cache=cache), range(args.requests)
+                    ))
+                rows.append((label, args.requests, time.perf_counter() - start, check(results), client.stats()))
+            cache_stats = cache.stats()
+            cache.close()
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        print("\n=== Resultado ===")
+        ok = True
+        for label, count, elapsed, valid, stats in rows:
+            ok = ok and valid
+            print(f"   • {label:10s} {count:5d} req em {elapsed:7.2f}s ({count / elapsed:7.1f} req/s) | "
+                  f"requisições: {stats['requests']:4d} | retries: {stats['retries']:4d} | erros: {stats['errors']} | "
+                  f"respostas ok: {'✅' if valid else '❌'}")
+        print(f"   • Stub: {counters['requests']} requisições, {counters['rate_limited']} com 429, "
+              f"máx. simultâneas: {counters['max_in_flight']} (limite {args.concurrency})")
+        print(f"   • Cache: {format_stats(cache_stats)}")
+        return 0 if ok else 1
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    exit(main())
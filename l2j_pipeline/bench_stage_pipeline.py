@@ -0,0 +1,178 @@
+"""
+Benchmark do pipeline em estágios do HybridMigrationEngine
+Compara, para os mesmos N arquivos Java:
+    - serial: generate_code() um arquivo por vez (como era o loop de migração)
+    - pipeline: generate_code_many() (AST em processos, LLM em asyncio,
+      compilação/validação/testes em threads, filas limitadas entre estágios)
+
+O LLM é um stub HTTP local (bench_llm_client) com latência fixa; compilação,
+validação de comportamento, testes e retrieval são simulados com latências
+configuráveis (o benchmark não depende de go, java, docker nem do índice RLCoder).
+O AST é o parser real (tree-sitter). Uma a cada --fail-every compilações falha, para
+exercitar o retry (volta ao estágio generate).
+
+Uso:
+    python l2j_pipeline/bench_stage_pipeline.py --files 40 --llm-latency 0.3 --compile-ms 150
+    python l2j_pipeline/bench_stage_pipeline.py --repo l2j_pipeline/temp_repos/l2j-server-login
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_llm_client import make_stub_handler
+from llm_client import LLMClient
+from hybrid_migration_engine import HybridMigrationEngine, DEFAULT_STAGE_WORKERS
+from stage_pipeline import format_stats
+
+GO_RESPONSE = """<code>
+package main
+
+type Item struct {
+    ID int
+}
+
+func (i *Item) Use() int { return i.ID }
+</code>"""
+
+SYNTHETIC_JAVA = """package com.l2jserver.gameserver.model;
+
+public class Item%d {
+    private int itemId;
+    public int getItemId() { return itemId; }
+    public void use() { System.out.println("Using item " + itemId); }
+}
+"""
+
+
+class SimulatedCompiler:
+    """go build simulado: `latency` s por compilação; 1 a cada `fail_every` falha (retry)."""
+
+    def __init__(self, latency: float, fail_every: int):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def validate_code(self, go_code: str):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            failed = self.fail_every > 0 and self.calls % self.fail_every == 0
+        if failed:
+            return {"success": False, "stdout": "", "stderr": "main.go:3:1: syntax error (simulado)"}
+        return {"success": True, "stdout": "", "stderr": ""}
+
+
+class SimulatedValidator:
+    use_docker = True  # permite vários workers no estágio
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def validate_behavior(self, java_code: str, go_code: str):
+        time.sleep(self.latency)
+        return {"success": True, "reward": 10}
+
+
+class SimulatedTestGenerator:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_test(self, go_code: str, java_code: str, filename: str) -> str:
+        time.sleep(self.latency)
+        return "package main\n"
+
+
+class SimulatedRetriever:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def retrieve_context(self, java_code: str, top_k: int = 3):
+        time.sleep(self.latency)
+        return {"relevant_code": ["public class Item { int itemId; }"], "file_paths": ["Item.java"]}
+
+
+def make_engine(base_url: str, args) -> HybridMigrationEngine:
+    """Engine sem o construtor (HRM, RLCoder, go e docker não são necessários aqui)."""
+    engine = HybridMigrationEngine.__new__(HybridMigrationEngine)
+    engine.target_lang = "Go"
+    engine.model = "stub/model"
+    engine.hrm_model = {"mode": "trained", "path": "bench"}
+    engine.llm_client = LLMClient("stub-key", base_url, max_concurrency=64)
+    engine.llm_cache = None
+    engine.compiler = SimulatedCompiler(args.compile_ms / 1000, args.fail_every)
+    engine.validator = SimulatedValidator(args.behavior_ms / 1000)
+    engine.test_gen = SimulatedTestGenerator(args.tests_ms / 1000)
+    engine.rlcoder = SimulatedRetriever(args.retrieve_ms / 1000)
+    return engine
+
+
+def load_sources(args):
+    if args.repo:
+        files = sorted(Path(args.repo).rglob("*.java"))[:args.files]
+        return [(str(path), path.read_text(encoding='utf-8', errors='replace')) for path in files]
+    return [(f"synthetic/Item{i}.java", SYNTHETIC_JAVA % i) for i in range(args.files)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: generate_code serial vs. pipeline em estágios")
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--repo", help="Usa arquivos .java reais deste diretório (padrão: sintéticos)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Latência do stub do LLM (s)")
+    parser.add_argument("--retrieve-ms", type=float, default=20)
+    parser.add_argument("--compile-ms", type=float, default=150)
+    parser.add_argument("--behavior-ms", type=float, default=100)
+    parser.add_argument("--tests-ms", type=float, default=50, help="Geração de testes (além do LLM)")
+    parser.add_argument("--fail-every", type=int, default=4, help="1 a cada N compilações falha (0 = nenhuma)")
+    parser.add_argument("--generate-workers", type=int, default=DEFAULT_STAGE_WORKERS["generate"])
+    parser.add_argument("--serial-max", type=int, default=12, help="Arquivos no modo serial")
+    args = parser.parse_args()
+
+    handler, counters = make_stub_handler(args.llm_latency, 0.0, respond=lambda messages: GO_RESPONSE)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    sources = load_sources(args)
+    print(f"[*] {len(sources)} arquivos | LLM {args.llm_latency}s | compilação {args.compile_ms:.0f}ms | "
+          f"comportamento {args.behavior_ms:.0f}ms | testes {args.tests_ms:.0f}ms")
+
+    try:
+        # Serial: um generate_code por arquivo
+        engine = make_engine(base_url, args)
+        serial = sources[:args.serial_max]
+        start = time.perf_counter()
+        serial_ok = sum(engine.generate_code(code, path)["success"] for path, code in serial)
+        serial_time = time.perf_counter() - start
+
+        # Pipeline: todos os arquivos em generate_code_many
+        engine = make_engine(base_url, args)
+        pipeline = engine.build_pipeline({"generate": args.generate_workers, "tests": args.generate_workers})
+        start = time.perf_counter()
+        results = engine.generate_code_many(
+            ({"java_code": code, "file_path": path} for path, code in sources), pipeline=pipeline)
+        pipeline_time = time.perf_counter() - start
+        pipeline_ok = sum(result["success"] for result in results)
+
+        print("\n=== Resultado ===")
+        print(f"   • serial    {len(serial):4d} arquivos em {serial_time:7.2f}s "
+              f"({len(serial) / serial_time:6.2f} arquivos/s) | ok: {serial_ok}")
+        print(f"   • pipeline  {len(sources):4d} arquivos em {pipeline_time:7.2f}s "
+              f"({len(sources) / pipeline_time:6.2f} arquivos/s) | ok: {pipeline_ok}")
+        print(f"   • Speedup: {(len(sources) / pipeline_time) / (len(serial) / serial_time):.1f}x")
+        print(f"   • Stub: {counters['requests']} requisições, máx. simultâneas: {counters['max_in_flight']}")
+        print(f"   • Por estágio: {format_stats(pipeline.stats())}")
+        pipeline.close()
+        return 0 if pipeline_ok == len(sources) and serial_ok == len(serial) else 1
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    exit(main())
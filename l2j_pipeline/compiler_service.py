@@ -1,72 +1,383 @@
 """
 Compiler Service (The Muscle)
 Validates generated Go code by attempting to build it.
+
+The sandbox is a single Go module with one reusable package directory per
+concurrent caller (workspaces/p<pid>-w<N>), so parallel validations - threads
+or worker processes sharing the sandbox - never see each other's files. Builds
+use the user's (usually warm) build cache; where it is disabled (GOCACHE=off,
+e.g. a container without HOME) the cache lives inside the sandbox instead,
+persists across calls and processes, and the standard library is compiled into
+it once at startup. Candidates are removed after
+each validation; failing ones are archived in failed/ (capped at max_archived
+files) for inspection.
+
+validate_many() checks N candidates with one toolchain invocation: each one
+becomes its own package (c<i>/candidate.go) inside a workspace and a single
+`go list -e -export -json ./workspaces/<ws>/...` type-checks and compiles them
+all without linking (a multi-package `go build` links every main package, one
+link per candidate). go list reports errors per package and keeps going past
+load errors, so each candidate gets its own verdict; the one link-time check
+that matters here, a main package without func main, is done on the source.
+In vet mode the batch runs `go vet ./workspaces/<ws>/...` and the diagnostics
+are mapped back to the candidate by package path. The go command startup and
+standard library loading are paid once per batch instead of once per file.
+BatchingCompiler coalesces concurrent validate_code() calls (e.g. the compile
+stage threads of the migration pipeline) into such batches.
+
+Layout:
+    data/compiler_sandbox/
+        go.mod
+        .cache/go-build        GOCACHE (only when the user's cache is off)
+        .cache/mod             GOMODCACHE (only when GOPATH is unset)
+        workspaces/p<pid>-w1/  candidate.go (only during a validation)
+        failed/                archived failing candidates
 """
 import subprocess
 import os
-import tempfile
+import re
+import glob
+import json
+import queue
+import shutil
+import threading
+import time
 import uuid
-from typing import Dict, Tuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MODULE_NAME = "l2j_migration_sandbox"
+WORKSPACE_DIR = "workspaces"
+ARCHIVE_DIR = "failed"
+CACHE_DIR = ".cache"
+CANDIDATE_FILE = "candidate.go"
+MAX_ARCHIVED = 200
+GO_TIMEOUT = 120
+MAX_BATCH = 64
+CHECK_MODES = ("build", "vet")
+# Top-level func main (candidates are gofmt-ed before the check)
+MAIN_FUNC_RE = re.compile(r'^func\s+main\s*\(\s*\)', re.MULTILINE)
+MISSING_MAIN = "function main is undeclared in the main package"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
 
 class GoCompiler:
-    def __init__(self, working_dir: str = "data/compiler_sandbox"):
+    def __init__(self, working_dir: str = "data/compiler_sandbox", check: str = "build",
+                 archive_failed: bool = True, max_archived: int = MAX_ARCHIVED):
+        """
+        Args:
+            working_dir: Sandbox root (the Go module)
+            check: "build" compiles the package (validate_code builds and discards the
+                   binary; batches compile without linking); "vet" runs a single
+                   `go vet`, which type-checks and also fails on vet findings
+            archive_failed: Keep failing candidates in failed/ (successful ones are deleted)
+            max_archived: Oldest archived candidates are pruned beyond this count
+        """
+        if check not in CHECK_MODES:
+            raise ValueError(f"Invalid check mode: {check}")
         self.working_dir = working_dir
+        self.check = check
+        self.archive_failed = archive_failed
+        self.max_archived = max_archived
         os.makedirs(self.working_dir, exist_ok=True)
-        
+        self.env = self._go_env()
+        self._fmt_cmd = ["gofmt", "-w"] if shutil.which("gofmt") else ["go", "fmt"]
+
+        # Free workspaces (LIFO: the most recently used one has the warmest page cache)
+        self._free = queue.LifoQueue()
+        self._workspaces = 0
+        self._lock = threading.Lock()
+
         # Ensure a go.mod exists for dependency tracking
         if not os.path.exists(os.path.join(self.working_dir, "go.mod")):
             self._init_module()
+        self._archive_legacy()
+        self._prune_workspaces()
+
+    def _go_env(self) -> Dict[str, str]:
+        """
+        Environment for the go command. The user's caches are kept; a disabled build
+        cache or unset module cache is replaced by one inside the sandbox (paths must
+        be absolute), and a new sandbox build cache is warmed with the standard library.
+        """
+        env = dict(os.environ)
+        try:
+            values = subprocess.run(["go", "env", "GOCACHE", "GOMODCACHE"], env=env, capture_output=True,
+                                    text=True, timeout=GO_TIMEOUT).stdout.splitlines()
+        except (OSError, subprocess.TimeoutExpired):
+            values = []
+        gocache, gomodcache = (values + ["", ""])[:2]
+        cache_root = os.path.abspath(os.path.join(self.working_dir, CACHE_DIR))
+        if gomodcache.strip() == "":
+            env["GOMODCACHE"] = os.path.join(cache_root, "mod")
+        if gocache.strip() in ("", "off"):
+            env["GOCACHE"] = os.path.join(cache_root, "go-build")
+            if values and not os.path.isdir(env["GOCACHE"]):
+                # Once per sandbox and without GO_TIMEOUT: otherwise the first batches
+                # compile the standard library inside their own time limit
+                subprocess.run(["go", "build", "std"], cwd=self.working_dir, env=env, capture_output=True)
+        return env
+
+    def _run(self, cmd: List[str], cwd: str) -> subprocess.CompletedProcess:
+        return subprocess.run(cmd, cwd=cwd, env=self.env, capture_output=True, text=True, timeout=GO_TIMEOUT)
 
     def _init_module(self):
         """Initializes a dummy go module for the sandbox."""
-        cmd = ["go", "mod", "init", "l2j_migration_sandbox"]
-        subprocess.run(cmd, cwd=self.working_dir, capture_output=True)
+        cmd = ["go", "mod", "init", MODULE_NAME]
+        subprocess.run(cmd, cwd=self.working_dir, env=self.env, capture_output=True)
+
+    def _archive_legacy(self):
+        """Moves gen_*.go files left in the sandbox root by older versions into failed/."""
+        for path in glob.glob(os.path.join(self.working_dir, "gen_*.go")):
+            self._archive(path)
+
+    def _prune_workspaces(self):
+        """Removes workspaces of processes that are no longer running."""
+        for path in glob.glob(os.path.join(self.working_dir, WORKSPACE_DIR, "p*-w*")):
+            pid = os.path.basename(path)[1:].split("-", 1)[0]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _archive(self, filepath: str) -> Optional[str]:
+        """Archives (or deletes) a failing candidate and prunes the archive."""
+        if not self.archive_failed:
+            os.remove(filepath)
+            return None
+        archive_dir = os.path.join(self.working_dir, ARCHIVE_DIR)
+        os.makedirs(archive_dir, exist_ok=True)
+        target = os.path.join(archive_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.go")
+        shutil.move(filepath, target)
+        with self._lock:
+            archived = sorted(glob.glob(os.path.join(archive_dir, "*.go")))
+            for old in archived[:max(0, len(archived) - self.max_archived)]:
+                os.remove(old)
+        return target
+
+    @contextmanager
+    def _workspace(self):
+        """Borrows a package directory for one validation (created on first use)."""
+        try:
+            workspace = self._free.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self._workspaces += 1
+                workspace = os.path.join(self.working_dir, WORKSPACE_DIR, f"p{os.getpid()}-w{self._workspaces}")
+            os.makedirs(workspace, exist_ok=True)
+        try:
+            self._reset(workspace)
+            yield workspace
+        finally:
+            self._reset(workspace)
+            self._free.put(workspace)
+
+    def _reset(self, workspace: str):
+        for name in os.listdir(workspace):
+            path = os.path.join(workspace, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def _check_cmd(self, package: str) -> List[str]:
+        if self.check == "vet":
+            return ["go", "vet", package]
+        # -o /dev/null throws away the binary, just checks buildability
+        return ["go", "build", "-o", os.devnull, package]
 
     def validate_code(self, go_code: str) -> Dict:
         """
-        Writes code to a temp file and tries to build it.
-        Returns: {success: bool, output: str, errors: str}
+        Writes code to a worker workspace and tries to build it.
+        Returns: {success: bool, stdout: str, stderr: str, filepath: archived file or None}
         """
-        # Create a unique filename to avoid collisions in parallel (future proof)
-        # But for Go build to work easily with packages, we might need structure.
-        # For now, we assume single file compilation or main package.
-        
         # Clean up code format (sometimes LLM leaves markdown blocks)
         clean_code = self._clean_markdown(go_code)
-        
-        filename = f"gen_{uuid.uuid4().hex[:8]}.go"
-        filepath = os.path.join(self.working_dir, filename)
-        
-        try:
-            with open(filepath, "w") as f:
-                f.write(clean_code)
-            
-            # 1. Format code (go fmt) - fixes trivial syntax issues
-            subprocess.run(["go", "fmt", filename], cwd=self.working_dir, capture_output=True)
-            
-            # 2. Try to compile
-            # -o /dev/null throws away the binary, just checks buildability
-            build_cmd = ["go", "build", "-o", os.devnull, filename]
-            result = subprocess.run(build_cmd, cwd=self.working_dir, capture_output=True, text=True)
-            
-            success = (result.returncode == 0)
-            
-            return {
-                "success": success,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "filepath": filepath 
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "stderr": f"System Error: {str(e)}"
-            }
-        finally:
-            # Cleanup? For debugging maybe keep it, but for prod clean it.
-            # Keeping for now to inspect "bad" code.
-            pass
+
+        with self._workspace() as workspace:
+            filepath = os.path.join(workspace, CANDIDATE_FILE)
+            package = "./" + os.path.relpath(workspace, self.working_dir).replace(os.sep, "/")
+            try:
+                with open(filepath, "w") as f:
+                    f.write(clean_code)
+
+                # 1. Format code (gofmt) - fixes trivial syntax issues; the standalone
+                #    binary skips the go command startup
+                self._run(self._fmt_cmd + [CANDIDATE_FILE], workspace)
+
+                # 2. Build (or vet) the workspace package in one toolchain invocation
+                result = self._run(self._check_cmd(package), self.working_dir)
+                success = (result.returncode == 0)
+
+                return {
+                    "success": success,
+                    "stdout": result.stdout,
+                    # Diagnostics refer to candidate.go, not to the workspace path
+                    "stderr": result.stderr.replace(package[2:] + "/", ""),
+                    "filepath": None if success else self._archive(filepath)
+                }
+
+            except subprocess.TimeoutExpired:
+                return {
+                    "success": False,
+                    "stderr": f"System Error: go {self.check} timed out after {GO_TIMEOUT}s"
+                }
+            except Exception as e:
+                return {
+                    "success": False,
+                    "stderr": f"System Error: {str(e)}"
+                }
+
+    def validate_many(self, go_codes: List[str]) -> List[Dict]:
+        """
+        Validates several candidates with one go list -export (or go vet) per MAX_BATCH.
+        Returns: one validate_code-style result per candidate, in the same order
+        """
+        results = []
+        for start in range(0, len(go_codes), MAX_BATCH):
+            results.extend(self._validate_batch(go_codes[start:start + MAX_BATCH]))
+        return results
+
+    def _validate_batch(self, go_codes: List[str]) -> List[Dict]:
+        if len(go_codes) == 1:
+            return [self.validate_code(go_codes[0])]
+
+        with self._workspace() as workspace:
+            package = "./" + os.path.relpath(workspace, self.working_dir).replace(os.sep, "/")
+            filepaths = []
+            try:
+                for i, go_code in enumerate(go_codes):
+                    os.makedirs(os.path.join(workspace, f"c{i}"))
+                    filepaths.append(os.path.join(workspace, f"c{i}", CANDIDATE_FILE))
+                    with open(filepaths[-1], "w") as f:
+                        f.write(self._clean_markdown(go_code))
+
+                # 1. Format all candidates in one gofmt call (directories are walked)
+                self._run(self._fmt_cmd + [f"./c{i}" for i in range(len(go_codes))], workspace)
+
+                # 2. One toolchain invocation over every candidate package
+                if self.check == "vet":
+                    outcomes = self._vet_batch(package, len(go_codes))
+                else:
+                    outcomes = self._compile_batch(package, filepaths)
+            except subprocess.TimeoutExpired:
+                outcomes = None
+            except Exception as e:
+                return [{"success": False, "stderr": f"System Error: {str(e)}"} for _ in go_codes]
+
+            results = [None] * len(go_codes)
+            for i, diagnostics in enumerate(outcomes or []):
+                if diagnostics is None:
+                    continue
+                results[i] = {
+                    "success": not diagnostics,
+                    "stdout": "",
+                    "stderr": "".join(line + "\n" for line in diagnostics),
+                    "filepath": self._archive(filepaths[i]) if diagnostics else None
+                }
+
+        if outcomes is None:
+            # A timeout says nothing about the individual candidates: check each half
+            half = len(go_codes) // 2
+            return self._validate_batch(go_codes[:half]) + self._validate_batch(go_codes[half:])
+
+        # Candidates without a verdict: go vet may have stopped before vetting them
+        # (another package failed to load), so they are vetted again without the
+        # failing packages; if nothing could be attributed at all (toolchain/module
+        # error), or go list gave no verdict, each is checked on its own
+        pending = [i for i, result in enumerate(results) if result is None]
+        if self.check == "vet" and pending and len(pending) < len(go_codes):
+            rechecked = self._validate_batch([go_codes[i] for i in pending])
+        else:
+            rechecked = [self.validate_code(go_codes[i]) for i in pending]
+        for i, result in zip(pending, rechecked):
+            results[i] = result
+        return results
+
+    def _compile_batch(self, package: str, filepaths: List[str]) -> List[Optional[List[str]]]:
+        """
+        `go list -e -export -json <package>/...`: compiles every candidate package
+        without linking. Returns per candidate its diagnostics ([] = compiles) or
+        None when go list gave no verdict for it.
+        """
+        result = self._run(["go", "list", "-e", "-export", "-json", package + "/..."], self.working_dir)
+        workspace = package[2:]
+        path_re = re.compile(re.escape(workspace) + r"/c(\d+)$")
+        outcomes = [None] * len(filepaths)
+        for info in self._json_objects(result.stdout):
+            match = path_re.search(info.get("ImportPath", ""))
+            if not match or int(match.group(1)) >= len(filepaths):
+                continue
+            i = int(match.group(1))
+            prefix = f"{workspace}/c{i}/"
+            diagnostics = []
+            if info.get("Error"):
+                diagnostics += info["Error"]["Err"].replace(prefix, "").rstrip("\n").splitlines()
+            for error in info.get("DepsErrors") or []:
+                position = error.get("Pos", "").replace(prefix, "")
+                diagnostics += f"{position + ': ' if position else ''}{error['Err']}".splitlines()
+            if not diagnostics and info.get("Name") == "main":
+                with open(filepaths[i]) as f:
+                    if not MAIN_FUNC_RE.search(f.read()):
+                        diagnostics.append(f"{CANDIDATE_FILE}: {MISSING_MAIN}")
+            if diagnostics or info.get("Export"):
+                outcomes[i] = diagnostics
+        return outcomes
+
+    def _vet_batch(self, package: str, count: int) -> List[Optional[List[str]]]:
+        """`go vet <package>/...`; a candidate without diagnostics only passes if vet exited 0."""
+        result = self._run(["go", "vet", package + "/..."], self.working_dir)
+        diagnostics, _ = self._split_diagnostics(result.stderr, package[2:], count)
+        return [lines if lines else ([] if result.returncode == 0 else None) for lines in diagnostics]
+
+    @staticmethod
+    def _json_objects(text: str) -> List[Dict]:
+        """Objects of a concatenated JSON stream (go list -json); stops at the first malformed one."""
+        decoder = json.JSONDecoder()
+        objects, position = [], 0
+        while True:
+            while position < len(text) and text[position].isspace():
+                position += 1
+            if position >= len(text):
+                return objects
+            try:
+                obj, position = decoder.raw_decode(text, position)
+            except ValueError:
+                return objects
+            objects.append(obj)
+
+    @staticmethod
+    def _split_diagnostics(stderr: str, workspace: str, count: int):
+        """
+        Assigns each output line to the candidate whose package path it mentions;
+        continuation lines follow the last candidate seen, "# <package>" headers of
+        other packages reset it. Paths are rewritten to candidate.go.
+        """
+        candidate_re = re.compile(re.escape(workspace) + r"/c(\d+)\b")
+        diagnostics = [[] for _ in range(count)]
+        unattributed = []
+        current = None
+        for line in stderr.splitlines():
+            match = candidate_re.search(line)
+            if match and int(match.group(1)) < count:
+                current = int(match.group(1))
+                line = line.replace(f"{workspace}/c{current}/", "")
+            elif line.startswith("#"):
+                current = None
+            if current is None:
+                if line.strip():
+                    unattributed.append(line)
+            else:
+                diagnostics[current].append(line)
+        return diagnostics, unattributed
 
     def _clean_markdown(self, code: str) -> str:
         if code.strip().startswith("```go"):
@@ -75,10 +386,56 @@ class GoCompiler:
             code = code.strip()[:-3]
         return code
 
+class BatchingCompiler:
+    """
+    validate_code() drop-in that coalesces concurrent calls into validate_many()
+    batches. A dispatcher thread takes the first waiting candidate, collects the
+    ones arriving within max_wait (up to max_batch) and checks them together;
+    candidates arriving while a batch builds go into the next one.
+    """
+
+    def __init__(self, compiler: Optional[GoCompiler] = None, max_batch: int = 16, max_wait: float = 0.02):
+        self.compiler = compiler or GoCompiler()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def validate_code(self, go_code: str) -> Dict:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="go-batch", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((go_code, future))
+        return future.result()
+
+    def validate_many(self, go_codes: List[str]) -> List[Dict]:
+        return self.compiler.validate_many(go_codes)
+
+    def _dispatch(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self.compiler.validate_many([go_code for go_code, _ in batch])
+            except Exception as e:
+                results = [{"success": False, "stderr": f"System Error: {str(e)}"} for _ in batch]
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
 if __name__ == "__main__":
     # Test
     compiler = GoCompiler()
-    
+
     good_code = """
     package main
     import "fmt"
@@ -86,16 +443,16 @@ if __name__ == "__main__":
         fmt.Println("Hello L2J")
     }
     """
-    
+
     bad_code = """
     package main
     func main() {
         fmt.Println("Missing Import")
     }
     """
-    
+
     print("Testing Good Code:")
     print(compiler.validate_code(good_code))
-    
+
     print("\nTesting Bad Code:")
     print(compiler.validate_code(bad_code))
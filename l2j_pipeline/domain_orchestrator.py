@@ -5,7 +5,7 @@ Classifies Java files into functional domains (Core, Network, Gameplay) using he
 import os
 import json
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 class Domain(str, Enum):
     CORE = "Core"
@@ -44,17 +44,23 @@ class DomainOrchestrator:
         
         return Domain.UNKNOWN
 
-    def generate_domain_map(self, file_list: List[str]) -> Dict[str, List[str]]:
-        """Generates a mapping of Domain -> List[Files]."""
+    def generate_domain_map(self, file_list: List[str],
+                            packages: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+        """Generates a mapping of Domain -> List[Files] (packages: optional file -> package)."""
         domain_map = {d.value: [] for d in Domain}
+        packages = packages or {}
         
         for fpath in file_list:
-            # Basic package extraction could be done here or passed in
-            domain = self.classify_file(fpath)
+            domain = self.classify_file(fpath, packages.get(fpath, ""))
             domain_map[domain.value].append(fpath)
             
         return domain_map
 
+    def generate_domain_map_from_corpus(self, ast_corpus) -> Dict[str, List[str]]:
+        """generate_domain_map over every file of an AST corpus (ast_corpus.AstCorpus), using its packages."""
+        packages = ast_corpus.packages()
+        return self.generate_domain_map(list(packages), packages)
+
 if __name__ == "__main__":
     # Test
     orch = DomainOrchestrator()
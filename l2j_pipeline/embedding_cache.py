@@ -0,0 +1,235 @@
+"""
+Cache Persistente de Embeddings do RLCoder
+(modelo, sha256 do texto) -> vetor float32, em SQLite com despejo LRU limitado por tamanho.
+
+Compartilhado pela indexação (build/update_semantic_index) e pelo retrieval semântico
+(queries do RLCoderAdapter): reindexar o mesmo repositório com outro nome, repetir o
+/transcribe no mesmo arquivo ou rodar prepare_guidance_dataset.py e depois
+generate_synth_dataset.py sobre o mesmo plano não recodifica textos já vistos.
+
+Os vetores são guardados como saem do encoder (sem normalização).
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+DEFAULT_CACHE_PATH = "data/embedding_cache/embeddings.sqlite"
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB de vetores
+# Após estourar o limite, despeja até esta fração dele (evita despejar a cada insert)
+EVICT_TO_FRACTION = 0.9
+# Chaves por consulta SQL (limite de parâmetros do SQLite)
+LOOKUP_BATCH = 500
+
+
+def text_key(model_name: str, text: str) -> str:
+    """Chave do cache: hash do nome do modelo + texto exato codificado."""
+    h = hashlib.sha256(model_name.encode('utf-8'))
+    h.update(b'\0')
+    h.update(text.encode('utf-8', errors='surrogatepass'))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache thread-safe de embeddings em disco.
+
+    encode() devolve os vetores na ordem dos textos, chamando o encoder apenas
+    para os ausentes (e uma única vez por texto repetido no mesmo lote).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def encode(self, model, model_name: str, texts: Sequence[str], **encode_kwargs) -> np.ndarray:
+        """
+        Equivalente a model.encode(texts, **encode_kwargs) com cache.
+
+        Returns:
+            Matriz float32 (len(texts), dim)
+        """
+        keys = [text_key(model_name, text) for text in texts]
+        found = self.get_many(keys)
+
+        # Ausentes (deduplicados) vão ao encoder em um único lote
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in found)
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(keys) - hits
+
+        if missing:
+            encoded = model.encode(list(missing.values()), **encode_kwargs)
+            encoded = np.ascontiguousarray(encoded, dtype='float32').reshape(len(missing), -1)
+            new_vectors = dict(zip(missing, encoded))
+            self.put_many(model_name, new_vectors)
+            found.update(new_vectors)
+
+        if not keys:
+            return np.zeros((0, 0), dtype='float32')
+        return np.stack([found[key] for key in keys]).astype('float32', copy=False)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Vetores presentes no cache (marca-os como usados agora)."""
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique), LOOKUP_BATCH):
+                batch = unique[start:start + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype='float32')
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model_name: str, vectors: Dict[str, np.ndarray]):
+        """Grava vetores novos e despeja os menos usados se passar de max_bytes."""
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (key, model_name, int(vector.shape[0]), vector.astype('float32').tobytes(), now)
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            for key, _, _, blob, _ in rows:
+                previous = self._conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                self._total_bytes += len(blob) - (previous[0] if previous else 0)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TO_FRACTION))
+            self._conn.commit()
+
+    def _evict(self, target_bytes: int):
+        """Remove as entradas menos recentemente usadas até caber em target_bytes (com lock)."""
+        to_delete = []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            if self._total_bytes <= target_bytes:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+        self._stats["evictions"] += len(to_delete)
+
+    def stats(self) -> Dict:
+        """Hits/misses desde a abertura, taxa de acerto e ocupação."""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            stats["entries"] = entries
+            stats["bytes"] = self._total_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        stats["path"] = self.path
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_stats(stats: Dict) -> str:
+    """Resumo de uma linha para logs."""
+    return (f"hits: {stats['hits']} | misses: {stats['misses']} | "
+            f"taxa de acerto: {stats['hit_ratio']:.1%} | entradas: {stats['entries']} "
+            f"({stats['bytes'] / (1 << 20):.1f} MiB)")
+
+
+# Uma instância por processo (ver process_state)
+_caches: Dict[str, EmbeddingCache] = process_singleton("embedding_cache.caches", dict)
+_caches_lock = process_singleton("embedding_cache.caches_lock", threading.Lock)
+
+
+def get_embedding_cache(path: Optional[str] = None, max_bytes: Optional[int] = None) -> EmbeddingCache:
+    """
+    Retorna o cache compartilhado do processo para `path`.
+
+    Padrões: variáveis RLCODER_EMBEDDING_CACHE (caminho) e RLCODER_EMBEDDING_CACHE_MB
+    (limite em MiB), ou DEFAULT_CACHE_PATH / DEFAULT_MAX_BYTES.
+    """
+    path = path or os.getenv("RLCODER_EMBEDDING_CACHE") or DEFAULT_CACHE_PATH
+    if max_bytes is None:
+        env_mb = os.getenv("RLCODER_EMBEDDING_CACHE_MB")
+        max_bytes = int(float(env_mb) * (1 << 20)) if env_mb else DEFAULT_MAX_BYTES
+    key = os.path.abspath(path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(path, max_bytes)
+            _caches[key] = cache
+        else:
+            cache.max_bytes = max_bytes
+        return cache
+
+
+def opened_cache_stats() -> List[Dict]:
+    """stats() dos caches já abertos neste processo (não cria nenhum)."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
+
+
+def cached_encode(model, model_name: str, texts: Sequence[str], cache: Optional[EmbeddingCache] = None,
+                  **encode_kwargs) -> np.ndarray:
+    """
+    model.encode com o cache do processo; se o cache falhar (disco, SQLite), codifica direto.
+    """
+    try:
+        cache = cache or get_embedding_cache()
+        return cache.encode(model, model_name, texts, **encode_kwargs)
+    except (sqlite3.Error, OSError) as e:
+        print(f"[!] Cache de embeddings indisponível ({e}). Codificando sem cache.")
+        encoded = model.encode(list(texts), **encode_kwargs)
+        return np.ascontiguousarray(encoded, dtype='float32').reshape(len(texts), -1)
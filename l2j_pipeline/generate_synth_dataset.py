@@ -11,35 +11,38 @@ import time
 from pathlib import Path
 from typing import List, Dict, Optional
 from tqdm import tqdm
-from openai import OpenAI
 from dotenv import load_dotenv
 from ast_parser import EnterpriseJavaParser # AST Integration
+from ast_corpus import AstCorpus, load_ast_corpus # AST pré-extraído (--parse-repo)
 from compiler_service import GoCompiler # RL Loop (Syntax)
 from behavior_validator import BehaviorValidator # RL Loop (Semantics)
 from test_generator import TestGenerator # QA Agent
-from rlcoder_adapter import RLCoderAdapter # Context Retrieval
+from rlcoder_adapter import RLCoderAdapter, prefetch_contexts, DEFAULT_PREFETCH # Context Retrieval
+from llm_client import get_llm_client, track_usage # Cliente LLM compartilhado (pool + retries)
+from llm_cache import open_llm_cache, format_stats, prompt_key # Cache de respostas do LLM
+from run_manifest import RunManifest, manifest_path_for, source_sha256, format_summary # Execuções retomáveis
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 class EnterpriseGenerator:
-    def __init__(self, target_lang: str = "Go", model: str = "qwen/qwen3-coder"):
+    def __init__(self, target_lang: str = "Go", model: str = "qwen/qwen3-coder",
+                 ast_corpus: Optional[AstCorpus] = None, use_llm_cache: bool = True):
         self.target_lang = target_lang
         self.model = model
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.parser = EnterpriseJavaParser() # Parse Engine
+        self.ast_corpus = ast_corpus # Corpus AST do repositório (evita reparsear)
         self.compiler = GoCompiler() # Validation Engine (Syntax)
         self.validator = BehaviorValidator() # Validation Engine (Semantics)
-        self.test_gen = TestGenerator(model=model) # QA Engine
+        self.test_gen = TestGenerator(model=model, use_llm_cache=use_llm_cache) # QA Engine
         self.rlcoder = RLCoderAdapter() # Context Retrieval Engine
         
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY não encontrada no ambiente (.env)")
             
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
+        self.client = get_llm_client(self.api_key)
+        self.llm_cache = open_llm_cache(use_llm_cache) # Reexecuções não repagam completions
         
         self.system_prompt = f"""You are an Expert L2J Migration Team (Powered by Qwen Logic).
 Personas:
@@ -72,20 +75,25 @@ OUTPUT FORMAT:
 </code>
 """
 
-    def generate_translation(self, java_code: str, file_path: str, max_retries: int = 3) -> Dict:
-        """Executa pipeline com AST Context + RL Loop."""
+    def generate_translation(self, java_code: str, file_path: str, max_retries: int = 3,
+                             rlcoder_context: Optional[Dict] = None) -> Dict:
+        """Executa pipeline com AST Context + RL Loop (rlcoder_context: contexto pré-buscado)."""
         
         # 1. Parse AST
         ast_data = {}
         try:
-            ast_data = self.parser.parse_file(file_path)
+            if self.ast_corpus is not None:
+                ast_data = self.ast_corpus.parse(self.parser, java_code, file_path)
+            else:
+                ast_data = self.parser.parse_source(java_code, file_path)
             ast_json = json.dumps(ast_data, indent=2)
         except Exception as e:
             # print(f"⚠️ AST Parse Warning: {e}")
             ast_json = f"AST Parse Failed: {e}"
         
         # 2. Retrieve RLCoder Context (Similar code from L2J)
-        rlcoder_context = self.rlcoder.retrieve_context(java_code, top_k=3)
+        if rlcoder_context is None:
+            rlcoder_context = self.rlcoder.retrieve_context(java_code, top_k=3)
         context_snippets = ""
         if rlcoder_context.get('relevant_code'):
             context_snippets = "\n\n".join([
@@ -117,18 +125,23 @@ SOURCE [Java]:
         ]
         
         # RL Loop: Generate -> Compile -> Fix -> Repeat
+        cache_key = None
         for attempt in range(max_retries + 1):
             try:
                 if attempt > 0:
                      print(f"   🔄 Auto-Fix Attempt {attempt}/{max_retries}...")
                 
-                response = self.client.chat.completions.create(
+                # Só a 1ª tentativa usa o cache (um retry pode repetir o prompt anterior)
+                params = {"temperature": 0.1 if attempt == 0 else 0.2}
+                cache = self.llm_cache if attempt == 0 else None
+                if cache is not None:
+                    cache_key = prompt_key(self.model, messages, params)
+                content = self.client.chat(
                     model=self.model,
                     messages=messages,
-                    temperature=0.1 if attempt == 0 else 0.2
+                    cache=cache,
+                    **params
                 )
-                
-                content = response.choices[0].message.content
                 code = self._extract_tag(content, "code")
                 analysis = self._extract_tag(content, "analysis")
                 architecture = self._extract_tag(content, "architecture")
@@ -237,10 +250,17 @@ Please Analysis the error and FIX the code. Return ONLY the corrected code in <c
                     
             except Exception as e:
                 print(f"❌ API Error: {e}")
+                self._discard_cached_response(cache_key)
                 return {"success": False, "error": str(e)}
 
+        self._discard_cached_response(cache_key)
         return {"success": False, "error": "Max retries exceeded (Compilation Failed)"}
 
+    def _discard_cached_response(self, cache_key: Optional[str]):
+        """Arquivo falhou: a resposta da 1ª tentativa sai do cache (retomar chama o modelo de novo)."""
+        if self.llm_cache is not None and cache_key:
+            self.llm_cache.delete(cache_key)
+
     def _extract_tag(self, text: str, tag: str) -> str:
         start_tag = f"<{tag}>"
         end_tag = f"</{tag}>"
@@ -248,26 +268,50 @@ Please Analysis the error and FIX the code. Return ONLY the corrected code in <c
             return text.split(start_tag)[1].split(end_tag)[0].strip()
         return ""
 
-    def process_batch(self, file_list: List[Dict], output_dir: str):
+    def process_batch(self, file_list: List[Dict], output_dir: str, prefetch: int = DEFAULT_PREFETCH,
+                      resume: bool = True, run_id: Optional[str] = None):
+        """
+        Migra file_list em ordem, registrando cada arquivo no manifesto de execuções
+        (<output_dir>/runs/enterprise.jsonl). Com resume, arquivos já migrados com o
+        mesmo fonte (e cuja saída existe) são pulados.
+        """
         os.makedirs(output_dir, exist_ok=True)
         results = []
+        manifest = RunManifest(manifest_path_for(output_dir, "enterprise"), run_id=run_id)
+        manifest.start_run({"files": len(file_list), "model": self.model, "target_lang": self.target_lang})
         
-        print(f"[*] Enterprise Pipeline (AST + Qwen + RL Loop). Model: {self.model}")
+        print(f"[*] Enterprise Pipeline (AST + Qwen + RL Loop). Model: {self.model} | run: {manifest.run_id}")
         
-        for file_info in tqdm(file_list):
+        def load_java(file_info):
+            try:
+                with open(file_info['file_path'], 'r', encoding='utf-8') as f:
+                    java_code = f.read()
+            except Exception as e:
+                print(f"⚠️ Read Error {file_info['file_path']}: {e}")
+                return None
+            if resume and manifest.is_complete(file_info['file_path'], source_sha256(java_code)):
+                manifest.skip()
+                return None
+            return java_code
+        
+        # Contexto RLCoder dos próximos `prefetch` arquivos em um único retrieval em lote
+        batches = prefetch_contexts(self.rlcoder, file_list, load_java, window=prefetch)
+        for file_info, java_code, rlcoder_context in tqdm(batches, total=len(file_list)):
             fpath = file_info['file_path']
             fname = os.path.basename(fpath)
+            sha256 = source_sha256(java_code)
+            start = time.time()
             
+            # Executa com RL Loop
             try:
-                with open(fpath, 'r', encoding='utf-8') as f:
-                    java_code = f.read()
+                with track_usage() as usage:
+                    result = self.generate_translation(java_code, fpath, rlcoder_context=rlcoder_context)
             except Exception as e:
-                print(f"⚠️ Read Error {fpath}: {e}")
+                print(f"❌ Error: {fname}: {e}")
+                manifest.record(fpath, "error", sha256, usage=usage, wall_time=time.time() - start,
+                                error=f"{type(e).__name__}: {e}", class_name=file_info.get('class_name'))
                 continue
             
-            # Executa com RL Loop
-            result = self.generate_translation(java_code, fpath)
-            
             if result["success"]:
                 entry = {
                     "source_file": fpath,
@@ -283,15 +327,26 @@ Please Analysis the error and FIX the code. Return ONLY the corrected code in <c
                 }
                 
                 safe_name = fname.replace('.', '_') + ".json"
-                with open(os.path.join(output_dir, safe_name), 'w') as f:
+                output_path = os.path.join(output_dir, safe_name)
+                with open(output_path, 'w') as f:
                     json.dump(entry, f, indent=2)
                 
+                manifest.record(fpath, "done", sha256, output=output_path, attempts=result.get("attempts", 1),
+                                usage=usage, wall_time=time.time() - start, class_name=file_info.get('class_name'))
                 results.append(entry)
-                time.sleep(1)
             else:
                 print(f"❌ Failed (After Retries): {fname}")
+                manifest.record(fpath, "failed", sha256, attempts=result.get("attempts", 1), usage=usage,
+                                wall_time=time.time() - start, error=result.get("error"),
+                                class_name=file_info.get('class_name'))
         
-        print(f"✅ Batch Completed. {len(results)}/{len(file_list)} processed.")
+        summary = manifest.end_run()
+        manifest.close()
+        print(f"✅ Batch Completed. {len(results)}/{len(file_list) - summary['skipped']} processed"
+              f" ({summary['skipped']} already done).")
+        print(f"   Manifesto: {format_summary(summary)}")
+        if self.llm_cache is not None:
+            print(f"   Cache do LLM: {format_stats(self.llm_cache.stats())}")
 
 def load_migration_plan(plan_path: str) -> List[Dict]:
     with open(plan_path, 'r') as f:
@@ -310,6 +365,11 @@ def main():
     parser.add_argument("--limit", type=int, default=5)
     parser.add_argument("--lang", default="Go")
     parser.add_argument("--model", default="qwen/qwen3-coder") # Default Qwen 3
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH) # Contexto RLCoder em lote
+    parser.add_argument("--ast-corpus", default=None) # Corpus AST (ast_parser.py --parse-repo)
+    parser.add_argument("--no-llm-cache", action="store_true") # Sempre chama o LLM (ignora o cache)
+    parser.add_argument("--no-resume", action="store_true") # Refaz arquivos já migrados (ignora o manifesto)
+    parser.add_argument("--run-id", default=None) # Id da execução no manifesto (padrão: data/hora)
     
     args = parser.parse_args()
     
@@ -323,8 +383,11 @@ def main():
     print(f"[*] Processing {len(batch)} files with Qwen + AST + Compiler Loop:")
     for f in batch: print(f"   - {f['class_name']}")
         
-    generator = EnterpriseGenerator(target_lang=args.lang, model=args.model)
-    generator.process_batch(batch, args.output)
+    generator = EnterpriseGenerator(target_lang=args.lang, model=args.model,
+                                    ast_corpus=load_ast_corpus(args.ast_corpus),
+                                    use_llm_cache=not args.no_llm_cache)
+    generator.process_batch(batch, args.output, prefetch=args.prefetch,
+                            resume=not args.no_resume, run_id=args.run_id)
 
 if __name__ == "__main__":
     main()
@@ -6,18 +6,54 @@ import os
 import json
 import time
 from pathlib import Path
-from typing import Dict, Optional
-from openai import OpenAI
+from typing import Callable, Dict, Iterable, List, Optional
 from dotenv import load_dotenv
 
 from ast_parser import EnterpriseJavaParser
-from compiler_service import GoCompiler
+from compiler_service import GoCompiler, BatchingCompiler
 from behavior_validator import BehaviorValidator
 from test_generator import TestGenerator
 from rlcoder_adapter import RLCoderAdapter
+from llm_client import get_llm_client, track_usage
+from llm_cache import open_llm_cache, prompt_key
+from stage_pipeline import DONE, Stage, StagePipeline
 
 load_dotenv()
 
+# Workers por estágio do pipeline de generate_code_many (ast > 1 = pool de processos)
+DEFAULT_STAGE_WORKERS = {
+    "ast": 2,
+    "retrieve": 1,
+    "prompt": 1,
+    "generate": 8,   # requisições ao LLM em voo (limitadas também por LLM_MAX_CONCURRENCY)
+    "compile": 16,   # threads aguardam o lote do BatchingCompiler: um go build por lote
+    "behavior": 4,
+    "tests": 4,
+}
+# generate_code: um arquivo, sem pools extras
+SERIAL_STAGE_WORKERS = {name: 1 for name in DEFAULT_STAGE_WORKERS}
+
+_ast_parser = None
+
+
+def _parse_ast_task(task: Dict):
+    """Estágio "ast" (no processo principal ou no pool; um parser por processo)."""
+    global _ast_parser
+    if _ast_parser is None:
+        _ast_parser = EnterpriseJavaParser()
+    
+    # 1. Parse AST
+    print(f"   [FLOW] 1. JS -> AST: Parsing Java AST for {task['file_path']}...")
+    try:
+        # Fonte já em memória: sem reler o arquivo; reparses do mesmo conteúdo saem do cache
+        task["ast_data"] = _ast_parser.parse_source(task["java_code"], task["file_path"])
+        task["ast_json"] = json.dumps(task["ast_data"], indent=2)
+        print(f"   [FLOW]    -> AST Success ({len(str(task['ast_json']))} bytes)")
+    except Exception as e:
+        task["ast_json"] = f"AST Parse Failed: {e}"
+        task["ast_data"] = {}
+        print(f"   [FLOW]    -> AST Failed: {e}")
+
 
 class HybridMigrationEngine:
     """
@@ -27,16 +63,17 @@ class HybridMigrationEngine:
     - RLCoder: Contexto + Reward
     """
     
-    def __init__(self, target_lang: str = "Go", model: str = "qwen/qwen3-coder", use_hrm_guidance: bool = True):
+    def __init__(self, target_lang: str = "Go", model: str = "qwen/qwen3-coder", use_hrm_guidance: bool = True,
+                 use_llm_cache: bool = True):
         self.target_lang = target_lang
         self.model = model
         self.use_hrm_guidance = use_hrm_guidance
         
         # Engines
         self.parser = EnterpriseJavaParser()
-        self.compiler = GoCompiler()
+        self.compiler = BatchingCompiler(GoCompiler())
         self.validator = BehaviorValidator()
-        self.test_gen = TestGenerator(model=model)
+        self.test_gen = TestGenerator(model=model, use_llm_cache=use_llm_cache)
         self.rlcoder = RLCoderAdapter()
         
         # LLM Client
@@ -44,10 +81,10 @@ class HybridMigrationEngine:
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY not found")
         
-        self.llm_client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key
-        )
+        # Cliente compartilhado do processo (pool, concorrência e retries)
+        self.llm_client = get_llm_client(self.api_key)
+        # Cache de respostas (read-through); use_llm_cache=False sempre chama o modelo
+        self.llm_cache = open_llm_cache(use_llm_cache)
         
         # HRM Model (opcional, se treinado)
         self.hrm_model = None
@@ -118,14 +155,13 @@ Provide guidance in JSON:
 }}
 """
         
-        response = self.llm_client.chat.completions.create(
+        content = self.llm_client.chat(
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.1
+            temperature=0.1,
+            cache=self.llm_cache
         )
         
-        content = response.choices[0].message.content
-        
         # Parse JSON
         try:
             if "```json" in content:
@@ -155,39 +191,131 @@ Provide guidance in JSON:
         
         return "\n\n".join(snippets)
     
-    def generate_code(self, java_code: str, file_path: str, max_retries: int = 3) -> Dict:
+    def generate_code(self, java_code: str, file_path: str, max_retries: int = 3,
+                      rlcoder_context: Optional[Dict] = None) -> Dict:
         """
         Pipeline completo: AST → RLCoder → HRM Guidance → LLM → Validation → Reward
+        
+        rlcoder_context: contexto já buscado em lote (prefetch_contexts); se None,
+        é buscado aqui.
         """
-        # 1. Parse AST
-        print(f"   [FLOW] 1. JS -> AST: Parsing Java AST for {file_path}...")
-        try:
-            ast_data = self.parser.parse_file(file_path)
-            ast_json = json.dumps(ast_data, indent=2)
-            print(f"   [FLOW]    -> AST Success ({len(str(ast_json))} bytes)")
-        except Exception as e:
-            ast_json = f"AST Parse Failed: {e}"
-            ast_data = {}
-            print(f"   [FLOW]    -> AST Failed: {e}")
+        item = {"java_code": java_code, "file_path": file_path, "rlcoder_context": rlcoder_context}
+        with self.build_pipeline(SERIAL_STAGE_WORKERS) as pipeline:
+            return self.generate_code_many([item], max_retries=max_retries, pipeline=pipeline)[0]
+    
+    def generate_code_many(self, items: Iterable[Dict], max_retries: int = 3,
+                           on_result: Optional[Callable[[Dict, Dict], None]] = None,
+                           stop: Optional[Callable[[], bool]] = None,
+                           pipeline: Optional[StagePipeline] = None) -> List[Dict]:
+        """
+        generate_code para vários arquivos independentes (ex.: uma onda do plano), em
+        pipeline: enquanto um arquivo compila, o próximo está no LLM e o seguinte no
+        retrieval.
         
-        # 2. RLCoder Context
-        print(f"   [FLOW] 2. JS -> RLC: Retrieving RLCoder Context...")
-        rlcoder_context = self.rlcoder.retrieve_context(java_code, top_k=3)
-        print(f"   [FLOW]    -> RLC Success (Found {len(rlcoder_context.get('relevant_code', []))} snippets)")
+        Args:
+            items: Dicts com java_code, file_path e, opcional, rlcoder_context; demais
+                   chaves (ex.: class_name) são repassadas a on_result
+            on_result: (item, resultado) assim que cada arquivo termina
+            stop: () -> bool; se verdadeiro, nenhum arquivo novo entra no pipeline
+            pipeline: build_pipeline() reaproveitado (acumula a vazão por estágio e
+                      mantém os pools de processos; quem o criou chama close())
+            
+        Returns:
+            Resultados (como generate_code, com "usage" e "wall_time"), na ordem de items;
+            "exception": True quando um estágio levantou exceção
+        """
+        self._require_hrm()
+        if pipeline is None:
+            with self.build_pipeline() as pipeline:
+                return self.generate_code_many(items, max_retries, on_result, stop, pipeline)
         
+        def tasks():
+            for item in items:
+                yield {**item, "max_retries": max_retries, "attempt": 0, "started": time.time(),
+                       "usage": {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0, "cache_hits": 0}}
         
-        # 3. HRM Guidance (OBRIGATÓRIO - modelo deve estar treinado)
+        def finish(task):
+            task["result"] = self._task_result(task)
+            if not task["result"]["success"]:
+                self._discard_cached_response(task)
+            if on_result is not None:
+                on_result(task, task["result"])
+        
+        return [task["result"] for task in pipeline.run(tasks(), on_result=finish, stop=stop)]
+    
+    def build_pipeline(self, workers: Optional[Dict[str, int]] = None) -> StagePipeline:
+        """
+        Estágios de generate_code com `workers` por estágio (padrão DEFAULT_STAGE_WORKERS):
+        AST em processos, LLM em asyncio, compilação/validação/testes em threads.
+        """
+        workers = {**DEFAULT_STAGE_WORKERS, **(workers or {})}
+        if not self.validator.use_docker:
+            # Execução local usa arquivos fixos no sandbox: uma validação por vez
+            workers["behavior"] = 1
+        return StagePipeline([
+            Stage("ast", _parse_ast_task, "process" if workers["ast"] > 1 else "thread", workers["ast"]),
+            Stage("retrieve", self._stage_retrieve, "thread", workers["retrieve"]),
+            Stage("prompt", self._stage_prompt, "thread", workers["prompt"]),
+            Stage("generate", self._stage_generate, "async", workers["generate"]),
+            Stage("compile", self._stage_compile, "thread", workers["compile"]),
+            Stage("behavior", self._stage_behavior, "thread", workers["behavior"]),
+            Stage("tests", self._stage_tests, "thread", workers["tests"]),
+        ])
+    
+    def _require_hrm(self):
+        # HRM Guidance (OBRIGATÓRIO - modelo deve estar treinado)
         if not self.hrm_model or self.hrm_model["mode"] != "trained":
             raise RuntimeError(
                 "HRM model not loaded! Cannot generate guidance.\n"
                 "Train HRM first: python pretrain.py --config config/hrm_guidance_l2j.yaml"
             )
-        
+    
+    @staticmethod
+    def _task_result(task: Dict) -> Dict:
+        if task.get("result") is not None:
+            result = dict(task["result"])
+        else:
+            print(f"❌ Error: {task.get('error')}")
+            # Exceção em um estágio (task["error"]), não uma falha de validação
+            result = {"success": False, "error": task.get("error", "Unknown error"), "exception": True}
+        result["usage"] = task["usage"]
+        result["wall_time"] = time.time() - task["started"]
+        return result
+    
+    @staticmethod
+    def _add_usage(task: Dict, usage: Dict):
+        for key, value in usage.items():
+            task["usage"][key] += value
+    
+    def _discard_cached_response(self, task: Dict):
+        """Arquivo falhou: a resposta da 1ª tentativa sai do cache (retomar chama o modelo de novo)."""
+        if self.llm_cache is not None and task.get("cache_key"):
+            self.llm_cache.delete(task["cache_key"])
+    
+    def _retry(self, task: Dict) -> str:
+        """Próxima tentativa (de volta ao LLM) ou fim com falha."""
+        task["attempt"] += 1
+        if task["attempt"] > task["max_retries"]:
+            task["result"] = {"success": False, "error": "Max retries exceeded"}
+            return DONE
+        return "generate"
+    
+    def _stage_retrieve(self, task: Dict):
+        # 2. RLCoder Context
+        if task.get("rlcoder_context") is None:
+            print(f"   [FLOW] 2. JS -> RLC: Retrieving RLCoder Context...")
+            task["rlcoder_context"] = self.rlcoder.retrieve_context(task["java_code"], top_k=3)
+        else:
+            print(f"   [FLOW] 2. JS -> RLC: Using prefetched RLCoder Context...")
+        print(f"   [FLOW]    -> RLC Success (Found {len(task['rlcoder_context'].get('relevant_code', []))} snippets)")
+    
+    def _stage_prompt(self, task: Dict):
+        # 3. HRM Guidance
         # TODO: Usar modelo HRM real quando implementado
         # guidance = self.hrm_model["model"].predict(java_code, ast_data, rlcoder_context)
         
         # Temporário: placeholder até modelo real estar implementado
-        guidance = {
+        task["guidance"] = {
             "migration_strategy": "Port to Go using HRM-guided approach",
             "critical_concerns": ["concurrency", "memory-management"],
             "recommended_patterns": ["struct-based", "interface-driven"]
@@ -196,84 +324,91 @@ Provide guidance in JSON:
         
         # 4. Build Guided Prompt
         print(f"   [FLOW] 4. HLG+RLC -> LLM: Preparing Prompt...")
-        prompt = self._build_guided_prompt(java_code, ast_json, rlcoder_context, guidance)
-        
-        messages = [
+        prompt = self._build_guided_prompt(task["java_code"], task["ast_json"], task["rlcoder_context"],
+                                           task["guidance"])
+        task["messages"] = [
             {"role": "system", "content": self._get_system_prompt()},
             {"role": "user", "content": prompt}
         ]
+    
+    async def _stage_generate(self, task: Dict):
+        # 5. RL Loop: LLM Generation
+        attempt = task["attempt"]
+        if attempt > 0:
+            print(f"   🔄 Retry {attempt}/{task['max_retries']}")
+        print(f"   [FLOW] 5. LLM -> GO: Generating code (Attempt {attempt+1})...")
+        params = {"temperature": 0.1 if attempt == 0 else 0.2}
+        # Só a 1ª tentativa usa o cache: um retry pode repetir o prompt (ex.: resposta sem
+        # <code>) e receberia de novo a mesma resposta inútil
+        cache = self.llm_cache if attempt == 0 else None
+        if cache is not None:
+            task["cache_key"] = prompt_key(self.model, task["messages"], params)
+        with track_usage() as usage:
+            content = await self.llm_client.achat(
+                model=self.model,
+                messages=task["messages"],
+                cache=cache,
+                **params
+            )
+        self._add_usage(task, usage)
+        code = self._extract_code(content)
+        if not code:
+            return self._retry(task)
+        task["content"] = content
+        task["code"] = code
+    
+    def _stage_compile(self, task: Dict):
+        # 6. Validate (Syntax)
+        print(f"   [FLOW] 6. GO -> COMP: Compiling...")
+        validation = self.compiler.validate_code(task["code"])
+        if not validation["success"]:
+            # Feedback de compilação
+            error_msg = validation.get("stderr", "Unknown error")
+            task["messages"].append({"role": "assistant", "content": task["content"]})
+            task["messages"].append({"role": "user", "content": f"COMPILER ERROR:\n{error_msg}\n\nFix the code."})
+            return self._retry(task)
+    
+    def _stage_behavior(self, task: Dict):
+        # 7. Validate (Behavior)
+        print(f"   [FLOW] 7. COMP -> BV: Validating behavior...")
+        behavior_result = self.validator.validate_behavior(task["java_code"], task["code"])
         
-        # 5. RL Loop
-        for attempt in range(max_retries + 1):
-            if attempt > 0:
-                print(f"   🔄 Retry {attempt}/{max_retries}")
-            
-            try:
-                # LLM Generation
-                print(f"   [FLOW] 5. LLM -> GO: Generating code (Attempt {attempt+1})...")
-                response = self.llm_client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.1 if attempt == 0 else 0.2
-                )
-                
-                content = response.choices[0].message.content
-                code = self._extract_code(content)
-                
-                if not code:
-                    continue
-                
-                # 6. Validate (Syntax)
-                print(f"   [FLOW] 6. GO -> COMP: Compiling...")
-                validation = self.compiler.validate_code(code)
-                
-                if not validation["success"]:
-                    # Feedback de compilação
-                    error_msg = validation.get("stderr", "Unknown error")
-                    messages.append({"role": "assistant", "content": content})
-                    messages.append({"role": "user", "content": f"COMPILER ERROR:\n{error_msg}\n\nFix the code."})
-                    continue
-                
-                # 7. Validate (Behavior)
-                print(f"   [FLOW] 7. COMP -> BV: Validating behavior...")
-                behavior_result = self.validator.validate_behavior(java_code, code)
-                
-                # 8. Calculate Reward
-                print(f"   [FLOW] 8. BV -> RP: Calculating Reward/Penalty...")
-                reward = self._calculate_reward(code, guidance, rlcoder_context, behavior_result)
-                print(f"   [FLOW]    -> Score: {reward['total']}/20")
-                
-                if reward["total"] >= 8:  # Threshold de qualidade
-                    print(f"   🎯 Success! Reward: {reward['total']:.1f}/20")
-                    
-                    # 9. Generate Tests
-                    try:
-                        test_code = self.test_gen.generate_test(code, java_code, file_path)
-                    except:
-                        test_code = ""
-                    
-                    return {
-                        "success": True,
-                        "code": code,
-                        "test_code": test_code,
-                        "guidance": guidance,
-                        "reward": reward,
-                        "attempts": attempt + 1
-                    }
-                else:
-                    # Reward baixo - feedback
-                    print(f"   [FLOW] 9. RP -> FB: Generating Feedback loop...")
-                    feedback = self._generate_feedback(reward, guidance, behavior_result)
-                    messages.append({"role": "assistant", "content": content})
-                    messages.append({"role": "user", "content": feedback})
-                    print(f"   [FLOW]    -> Retrying with feedback...")
-                    continue
-                    
-            except Exception as e:
-                print(f"❌ Error: {e}")
-                return {"success": False, "error": str(e)}
+        # 8. Calculate Reward
+        print(f"   [FLOW] 8. BV -> RP: Calculating Reward/Penalty...")
+        reward = self._calculate_reward(task["code"], task["guidance"], task["rlcoder_context"], behavior_result)
+        print(f"   [FLOW]    -> Score: {reward['total']}/20")
+        
+        if reward["total"] >= 8:  # Threshold de qualidade
+            print(f"   🎯 Success! Reward: {reward['total']:.1f}/20")
+            task["reward"] = reward
+            return None
         
-        return {"success": False, "error": "Max retries exceeded"}
+        # Reward baixo - feedback
+        print(f"   [FLOW] 9. RP -> FB: Generating Feedback loop...")
+        feedback = self._generate_feedback(reward, task["guidance"], behavior_result)
+        task["messages"].append({"role": "assistant", "content": task["content"]})
+        task["messages"].append({"role": "user", "content": feedback})
+        print(f"   [FLOW]    -> Retrying with feedback...")
+        return self._retry(task)
+    
+    def _stage_tests(self, task: Dict):
+        # 9. Generate Tests
+        try:
+            with track_usage() as usage:
+                test_code = self.test_gen.generate_test(task["code"], task["java_code"], task["file_path"])
+            self._add_usage(task, usage)
+        except:
+            test_code = ""
+        
+        task["result"] = {
+            "success": True,
+            "code": task["code"],
+            "test_code": test_code,
+            "guidance": task["guidance"],
+            "reward": task["reward"],
+            "attempts": task["attempt"] + 1
+        }
+        return DONE
     
     def _build_guided_prompt(self, java_code, ast_json, rlcoder_context, guidance):
         """Build prompt com guidance do HRM."""
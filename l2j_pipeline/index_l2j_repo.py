@@ -4,16 +4,66 @@ Cria um índice do repositório L2J para retrieval inteligente durante transcri
 """
 import os
 import json
+import hashlib
 import argparse
 from pathlib import Path
-from typing import List, Dict
+import bisect
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 import numpy as np
 
+try:
+    from index_store import (
+        load_manifest, save_manifest, load_index_files, load_index_metadata,
+        write_content_and_table, write_index_metadata, open_content_store,
+        content_store_path_for, ContentStoreWriter
+    )
+    from keyword_index import build_keyword_index, keyword_index_path_for
+except ImportError:
+    from l2j_pipeline.index_store import (
+        load_manifest, save_manifest, load_index_files, load_index_metadata,
+        write_content_and_table, write_index_metadata, open_content_store,
+        content_store_path_for, ContentStoreWriter
+    )
+    from l2j_pipeline.keyword_index import build_keyword_index, keyword_index_path_for
+
+# Chunks por método/classe via tree-sitter (sem ele: um chunk por arquivo)
+try:
+    try:
+        from ast_parser import EnterpriseJavaParser
+        from ast_corpus import load_ast_corpus
+    except ImportError:
+        from l2j_pipeline.ast_parser import EnterpriseJavaParser
+        from l2j_pipeline.ast_corpus import load_ast_corpus
+    HAS_AST = True
+except ImportError:
+    HAS_AST = False
+
 # Try importing semantic search libs
 try:
     from sentence_transformers import SentenceTransformer
     import faiss
+    try:
+        from ann_index import (
+            DEFAULT_TARGET_RECALL, TUNE_QUERIES, TUNE_K, build_ann_index,
+            create_ann_index, train_ann_index, training_sample_size, min_training_vectors,
+            tune_search_params, tune_search_params_with_truth, StreamingExactNeighbours,
+            apply_search_params, resolve_index_type, search_param_name,
+            supports_incremental, supports_removal, describe_index
+        )
+        from embedding_cache import EmbeddingCache, get_embedding_cache, cached_encode, format_stats
+    except ImportError:
+        from l2j_pipeline.ann_index import (
+            DEFAULT_TARGET_RECALL, TUNE_QUERIES, TUNE_K, build_ann_index,
+            create_ann_index, train_ann_index, training_sample_size, min_training_vectors,
+            tune_search_params, tune_search_params_with_truth, StreamingExactNeighbours,
+            apply_search_params, resolve_index_type, search_param_name,
+            supports_incremental, supports_removal, describe_index
+        )
+        from l2j_pipeline.embedding_cache import EmbeddingCache, get_embedding_cache, cached_encode, format_stats
     HAS_SEMANTIC = True
 except ImportError:
     HAS_SEMANTIC = False
@@ -21,12 +71,135 @@ except ImportError:
 
 
 
-def scan_java_files(repo_path: str) -> List[Dict]:
+DEFAULT_SCAN_CHUNK_SIZE = 256
+# Manifesto v2: entradas com chunks (ids FAISS por chunk)
+MANIFEST_VERSION = 2
+# Caracteres de cada chunk usados no embedding
+EMBED_MAX_CHARS = 1024
+# Encoder dos chunks (o mesmo DEFAULT_ENCODER do retrieval)
+EMBED_MODEL = 'all-MiniLM-L6-v2'
+# Modo streaming: chunks por lote de embeddings/add no FAISS
+DEFAULT_EMBED_BATCH = 1024
+# Modo streaming: teto da amostra de treino do IVF (~300 MB com 384 dimensões)
+MAX_STREAM_TRAIN_VECTORS = 200_000
+
+_chunk_parser = None
+
+
+def default_scan_workers() -> int:
+    """Número padrão de processos do scanner (1 = serial)."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def list_java_files(repo_path: str) -> List[str]:
+    """Lista os arquivos Java do repositório (paths relativos, ordem do rglob)."""
+    repo = Path(repo_path)
+    return [str(p.relative_to(repo)) for p in repo.rglob("*.java")]
+
+
+def _scan_batch(job: Tuple[str, List[str], Dict]) -> List[Dict]:
+    """
+    Worker do scanner: lê e extrai um lote de arquivos.
+    
+    Roda tanto no processo principal (modo serial) quanto em um processo do pool,
+    por isso recebe/retorna apenas tipos serializáveis. O terceiro item do job são
+    os chunks do corpus AST dos paths do lote ({path: (sha256, chunks)}).
+    """
+    repo_path, rel_paths, ast_chunks = job
+    records = []
+    for rel_path in rel_paths:
+        try:
+            with open(os.path.join(repo_path, rel_path), 'rb') as f:
+                data = f.read()
+            digest = file_digest(data)
+            content = decode_source(data)
+            chunks = None
+            hint = ast_chunks.get(rel_path)
+            # Spans do corpus são sobre os bytes brutos: só valem se a decodificação não os alterou
+            if hint and hint[0] == digest and content.encode('utf-8') == data:
+                chunks = hint[1]
+            records.append({
+                "path": rel_path,
+                "sha256": digest,
+                "entry": build_file_entry(rel_path, content, chunks)
+            })
+        except Exception as e:
+            records.append({"path": rel_path, "error": str(e)})
+    return records
+
+
+def scan_paths(repo_path: str, rel_paths: List[str], workers: int = 1,
+               chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE,
+               ast_chunks: Optional[Dict] = None) -> List[Dict]:
+    """
+    Lê e extrai metadados de uma lista de arquivos, em lotes.
+    
+    Args:
+        repo_path: Raiz do repositório
+        rel_paths: Paths relativos a processar
+        workers: Processos do pool (<= 1 executa em série no processo atual)
+        chunk_size: Arquivos por lote enviado a cada worker
+        ast_chunks: AstCorpus.chunk_hints(); arquivos com mesmo sha256 usam os chunks
+            do corpus em vez de reparsear
+        
+    Returns:
+        Registros na mesma ordem de rel_paths ({path, sha256, entry} ou {path, error})
+    """
+    records = []
+    for batch in iter_scan_paths(repo_path, rel_paths, workers, chunk_size, ast_chunks):
+        records.extend(batch)
+    return records
+
+
+def iter_scan_paths(repo_path: str, rel_paths: List[str], workers: int = 1,
+                    chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE,
+                    ast_chunks: Optional[Dict] = None) -> Iterator[List[Dict]]:
+    """
+    Versão geradora de scan_paths: produz um lote de registros por vez, em ordem.
+    
+    No pool, no máximo `2 * workers` lotes ficam em voo: o conteúdo lido nunca
+    passa de alguns lotes em memória, independente do tamanho do repositório.
+    """
+    chunk_size = max(1, chunk_size)
+    ast_chunks = ast_chunks or {}
+    # Cada job leva só os chunks do corpus dos seus paths
+    jobs = (
+        (repo_path, batch, {p: ast_chunks[p] for p in batch if p in ast_chunks})
+        for batch in (rel_paths[i:i + chunk_size] for i in range(0, len(rel_paths), chunk_size))
+    )
+    
+    with tqdm(total=len(rel_paths), desc="Processando") as progress:
+        if workers <= 1 or len(rel_paths) <= chunk_size:
+            for batch in map(_scan_batch, jobs):
+                progress.update(len(batch))
+                yield batch
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Fila FIFO de futures preserva a ordem dos lotes -> resultado idêntico ao serial
+                pending = deque()
+                for job in jobs:
+                    pending.append(executor.submit(_scan_batch, job))
+                    if len(pending) >= 2 * workers:
+                        batch = pending.popleft().result()
+                        progress.update(len(batch))
+                        yield batch
+                while pending:
+                    batch = pending.popleft().result()
+                    progress.update(len(batch))
+                    yield batch
+
+
+def scan_java_files(repo_path: str, workers: int = 1,
+                    chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE,
+                    ast_chunks: Optional[Dict] = None) -> List[Dict]:
     """
     Escaneia todos os arquivos Java no repositório.
     
     Args:
         repo_path: Caminho para o repositório L2J
+        workers: Processos do pool (1 = serial)
+        chunk_size: Arquivos por lote
+        ast_chunks: Chunks prontos do corpus AST (AstCorpus.chunk_hints())
         
     Returns:
         Lista de dicts com informações dos arquivos
@@ -34,26 +207,234 @@ def scan_java_files(repo_path: str) -> List[Dict]:
     print(f"[*] Escaneando arquivos Java em: {repo_path}")
     java_files = []
     
-    repo = Path(repo_path)
-    for java_file in tqdm(list(repo.rglob("*.java")), desc="Processando"):
-        try:
-            with open(java_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            java_files.append({
-                "path": str(java_file.relative_to(repo)),
-                "content": content,
-                "size": len(content),
-                "lines": content.count('\n'),
-                "package": extract_package(content),
-                "classes": extract_classes(content)
-            })
-        except Exception as e:
-            print(f"⚠️  Erro ao processar {java_file}: {e}")
+    for record in scan_paths(repo_path, list_java_files(repo_path), workers, chunk_size, ast_chunks):
+        if "error" in record:
+            print(f"⚠️  Erro ao processar {os.path.join(repo_path, record['path'])}: {record['error']}")
+        else:
+            java_files.append(record["entry"])
     
     return java_files
 
 
+def extract_file_metadata(content: str) -> Tuple[str, List[str], int]:
+    """
+    Extrai pacote, classes e número de linhas em uma única passada.
+    
+    Equivalente a extract_package + extract_classes + content.count('\\n').
+    """
+    package = None
+    classes = []
+    lines = content.split('\n')
+    for line in lines:
+        line = line.strip()
+        if package is None and line.startswith('package '):
+            package = line.replace('package ', '').replace(';', '').strip()
+        if 'class ' in line and not line.startswith('//'):
+            # Simplified extraction
+            parts = line.split('class ')
+            if len(parts) > 1:
+                class_name = parts[1].split()[0].split('{')[0].split('<')[0]
+                classes.append(class_name)
+    return package if package is not None else "default", classes, len(lines) - 1
+
+
+def extract_chunks(content: str, classes: List[str]) -> List[Dict]:
+    """
+    Divide o arquivo em chunks (cabeçalho de tipo, métodos e construtores).
+    
+    Spans em bytes são relativos ao conteúdo UTF-8 gravado no blob. Sem
+    tree-sitter (ou sem declarações reconhecidas) o arquivo inteiro vira um chunk.
+    """
+    global _chunk_parser
+    data = content.encode('utf-8')
+    chunks = []
+    if HAS_AST:
+        # Um parser por processo (workers do pool incluídos)
+        try:
+            if _chunk_parser is None:
+                _chunk_parser = EnterpriseJavaParser()
+            chunks = _chunk_parser.extract_chunks(data)
+        except Exception:
+            chunks = []
+    if not chunks:
+        chunks = [{
+            "kind": "file",
+            "name": classes[0] if classes else "",
+            "start_byte": 0,
+            "end_byte": len(data),
+            "start_line": 1,
+            "end_line": max(1, len(content.splitlines()))
+        }]
+    return chunks
+
+
+def build_file_entry(rel_path: str, content: str, chunks: Optional[List[Dict]] = None) -> Dict:
+    """Monta a entrada do índice para um arquivo já lido (chunks: prontos, do corpus AST)."""
+    package, classes, line_count = extract_file_metadata(content)
+    return {
+        "path": rel_path,
+        "content": content,
+        "size": len(content),
+        "lines": line_count,
+        "package": package,
+        "classes": classes,
+        "chunks": [dict(chunk) for chunk in chunks] if chunks else extract_chunks(content, classes)
+    }
+
+
+def decode_source(data: bytes) -> str:
+    """Decodifica bytes como o modo texto do open() (utf-8, newlines universais)."""
+    text = data.decode('utf-8', errors='ignore')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def file_digest(data: bytes) -> str:
+    """Hash de conteúdo usado pelo manifesto incremental."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _manifest_entry(old: Dict, update: Dict = None) -> Dict:
+    """Copia os campos de identidade de uma entrada do manifesto anterior."""
+    entry = {k: old[k] for k in ("mtime", "size", "sha256", "vector_id")}
+    if update:
+        entry.update(update)
+        entry["vector_id"] = old["vector_id"]
+    return entry
+
+
+def _assign_chunk_ids(file_info: Dict, manifest: Dict):
+    """Atribui ids FAISS novos aos chunks de um arquivo adicionado/alterado."""
+    for chunk in file_info["chunks"]:
+        chunk["id"] = manifest["next_chunk_id"]
+        manifest["next_chunk_id"] += 1
+
+
+def scan_java_files_incremental(repo_path: str, output_path: str, reuse: bool = True,
+                                workers: int = 1,
+                                chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE,
+                                ast_chunks: Optional[Dict] = None) -> Tuple[List[Dict], Dict, Dict]:
+    """
+    Escaneia o repositório reaproveitando o índice anterior.
+    
+    Arquivos com mesmo mtime/tamanho (ou mesmo hash de conteúdo) são
+    reaproveitados do índice salvo; apenas adicionados, alterados e
+    removidos são reprocessados (em lotes, opcionalmente em paralelo).
+    
+    Args:
+        repo_path: Caminho para o repositório L2J
+        output_path: Caminho do índice JSON existente
+        reuse: Se False, ignora o estado anterior (indexação completa)
+        workers: Processos do pool para os arquivos a reler (1 = serial)
+        chunk_size: Arquivos por lote
+        ast_chunks: Chunks prontos do corpus AST (AstCorpus.chunk_hints())
+        
+    Returns:
+        (java_files, manifest, changes) onde changes lista os paths
+        "added", "changed", "deleted", os ids FAISS obsoletos em
+        "stale_chunk_ids", o contador "reused" e "rebuild" quando não
+        há estado anterior utilizável
+    """
+    print(f"[*] Escaneando arquivos Java em: {repo_path}")
+    old_manifest = load_manifest(output_path) if reuse else {}
+    old_entries = old_manifest.get("files", {})
+    
+    previous_files = {}
+    if old_entries:
+        try:
+            previous_files = {fi["path"]: fi for fi in load_index_files(output_path)}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Índice anterior ilegível ({e}). Fazendo indexação completa.")
+    
+    # Sem índice anterior utilizável (ou manifesto v1, sem chunks), nenhum arquivo pode ser reaproveitado
+    if not previous_files or old_manifest.get("version", 1) < MANIFEST_VERSION:
+        old_entries = {}
+    
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "next_vector_id": old_manifest.get("next_vector_id", 0) if old_entries else 0,
+        "next_chunk_id": old_manifest.get("next_chunk_id", 0) if old_entries else 0,
+        "files": {}
+    }
+    changes = {"added": [], "changed": [], "deleted": [], "reused": 0, "rebuild": not old_entries}
+    
+    # 1. stat() de todos os arquivos; mtime e tamanho inalterados -> reaproveita sem ler
+    all_paths = list_java_files(repo_path)
+    stats = {}
+    to_read = []
+    for rel_path in all_paths:
+        try:
+            stat = os.stat(os.path.join(repo_path, rel_path))
+        except OSError as e:
+            print(f"⚠️  Erro ao processar {os.path.join(repo_path, rel_path)}: {e}")
+            continue
+        stats[rel_path] = stat
+        old = old_entries.get(rel_path)
+        if not (old and rel_path in previous_files
+                and old["mtime"] == stat.st_mtime_ns and old["size"] == stat.st_size):
+            to_read.append(rel_path)
+    
+    # 2. Ler e extrair apenas os candidatos (lotes, pool de processos)
+    scanned = {record["path"]: record for record in scan_paths(repo_path, to_read, workers, chunk_size, ast_chunks)}
+    
+    # 3. Montar resultado na ordem original
+    java_files = []
+    for rel_path in all_paths:
+        if rel_path not in stats:
+            continue
+        stat = stats[rel_path]
+        old = old_entries.get(rel_path)
+        previous = previous_files.get(rel_path)
+        record = scanned.get(rel_path)
+        
+        if record is None:
+            # Caminho rápido: mtime e tamanho inalterados
+            manifest["files"][rel_path] = _manifest_entry(old)
+            java_files.append(previous)
+            changes["reused"] += 1
+            continue
+        
+        if "error" in record:
+            print(f"⚠️  Erro ao processar {os.path.join(repo_path, rel_path)}: {record['error']}")
+            continue
+        
+        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "sha256": record["sha256"]}
+        if old and previous is not None and old["sha256"] == record["sha256"]:
+            # Apenas "touch": conteúdo idêntico
+            entry = _manifest_entry(old, entry)
+            manifest["files"][rel_path] = entry
+            java_files.append(previous)
+            changes["reused"] += 1
+            continue
+        
+        if old and previous is not None:
+            entry["vector_id"] = old["vector_id"]
+            changes["changed"].append(rel_path)
+        else:
+            entry["vector_id"] = manifest["next_vector_id"]
+            manifest["next_vector_id"] += 1
+            changes["added"].append(rel_path)
+        
+        manifest["files"][rel_path] = entry
+        _assign_chunk_ids(record["entry"], manifest)
+        java_files.append(record["entry"])
+    
+    changes["deleted"] = [
+        path for path in old_entries if path not in manifest["files"]
+    ]
+    changes["deleted_vector_ids"] = [old_entries[p]["vector_id"] for p in changes["deleted"]]
+    # Chunks de arquivos alterados/removidos saem do FAISS (alterados recebem ids novos)
+    changes["stale_chunk_ids"] = [
+        chunk["id"]
+        for path in changes["changed"] + changes["deleted"]
+        for chunk in old_entries[path].get("chunks", [])
+    ]
+    
+    for file_info in java_files:
+        file_info["vector_id"] = manifest["files"][file_info["path"]]["vector_id"]
+    
+    return java_files, manifest, changes
+
+
 def extract_package(content: str) -> str:
     """Extrai o nome do pacote do código Java."""
     for line in content.split('\n'):
@@ -103,66 +484,634 @@ def build_simple_index(java_files: List[Dict]) -> Dict:
                 index["class_map"][class_name] = []
             index["class_map"][class_name].append(file_info["path"])
     
+    index["metadata"]["classes"] = len(index["class_map"])
+    index["metadata"]["total_chunks"] = sum(len(f.get("chunks", [])) for f in java_files)
     return index
 
 
-def build_semantic_index(java_files: List[Dict], output_path: str):
-    """Gera embeddings e cria índice FAISS."""
+def chunk_text(file_info: Dict, chunk: Dict, data: bytes = None) -> str:
+    """Texto de um chunk (nome qualificado + trecho do código) usado no embedding."""
+    if data is None:
+        data = file_info["content"].encode('utf-8')
+    return chunk_doc(chunk, data[chunk["start_byte"]:chunk["end_byte"]])
+
+
+def chunk_doc(chunk: Dict, code: bytes) -> str:
+    """Texto de embedding de um chunk a partir dos seus bytes."""
+    code = code.decode('utf-8', errors='ignore')
+    return f"{chunk['name']}\n{code}"[:EMBED_MAX_CHARS]
+
+
+def _encode_docs(model, docs: List[str], embedding_cache: "EmbeddingCache" = None,
+                 show_progress_bar: bool = True):
+    """Embeddings float32 normalizados (cosseno), passando pelo cache quando houver."""
+    if embedding_cache is not None:
+        embeddings = cached_encode(model, EMBED_MODEL, docs, embedding_cache,
+                                   show_progress_bar=show_progress_bar, batch_size=32)
+    else:
+        embeddings = model.encode(docs, show_progress_bar=show_progress_bar, batch_size=32)
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32').reshape(len(docs), -1)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def _encode_chunks(java_files: List[Dict], embedding_cache: "EmbeddingCache" = None):
+    """
+    Gera embeddings normalizados (cosseno) para os chunks dos arquivos.
+    
+    Chunks cujo texto já está no cache de embeddings não passam pelo encoder
+    (o modelo só é carregado se algum chunk faltar).
+    
+    Returns:
+        (embeddings, ids) com um vetor por chunk e o id FAISS de cada chunk
+    """
+    # Modelo leve e rápido
+    model = _LazyEncoder(EMBED_MODEL)
+    
+    # Um documento por método/construtor/cabeçalho de tipo
+    docs = []
+    ids = []
+    for file_info in java_files:
+        data = file_info["content"].encode('utf-8')
+        for chunk in file_info["chunks"]:
+            docs.append(chunk_text(file_info, chunk, data))
+            ids.append(chunk["id"])
+    
+    # Gerar embeddings (apenas os ausentes do cache), normalizados para cosseno
+    embeddings = _encode_docs(model, docs, embedding_cache)
+    if embedding_cache is not None:
+        print(f"   • Cache de embeddings: {format_stats(embedding_cache.stats())}")
+    return embeddings, np.array(ids, dtype='int64')
+
+
+class _LazyEncoder:
+    """SentenceTransformer carregado apenas no primeiro encode() (cache 100% quente não o carrega)."""
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+    
+    def encode(self, *args, **kwargs):
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_name)
+        return self._model.encode(*args, **kwargs)
+
+
+def build_semantic_index(java_files: List[Dict], output_path: str, index_type: str = "auto",
+                         params: Dict = None, target_recall: float = None,
+                         embedding_cache: "EmbeddingCache" = None) -> Dict:
+    """
+    Gera embeddings por chunk e cria índice FAISS.
+    
+    Args:
+        java_files: Arquivos com chunks
+        output_path: Caminho do índice JSON (o FAISS vai para `.faiss`)
+        index_type: "auto", "flat", "ivf_flat", "hnsw" ou "ivf_pq" (ver ann_index)
+        params: Parâmetros explícitos (nlist, nprobe, M, efSearch, pq_m); nprobe/efSearch
+                informados desligam o ajuste automático
+        target_recall: Recall@10 alvo do ajuste de nprobe/efSearch
+        embedding_cache: Cache de embeddings (None = sempre codificar)
+        
+    Returns:
+        Descrição do índice para os metadados ("semantic_index")
+    """
     if not HAS_SEMANTIC:
-        return
+        return None
         
     print("\n[*] Gerando embeddings para busca semântica (pode demorar)...")
     
-    # Modelo leve e rápido
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    embeddings, ids = _encode_chunks(java_files, embedding_cache)
+    print(f"   • Chunks: {len(ids)} ({len(java_files)} arquivos)")
     
-    # Preparar textos (Class + Methods signatures seria ideal, vamos usar os primeiros 512 tokens)
-    docs = [f['content'][:1024] for f in java_files]
+    # Produto interno = cosseno após normalização. Flat/HNSW ficam num IDMap2 e o IVF
+    # guarda os ids nas listas: todos aceitam add_with_ids na indexação incremental
+    params = params or {}
+    requested = resolve_index_type(index_type, len(ids))
+    index, index_type, built_params = build_ann_index(embeddings, ids, requested, params)
+    print(f"   • Tipo: {index_type} {built_params or ''}")
+    if search_param_name(index_type) not in params:
+        built_params = tune_search_params(
+            index, index_type, built_params, embeddings, ids,
+            target_recall=target_recall or DEFAULT_TARGET_RECALL
+        )
     
-    # Gerar embeddings
-    embeddings = model.encode(docs, show_progress_bar=True, batch_size=32)
+    # Salvar índice FAISS separado
+    faiss_path = _write_pending_faiss(index, output_path)
+    print(f"✅ Índice Semântico FAISS salvo: {faiss_path} (publicado por finalize_index)")
+    return describe_index(index, index_type, built_params, requested)
+
+
+def update_semantic_index(java_files: List[Dict], changes: Dict, output_path: str,
+                          index_type: str = "auto", params: Dict = None,
+                          target_recall: float = None,
+                          embedding_cache: "EmbeddingCache" = None) -> Dict:
+    """
+    Atualiza o índice FAISS existente apenas para os arquivos alterados.
     
-    # Normalizar para cosseno
-    faiss.normalize_L2(embeddings)
+    Vetores dos chunks de arquivos removidos/alterados são apagados pelo id e os
+    chunks novos entram com ids novos. Reconstrói por completo se não houver índice
+    compatível em disco, se o tipo/parâmetros pedidos mudaram ou se há remoções
+    num índice HNSW (sem remove_ids).
     
-    # Criar índice FAISS (Flat IP = Inner Product = Cosine Similarity após normalização)
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings)
+    Returns:
+        Descrição do índice para os metadados ("semantic_index")
+    """
+    if not HAS_SEMANTIC:
+        return None
     
-    # Salvar índice FAISS separado
+    total_chunks = sum(len(f["chunks"]) for f in java_files)
+    stale_ids = changes.get("stale_chunk_ids", [])
+    index, previous = _open_index_for_update(changes, output_path, index_type, params, total_chunks)
+    
+    if index is None:
+        return build_semantic_index(java_files, output_path, index_type, params, target_recall,
+                                    embedding_cache)
+    
+    touched = set(changes["added"]) | set(changes["changed"])
+    
+    if not touched and not stale_ids:
+        print("[*] Índice semântico já está atualizado.")
+        return describe_index(index, previous["type"], previous["params"], previous.get("requested"))
+    
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype='int64'))
+    
+    to_encode = [f for f in java_files if f["path"] in touched]
+    if to_encode:
+        print(f"\n[*] Gerando embeddings para {len(to_encode)} arquivo(s) alterado(s)...")
+        embeddings, ids = _encode_chunks(to_encode, embedding_cache)
+        # IVF: novos vetores usam os centróides já treinados
+        index.add_with_ids(embeddings, ids)
+    
+    apply_search_params(index, previous["params"])
+    faiss_path = _write_pending_faiss(index, output_path)
+    print(f"✅ Índice Semântico FAISS atualizado: {faiss_path} (publicado por finalize_index)")
+    return describe_index(index, previous["type"], previous["params"], previous.get("requested"))
+
+
+def _pending_faiss_path(output_path: str) -> str:
+    """FAISS gravado nesta execução, ainda não visível (ver finalize_index)."""
+    return output_path.replace('.json', '.faiss') + ".tmp"
+
+
+def _write_pending_faiss(index, output_path: str) -> str:
+    """Grava o FAISS ao lado do atual; o `.faiss` em uso só é trocado por finalize_index."""
+    faiss.write_index(index, _pending_faiss_path(output_path))
+    return output_path.replace('.json', '.faiss')
+
+
+def _publish_faiss(output_path: str, publish: bool):
+    """Troca o `.faiss` pelo gravado nesta execução (publish) ou descarta o pendente."""
+    pending = _pending_faiss_path(output_path)
+    if not os.path.exists(pending):
+        return
+    if publish:
+        os.replace(pending, output_path.replace('.json', '.faiss'))
+    else:
+        os.remove(pending)
+
+
+def _open_index_for_update(changes: Dict, output_path: str, index_type: str, params: Dict,
+                           total_chunks: int):
+    """
+    Abre o FAISS em disco para atualização incremental.
+    
+    Returns:
+        (index, previous) com previous = "semantic_index" dos metadados anteriores;
+        index é None quando é preciso reconstruir (ver update_semantic_index)
+    """
     faiss_path = output_path.replace('.json', '.faiss')
-    faiss.write_index(index, faiss_path)
-    print(f"✅ Índice Semântico FAISS salvo: {faiss_path}")
+    previous = (load_index_metadata(output_path) or {}).get("semantic_index") or {"type": "flat", "params": {}}
+    stale_ids = changes.get("stale_chunk_ids", [])
+    # FAISS pendente de uma execução interrompida antes do finalize_index
+    _publish_faiss(output_path, publish=False)
+    
+    index = None
+    if os.path.exists(faiss_path) and not changes.get("rebuild"):
+        index = faiss.read_index(faiss_path)
+        if not supports_incremental(index):
+            print("[*] Índice FAISS legado (sem ids). Reconstruindo por completo...")
+            index = None
+        elif resolve_index_type(index_type, total_chunks) != previous.get("requested", previous["type"]) or any(
+            previous["params"].get(k) != v for k, v in (params or {}).items()
+        ):
+            print(f"[*] Tipo/parâmetros do índice FAISS mudaram. Reconstruindo por completo...")
+            index = None
+        elif stale_ids and not supports_removal(index):
+            print(f"[*] {previous['type']} não suporta remoção de vetores. Reconstruindo por completo...")
+            index = None
+    return index, previous
+
+
+
+# ---------------------------------------------------------------------------
+# Indexação em streaming: memória limitada, independente do tamanho do repositório
+# ---------------------------------------------------------------------------
+
+def _is_unchanged(old: Optional[Dict], stat) -> bool:
+    """mtime e tamanho iguais ao manifesto anterior (reaproveita sem ler)."""
+    return bool(old) and old["mtime"] == stat.st_mtime_ns and old["size"] == stat.st_size
+
+
+def stream_scan_to_store(repo_path: str, output_path: str, reuse: bool = True, workers: int = 1,
+                         chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE,
+                         ast_chunks: Optional[Dict] = None) -> Tuple[Optional[Dict], Dict, Dict]:
+    """
+    Escaneia o repositório gravando o conteúdo direto no blob, lote a lote.
+    
+    Equivalente a scan_java_files_incremental + build_simple_index +
+    write_content_and_table, sem acumular conteúdo: arquivos lidos vêm de
+    iter_scan_paths (poucos lotes em voo) e arquivos reaproveitados são
+    copiados do blob anterior via mmap. Em memória ficam só a tabela de
+    arquivos (manifesto) e os agregados dos metadados (pacotes, class_map).
+    
+    Returns:
+        (index, manifest, changes) no formato de scan_java_files_incremental;
+        index tem "metadata" e "class_map" (sem "files") e é None se não
+        houver arquivos Java (o blob anterior é mantido). O blob novo fica
+        pendente até finalize_index(): até lá o índice anterior segue legível
+    """
+    print(f"[*] Escaneando arquivos Java em (streaming): {repo_path}")
+    old_manifest = load_manifest(output_path) if reuse else {}
+    old_entries = old_manifest.get("files", {})
+    
+    old_store = None
+    if old_entries and old_manifest.get("version", 1) >= MANIFEST_VERSION:
+        try:
+            old_store = open_content_store(output_path, old_manifest)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Índice anterior ilegível ({e}). Fazendo indexação completa.")
+    # Sem blob anterior utilizável (ou manifesto v1, sem chunks), nada é reaproveitado
+    if old_store is None:
+        old_entries = {}
+    
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "next_vector_id": old_manifest.get("next_vector_id", 0) if old_entries else 0,
+        "next_chunk_id": old_manifest.get("next_chunk_id", 0) if old_entries else 0,
+        "files": {}
+    }
+    changes = {"added": [], "changed": [], "deleted": [], "reused": 0, "rebuild": not old_entries}
+    
+    # 1. stat() de todos os arquivos; só os alterados entram no scan
+    all_paths = list_java_files(repo_path)
+    stats = {}
+    to_read = []
+    for rel_path in all_paths:
+        try:
+            stats[rel_path] = os.stat(os.path.join(repo_path, rel_path))
+        except OSError as e:
+            print(f"⚠️  Erro ao processar {os.path.join(repo_path, rel_path)}: {e}")
+            continue
+        if not _is_unchanged(old_entries.get(rel_path), stats[rel_path]):
+            to_read.append(rel_path)
+    
+    # 2. Scan preguiçoso, na mesma ordem de to_read
+    scanned = (record for batch in iter_scan_paths(repo_path, to_read, workers, chunk_size, ast_chunks)
+               for record in batch)
+    
+    total_lines = 0
+    total_chunks = 0
+    packages = set()
+    class_map = {}
+    writer = ContentStoreWriter(content_store_path_for(output_path))
+    try:
+        for rel_path in all_paths:
+            if rel_path not in stats:
+                continue
+            stat = stats[rel_path]
+            old = old_entries.get(rel_path)
+            
+            file_info = None
+            if _is_unchanged(old, stat):
+                # Caminho rápido: mtime e tamanho inalterados
+                entry = _manifest_entry(old)
+                changes["reused"] += 1
+            else:
+                record = next(scanned)
+                if "error" in record:
+                    print(f"⚠️  Erro ao processar {os.path.join(repo_path, rel_path)}: {record['error']}")
+                    continue
+                entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "sha256": record["sha256"]}
+                if old and old["sha256"] == record["sha256"]:
+                    # Apenas "touch": conteúdo idêntico
+                    entry = _manifest_entry(old, entry)
+                    changes["reused"] += 1
+                else:
+                    if old:
+                        entry["vector_id"] = old["vector_id"]
+                        changes["changed"].append(rel_path)
+                    else:
+                        entry["vector_id"] = manifest["next_vector_id"]
+                        manifest["next_vector_id"] += 1
+                        changes["added"].append(rel_path)
+                    file_info = record["entry"]
+                    _assign_chunk_ids(file_info, manifest)
+            
+            if file_info is None:
+                offset, length = writer.append_bytes(old_store.read_sequential(old["offset"], old["length"]))
+                for key in ("lines", "package", "classes", "chunks"):
+                    entry[key] = old[key]
+            else:
+                offset, length = writer.append(file_info["content"])
+                for key in ("lines", "package", "classes", "chunks"):
+                    entry[key] = file_info[key]
+            entry["offset"] = offset
+            entry["length"] = length
+            manifest["files"][rel_path] = entry
+            
+            total_lines += entry["lines"]
+            total_chunks += len(entry["chunks"])
+            packages.add(entry["package"])
+            for class_name in entry["classes"]:
+                class_map.setdefault(class_name, []).append(rel_path)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if old_store is not None:
+            old_store.close()
+    
+    if not manifest["files"]:
+        writer.abort()
+        return None, manifest, changes
+    writer.commit()
+    manifest["content_generation"] = writer.generation
+    
+    changes["deleted"] = [path for path in old_entries if path not in manifest["files"]]
+    changes["deleted_vector_ids"] = [old_entries[p]["vector_id"] for p in changes["deleted"]]
+    changes["stale_chunk_ids"] = [
+        chunk["id"]
+        for path in changes["changed"] + changes["deleted"]
+        for chunk in old_entries[path].get("chunks", [])
+    ]
+    
+    index = {
+        "metadata": {
+            "total_files": len(manifest["files"]),
+            "total_lines": total_lines,
+            "packages": sorted(packages),
+            "classes": len(class_map),
+            "total_chunks": total_chunks
+        },
+        "class_map": class_map
+    }
+    return index, manifest, changes
+
+
+def save_index_streaming(index: Dict, manifest: Dict, output_path: str):
+    """Índice compacto + BM25 lendo o conteúdo do blob já gravado, um arquivo por vez."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    store = open_content_store(output_path, manifest)
+    
+    def documents():
+        for entry in manifest["files"].values():
+            data = store.read_sequential(entry["offset"], entry["length"])
+            yield entry["vector_id"], data.decode('utf-8', errors='ignore')
+    
+    with store:
+        _save_compact_and_keyword_index(index, list(manifest["files"]), documents(), output_path)
+
+
+class _ChunkTable:
+    """Chunks de uma tabela de arquivos por posição global, com texto lido do blob (mmap)."""
+    
+    def __init__(self, entries: List[Dict], store):
+        self.entries = entries
+        self.store = store
+        self._starts = []
+        self.total = 0
+        for entry in entries:
+            self._starts.append(self.total)
+            self.total += len(entry["chunks"])
+    
+    def _doc(self, entry: Dict, chunk: Dict) -> str:
+        # Só o prefixo usado no embedding (UTF-8: até 4 bytes por caractere)
+        length = min(chunk["end_byte"] - chunk["start_byte"], EMBED_MAX_CHARS * 4)
+        offset = entry["offset"] + chunk["start_byte"]
+        return chunk_doc(chunk, self.store.read_sequential(offset, length))
+    
+    def _locate(self, position: int) -> Tuple[Dict, Dict]:
+        row = bisect.bisect_right(self._starts, position) - 1
+        entry = self.entries[row]
+        return entry, entry["chunks"][position - self._starts[row]]
+    
+    def docs(self, positions: List[int]) -> List[str]:
+        """Textos dos chunks nas posições globais informadas."""
+        return [self._doc(*self._locate(position)) for position in positions]
+    
+    def ids(self, positions: List[int]) -> np.ndarray:
+        """ids FAISS dos chunks nas posições globais informadas."""
+        return np.array([self._locate(position)[1]["id"] for position in positions], dtype='int64')
+    
+    def iter_batches(self, batch_size: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """(textos, ids FAISS) de batch_size chunks por vez, na ordem da tabela."""
+        docs, ids = [], []
+        for entry in self.entries:
+            for chunk in entry["chunks"]:
+                docs.append(self._doc(entry, chunk))
+                ids.append(chunk["id"])
+                if len(docs) >= batch_size:
+                    yield docs, np.array(ids, dtype='int64')
+                    docs, ids = [], []
+        if docs:
+            yield docs, np.array(ids, dtype='int64')
 
 
+def _encode_positions(model, table: _ChunkTable, positions: List[int], batch_size: int,
+                      embedding_cache: "EmbeddingCache" = None) -> np.ndarray:
+    """Embeddings normalizados de chunks escolhidos (amostras de treino/ajuste), em lotes."""
+    parts = [
+        _encode_docs(model, table.docs(positions[i:i + batch_size]), embedding_cache, False)
+        for i in range(0, len(positions), batch_size)
+    ]
+    return np.concatenate(parts) if parts else np.zeros((0, 0), dtype='float32')
 
-def save_index(index: Dict, output_path: str):
-    """Salva o índice em disco."""
+
+def _add_chunk_batches(index, model, table: _ChunkTable, batch_size: int,
+                       embedding_cache: "EmbeddingCache" = None, truth: "StreamingExactNeighbours" = None):
+    """Codifica e adiciona os chunks ao FAISS lote a lote (um lote de embeddings em memória)."""
+    batches = (table.total + batch_size - 1) // batch_size
+    for docs, ids in tqdm(table.iter_batches(batch_size), total=batches, desc="Embeddings"):
+        embeddings = _encode_docs(model, docs, embedding_cache, False)
+        index.add_with_ids(embeddings, ids)
+        if truth is not None:
+            truth.update(embeddings, ids)
+
+
+def build_semantic_index_streaming(manifest: Dict, output_path: str, index_type: str = "auto",
+                                   params: Dict = None, target_recall: float = None,
+                                   embedding_cache: "EmbeddingCache" = None,
+                                   batch_size: int = DEFAULT_EMBED_BATCH, seed: int = 0) -> Dict:
+    """
+    Versão em streaming de build_semantic_index.
+    
+    Os chunks são lidos do blob e codificados em lotes de batch_size, indo
+    direto para o FAISS. Amostra de treino do IVF (limitada a
+    MAX_STREAM_TRAIN_VECTORS) e consultas do ajuste de nprobe/efSearch são
+    codificadas antes; os vizinhos exatos do ajuste são acumulados durante o
+    stream. Fora o próprio índice FAISS (use ivf_pq para comprimi-lo), a memória
+    não cresce com o repositório.
+    
+    Returns:
+        Descrição do índice para os metadados ("semantic_index")
+    """
+    if not HAS_SEMANTIC:
+        return None
+    
+    store = open_content_store(output_path, manifest)
+    if store is None:
+        print("⚠️  Blob de conteúdo ausente/inconsistente. Índice semântico não gerado.")
+        return None
+    
+    params = params or {}
+    model = _LazyEncoder(EMBED_MODEL)
+    with store:
+        table = _ChunkTable(list(manifest["files"].values()), store)
+        if table.total == 0:
+            print("⚠️  Nenhum chunk para indexar.")
+            return None
+        print(f"\n[*] Gerando embeddings em streaming: {table.total} chunks "
+              f"({len(table.entries)} arquivos), lotes de {batch_size}...")
+        
+        # Consultas do ajuste (também dão a dimensão do encoder)
+        query_positions = sorted(random.Random(seed + 1).sample(range(table.total), min(TUNE_QUERIES, table.total)))
+        queries = _encode_positions(model, table, query_positions, batch_size, embedding_cache)
+        
+        requested = resolve_index_type(index_type, table.total)
+        index, index_type, built_params = create_ann_index(requested, table.total, queries.shape[1], params)
+        print(f"   • Tipo: {index_type} {built_params or ''}")
+        if not index.is_trained:
+            sample_size = min(
+                training_sample_size(index_type, built_params, table.total),
+                max(min_training_vectors(index_type, built_params), MAX_STREAM_TRAIN_VECTORS)
+            )
+            positions = sorted(random.Random(seed).sample(range(table.total), sample_size))
+            train_ann_index(index, index_type, _encode_positions(model, table, positions, batch_size, embedding_cache))
+        
+        param_name = search_param_name(index_type)
+        tune = param_name is not None and param_name not in params
+        # As consultas estão no índice: cada uma fica fora dos próprios vizinhos
+        query_ids = table.ids(query_positions)
+        tune = tune and table.total > 1
+        truth = StreamingExactNeighbours(queries, min(TUNE_K, table.total - 1), query_ids) if tune else None
+        _add_chunk_batches(index, model, table, batch_size, embedding_cache, truth)
+    
+    apply_search_params(index, built_params)
+    if tune:
+        built_params = tune_search_params_with_truth(
+            index, index_type, built_params, queries, truth.truth_ids(),
+            target_recall=target_recall or DEFAULT_TARGET_RECALL, query_ids=query_ids
+        )
+    if embedding_cache is not None:
+        print(f"   • Cache de embeddings: {format_stats(embedding_cache.stats())}")
+    
+    faiss_path = _write_pending_faiss(index, output_path)
+    print(f"✅ Índice Semântico FAISS salvo: {faiss_path} (publicado por finalize_index)")
+    return describe_index(index, index_type, built_params, requested)
+
+
+def update_semantic_index_streaming(manifest: Dict, changes: Dict, output_path: str,
+                                    index_type: str = "auto", params: Dict = None,
+                                    target_recall: float = None,
+                                    embedding_cache: "EmbeddingCache" = None,
+                                    batch_size: int = DEFAULT_EMBED_BATCH) -> Dict:
+    """Versão em streaming de update_semantic_index (mesmas regras de reconstrução)."""
+    if not HAS_SEMANTIC:
+        return None
+    
+    total_chunks = sum(len(entry["chunks"]) for entry in manifest["files"].values())
+    stale_ids = changes.get("stale_chunk_ids", [])
+    index, previous = _open_index_for_update(changes, output_path, index_type, params, total_chunks)
+    if index is None:
+        return build_semantic_index_streaming(manifest, output_path, index_type, params, target_recall,
+                                              embedding_cache, batch_size)
+    
+    touched = set(changes["added"]) | set(changes["changed"])
+    if not touched and not stale_ids:
+        print("[*] Índice semântico já está atualizado.")
+        return describe_index(index, previous["type"], previous["params"], previous.get("requested"))
+    
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype='int64'))
+    
+    if touched:
+        print(f"\n[*] Gerando embeddings para {len(touched)} arquivo(s) alterado(s)...")
+        with open_content_store(output_path, manifest) as store:
+            entries = [entry for path, entry in manifest["files"].items() if path in touched]
+            # IVF: novos vetores usam os centróides já treinados
+            _add_chunk_batches(index, _LazyEncoder(EMBED_MODEL), _ChunkTable(entries, store),
+                               batch_size, embedding_cache)
+    
+    apply_search_params(index, previous["params"])
+    faiss_path = _write_pending_faiss(index, output_path)
+    print(f"✅ Índice Semântico FAISS atualizado: {faiss_path} (publicado por finalize_index)")
+    return describe_index(index, previous["type"], previous["params"], previous.get("requested"))
+
+
+def save_index(index: Dict, manifest: Dict, output_path: str):
+    """
+    Salva o conteúdo e as versões compactas do índice em disco.
+    
+    O conteúdo vai para uma geração nova do blob `.content` (offsets na tabela
+    do manifesto), publicada junto com o manifesto e o JSON de metadados por
+    finalize_index() depois do índice semântico.
+    """
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    # Salvar versão completa (JSON)
-    print(f"[*] Salvando índice completo: {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(index, f, indent=2)
+    # Salvar conteúdo (blob contíguo, lido via mmap no retrieval)
+    print(f"[*] Salvando conteúdo: {output_path.replace('.json', '.content')}")
+    write_content_and_table(index["files"], manifest, output_path)
     
+    _save_compact_and_keyword_index(
+        index, [f["path"] for f in index["files"]],
+        ((f["vector_id"], f["content"]) for f in index["files"]), output_path
+    )
+
+
+def _save_compact_and_keyword_index(index: Dict, file_list: List[str], documents, output_path: str):
+    """Grava o índice compacto (sem conteúdo) e o índice BM25 a partir de (vector_id, conteúdo)."""
     # Salvar versão compacta (sem conteúdo completo)
     compact_path = output_path.replace('.json', '_compact.json')
     compact_index = {
         "metadata": index["metadata"],
         "class_map": index["class_map"],
-        "file_list": [f["path"] for f in index["files"]]
+        "file_list": file_list
     }
     
     print(f"[*] Salvando índice compacto: {compact_path}")
     with open(compact_path, 'w', encoding='utf-8') as f:
         json.dump(compact_index, f, indent=2)
     
+    # Índice invertido BM25 (fallback/keyword retrieval)
+    bm25_path = keyword_index_path_for(output_path)
+    print(f"[*] Salvando índice BM25: {bm25_path}")
+    bm25_stats = build_keyword_index(documents, bm25_path)
+    print(f"   • Termos: {bm25_stats['terms']} | Postings: {bm25_stats['postings']}")
+
+
+def finalize_index(index: Dict, manifest: Dict, output_path: str):
+    """
+    Publica o FAISS gravado nesta execução e grava manifesto (publicando a geração
+    nova do blob) e metadados: a partir daqui o novo índice fica visível. Até aqui
+    o `.faiss`, o blob e o manifesto em uso são os anteriores, então uma queda antes
+    deste ponto mantém o índice anterior legível e reaproveitável pela próxima
+    execução incremental.
+    """
+    _publish_faiss(output_path, publish=bool(index["metadata"].get("semantic_index")))
+    save_manifest(manifest, output_path)
+    
+    metadata = {k: v for k, v in index["metadata"].items() if k != "packages"}
+    metadata["total_packages"] = len(index["metadata"]["packages"])
+    print(f"[*] Salvando metadados: {output_path}")
+    write_index_metadata(metadata, output_path)
+    
     print(f"✅ Indexação concluída!")
     print(f"   • Total de arquivos: {index['metadata']['total_files']}")
     print(f"   • Total de linhas: {index['metadata']['total_lines']}")
     print(f"   • Pacotes encontrados: {len(index['metadata']['packages'])}")
     print(f"   • Classes mapeadas: {len(index['class_map'])}")
+    print(f"   • Chunks (métodos/tipos): {index['metadata']['total_chunks']}")
 
 
 def main():
@@ -179,6 +1128,70 @@ def main():
         default="data/rlcoder_index/l2j_index.json",
         help="Caminho de saída para o índice"
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reprocessa apenas arquivos adicionados/alterados/removidos (usa o manifesto)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default_scan_workers(),
+        help="Processos para leitura/extração dos arquivos (1 = serial)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_SCAN_CHUNK_SIZE,
+        help="Arquivos por lote enviado a cada worker"
+    )
+    parser.add_argument(
+        "--ast-corpus",
+        help="Corpus AST (ast_parser.py --parse-repo): chunks prontos para arquivos inalterados"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Pipeline em lotes com memória limitada (repositórios maiores que a RAM)"
+    )
+    parser.add_argument(
+        "--embed-batch",
+        type=int,
+        default=DEFAULT_EMBED_BATCH,
+        help="Streaming: chunks por lote de embeddings adicionado ao FAISS"
+    )
+    parser.add_argument(
+        "--ann",
+        default="auto",
+        choices=["auto", "flat", "ivf_flat", "hnsw", "ivf_pq"],
+        help="Tipo do índice FAISS (auto = flat em repos pequenos, IVF-Flat nos grandes)"
+    )
+    parser.add_argument("--nlist", type=int, help="IVF: número de listas (padrão ~4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, help="IVF: listas visitadas por consulta (desliga o ajuste)")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW: vizinhos por nó")
+    parser.add_argument("--ef-search", type=int, help="HNSW: efSearch (desliga o ajuste)")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ: subquantizadores (bytes por vetor)")
+    parser.add_argument(
+        "--embedding-cache",
+        default=None,
+        help="Cache de embeddings em disco (padrão: $RLCODER_EMBEDDING_CACHE ou data/embedding_cache/embeddings.sqlite)"
+    )
+    parser.add_argument(
+        "--embedding-cache-mb",
+        type=float,
+        help="Limite do cache de embeddings em MiB (LRU; padrão 1024)"
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Codifica todos os chunks sem consultar/gravar o cache"
+    )
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=0.95,
+        help="Recall@10 alvo (vs. busca exata) no ajuste de nprobe/efSearch"
+    )
     
     args = parser.parse_args()
     
@@ -188,25 +1201,82 @@ def main():
         print(f"   Execute primeiro: make clone-l2j ou clone manualmente")
         return 1
     
-    # Escanear arquivos
-    java_files = scan_java_files(args.repo)
+    ast_chunks = None
+    if args.ast_corpus:
+        if HAS_AST:
+            ast_chunks = load_ast_corpus(args.ast_corpus).chunk_hints()
+        else:
+            print("⚠️  tree-sitter indisponível: --ast-corpus ignorado.")
     
-    if not java_files:
-        print("❌ Nenhum arquivo Java encontrado!")
-        return 1
-    
-    # Construir índice
-    print("\n[*] Construindo índice...")
-    index = build_simple_index(java_files)
+    # Escanear arquivos (modo completo ignora o manifesto, mas o regrava)
+    if args.streaming:
+        # Conteúdo vai direto para o blob; nada do repositório fica inteiro em memória
+        java_files = None
+        index, manifest, changes = stream_scan_to_store(
+            args.repo, args.output, reuse=args.incremental,
+            workers=args.workers, chunk_size=args.chunk_size, ast_chunks=ast_chunks
+        )
+        if index is None:
+            print("❌ Nenhum arquivo Java encontrado!")
+            return 1
+    else:
+        java_files, manifest, changes = scan_java_files_incremental(
+            args.repo, args.output, reuse=args.incremental,
+            workers=args.workers, chunk_size=args.chunk_size, ast_chunks=ast_chunks
+        )
+        
+        if not java_files:
+            print("❌ Nenhum arquivo Java encontrado!")
+            return 1
+        
+        # Construir índice
+        print("\n[*] Construindo índice...")
+        index = build_simple_index(java_files)
+    index["metadata"]["last_build"] = {
+        "mode": "incremental" if args.incremental else "full",
+        "streaming": args.streaming,
+        "reused": changes["reused"],
+        "recomputed": len(changes["added"]) + len(changes["changed"]),
+        "added": len(changes["added"]),
+        "changed": len(changes["changed"]),
+        "deleted": len(changes["deleted"])
+    }
     
     # Salvar
-    save_index(index, args.output)
+    if args.streaming:
+        save_index_streaming(index, manifest, args.output)
+    else:
+        save_index(index, manifest, args.output)
     
     # Passo Extra: Construir Índice Semântico
     if HAS_SEMANTIC:
-        build_semantic_index(java_files, args.output)
-
+        ann_params = {
+            "nlist": args.nlist, "nprobe": args.nprobe, "M": args.hnsw_m,
+            "efSearch": args.ef_search, "pq_m": args.pq_m
+        }
+        embedding_cache = None
+        if not args.no_embedding_cache:
+            max_bytes = int(args.embedding_cache_mb * (1 << 20)) if args.embedding_cache_mb else None
+            embedding_cache = get_embedding_cache(args.embedding_cache, max_bytes)
+        ann_params = {k: v for k, v in ann_params.items() if v is not None}
+        if args.streaming:
+            index["metadata"]["semantic_index"] = update_semantic_index_streaming(
+                manifest, changes, args.output, index_type=args.ann, params=ann_params,
+                target_recall=args.target_recall, embedding_cache=embedding_cache,
+                batch_size=args.embed_batch
+            )
+        else:
+            index["metadata"]["semantic_index"] = update_semantic_index(
+                java_files, changes, args.output, index_type=args.ann, params=ann_params,
+                target_recall=args.target_recall, embedding_cache=embedding_cache
+            )
     
+    # FAISS, manifesto e metadados por último: só marca arquivos como indexados após o FAISS estar salvo
+    finalize_index(index, manifest, args.output)
+    
+    last_build = index["metadata"]["last_build"]
+    print(f"   • Reaproveitados: {last_build['reused']} | Recalculados: {last_build['recomputed']} | Removidos: {last_build['deleted']}")
+
     print(f"\n🎯 Próximo passo: Use o índice em transcribe.py:")
     print(f"   from l2j_pipeline.rlcoder_adapter import RLCoderAdapter")
     print(f"   adapter = RLCoderAdapter('{args.output}')")
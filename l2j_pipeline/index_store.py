@@ -0,0 +1,405 @@
+"""
+Armazenamento do Índice RLCoder
+Formato dividido: metadados pequenos (JSON) + tabela de arquivos (manifesto) + blob contíguo
+de conteúdo acessado via mmap por offsets.
+
+Arquivos para um índice `l2j_index.json`:
+    l2j_index.json           -> metadados/contadores (leitura O(1), usado por /index-status)
+    l2j_index_manifest.json  -> tabela por arquivo: path, mtime, size, sha256, vector_id,
+                                offset, length, lines, package, classes, chunks
+                                (id FAISS, tipo, nome e spans byte/linha de cada chunk)
+    l2j_index.content        -> blob com o conteúdo UTF-8 de todos os arquivos
+    l2j_index.content.<gen>  -> blob de uma indexação em andamento (geração ainda não
+                                publicada; vira l2j_index.content em save_manifest)
+
+O manifesto é o ponto de commit: até ele ser gravado, leitores e a próxima indexação
+incremental continuam usando a geração anterior do blob.
+"""
+import os
+import re
+import glob
+import json
+import mmap
+import uuid
+import hashlib
+import shutil
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+INDEX_FORMAT_VERSION = 2
+CONTENT_MAGIC = b"L2JCS001"
+CONTENT_HEADER_SIZE = len(CONTENT_MAGIC) + 16  # magic + generation (uuid4)
+# Leituras sequenciais: bytes lidos entre liberações das páginas do mmap
+RELEASE_EVERY_BYTES = 16 << 20
+
+
+def content_store_path_for(index_path: str) -> str:
+    """Caminho do blob de conteúdo, ao lado do índice JSON."""
+    return index_path.replace('.json', '.content')
+
+
+def pending_content_path_for(index_path: str, generation: str) -> str:
+    """Blob de uma geração gravada mas ainda não publicada pelo manifesto."""
+    return f"{content_store_path_for(index_path)}.{generation}"
+
+
+def manifest_path_for(index_path: str) -> str:
+    """Caminho do manifesto por arquivo, ao lado do índice JSON."""
+    return index_path.replace('.json', '_manifest.json')
+
+
+def is_legacy_index(index_data: Dict) -> bool:
+    """Índices v1 guardam o conteúdo completo dentro do próprio JSON."""
+    return index_data.get("format_version", 1) < INDEX_FORMAT_VERSION
+
+
+def index_needs_conversion(index_path: str) -> bool:
+    """Índice v1 em disco: converta com `index_store.py convert` ou reindexe."""
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return is_legacy_index(json.load(f))
+
+
+def _tmp_path(path: str) -> str:
+    """Temporário por processo para escrita atômica (escritores concorrentes não se atropelam)."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+class ContentStoreWriter:
+    """
+    Escreve o blob de conteúdo sequencialmente.
+
+    O arquivo é gravado em `<path>.<geração>`; commit() só o fecha em disco. Ele
+    substitui o blob anterior quando o manifesto que aponta para a geração é salvo
+    (save_manifest), então leitores (mmap) nunca veem um blob parcial nem um blob
+    mais novo que o manifesto.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation = uuid.uuid4().hex
+        self.pending_path = f"{path}.{self.generation}"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(self.pending_path, 'wb')
+        self._file.write(CONTENT_MAGIC + bytes.fromhex(self.generation))
+        self._offset = CONTENT_HEADER_SIZE
+
+    def append(self, content: str) -> Tuple[int, int]:
+        """Adiciona o conteúdo e retorna (offset, length) em bytes."""
+        return self.append_bytes(content.encode('utf-8'))
+
+    def append_bytes(self, data: bytes) -> Tuple[int, int]:
+        offset = self._offset
+        self._file.write(data)
+        self._offset += len(data)
+        return offset, len(data)
+
+    def commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.pending_path):
+            os.remove(self.pending_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+class ContentStore:
+    """Leitura do blob de conteúdo via mmap (só as páginas acessadas vão para a RAM)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Content store vazio ou inválido: {path}")
+        if self._mm[:len(CONTENT_MAGIC)] != CONTENT_MAGIC:
+            self.close()
+            raise ValueError(f"Content store inválido (magic): {path}")
+        self.generation = self._mm[len(CONTENT_MAGIC):CONTENT_HEADER_SIZE].hex()
+        self._unreleased = 0
+
+    def read_bytes(self, offset: int, length: int) -> bytes:
+        return self._mm[offset:offset + length]
+
+    def read(self, offset: int, length: int, max_chars: Optional[int] = None) -> str:
+        """
+        Lê o conteúdo de um arquivo.
+
+        Args:
+            offset, length: Posição em bytes (da tabela de arquivos)
+            max_chars: Se definido, lê apenas o prefixo necessário para max_chars caracteres
+        """
+        if max_chars is not None:
+            # UTF-8 usa no máximo 4 bytes por caractere
+            length = min(length, max_chars * 4)
+        text = self._mm[offset:offset + length].decode('utf-8', errors='ignore')
+        return text[:max_chars] if max_chars is not None else text
+
+    def read_sequential(self, offset: int, length: int) -> bytes:
+        """
+        read_bytes para passadas que percorrem o blob inteiro (indexação em streaming).
+
+        A cada RELEASE_EVERY_BYTES lidos as páginas mapeadas saem do RSS do processo
+        (continuam no page cache): sem isso, ler o blob todo via mmap faz o RSS
+        crescer com o tamanho do repositório.
+        """
+        data = self._mm[offset:offset + length]
+        self._unreleased += length
+        if self._unreleased >= RELEASE_EVERY_BYTES:
+            self.release()
+        return data
+
+    def release(self):
+        """Descarta do RSS todas as páginas mapeadas do blob (MADV_DONTNEED)."""
+        self._unreleased = 0
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            self._mm.madvise(mmap.MADV_DONTNEED)
+
+    def close(self):
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def load_manifest(index_path: str) -> Dict:
+    """Carrega o manifesto (tabela de arquivos) se existir."""
+    path = manifest_path_for(index_path)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Manifesto inválido ({e}). Fazendo indexação completa.")
+    return {"version": 1, "next_vector_id": 0, "files": {}}
+
+
+def save_manifest(manifest: Dict, index_path: str):
+    """
+    Salva o manifesto (escrita atômica) e publica a geração do blob que ele referencia.
+
+    Entre as duas trocas, open_content_store encontra a geração nova pelo nome.
+    """
+    path = manifest_path_for(index_path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    publish_content_store(manifest, index_path)
+
+
+def publish_content_store(manifest: Dict, index_path: str):
+    """Move a geração do manifesto para o caminho do blob e apaga gerações abandonadas."""
+    path = content_store_path_for(index_path)
+    generation = manifest.get("content_generation")
+    if generation and os.path.exists(pending_content_path_for(index_path, generation)):
+        os.replace(pending_content_path_for(index_path, generation), path)
+    # Gerações de indexações interrompidas antes do manifesto (queda, exceção)
+    for stale in glob.glob(glob.escape(path) + ".*"):
+        if re.fullmatch(r"[0-9a-f]{32}", stale[len(path) + 1:]):
+            os.remove(stale)
+
+
+def load_index_metadata(index_path: str) -> Optional[Dict]:
+    """
+    Lê apenas os contadores do índice.
+
+    Para o formato v2 isso é um JSON de tamanho constante; índices legados
+    (v1) ainda são lidos por completo.
+    """
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+    metadata = dict(index_data["metadata"])
+    if is_legacy_index(index_data):
+        metadata["classes"] = len(index_data["class_map"])
+    return metadata
+
+
+def load_file_table(index_path: str) -> Tuple[List[Dict], Dict]:
+    """
+    Carrega a tabela de arquivos (sem conteúdo) de um índice v2.
+
+    Returns:
+        (files, manifest) com files na ordem do manifesto e o campo "path" preenchido
+    """
+    manifest = load_manifest(index_path)
+    files = []
+    for path, entry in manifest.get("files", {}).items():
+        file_info = dict(entry)
+        file_info["path"] = path
+        files.append(file_info)
+    return files, manifest
+
+
+def open_content_store(index_path: str, manifest: Dict) -> Optional[ContentStore]:
+    """
+    Abre o blob da geração do manifesto informado: o publicado ou, se o manifesto
+    ainda não foi salvo (indexação em andamento) ou acabou de ser, o pendente.
+    """
+    path = content_store_path_for(index_path)
+    generation = manifest.get("content_generation")
+    candidates = [path]
+    if generation:
+        # O pendente pode ser publicado entre as duas tentativas: tenta o blob de novo
+        candidates += [pending_content_path_for(index_path, generation), path]
+    found = False
+    for candidate in candidates:
+        try:
+            store = ContentStore(candidate)
+        except FileNotFoundError:
+            continue
+        found = True
+        if store.generation == generation:
+            return store
+        store.close()
+    if found:
+        print(f"⚠️  Content store fora de sincronia com o manifesto: {path}")
+    return None
+
+
+def load_index_files(index_path: str) -> List[Dict]:
+    """
+    Carrega todos os arquivos de um índice (v1 ou v2) com conteúdo.
+
+    Usado pela indexação incremental para reaproveitar arquivos inalterados.
+    Retorna lista vazia se o índice não existir ou estiver inconsistente.
+    """
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+    if is_legacy_index(index_data):
+        return index_data.get("files", [])
+
+    files, manifest = load_file_table(index_path)
+    store = open_content_store(index_path, manifest)
+    if store is None:
+        return []
+    with store:
+        for file_info in files:
+            file_info["content"] = store.read(file_info["offset"], file_info["length"])
+    return files
+
+
+def write_content_and_table(java_files: List[Dict], manifest: Dict, index_path: str):
+    """
+    Grava o blob de conteúdo (geração pendente até save_manifest) e preenche a
+    tabela de arquivos do manifesto.
+
+    Cada entrada do manifesto recebe offset/length no blob e os metadados
+    extraídos (lines, package, classes, chunks). Os spans dos chunks são
+    relativos ao offset do arquivo.
+    """
+    with ContentStoreWriter(content_store_path_for(index_path)) as writer:
+        for file_info in java_files:
+            offset, length = writer.append(file_info["content"])
+            entry = manifest["files"][file_info["path"]]
+            entry["offset"] = offset
+            entry["length"] = length
+            entry["lines"] = file_info["lines"]
+            entry["package"] = file_info["package"]
+            entry["classes"] = file_info["classes"]
+            if "chunks" in file_info:
+                entry["chunks"] = file_info["chunks"]
+    manifest["content_generation"] = writer.generation
+
+
+def write_index_metadata(metadata: Dict, index_path: str):
+    """Grava o JSON pequeno de metadados (último passo de uma indexação)."""
+    index_data = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "metadata": metadata,
+        "content_store": os.path.basename(content_store_path_for(index_path)),
+        "manifest": os.path.basename(manifest_path_for(index_path))
+    }
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    tmp_path = _tmp_path(index_path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index_data, f, indent=2)
+    os.replace(tmp_path, index_path)
+
+
+def convert_legacy_index(index_path: str) -> bool:
+    """
+    Converte (uma vez) um índice v1 com conteúdo embutido para o formato v2.
+
+    O JSON original é preservado em `<base>.legacy.json`. vector_id = posição
+    do arquivo, compatível com índices FAISS construídos a partir do v1.
+
+    Returns:
+        True se houve conversão, False se o índice já estava no formato v2
+    """
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+    if not is_legacy_index(index_data):
+        return False
+
+    print(f"[*] Convertendo índice legado para o formato v2: {index_path}")
+    files = index_data.get("files", [])
+    manifest = {"version": 1, "next_vector_id": 0, "files": {}}
+    for position, file_info in enumerate(files):
+        vector_id = file_info.get("vector_id", position)
+        # mtime/size desconhecidos: a próxima indexação incremental recalcula o hash
+        # e reaproveita o arquivo se o conteúdo for idêntico
+        manifest["files"][file_info["path"]] = {
+            "mtime": 0,
+            "size": -1,
+            "sha256": hashlib.sha256(file_info["content"].encode('utf-8')).hexdigest(),
+            "vector_id": vector_id
+        }
+        manifest["next_vector_id"] = max(manifest["next_vector_id"], vector_id + 1)
+
+    write_content_and_table(files, manifest, index_path)
+    save_manifest(manifest, index_path)
+
+    shutil.copyfile(index_path, index_path.replace('.json', '.legacy.json'))
+    metadata = dict(index_data["metadata"])
+    metadata.pop("packages", None)
+    metadata["total_packages"] = len(index_data["metadata"].get("packages", []))
+    metadata["classes"] = len(index_data.get("class_map", {}))
+    write_index_metadata(metadata, index_path)
+    print(f"✅ Índice convertido ({len(files)} arquivos). Original: {index_path.replace('.json', '.legacy.json')}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ferramentas do armazenamento do índice RLCoder")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="Converte um índice JSON legado para o formato v2")
+    convert.add_argument("index", nargs="?", default="data/rlcoder_index/l2j_index.json")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        if not os.path.exists(args.index):
+            print(f"❌ Índice não encontrado: {args.index}")
+            return 1
+        if not convert_legacy_index(args.index):
+            print(f"[*] Índice já está no formato v{INDEX_FORMAT_VERSION}: {args.index}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
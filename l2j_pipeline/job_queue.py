@@ -0,0 +1,549 @@
+"""
+Fila de Jobs Persistente
+Jobs longos (migração, clone/indexação de repositórios) em SQLite, executados por um
+pool de processos worker fora do processo da API.
+
+    API      -> enqueue() e consulta de estado (get/list_jobs), cancel(), resume()
+    Workers  -> claim_next() atômico, handler do tipo do job, progresso e checkpoint
+
+Estados: queued -> running -> done | failed | cancelled.
+
+Cada item concluído (ex.: um arquivo migrado) fica registrado em job_items: um job
+retomado (resume(), ou recolocado na fila porque o worker morreu / a API reiniciou)
+pula o que já terminou. O cancelamento é cooperativo: o handler consulta
+ctx.cancelled() entre itens e ctx.run_command() encerra o subprocesso em andamento.
+O encerramento do worker (SIGTERM) usa o mesmo caminho: o job em andamento para no
+próximo item e volta para a fila.
+
+Uso (pool de workers):
+    python l2j_pipeline/job_queue.py --workers 2
+A API sobe o pool sozinha (L2J_JOB_WORKERS, padrão 1; 0 = workers externos) e o
+encerra ao sair.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import sqlite3
+import argparse
+import importlib
+import threading
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Callable, Dict, List, Optional
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+DEFAULT_DB_PATH = "data/jobs/jobs.sqlite"
+DEFAULT_WORKERS = 1
+POLL_INTERVAL = 1.0
+CANCEL_POLL_INTERVAL = 2.0
+# Espera pelos workers no encerramento do pool antes do SIGKILL
+WORKER_STOP_TIMEOUT = 30.0
+
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+# Tipo do job -> "módulo:função(ctx)" (importado só no worker)
+JOB_HANDLERS = {
+    "migration": "migration_api:run_migration_job",
+    "repo_add": "repo_manager:run_add_repo_job",
+    "repo_index": "repo_manager:run_index_repo_job",
+    "index_l2j": "repo_manager:run_index_l2j_job",
+}
+
+
+class JobCancelled(Exception):
+    """Levantada dentro do handler quando o job foi cancelado."""
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Fila thread-safe sobre SQLite (WAL); várias instâncias/processos podem abrir o
+    mesmo arquivo.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("L2J_JOB_DB") or DEFAULT_DB_PATH
+        self.log_dir = os.path.join(os.path.dirname(self.path) or '.', "logs")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, params TEXT NOT NULL,"
+            " state TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0,"
+            " total INTEGER, message TEXT, result TEXT, error TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0, worker_pid INTEGER, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, started REAL, finished REAL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            " job_id INTEGER NOT NULL, item TEXT NOT NULL, status TEXT NOT NULL, finished REAL NOT NULL,"
+            " PRIMARY KEY (job_id, item))"
+        )
+
+    # ---------------- API ----------------
+
+    def enqueue(self, kind: str, params: Optional[Dict] = None) -> int:
+        """Coloca um job na fila; retorna o id."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Tipo de job desconhecido: {kind}")
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, params, state, created, updated) VALUES (?, ?, 'queued', ?, ?)",
+                (kind, json.dumps(params or {}), now, now)
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, state: Optional[str] = None, kind: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Jobs mais recentes primeiro."""
+        query, args = "SELECT * FROM jobs WHERE 1 = 1", []
+        if state:
+            query += " AND state = ?"
+            args.append(state)
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: int) -> Optional[Dict]:
+        """Cancela um job: da fila sai na hora; em execução, o worker para no próximo item."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished = ?, updated = ? WHERE id = ? AND state = 'queued'",
+                (now, now, job_id)
+            )
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated = ? WHERE id = ? AND state = 'running'",
+                (now, job_id)
+            )
+        return self.get(job_id)
+
+    def resume(self, job_id: int) -> Optional[Dict]:
+        """Recoloca na fila um job que falhou ou foi cancelado (itens concluídos são pulados)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'queued', cancel_requested = 0, error = NULL, finished = NULL,"
+                " worker_pid = NULL, updated = ? WHERE id = ? AND state IN ('failed', 'cancelled')",
+                (now, job_id)
+            )
+        return self.get(job_id)
+
+    def log_path(self, job_id: int) -> str:
+        return os.path.join(self.log_dir, f"{job_id}.log")
+
+    def read_log(self, job_id: int, lines: int = 50) -> str:
+        try:
+            with open(self.log_path(job_id), 'r', encoding='utf-8', errors='replace') as f:
+                return "".join(f.readlines()[-lines:])
+        except FileNotFoundError:
+            return ""
+
+    # ---------------- Workers ----------------
+
+    def claim_next(self, worker_pid: int) -> Optional[Dict]:
+        """Pega o job mais antigo da fila (atômico entre processos)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'running', worker_pid = ?, attempts = attempts + 1,"
+                    " started = COALESCE(started, ?), updated = ? WHERE id = ?",
+                    (worker_pid, now, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def requeue_orphans(self) -> int:
+        """
+        Jobs 'running' cujo worker morreu (queda, reinício): voltam para a fila, ou
+        ficam 'cancelled' se o cancelamento já tinha sido pedido.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id, worker_pid, cancel_requested FROM jobs WHERE state = 'running'").fetchall()
+        requeued = 0
+        now = time.time()
+        for row in rows:
+            if _pid_alive(row["worker_pid"]):
+                continue
+            state = 'cancelled' if row["cancel_requested"] else 'queued'
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, worker_pid = NULL, updated = ?,"
+                    " finished = CASE WHEN ? = 'cancelled' THEN ? ELSE NULL END"
+                    " WHERE id = ? AND state = 'running'",
+                    (state, now, state, now, row["id"])
+                )
+            requeued += state == 'queued'
+        return requeued
+
+    def update(self, job_id: int, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def finish(self, job_id: int, state: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        self.update(job_id, state=state, finished=time.time(), worker_pid=None,
+                    result=json.dumps(result) if result is not None else None, error=error)
+
+    def cancel_requested(self, job_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def record_item(self, job_id: int, item: str, status: str = "done"):
+        """Registra um item concluído e atualiza os contadores do job."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO job_items (job_id, item, status, finished) VALUES (?, ?, ?, ?)",
+                    (job_id, item, status, now)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET done = (SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status = 'done'),"
+                    " failed = (SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status = 'failed'),"
+                    " updated = ? WHERE id = ?",
+                    (job_id, job_id, now, job_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def completed_items(self, job_id: int) -> set:
+        """Itens já concluídos com sucesso (pulados ao retomar)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item FROM job_items WHERE job_id = ? AND status = 'done'", (job_id,)
+            ).fetchall()
+        return {row["item"] for row in rows}
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        total = job["total"]
+        job["progress"] = (job["done"] + job["failed"]) / total if total else None
+        return job
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobContext:
+    """O que um handler recebe: parâmetros, progresso, checkpoint e cancelamento."""
+
+    def __init__(self, queue: JobQueue, job: Dict, stopping: Optional[threading.Event] = None):
+        self.queue = queue
+        self.job_id = job["id"]
+        self.kind = job["kind"]
+        self.params = job["params"]
+        self._completed = queue.completed_items(self.job_id)
+        self._cancelled = False
+        self._last_cancel_check = 0.0
+        self._stopping = stopping
+
+    def set_total(self, total: int):
+        self.queue.update(self.job_id, total=total)
+
+    def set_message(self, message: str):
+        self.queue.update(self.job_id, message=message)
+
+    def is_done(self, item: str) -> bool:
+        """Item concluído numa execução anterior deste job."""
+        return item in self._completed
+
+    @property
+    def resumed_items(self) -> int:
+        return len(self._completed)
+
+    def item_done(self, item: str):
+        self._completed.add(item)
+        self.queue.record_item(self.job_id, item, "done")
+
+    def item_failed(self, item: str):
+        self.queue.record_item(self.job_id, item, "failed")
+
+    def cancelled(self) -> bool:
+        """
+        Cancelamento pedido (consulta o banco no máximo a cada CANCEL_POLL_INTERVAL s)
+        ou worker encerrando.
+        """
+        if self._stopping is not None and self._stopping.is_set():
+            return True
+        if not self._cancelled:
+            now = time.monotonic()
+            if now - self._last_cancel_check >= CANCEL_POLL_INTERVAL:
+                self._last_cancel_check = now
+                self._cancelled = self.queue.cancel_requested(self.job_id)
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+    def run_command(self, cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+        """
+        subprocess.run(cmd, check=True, capture_output=True, text=True) que encerra o
+        processo filho se o job for cancelado (JobCancelled).
+        """
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=CANCEL_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if self.cancelled():
+                    process.terminate()
+                    try:
+                        process.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                    raise JobCancelled()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def resolve_handler(kind: str) -> Callable[[JobContext], Optional[Dict]]:
+    module_name, _, function = JOB_HANDLERS[kind].partition(':')
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        module = importlib.import_module(f"l2j_pipeline.{module_name}")
+    return getattr(module, function)
+
+
+def run_job(queue: JobQueue, job: Dict, stopping: Optional[threading.Event] = None):
+    """
+    Executa um job já reivindicado; stdout/stderr vão para o log do job.
+
+    stopping: sinalizado no encerramento do worker; o job para como num cancelamento
+    e volta para a fila (ou fica 'cancelled' se o cancelamento também foi pedido).
+    """
+    ctx = JobContext(queue, job, stopping)
+    os.makedirs(queue.log_dir, exist_ok=True)
+    with open(queue.log_path(job["id"]), 'a', encoding='utf-8', buffering=1) as log:
+        with redirect_stdout(log), redirect_stderr(log):
+            print(f"[job {job['id']}] {job['kind']} (tentativa {job['attempts']}, "
+                  f"{ctx.resumed_items} item(ns) já concluído(s))")
+            try:
+                result = resolve_handler(job["kind"])(ctx)
+                state, error = ("cancelled", None) if ctx.cancelled() else ("done", None)
+            except JobCancelled:
+                result, state, error = None, "cancelled", None
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                result, state, error = None, "failed", f"{type(e).__name__}: {e}"
+            if state == "cancelled" and stopping is not None and stopping.is_set() \
+                    and not queue.cancel_requested(job["id"]):
+                print(f"[job {job['id']}] interrompido (worker encerrando): volta para a fila")
+                queue.update(job["id"], state="queued", worker_pid=None)
+                return
+            print(f"[job {job['id']}] {state}")
+    queue.finish(job["id"], state, result, error)
+
+
+def worker_loop(db_path: Optional[str] = None, poll_interval: float = POLL_INTERVAL, once: bool = False):
+    """
+    Loop de um processo worker: pega jobs da fila até receber SIGTERM, que também
+    interrompe o job em andamento no próximo item (ver run_job).
+    """
+    # Caminho do pacote: handlers importam módulos irmãos sem prefixo
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    queue = JobQueue(db_path)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    while not stopping.is_set():
+        job = queue.claim_next(os.getpid())
+        if job is None:
+            if once:
+                break
+            stopping.wait(poll_interval)
+            continue
+        run_job(queue, job, stopping)
+    queue.close()
+
+
+def pool_pid_path(db_path: Optional[str] = None) -> str:
+    """Arquivo com o pid do supervisor do pool, ao lado do banco da fila."""
+    db_path = db_path or os.getenv("L2J_JOB_DB") or DEFAULT_DB_PATH
+    return os.path.join(os.path.dirname(db_path) or '.', "pool.pid")
+
+
+def run_worker_pool(workers: int = DEFAULT_WORKERS, db_path: Optional[str] = None):
+    """
+    Supervisor: mantém `workers` processos vivos e recoloca na fila jobs de workers mortos.
+
+    No SIGTERM/SIGINT encerra os workers (SIGKILL após WORKER_STOP_TIMEOUT) e só então
+    remove o pool.pid: enquanto algum worker vive, start_worker_pool não sobe outro pool.
+    """
+    queue = JobQueue(db_path)
+    pid_path = pool_pid_path(db_path)
+    os.makedirs(os.path.dirname(pid_path) or '.', exist_ok=True)
+    with open(pid_path, 'w') as f:
+        f.write(str(os.getpid()))
+
+    requeued = queue.requeue_orphans()
+    print(f"[*] Pool de jobs: {workers} worker(s) | {requeued} job(s) retomado(s) | fila: {queue.path}")
+    processes: List[multiprocessing.Process] = []
+    stopping = {"flag": False}
+    signal.signal(signal.SIGTERM, lambda *_: stopping.update(flag=True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.update(flag=True))
+    try:
+        while not stopping["flag"]:
+            processes = [p for p in processes if p.is_alive()]
+            while len(processes) < workers:
+                process = multiprocessing.Process(target=worker_loop, args=(db_path,), daemon=False)
+                process.start()
+                processes.append(process)
+            # Worker que morreu no meio de um job: o job volta para a fila
+            queue.requeue_orphans()
+            time.sleep(POLL_INTERVAL)
+    finally:
+        for process in processes:
+            process.terminate()
+        deadline = time.time() + WORKER_STOP_TIMEOUT
+        for process in processes:
+            process.join(timeout=max(0.0, deadline - time.time()))
+        for process in processes:
+            if process.is_alive():
+                # Handler que não consulta ctx.cancelled(): o job volta para a fila
+                # pelo requeue_orphans da próxima subida
+                process.kill()
+                process.join()
+        try:
+            os.remove(pid_path)
+        except OSError:
+            pass
+
+
+def pool_running(db_path: Optional[str] = None) -> bool:
+    try:
+        with open(pool_pid_path(db_path)) as f:
+            return _pid_alive(int(f.read().strip() or 0))
+    except (OSError, ValueError):
+        return False
+
+
+def start_worker_pool(workers: Optional[int] = None, db_path: Optional[str] = None) -> Optional[int]:
+    """
+    Sobe o pool em um processo separado (se ainda não houver um); usado na subida da API.
+
+    workers: padrão L2J_JOB_WORKERS (0 = não sobe; workers rodam por fora).
+    Returns: pid do supervisor iniciado, ou None
+    """
+    if workers is None:
+        workers = int(os.getenv("L2J_JOB_WORKERS", DEFAULT_WORKERS))
+    if workers <= 0 or pool_running(db_path):
+        return None
+    cmd = [sys.executable, os.path.abspath(__file__), "--workers", str(workers)]
+    if db_path:
+        cmd += ["--db", db_path]
+    process = subprocess.Popen(cmd, start_new_session=True)
+    return process.pid
+
+
+def stop_worker_pool(pid: int, timeout: float = 60.0) -> bool:
+    """
+    Pede o encerramento do supervisor `pid` com SIGTERM; usado na saída da API para o
+    pool que ela mesma subiu. O supervisor repassa o SIGTERM aos workers, cujos jobs em
+    andamento param no próximo item e voltam para a fila, espera até WORKER_STOP_TIMEOUT
+    (depois SIGKILL) e remove o pool.pid quando todos saíram.
+
+    Returns: True se o supervisor saiu dentro de `timeout` (mantenha-o acima de
+    WORKER_STOP_TIMEOUT)
+    """
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return True
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            # Filho deste processo (start_worker_pool): recolhe o status para não virar zumbi
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                return True
+        except ChildProcessError:
+            if not _pid_alive(pid):
+                return True
+        time.sleep(0.1)
+    return False
+
+
+# Uma instância por processo (ver process_state)
+_queues: Dict[str, JobQueue] = process_singleton("job_queue.queues", dict)
+_queues_lock = process_singleton("job_queue.queues_lock", threading.Lock)
+
+
+def get_job_queue(path: Optional[str] = None) -> JobQueue:
+    """Fila compartilhada do processo para `path` (padrão L2J_JOB_DB ou DEFAULT_DB_PATH)."""
+    key = os.path.abspath(path or os.getenv("L2J_JOB_DB") or DEFAULT_DB_PATH)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = JobQueue(key)
+            _queues[key] = queue
+        return queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool de workers da fila de jobs")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("L2J_JOB_WORKERS", DEFAULT_WORKERS) or 1))
+    parser.add_argument("--db", default=None, help="Banco da fila (padrão $L2J_JOB_DB ou data/jobs/jobs.sqlite)")
+    args = parser.parse_args()
+    run_worker_pool(max(1, args.workers), args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+try:
+    from job_queue import get_job_queue, JOB_STATES
+except ImportError:
+    from l2j_pipeline.job_queue import get_job_queue, JOB_STATES
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def _get_or_404(job_id: int):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@router.get("")
+async def list_jobs(state: Optional[str] = None, kind: Optional[str] = None, limit: int = 50):
+    """Lista os jobs (mais recentes primeiro), filtrando por estado e tipo."""
+    if state and state not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"Estado inválido: {state}")
+    return {"jobs": get_job_queue().list_jobs(state, kind, max(1, min(limit, 500)))}
+
+@router.get("/{job_id}")
+async def get_job(job_id: int):
+    """Estado, progresso (done/failed/total), mensagem e resultado de um job."""
+    return _get_or_404(job_id)
+
+@router.get("/{job_id}/log")
+async def get_job_log(job_id: int, lines: int = 50):
+    """Últimas linhas da saída do job."""
+    _get_or_404(job_id)
+    return {"log": get_job_queue().read_log(job_id, max(1, lines))}
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    """Cancela um job (na fila: imediato; em execução: o worker para no próximo arquivo)."""
+    _get_or_404(job_id)
+    return get_job_queue().cancel(job_id)
+
+@router.post("/{job_id}/resume")
+async def resume_job(job_id: int):
+    """Recoloca na fila um job que falhou ou foi cancelado, pulando os arquivos já concluídos."""
+    job = _get_or_404(job_id)
+    if job["state"] not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job em estado '{job['state']}' não pode ser retomado")
+    return get_job_queue().resume(job_id)
@@ -0,0 +1,208 @@
+"""
+Índice Invertido BM25 do RLCoder
+Token -> postings (vector_id, impacto BM25) construído na indexação e salvo ao lado do FAISS.
+
+Os impactos BM25 (idf * tf normalizado pelo tamanho do documento) são pré-calculados e cada
+lista de postings é ordenada por impacto e truncada em `max_postings`. Assim, uma consulta
+percorre no máximo `MAX_QUERY_TERMS * max_postings` entradas, independente do tamanho do repo.
+
+Formato `<base>.bm25`:
+    magic (8 bytes) | tamanho do header (uint64) | header JSON | ids int32[] | impactos float32[]
+"""
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import struct
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BM25_MAGIC = b"L2JBM25\x01"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_MAX_POSTINGS = 2000
+MAX_QUERY_TERMS = 32
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# Palavras reservadas/ruído do Java: aparecem em quase todo arquivo
+JAVA_STOPWORDS = frozenset("""
+abstract assert boolean break byte case catch char class const continue default do double
+else enum extends final finally float for goto if implements import instanceof int interface
+long native new package private protected public return short static strictfp super switch
+synchronized this throw throws transient try void volatile while true false null var string
+override
+""".split())
+
+
+def keyword_index_path_for(index_path: str) -> str:
+    """Caminho do índice BM25, ao lado do índice JSON/FAISS."""
+    return index_path.replace('.json', '.bm25')
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens de identificadores (minúsculos), sem palavras reservadas do Java."""
+    tokens = []
+    for match in IDENTIFIER_RE.finditer(text):
+        token = match.group(0).lower()
+        if len(token) > 1 and token not in JAVA_STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def build_keyword_index(documents: Iterable[Tuple[int, str]], output_path: str,
+                        k1: float = DEFAULT_K1, b: float = DEFAULT_B,
+                        max_postings: int = DEFAULT_MAX_POSTINGS) -> Dict:
+    """
+    Constrói e salva o índice BM25.
+
+    Args:
+        documents: Pares (vector_id, conteúdo)
+        output_path: Caminho do arquivo `.bm25`
+        k1, b: Parâmetros do BM25
+        max_postings: Máximo de documentos por termo (os de maior impacto)
+
+    Returns:
+        Estatísticas da construção
+    """
+    # Postings em arrays compactos (8 bytes por ocorrência, não uma tupla Python):
+    # documents pode ser um gerador sobre o blob de conteúdo (indexação em streaming)
+    postings: Dict[str, Tuple[array, array]] = {}
+    doc_lengths: Dict[int, int] = {}
+
+    for doc_id, content in documents:
+        counts = Counter(tokenize(content))
+        doc_lengths[doc_id] = sum(counts.values())
+        for term, tf in counts.items():
+            plist = postings.get(term)
+            if plist is None:
+                plist = postings[term] = (array('i'), array('i'))
+            plist[0].append(doc_id)
+            plist[1].append(tf)
+
+    num_docs = len(doc_lengths)
+    avgdl = (sum(doc_lengths.values()) / num_docs) if num_docs else 0.0
+
+    ids = array('i')
+    impacts = array('f')
+    terms = {}
+    for term in sorted(postings):
+        doc_ids, tfs = postings.pop(term)
+        df = len(doc_ids)
+        idf = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+        scored = []
+        for doc_id, tf in zip(doc_ids, tfs):
+            norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / avgdl) if avgdl else k1
+            scored.append((idf * tf * (k1 + 1.0) / (tf + norm), doc_id))
+        if len(scored) > max_postings:
+            scored = heapq.nlargest(max_postings, scored)
+        else:
+            scored.sort(reverse=True)
+        terms[term] = [len(ids), len(scored), df]
+        for impact, doc_id in scored:
+            ids.append(doc_id)
+            impacts.append(impact)
+
+    header = {
+        "k1": k1,
+        "b": b,
+        "num_docs": num_docs,
+        "avgdl": avgdl,
+        "max_postings": max_postings,
+        "num_postings": len(ids),
+        "terms": terms
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(BM25_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        # Alinhar os arrays em 4 bytes para o cast() do memoryview
+        padding = (-f.tell()) % 4
+        f.write(b'\0' * padding)
+        ids.tofile(f)
+        impacts.tofile(f)
+    os.replace(tmp_path, output_path)
+
+    return {"terms": len(terms), "postings": len(ids), "documents": num_docs}
+
+
+class KeywordIndex:
+    """Leitura do índice BM25 via mmap: só as postings dos termos consultados são lidas."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(BM25_MAGIC)] != BM25_MAGIC:
+            self.close()
+            raise ValueError(f"Índice BM25 inválido (magic): {path}")
+
+        header_len = struct.unpack_from('<Q', self._mm, len(BM25_MAGIC))[0]
+        header_start = len(BM25_MAGIC) + 8
+        header = json.loads(self._mm[header_start:header_start + header_len])
+        self.terms: Dict[str, List[int]] = header.pop("terms")
+        self.params = header
+
+        data_start = header_start + header_len
+        data_start += (-data_start) % 4
+        num_postings = header["num_postings"]
+        view = memoryview(self._mm)
+        self._ids = view[data_start:data_start + 4 * num_postings].cast('i')
+        impacts_start = data_start + 4 * num_postings
+        self._impacts = view[impacts_start:impacts_start + 4 * num_postings].cast('f')
+
+    @property
+    def num_docs(self) -> int:
+        return self.params["num_docs"]
+
+    def query_terms(self, query: str) -> List[str]:
+        """Termos da consulta presentes no índice, os mais raros (maior idf) primeiro."""
+        unique = {t for t in tokenize(query) if t in self.terms}
+        # df menor = idf maior; limita o trabalho por consulta
+        return sorted(unique, key=lambda t: (self.terms[t][2], t))[:MAX_QUERY_TERMS]
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Busca BM25.
+
+        Returns:
+            Lista de (vector_id, score) ordenada por score decrescente
+        """
+        scores: Dict[int, float] = {}
+        for term in self.query_terms(query):
+            start, count, _ = self.terms[term]
+            ids = self._ids[start:start + count]
+            impacts = self._impacts[start:start + count]
+            for doc_id, impact in zip(ids, impacts):
+                scores[doc_id] = scores.get(doc_id, 0.0) + impact
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def close(self):
+        for name in ('_ids', '_impacts'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+def open_keyword_index(index_path: str) -> Optional[KeywordIndex]:
+    """Abre o índice BM25 de um índice RLCoder, se existir."""
+    path = keyword_index_path_for(index_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        return KeywordIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"[!] Falha ao carregar índice BM25: {e}")
+        return None
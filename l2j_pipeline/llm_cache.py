@@ -0,0 +1,249 @@
+"""
+Cache Persistente de Respostas do LLM
+(modelo, parâmetros, hash do prompt normalizado) -> resposta, em SQLite com TTL e
+despejo LRU limitado por tamanho.
+
+Usado pelo llm_client (chat(..., cache=...)): rodar de novo /migration/generate,
+prepare_guidance_dataset.py ou generate_synth_dataset.py sobre o mesmo plano (por
+exemplo após uma queda) reaproveita as completions já pagas. Cada entrada guarda os
+tokens gastos, para reportar quanto o cache economizou.
+
+Normalização do prompt: finais de linha (CRLF -> LF) e espaços no fim das linhas e
+das mensagens não mudam a chave.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+DEFAULT_CACHE_PATH = "data/llm_cache/responses.sqlite"
+DEFAULT_MAX_BYTES = 512 << 20  # 512 MiB de respostas
+DEFAULT_TTL_DAYS = 30.0
+# Após estourar o limite, despeja até esta fração dele (evita despejar a cada insert)
+EVICT_TO_FRACTION = 0.9
+
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+
+def normalize_content(content) -> str:
+    """Conteúdo de uma mensagem para a chave (str ou lista de partes)."""
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    content = content.replace('\r\n', '\n')
+    return _TRAILING_SPACE_RE.sub('', content).strip()
+
+
+def prompt_key(model: str, messages: List[Dict], params: Optional[Dict] = None) -> str:
+    """Chave do cache: modelo + parâmetros da requisição (temperature etc.) + mensagens normalizadas."""
+    payload = {
+        "model": model,
+        "params": params or {},
+        "messages": [[m.get("role", ""), normalize_content(m.get("content", ""))] for m in messages]
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache thread-safe de respostas do LLM em disco.
+
+    get() devolve None para entradas ausentes ou mais velhas que o TTL (que são apagadas).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_days: float = DEFAULT_TTL_DAYS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl_days * 86400 if ttl_days > 0 else None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+            " prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(response AS BLOB))), 0) FROM responses"
+        ).fetchone()[0]
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0,
+                       "saved_prompt_tokens": 0, "saved_completion_tokens": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """Resposta em cache (marca como usada agora) ou None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, prompt_tokens, completion_tokens, created, LENGTH(CAST(response AS BLOB))"
+                " FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[4]
+                self._stats["expired"] += 1
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+            self._stats["saved_prompt_tokens"] += row[1]
+            self._stats["saved_completion_tokens"] += row[2]
+            return row[0]
+
+    def put(self, key: str, model: str, response: str, usage: Optional[Dict] = None):
+        """Grava uma resposta e despeja as menos usadas se passar de max_bytes."""
+        usage = usage or {}
+        now = time.time()
+        size = len(response.encode('utf-8', errors='surrogatepass'))
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT LENGTH(CAST(response AS BLOB)) FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, model, response, prompt_tokens, completion_tokens, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, int(usage.get("prompt_tokens") or 0),
+                 int(usage.get("completion_tokens") or 0), now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TO_FRACTION))
+            self._conn.commit()
+
+    def delete(self, key: str) -> bool:
+        """Remove uma resposta (ex.: levou a um arquivo que falhou); retorna se existia."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT LENGTH(CAST(response AS BLOB)) FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            self._total_bytes -= row[0]
+            return True
+
+    def _evict(self, target_bytes: int):
+        """Remove as entradas menos recentemente usadas até caber em target_bytes (com lock)."""
+        to_delete = []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(CAST(response AS BLOB)) FROM responses ORDER BY last_used"
+        ):
+            if self._total_bytes <= target_bytes:
+                break
+            to_delete.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self._stats["evictions"] += len(to_delete)
+
+    def purge_expired(self) -> int:
+        """Apaga todas as entradas fora do TTL; retorna quantas."""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cutoff = time.time() - self.ttl
+            expired = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(response AS BLOB))), 0)"
+                " FROM responses WHERE created < ?", (cutoff,)
+            ).fetchone()
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+            self._conn.commit()
+            self._total_bytes -= expired[1]
+            self._stats["expired"] += expired[0]
+            return expired[0]
+
+    def stats(self) -> Dict:
+        """Hits/misses desde a abertura, taxa de acerto, tokens economizados e ocupação."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats["bytes"] = self._total_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["saved_tokens"] = stats["saved_prompt_tokens"] + stats["saved_completion_tokens"]
+        stats["max_bytes"] = self.max_bytes
+        stats["path"] = self.path
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_stats(stats: Dict) -> str:
+    """Resumo de uma linha para logs."""
+    return (f"hits: {stats['hits']} | misses: {stats['misses']} | "
+            f"taxa de acerto: {stats['hit_ratio']:.1%} | tokens economizados: {stats['saved_tokens']:,} | "
+            f"entradas: {stats['entries']} ({stats['bytes'] / (1 << 20):.1f} MiB)")
+
+
+# Uma instância por processo (ver process_state)
+_caches: Dict[str, LLMCache] = process_singleton("llm_cache.caches", dict)
+_caches_lock = process_singleton("llm_cache.caches_lock", threading.Lock)
+
+
+def get_llm_cache(path: Optional[str] = None, max_bytes: Optional[int] = None,
+                  ttl_days: Optional[float] = None) -> LLMCache:
+    """
+    Retorna o cache compartilhado do processo para `path`.
+
+    Padrões: variáveis LLM_CACHE (caminho), LLM_CACHE_MB (limite em MiB) e
+    LLM_CACHE_TTL_DAYS (0 = sem expiração), ou DEFAULT_CACHE_PATH / DEFAULT_MAX_BYTES /
+    DEFAULT_TTL_DAYS.
+    """
+    path = path or os.getenv("LLM_CACHE") or DEFAULT_CACHE_PATH
+    if max_bytes is None:
+        env_mb = os.getenv("LLM_CACHE_MB")
+        max_bytes = int(float(env_mb) * (1 << 20)) if env_mb else DEFAULT_MAX_BYTES
+    if ttl_days is None:
+        ttl_days = float(os.getenv("LLM_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS))
+    key = os.path.abspath(path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = LLMCache(path, max_bytes, ttl_days)
+            _caches[key] = cache
+        else:
+            cache.max_bytes = max_bytes
+            cache.ttl = ttl_days * 86400 if ttl_days > 0 else None
+        return cache
+
+
+def open_llm_cache(enabled: bool = True) -> Optional[LLMCache]:
+    """
+    Cache do processo para um ponto de entrada (--no-llm-cache => None).
+
+    Se o cache não abrir (disco, SQLite), segue sem cache.
+    """
+    if not enabled:
+        return None
+    try:
+        return get_llm_cache()
+    except (sqlite3.Error, OSError) as e:
+        print(f"[!] Cache do LLM indisponível ({e}). Seguindo sem cache.")
+        return None
@@ -0,0 +1,265 @@
+"""
+Cliente LLM Compartilhado
+Um AsyncOpenAI por (endpoint, chave) e por processo, usado por todos os estágios
+que chamam o LLM (migração, testes, guidance, transcrição).
+
+    - Pool de conexões HTTP: um único cliente (keep-alive) em vez de um por engine
+    - Concorrência global: no máximo LLM_MAX_CONCURRENCY requisições em voo
+    - Rate limit por modelo: LLM_RATE_LIMITS="qwen/qwen3-coder=60,*=120" (requisições/minuto)
+    - Retries com backoff exponencial + jitter em 429, 5xx, timeout e falha de conexão
+      (respeita Retry-After quando o servidor envia)
+
+As requisições rodam em um event loop próprio (thread daemon): código síncrono usa
+chat() e código async (endpoints FastAPI) usa achat(), sem bloquear o loop de quem
+chama. Com cache=LLMCache (llm_cache), respostas já vistas para o mesmo modelo,
+parâmetros e prompt normalizado voltam do disco sem requisição. track_usage() soma
+os tokens gastos por um trecho de código (ex.: por arquivo migrado). LLM_BASE_URL aponta
+para outro servidor compatível com a API da OpenAI (ex.: um stub local, ver
+bench_llm_client.py).
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+
+try:
+    from llm_cache import LLMCache, prompt_key
+except ImportError:
+    from l2j_pipeline.llm_cache import LLMCache, prompt_key
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_TIMEOUT = 300.0
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Acumulador de uso da thread/tarefa atual (track_usage)
+_usage: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage():
+    """
+    Soma o uso das chamadas chat()/achat() feitas dentro do bloco, nesta thread ou
+    tarefa (ex.: os tokens gastos para migrar um arquivo):
+
+        with track_usage() as usage:
+            engine.generate_code(...)
+        usage["prompt_tokens"], usage["completion_tokens"], usage["requests"], usage["cache_hits"]
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0, "cache_hits": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _add_usage(usage: Optional[Dict], cached: bool):
+    tracker = _usage.get()
+    if tracker is None:
+        return
+    if cached:
+        tracker["cache_hits"] += 1
+        return
+    tracker["requests"] += 1
+    tracker["prompt_tokens"] += int((usage or {}).get("prompt_tokens") or 0)
+    tracker["completion_tokens"] += int((usage or {}).get("completion_tokens") or 0)
+
+
+def parse_rate_limits(spec: Optional[str]) -> Dict[str, float]:
+    """'modelo=rpm,*=rpm' -> {modelo: requisições por minuto} ('*' = demais modelos)."""
+    limits = {}
+    for item in (spec or "").split(','):
+        model, sep, rpm = item.strip().rpartition('=')
+        if sep and model and rpm:
+            limits[model] = float(rpm)
+    return limits
+
+
+class RateLimiter:
+    """Espaça as requisições de um modelo em 60/rpm segundos (usado só no loop do cliente)."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class LLMClient:
+    """
+    Cliente de chat completions com pool, limite de concorrência, rate limit por
+    modelo e retries. Thread-safe; criar via get_llm_client().
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, rate_limits: Optional[Dict[str, float]] = None,
+                 max_retries: Optional[int] = None, timeout: float = DEFAULT_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("LLM_BASE_URL") or OPENROUTER_BASE_URL
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.rate_limits = rate_limits if rate_limits is not None else parse_rate_limits(os.getenv("LLM_RATE_LIMITS"))
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "cache_hits": 0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop do cliente (criado na primeira chamada)."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _limiter(self, model: str) -> RateLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = RateLimiter(self.rate_limits.get(model, self.rate_limits.get('*', 0)))
+            self._limiters[model] = limiter
+        return limiter
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Espera antes do retry `attempt` (1, 2, ...): Retry-After ou exponencial com jitter."""
+        retry_after = self._retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(BACKOFF_MAX, retry_after)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+    async def _chat(self, model: str, messages: List[Dict], cache: Optional[LLMCache] = None,
+                    **kwargs) -> Tuple[Optional[str], Dict, bool]:
+        """Roda no loop do cliente: (conteúdo, uso de tokens, veio do cache)."""
+        key = None
+        if cache is not None:
+            key = prompt_key(model, messages, kwargs)
+            content = cache.get(key)
+            if content is not None:
+                self._stats["cache_hits"] += 1
+                return content, {}, True
+        
+        content, usage = await self._request(model, messages, **kwargs)
+        if key is not None and content is not None:
+            cache.put(key, model, content, usage)
+        return content, usage, False
+
+    async def _request(self, model: str, messages: List[Dict], **kwargs) -> Tuple[Optional[str], Dict]:
+        """(conteúdo, uso de tokens) de uma requisição, com semáforo, rate limit e retries."""
+        if self._client is None:
+            # max_retries=0: os retries (com rate limit e semáforo) são feitos aqui
+            self._client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key or "",
+                                       max_retries=0, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        attempt = 0
+        while True:
+            await self._limiter(model).acquire()
+            async with self._semaphore:
+                self._stats["requests"] += 1
+                self._stats["in_flight"] += 1
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=model, messages=messages, **kwargs
+                    )
+                    usage = response.usage.model_dump() if getattr(response, "usage", None) else {}
+                    return response.choices[0].message.content, usage
+                except RETRYABLE_ERRORS as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        self._stats["errors"] += 1
+                        raise
+                    error = e
+                except Exception:
+                    self._stats["errors"] += 1
+                    raise
+                finally:
+                    self._stats["in_flight"] -= 1
+            # Espera fora do semáforo: não segura uma vaga de concorrência dormindo
+            self._stats["retries"] += 1
+            await asyncio.sleep(self.backoff(attempt, error))
+
+    def chat(self, model: str, messages: List[Dict], cache: Optional[LLMCache] = None, **kwargs) -> str:
+        """
+        Chat completion (bloqueante; seguro para várias threads).
+
+        Args:
+            cache: Cache de respostas (read-through); None = sempre chama o modelo
+            **kwargs: Demais parâmetros de chat.completions.create (temperature etc.)
+
+        Returns:
+            Conteúdo da primeira escolha
+        """
+        future = asyncio.run_coroutine_threadsafe(self._chat(model, messages, cache, **kwargs),
+                                                  self._ensure_loop())
+        content, usage, cached = future.result()
+        _add_usage(usage, cached)
+        return content
+
+    async def achat(self, model: str, messages: List[Dict], cache: Optional[LLMCache] = None, **kwargs) -> str:
+        """chat() para código async: aguarda sem bloquear o event loop de quem chama."""
+        future = asyncio.run_coroutine_threadsafe(self._chat(model, messages, cache, **kwargs),
+                                                  self._ensure_loop())
+        content, usage, cached = await asyncio.wrap_future(future)
+        _add_usage(usage, cached)
+        return content
+
+    def stats(self) -> Dict:
+        return {**self._stats, "max_concurrency": self.max_concurrency, "base_url": self.base_url}
+
+
+# Uma instância por processo (ver process_state)
+_clients: Dict[Tuple[str, str], LLMClient] = process_singleton("llm_client.clients", dict)
+_clients_lock = process_singleton("llm_client.clients_lock", threading.Lock)
+
+
+def get_llm_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> LLMClient:
+    """
+    Retorna o cliente compartilhado do processo para (endpoint, chave).
+
+    Padrões: OPENROUTER_API_KEY e LLM_BASE_URL (ou OpenRouter).
+    """
+    api_key = api_key or os.getenv("OPENROUTER_API_KEY") or ""
+    base_url = base_url or os.getenv("LLM_BASE_URL") or OPENROUTER_BASE_URL
+    key = (base_url, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LLMClient(api_key, base_url)
+            _clients[key] = client
+        return client
@@ -1,19 +1,67 @@
 """
 Script de Mapeamento de Dependências do L2J
-Analisa os imports Java e gera um grafo direcionado para determinar a ordem de migração.
+Analisa as referências entre classes Java e gera um grafo direcionado (com pesos)
+para determinar a ordem de migração.
+
+Com tree-sitter, as arestas vêm das referências do AST (herança, tipos usados,
+chamadas estáticas, anotações, nomes qualificados) resolvidas como o compilador
+Java faria; a análise de cada arquivo fica em cache por hash de conteúdo, então
+replanejar após um commit só reanalisa os arquivos alterados. Sem tree-sitter (ou
+com --imports-only), as arestas vêm apenas das linhas de import.
 """
 import os
 import re
 import json
+import hashlib
 import networkx as nx
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
-def scan_imports(file_path: Path) -> Tuple[str, List[str]]:
-    """Lê um arquivo Java e extrai o pacote e as importações."""
+try:
+    from migration_plan import write_plan, plan_binary_path_for
+except ImportError:
+    from l2j_pipeline.migration_plan import write_plan, plan_binary_path_for
+
+try:
+    from ast_parser import EnterpriseJavaParser
+    from ast_corpus import AstCorpus, load_ast_corpus
+    from parse_cache import AST_SCHEMA_VERSION
+    HAS_AST = True
+except ImportError:
+    try:
+        from l2j_pipeline.ast_parser import EnterpriseJavaParser
+        from l2j_pipeline.ast_corpus import AstCorpus, load_ast_corpus
+        from l2j_pipeline.parse_cache import AST_SCHEMA_VERSION
+        HAS_AST = True
+    except ImportError:
+        # Sem tree-sitter: apenas o scan de imports por linha
+        AstCorpus = None
+        load_ast_corpus = None
+        HAS_AST = False
+
+# Peso de cada ocorrência na aresta: herança prende mais a ordem de migração que um uso
+REFERENCE_WEIGHTS = {"extends": 5, "implements": 3, "static": 2, "type": 1, "annotation": 1, "import": 1}
+# Campos da análise por arquivo (EnterpriseJavaParser.extract_references)
+ANALYSIS_FIELDS = ("package", "imports", "local_types", "references")
+REFERENCE_CACHE_VERSION = 1
+DEFAULT_REFERENCE_CACHE_DIR = "data/dependency_cache"
+
+_reference_parser = None
+
+# Identificadores com inicial maiúscula: candidatos a referência de classe do mesmo pacote
+TYPE_NAME_RE = re.compile(r'\b[A-Z][A-Za-z0-9_]*\b')
+
+def scan_source(file_path: Path) -> Tuple[str, List[str], Set[str]]:
+    """
+    Lê um arquivo Java uma única vez: pacote, importações internas e nomes de
+    tipo citados fora de imports/comentários de linha (referências implícitas
+    ao próprio pacote, que não precisam de import).
+    """
     package = ""
     imports = []
+    names = set()
     
     try:
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -23,17 +71,300 @@ def scan_imports(file_path: Path) -> Tuple[str, List[str]]:
                     package = line.replace("package ", "").replace(";", "").strip()
                 elif line.startswith("import "):
                     imp = line.replace("import ", "").replace(";", "").strip()
+                    # import static a.b.C.m -> a.b.C.m (resolvido para a classe a.b.C)
+                    if imp.startswith("static "):
+                        imp = imp[len("static "):].strip()
                     # Ignorar imports do sistema java.* e javax.* por enquanto
                     # Focamos nas dependências internas do projeto
-                    if not imp.startswith("java.") and not imp.startswith("javax."):
+                    if _is_project_import(imp):
                         imports.append(imp)
+                elif line and not line.startswith(("//", "/*", "*")):
+                    names.update(TYPE_NAME_RE.findall(line))
     except Exception as e:
         print(f"Erro ao ler {file_path}: {e}")
         
+    return package, imports, names
+
+def scan_imports(file_path: Path) -> Tuple[str, List[str]]:
+    """Lê um arquivo Java e extrai o pacote e as importações."""
+    package, imports, _ = scan_source(file_path)
     return package, imports
 
-def build_dependency_graph(repo_path: str) -> nx.DiGraph:
-    """Constrói o grafo de dependências do projeto."""
+def _is_project_import(imp: str) -> bool:
+    """Ignora imports do sistema java.* e javax.* (mesmo critério de scan_imports)."""
+    return not imp.startswith("java.") and not imp.startswith("javax.")
+
+def collect_sources(repo_path: str, ast_corpus: Optional["AstCorpus"] = None) -> List[Tuple[Path, str, List[str], Set[str]]]:
+    """
+    (arquivo, pacote, imports internos, nomes de tipo citados) de cada arquivo Java.
+
+    Com ast_corpus, pacote e imports vêm do corpus; os nomes citados vêm sempre
+    do scan por linha (o corpus não guarda referências do corpo).
+    """
+    repo = Path(repo_path)
+    if ast_corpus is not None:
+        sources = []
+        for record in ast_corpus:
+            file_path = repo / record["path"]
+            _, _, names = scan_source(file_path)
+            imports = [imp for imp in record["imports"] if _is_project_import(imp)]
+            sources.append((file_path, record["package"], imports, names))
+        return sources
+    return [(file_path, *scan_source(file_path)) for file_path in repo.rglob("*.java")]
+
+def build_package_index(class_map: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """pacote -> {nome simples -> nome completo}, em uma passada sobre as classes."""
+    package_index: Dict[str, Dict[str, str]] = {}
+    for full_name in class_map:
+        package, _, simple = full_name.rpartition('.')
+        package_index.setdefault(package, {})[simple] = full_name
+    return package_index
+
+def owning_class(name: str, class_map: Dict[str, str]) -> Optional[str]:
+    """Classe do projeto que contém `name`: a.b.C, a.b.C.Inner e a.b.C.membro -> a.b.C."""
+    while name:
+        if name in class_map:
+            return name
+        name, sep, _ = name.rpartition('.')
+        if not sep:
+            return None
+    return None
+
+def resolve_import(imp: str, class_map: Dict[str, str],
+                   package_index: Dict[str, Dict[str, str]]) -> List[str]:
+    """
+    Classes do projeto que um import referencia.
+
+    - a.b.C / a.b.C.Inner / (static) a.b.C.membro -> a.b.C
+    - a.b.*                                      -> classes do pacote a.b (sem subpacotes)
+    - a.b.C.* / (static) a.b.C.*                 -> a.b.C
+    """
+    if imp.endswith(".*"):
+        base = imp[:-2]
+        classes = package_index.get(base)
+        if classes is not None:
+            return list(classes.values())
+        owner = owning_class(base, class_map)
+        return [owner] if owner else []
+    owner = owning_class(imp, class_map)
+    return [owner] if owner else []
+
+def default_reference_workers() -> int:
+    """Número padrão de processos da análise de referências (1 = serial)."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+def default_reference_cache_path(repo_path: str) -> str:
+    """data/dependency_cache/<nome do repositório>.json"""
+    name = os.path.basename(os.path.normpath(repo_path)) or "repo"
+    return os.path.join(DEFAULT_REFERENCE_CACHE_DIR, f"{name}.json")
+
+def load_reference_cache(path: str) -> Dict[str, Dict]:
+    """sha256 -> análise do arquivo (vazio se ausente, ilegível ou de outra versão)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"[!] Cache de referências ignorado ({e}).")
+        return {}
+    if data.get("version") != REFERENCE_CACHE_VERSION or data.get("ast_schema") != AST_SCHEMA_VERSION:
+        return {}
+    return data.get("files", {})
+
+def save_reference_cache(path: str, entries: Dict[str, Dict]):
+    """Grava o cache (escrita atômica) apenas com as entradas dos arquivos atuais."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": REFERENCE_CACHE_VERSION, "ast_schema": AST_SCHEMA_VERSION, "files": entries},
+                  f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _analyze_file(file_path: str) -> Tuple[str, Optional[str], Dict]:
+    """
+    Worker: (arquivo, sha256, extract_references) de um arquivo.
+
+    Roda no processo principal ou no pool (um parser por processo); sha256 é None
+    se o arquivo não puder ser lido.
+    """
+    global _reference_parser
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return file_path, None, {"error": str(e)}
+    if _reference_parser is None:
+        _reference_parser = EnterpriseJavaParser(cache=False)
+    return file_path, hashlib.sha256(data).hexdigest(), _reference_parser.extract_references(data)
+
+def collect_symbol_sources(repo_path: str, ast_corpus: Optional["AstCorpus"] = None,
+                           cache_path: Optional[str] = None,
+                           workers: int = 1) -> Tuple[List[Tuple[Path, Dict]], Dict[str, int]]:
+    """
+    Análise de referências (pacote, imports, tipos locais, referências) de cada arquivo Java.
+
+    Reaproveitada por hash de conteúdo: corpus AST com o mesmo sha256 -> cache em
+    disco (cache_path) -> parse, só para os ausentes (pool com `workers` processos).
+
+    Returns:
+        ([(arquivo, análise)], {"files", "corpus", "cached", "analyzed", "errors"})
+    """
+    cache = load_reference_cache(cache_path) if cache_path else {}
+    stats = {"files": 0, "corpus": 0, "cached": 0, "analyzed": 0, "errors": 0}
+    found: Dict[str, Tuple[str, Dict]] = {}
+    missing = []
+    
+    java_files = list(Path(repo_path).rglob("*.java"))
+    for file_path in java_files:
+        try:
+            with open(file_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            print(f"Erro ao ler {file_path}: {e}")
+            stats["errors"] += 1
+            continue
+        record = ast_corpus.lookup_sha(digest) if ast_corpus is not None else None
+        if record is not None:
+            found[str(file_path)] = (digest, {k: record[k] for k in ANALYSIS_FIELDS})
+            stats["corpus"] += 1
+        elif digest in cache:
+            found[str(file_path)] = (digest, cache[digest])
+            stats["cached"] += 1
+        else:
+            missing.append(str(file_path))
+    
+    if missing:
+        print(f"[*] Analisando referências de {len(missing)} arquivo(s)...")
+        if workers <= 1 or len(missing) < 2 * workers:
+            for path, digest, analysis in map(_analyze_file, missing):
+                _store_analysis(found, stats, path, digest, analysis)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(missing) // (4 * workers))
+                for path, digest, analysis in executor.map(_analyze_file, missing, chunksize=chunksize):
+                    _store_analysis(found, stats, path, digest, analysis)
+    
+    sources = []
+    for file_path in java_files:
+        entry = found.get(str(file_path))
+        if entry is not None:
+            sources.append((file_path, entry[1]))
+    stats["files"] = len(sources)
+    
+    if cache_path:
+        try:
+            save_reference_cache(cache_path, {digest: analysis for digest, analysis in found.values()})
+        except OSError as e:
+            print(f"[!] Não foi possível gravar o cache de referências: {e}")
+    return sources, stats
+
+def _store_analysis(found: Dict, stats: Dict[str, int], path: str, digest: Optional[str], analysis: Dict):
+    if digest is None:
+        print(f"Erro ao ler {path}: {analysis['error']}")
+        stats["errors"] += 1
+        return
+    found[path] = (digest, analysis)
+    stats["analyzed"] += 1
+
+def resolve_reference(name: str, package: str, single_imports: Dict[str, str], wildcard_packages: List[str],
+                      local_types: Set[str], class_map: Dict[str, str],
+                      package_index: Dict[str, Dict[str, str]]) -> Optional[str]:
+    """
+    Classe do projeto referenciada por `name` no arquivo, na ordem de escopo do Java:
+    tipos do próprio arquivo > nome qualificado > import explícito > mesmo pacote > import wildcard.
+    """
+    head = name.split('.', 1)[0]
+    if head in local_types:
+        return None
+    if '.' in name:
+        # a.b.Config / Outer.Inner
+        owner = owning_class(name, class_map)
+        if owner:
+            return owner
+        name = head
+    if name in single_imports:
+        return single_imports[name]
+    full = package_index.get(package, {}).get(name)
+    if full:
+        return full
+    for wildcard_package in wildcard_packages:
+        full = package_index[wildcard_package].get(name)
+        if full:
+            return full
+    return None
+
+def reference_targets(analysis: Dict, class_map: Dict[str, str],
+                      package_index: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, int]]:
+    """Classe do projeto -> {tipo de referência: ocorrências} para um arquivo analisado."""
+    targets: Dict[str, Dict[str, int]] = {}
+    
+    def add(target: str, kind: str, count: int):
+        kinds = targets.setdefault(target, {})
+        kinds[kind] = kinds.get(kind, 0) + count
+    
+    single_imports = {}
+    wildcard_packages = []
+    for imp in analysis["imports"]:
+        if not _is_project_import(imp):
+            continue
+        if imp.endswith(".*"):
+            base = imp[:-2]
+            if base in package_index:
+                # Pacote inteiro: só as classes realmente citadas viram arestas
+                wildcard_packages.append(base)
+                continue
+            # a.b.C.* (membros de C): depende de C
+            owner = owning_class(base, class_map)
+            if owner:
+                add(owner, "import", 1)
+        else:
+            owner = owning_class(imp, class_map)
+            if owner:
+                single_imports[imp.rpartition('.')[2]] = owner
+                add(owner, "import", 1)
+    
+    local_types = set(analysis["local_types"])
+    package = analysis["package"]
+    for name, kinds in analysis["references"].items():
+        target = resolve_reference(name, package, single_imports, wildcard_packages,
+                                   local_types, class_map, package_index)
+        if target:
+            for kind, count in kinds.items():
+                add(target, kind, count)
+    return targets
+
+def edge_weight(kinds: Dict[str, int]) -> int:
+    return sum(REFERENCE_WEIGHTS.get(kind, 1) * count for kind, count in kinds.items())
+
+def build_dependency_graph(repo_path: str, ast_corpus: Optional["AstCorpus"] = None,
+                           references: Optional[bool] = None, cache_path: Optional[str] = None,
+                           workers: int = 1, stats: Optional[Dict] = None) -> nx.DiGraph:
+    """
+    Constrói o grafo de dependências do projeto.
+
+    Args:
+        repo_path: Raiz do repositório
+        ast_corpus: Corpus AST (--parse-repo); registros com o mesmo hash dispensam o parse
+        references: True = arestas das referências do AST (padrão com tree-sitter);
+            False = apenas imports (pacote e imports do corpus, se houver)
+        cache_path: Cache da análise por hash de conteúdo (modo referências)
+        workers: Processos para analisar os arquivos fora do cache
+        stats: Se informado, recebe as contagens da análise (corpus/cache/analisados)
+
+    As arestas têm "weight" (soma de REFERENCE_WEIGHTS por ocorrência) e "kinds"
+    ({tipo: ocorrências}). No modo imports, imports explícitos, estáticos e wildcard
+    são resolvidos pelo índice pacote -> classes e classes do mesmo pacote citadas
+    no arquivo também viram arestas (não precisam de import).
+    """
+    if references is None:
+        references = HAS_AST
+    if references and not HAS_AST:
+        print("[!] tree-sitter indisponível: usando apenas os imports.")
+        references = False
+    if references:
+        return _build_reference_graph(repo_path, ast_corpus, cache_path, workers, stats)
+    
     G = nx.DiGraph()
     
     # Mapa: FullClassName -> FilePath
@@ -41,40 +372,73 @@ def build_dependency_graph(repo_path: str) -> nx.DiGraph:
     
     # 1. Primeiro passo: Mapear todas as classes disponíveis no projeto
     print("[*] Mapeando classes do projeto...")
-    repo = Path(repo_path)
-    java_files = list(repo.rglob("*.java"))
+    sources = collect_sources(repo_path, ast_corpus)
     
-    for file_path in java_files:
-        package, _ = scan_imports(file_path)
+    for file_path, package, _, _ in sources:
         class_name = file_path.stem
         full_name = f"{package}.{class_name}" if package else class_name
         
         class_map[full_name] = str(file_path)
         G.add_node(full_name, file_path=str(file_path))
 
-    print(f"[*] Total de classes mapeadas: {len(class_map)}")
+    package_index = build_package_index(class_map)
+    print(f"[*] Total de classes mapeadas: {len(class_map)} em {len(package_index)} pacotes")
 
-    # 2. Segundo passo: Criar arestas baseadas nos imports
+    # 2. Segundo passo: Criar arestas a partir dos imports e do próprio pacote
     print("[*] Analisando dependências...")
-    for file_path in java_files:
-        package, imports = scan_imports(file_path)
+    for file_path, package, imports, names in sources:
         class_name = file_path.stem
         current_full_name = f"{package}.{class_name}" if package else class_name
         
+        targets = set()
         for imp in imports:
-            # Dependência explícita (import com.l2j.Config)
-            if imp in class_map:
-                G.add_edge(current_full_name, imp)
-            
-            # Dependência Wildcard (import com.l2j.*)
-            elif imp.endswith(".*"):
-                base_pkg = imp[:-2]
-                for node in G.nodes():
-                    if node.startswith(base_pkg) and node != current_full_name:
-                         # Simplificação: assume dependência se estiver no mesmo pacote importado
-                         # (Idealmente checaria uso no código, mas imports servem como proxy forte)
-                         G.add_edge(current_full_name, node)
+            targets.update(resolve_import(imp, class_map, package_index))
+        
+        # Mesmo pacote: visível sem import, basta ser citado
+        same_package = package_index.get(package, {})
+        if len(names) < len(same_package):
+            targets.update(same_package[name] for name in names if name in same_package)
+        else:
+            targets.update(full for simple, full in same_package.items() if simple in names)
+        
+        targets.discard(current_full_name)
+        G.add_edges_from((current_full_name, target, {"weight": 1, "kinds": {"import": 1}}) for target in targets)
+
+    return G
 
+def _build_reference_graph(repo_path: str, ast_corpus: Optional["AstCorpus"], cache_path: Optional[str],
+                           workers: int, stats: Optional[Dict]) -> nx.DiGraph:
+    """build_dependency_graph no modo referências do AST."""
+    G = nx.DiGraph()
+    class_map = {}
+    
+    print("[*] Mapeando classes do projeto...")
+    sources, analysis_stats = collect_symbol_sources(repo_path, ast_corpus, cache_path, workers)
+    if stats is not None:
+        stats.update(analysis_stats)
+    print(f"[*] Análise de referências: {analysis_stats['analyzed']} analisados | "
+          f"{analysis_stats['cached']} do cache | {analysis_stats['corpus']} do corpus AST")
+    
+    names = []
+    for file_path, analysis in sources:
+        package = analysis["package"]
+        full_name = f"{package}.{file_path.stem}" if package else file_path.stem
+        class_map[full_name] = str(file_path)
+        G.add_node(full_name, file_path=str(file_path))
+        names.append(full_name)
+    
+    package_index = build_package_index(class_map)
+    print(f"[*] Total de classes mapeadas: {len(class_map)} em {len(package_index)} pacotes")
+    
+    print("[*] Resolvendo referências...")
+    for full_name, (_, analysis) in zip(names, sources):
+        targets = reference_targets(analysis, class_map, package_index)
+        targets.pop(full_name, None)
+        G.add_edges_from(
+            (full_name, target, {"weight": edge_weight(kinds), "kinds": kinds})
+            for target, kinds in targets.items()
+        )
+    
     return G
 
 def analyze_migration_order(G: nx.DiGraph) -> List[str]:
@@ -102,47 +466,106 @@ def analyze_migration_order(G: nx.DiGraph) -> List[str]:
         scc_order = list(nx.topological_sort(condensed_G))
         
         final_order = []
-        # Expandir os grupos (dentro do ciclo, a ordem não importa tanto, precisam ser migrados juntos)
+        # Expandir os grupos (migrados juntos; dentro do ciclo, o mais usado pelos demais vem antes)
         for scc_idx in reversed(scc_order):
             members = condensed_G.nodes[scc_idx]['members']
-            final_order.extend(members)
+            final_order.extend(order_cycle_members(G, members))
             
         return final_order
 
+def compute_migration_waves(G: nx.DiGraph) -> List[List[str]]:
+    """
+    Ondas de migração: níveis topológicos do grafo condensado (Leaves -> Roots).
+
+    A onda 0 tem as classes que não dependem de nenhuma outra do projeto; a onda k,
+    as que só dependem de ondas anteriores. Classes da mesma onda são independentes
+    entre si (exceto membros de um mesmo ciclo, que ficam juntos e na ordem de
+    order_cycle_members) e podem ser migradas em paralelo.
+    """
+    condensed_G = nx.condensation(G)
+    level = {}
+    # Sucessores = dependências: o nível de um grupo vem depois de todas elas
+    for scc_idx in reversed(list(nx.topological_sort(condensed_G))):
+        level[scc_idx] = 1 + max((level[dep] for dep in condensed_G.successors(scc_idx)), default=-1)
+    
+    groups: List[List[List[str]]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for scc_idx, wave in level.items():
+        groups[wave].append(order_cycle_members(G, condensed_G.nodes[scc_idx]['members']))
+    return [[name for members in sorted(wave) for name in members] for wave in groups]
+
+def order_cycle_members(G: nx.DiGraph, members) -> List[str]:
+    """
+    Ordem dentro de um ciclo: maior peso de entrada vindo dos outros membros primeiro
+    (empate por nome, para um plano determinístico).
+    """
+    if len(members) == 1:
+        return list(members)
+    members = set(members)
+    
+    def incoming(node: str) -> int:
+        return sum(data.get("weight", 1) for src, _, data in G.in_edges(node, data=True) if src in members)
+    
+    return sorted(members, key=lambda node: (-incoming(node), node))
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--repo", default="l2j_pipeline/temp_repos/l2j-server-login")
     parser.add_argument("--output", default="data/migration_plan.json")
+    parser.add_argument("--ast-corpus", help="Corpus AST (ast_parser.py --parse-repo) em vez de reler os arquivos")
+    parser.add_argument("--imports-only", action="store_true", help="Arestas só a partir dos imports (sem AST)")
+    parser.add_argument("--refs-cache", help="Cache da análise por hash (padrão data/dependency_cache/<repo>.json)")
+    parser.add_argument("--no-refs-cache", action="store_true", help="Reanalisa todos os arquivos sem cache")
+    parser.add_argument("--workers", type=int, default=default_reference_workers(),
+                        help="Processos para analisar arquivos fora do cache (1 = serial)")
     args = parser.parse_args()
     
     if not os.path.exists(args.repo):
         print(f"Repo não encontrado: {args.repo}")
         return
 
-    G = build_dependency_graph(args.repo)
+    ast_corpus = None
+    if args.ast_corpus:
+        if load_ast_corpus is None:
+            print("[!] tree-sitter indisponível: --ast-corpus ignorado.")
+        else:
+            ast_corpus = load_ast_corpus(args.ast_corpus)
+
+    cache_path = None if args.no_refs_cache else (args.refs_cache or default_reference_cache_path(args.repo))
+    analysis_stats = {}
+    G = build_dependency_graph(args.repo, ast_corpus, references=not args.imports_only,
+                               cache_path=cache_path, workers=args.workers, stats=analysis_stats)
     
     print(f"[*] Grafo construído: {G.number_of_nodes()} nós, {G.number_of_edges()} arestas")
     
     migration_order = analyze_migration_order(G)
+    migration_waves = compute_migration_waves(G)
     
     print(f"[*] Ordem de migração definida ({len(migration_order)} arquivos)")
     print(f"   Top 5 primeiros (Independentes): {migration_order[:5]}")
     print(f"   Top 5 últimos (Mais dependentes): {migration_order[-5:]}")
+    print(f"[*] {len(migration_waves)} ondas paralelas "
+          f"(maior: {max(map(len, migration_waves), default=0)} arquivos)")
     
     result = {
         "stats": {
             "nodes": G.number_of_nodes(),
-            "edges": G.number_of_edges()
+            "edges": G.number_of_edges(),
+            "waves": len(migration_waves),
+            **({"analysis": analysis_stats} if analysis_stats else {})
         },
         "migration_order": migration_order,
+        "migration_waves": migration_waves,
         "graph_data": nx.node_link_data(G)
     }
     
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
     with open(args.output, 'w') as f:
         json.dump(result, f, indent=2)
+    # Formato compacto (classe -> arquivo + CSR) lido pela API; gravado depois do JSON para não ficar mais antigo
+    compact = write_plan(plan_binary_path_for(args.output), G, migration_order, migration_waves, result["stats"])
         
     print(f"✅ Plano de migração salvo em: {args.output}")
+    print(f"   Compacto: {plan_binary_path_for(args.output)} ({compact['bytes'] / (1 << 20):.1f} MiB)")
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import os
@@ -6,6 +6,21 @@ import json
 import subprocess
 import glob
 import time
+import threading
+
+try:
+    from migration_plan import MigrationPlan, get_migration_plan, DEFAULT_PLAN_PATH
+except ImportError:
+    from l2j_pipeline.migration_plan import MigrationPlan, get_migration_plan, DEFAULT_PLAN_PATH
+
+try:
+    from job_queue import get_job_queue
+    from run_manifest import RunManifest, manifest_path_for, source_sha256, format_summary
+except ImportError:
+    from l2j_pipeline.job_queue import get_job_queue
+    from l2j_pipeline.run_manifest import RunManifest, manifest_path_for, source_sha256, format_summary
+
+DATASET_DIR = "data/synth_dataset"
 
 router = APIRouter(prefix="/migration", tags=["migration"])
 
@@ -14,11 +29,22 @@ class GenerateRequest(BaseModel):
     target_lang: str = "Go"
     model: str = "qwen/qwen3-coder"
     use_hrm_model: bool = False  # Mantido por compatibilidade, mas sempre usa híbrido
+    prefetch: int = 8  # Arquivos cujo contexto RLCoder é buscado em lote
+    workers: int = 4  # Requisições ao LLM em voo no pipeline (geração e testes; 1 = serial)
+    llm_cache: bool = True  # Reaproveita respostas do LLM já pagas (False = sempre chama o modelo)
+    resume: bool = True  # Pula arquivos já migrados em execuções anteriores (manifesto, mesmo hash do fonte)
 
 @router.get("/plan")
-async def get_migration_plan():
-    """Retorna o plano de migração (dependências e ordem)."""
-    return load_migration_plan_data()
+async def get_plan(offset: int = 0, limit: Optional[int] = None, graph: bool = False):
+    """
+    Retorna o plano de migração (ordem, ondas e estatísticas), paginado por offset/limit.
+
+    graph=true inclui os nós da janela e suas dependências (visualização do grafo).
+    """
+    plan = get_migration_plan(DEFAULT_PLAN_PATH)
+    if plan is None:
+        return {"error": "Plano não encontrado. Execute a Fase 1."}
+    return plan.window(max(0, offset), limit, graph)
 
 @router.get("/checkpoints")
 async def list_checkpoints():
@@ -64,91 +90,146 @@ async def list_checkpoints():
     return results
 
 @router.post("/generate")
-async def generate_dataset(req: GenerateRequest, background_tasks: BackgroundTasks):
-    """Inicia a geração usando HybridMigrationEngine (HRM+LLM+RLCoder)."""
+async def generate_dataset(req: GenerateRequest):
+    """Enfileira a geração usando HybridMigrationEngine (HRM+LLM+RLCoder); acompanhar em /jobs/{job_id}."""
+    job_id = get_job_queue().enqueue("migration", req.model_dump())
+    return {"message": "Hybrid migration queued (HRM+LLM+RLCoder)", "status": "queued", "job_id": job_id}
+
+def run_migration_job(ctx) -> Dict:
+    """
+    Job "migration" da fila (job_queue): migra as primeiras params["limit"] classes do plano.
+
+    Cada arquivo concluído é registrado no job e no manifesto de execuções
+    (data/synth_dataset/runs/hybrid.jsonl); ao retomar o job, ou em um job novo com
+    resume=True, os arquivos já migrados (mesmo hash do fonte, saída em disco) são
+    pulados. Um cancelamento para de iniciar arquivos e encerra após os que estão
+    em andamento.
+    """
+    req = GenerateRequest(**ctx.params)
+    print(f"[*] Starting Hybrid Migration (HRM+LLM+RLCoder) - limit={req.limit}")
+    
+    import sys
+    sys.path.append('l2j_pipeline')
+    from hybrid_migration_engine import HybridMigrationEngine
+    from rlcoder_adapter import prefetch_contexts
+    from llm_cache import format_stats as format_llm_cache_stats
+    from stage_pipeline import format_stats as format_pipeline_stats
+    
+    # Carregar plano de migração (memoizado no processo)
+    plan = get_migration_plan(DEFAULT_PLAN_PATH)
+    if plan is None:
+        raise RuntimeError("Migration plan not found")
     
-    def run_generation():
-        print(f"[*] Starting Hybrid Migration (HRM+LLM+RLCoder) - limit={req.limit}")
+    waves = plan_waves(plan, req.limit)
+    total = sum(map(len, waves))
+    ctx.set_total(total)
+    skipped = sum(1 for wave in waves for name in wave if ctx.is_done(name))
+    if skipped:
+        print(f"[*] Resuming: {skipped}/{total} files already migrated")
+    
+    # Inicializar engine híbrido
+    engine = HybridMigrationEngine(
+        target_lang=req.target_lang,
+        model=req.model,
+        use_hrm_guidance=True,  # Sempre usa guidance
+        use_llm_cache=req.llm_cache
+    )
+    manifest = RunManifest(manifest_path_for(DATASET_DIR, "hybrid"), run_id=f"job-{ctx.job_id}")
+    manifest.start_run(ctx.params)
+    
+    def load_java(class_name):
+        if ctx.is_done(class_name):
+            return None
+        file_path = plan.file_for(class_name)
+        if not file_path or not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            java_code = f.read()
+        if req.resume and manifest.is_complete(file_path, source_sha256(java_code)):
+            # Migrado em uma execução anterior e o fonte não mudou
+            manifest.skip()
+            ctx.item_done(class_name)
+            return None
+        return java_code
+    
+    progress = {"finished": skipped, "processed": 0}
+    progress_lock = threading.Lock()
+    
+    def on_result(item, result):
+        class_name, file_path, java_code = item["class_name"], item["file_path"], item["java_code"]
+        sha256 = source_sha256(java_code)
+        with progress_lock:
+            progress["finished"] += 1
+            finished = progress["finished"]
         
-        try:
-            # Usar HybridMigrationEngine diretamente
-            import sys
-            sys.path.append('l2j_pipeline')
-            from hybrid_migration_engine import HybridMigrationEngine
-            import json
-            
-            # Carregar plano de migração
-            plan = load_migration_plan_data()
-            if not plan or 'migration_order' not in plan:
-                print("❌ Migration plan not found")
-                return
-            
-            # Inicializar engine híbrido
-            engine = HybridMigrationEngine(
-                target_lang=req.target_lang,
-                model=req.model,
-                use_hrm_guidance=True  # Sempre usa guidance
-            )
-            
-            # Processar files em batch
-            processed = 0
-            for class_name in plan['migration_order'][:req.limit]:
-                # Encontrar file path
-                file_path = None
-                for node in plan.get('graph_data', {}).get('nodes', []):
-                    if node['id'] == class_name:
-                        file_path = node['file_path']
-                        break
-                
-                if not file_path or not os.path.exists(file_path):
-                    continue
-                
-                # Ler Java code
-                with open(file_path, 'r') as f:
-                    java_code = f.read()
-                
-                print(f"[{processed+1}/{req.limit}] Processing {class_name}...")
-                
-                # Gerar com engine híbrido
-                result = engine.generate_code(java_code, file_path)
-                
-                if result.get('success'):
-                    # Salvar no dataset
-                    os.makedirs("data/synth_dataset", exist_ok=True)
-                    safe_name = os.path.basename(file_path).replace('.', '_') + "_java.json"
-                    output_path = os.path.join("data/synth_dataset", safe_name)
-                    
-                    entry = {
-                        "source_file": file_path,
-                        "target_lang": req.target_lang,
-                        "model_used": req.model,
-                        "input_code": java_code,
-                        "output_code": result['code'],
-                        "test_code": result.get('test_code', ''),
-                        "guidance": result.get('guidance', {}),
-                        "reward": result.get('reward', {}),
-                        "attempts": result.get('attempts', 1),
-                        "timestamp": time.time(),
-                        "pipeline_version": "hybrid_v1_hrm_llm_rlcoder"
-                    }
-                    
-                    with open(output_path, 'w') as f:
-                        json.dump(entry, f, indent=2)
-                    
-                    print(f"   ✅ Success! Reward: {result['reward']['total']:.1f}/20")
-                    processed += 1
-                else:
-                    print(f"   ❌ Failed: {result.get('error')}")
+        if result.get('success'):
+            # Salvar no dataset
+            os.makedirs(DATASET_DIR, exist_ok=True)
+            safe_name = os.path.basename(file_path).replace('.', '_') + "_java.json"
+            output_path = os.path.join(DATASET_DIR, safe_name)
             
-            print(f"\n🎉 Batch complete: {processed}/{req.limit} files migrated")
+            entry = {
+                "source_file": file_path,
+                "target_lang": req.target_lang,
+                "model_used": req.model,
+                "input_code": java_code,
+                "output_code": result['code'],
+                "test_code": result.get('test_code', ''),
+                "guidance": result.get('guidance', {}),
+                "reward": result.get('reward', {}),
+                "attempts": result.get('attempts', 1),
+                "timestamp": time.time(),
+                "pipeline_version": "hybrid_v1_hrm_llm_rlcoder"
+            }
             
-        except Exception as e:
-            print(f"❌ Generation error: {e}")
-            import traceback
-            traceback.print_exc()
+            with open(output_path, 'w') as f:
+                json.dump(entry, f, indent=2)
             
-    background_tasks.add_task(run_generation)
-    return {"message": "Hybrid migration started (HRM+LLM+RLCoder)", "status": "processing"}
+            print(f"[{finished}/{total}] ✅ {class_name}: Success! Reward: {result['reward']['total']:.1f}/20")
+            manifest.record(file_path, "done", sha256, output=output_path, attempts=result.get('attempts', 1),
+                            usage=result.get('usage'), wall_time=result.get('wall_time', 0.0),
+                            class_name=class_name, reward=result.get('reward', {}).get('total'))
+            ctx.item_done(class_name)
+            with progress_lock:
+                progress["processed"] += 1
+        else:
+            print(f"[{finished}/{total}] ❌ {class_name}: Failed: {result.get('error')}")
+            # "error": um estágio levantou exceção; "failed": não passou na validação
+            status = "error" if result.get('exception') else "failed"
+            manifest.record(file_path, status, sha256, attempts=result.get('attempts', 1),
+                            usage=result.get('usage'), wall_time=result.get('wall_time', 0.0),
+                            error=result.get('error'), class_name=class_name)
+            ctx.item_failed(class_name)
+    
+    # Estágios do engine em pipeline (AST, retrieval, LLM, compilação, validação, testes);
+    # a vazão por estágio e o pool de processos do AST valem para todas as ondas
+    pipeline = engine.build_pipeline({"generate": req.workers, "tests": req.workers})
+    
+    def run_wave(wave):
+        # Contexto RLCoder buscado em lote à medida que o pipeline consome a onda
+        items = (
+            {"class_name": name, "file_path": plan.file_for(name), "java_code": java_code, "rlcoder_context": context}
+            for name, java_code, context in prefetch_contexts(engine.rlcoder, wave, load_java, window=req.prefetch)
+        )
+        engine.generate_code_many(items, on_result=on_result, stop=ctx.cancelled, pipeline=pipeline)
+    
+    # Onda a onda (dependências antes); dentro da onda, os arquivos são independentes
+    try:
+        run_migration_waves(waves, run_wave, stop=ctx.cancelled)
+    finally:
+        pipeline.close()
+        summary = manifest.end_run()
+        manifest.close()
+    
+    skipped += summary["skipped"]
+    print(f"\n🎉 Batch complete: {progress['processed']}/{total - skipped} files migrated"
+          + (f" ({skipped} already done)" if skipped else ""))
+    print(f"   Manifest: {format_summary(summary)}")
+    print(f"   Pipeline: {format_pipeline_stats(pipeline.stats())}")
+    if engine.llm_cache is not None:
+        print(f"   LLM cache: {format_llm_cache_stats(engine.llm_cache.stats())}")
+    return {"total": total, "migrated": progress["processed"], "skipped": skipped, "run": summary,
+            "pipeline": pipeline.stats()}
 
 @router.get("/dataset")
 async def list_dataset_entries():
@@ -268,9 +349,34 @@ async def generate_test_case(filename: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def load_migration_plan_data():
-    plan_path = "data/migration_plan.json"
-    if os.path.exists(plan_path):
-        with open(plan_path, "r") as f:
-            return json.load(f)
-    return {"error": "Plano não encontrado. Execute a Fase 1."}
+def plan_waves(plan: MigrationPlan, limit: Optional[int] = None) -> List[List[str]]:
+    """
+    Ondas de migração do plano (map_dependencies), truncadas nas primeiras `limit` classes.
+
+    Planos antigos, sem "migration_waves", viram uma onda por classe (ordem serial).
+    """
+    if limit is None:
+        return list(plan.waves())
+    result = []
+    for wave in plan.waves():
+        if limit <= 0:
+            break
+        result.append(wave[:limit])
+        limit -= len(result[-1])
+    return result
+
+def run_migration_waves(waves: List[List[str]], run_wave, stop=None):
+    """
+    Executa run_wave(onda) para cada onda, em ordem.
+
+    Uma onda só começa quando a anterior terminou (todas as suas dependências já
+    foram migradas); dentro dela, os arquivos são independentes e run_wave pode
+    processá-los em paralelo (HybridMigrationEngine.generate_code_many).
+    stop: () -> bool; se verdadeiro, nenhuma onda nova começa.
+    """
+    for index, wave in enumerate(waves, 1):
+        if stop is not None and stop():
+            print(f"[!] Interrompido antes da onda {index}/{len(waves)}")
+            break
+        print(f"[*] Onda {index}/{len(waves)}: {len(wave)} arquivo(s)")
+        run_wave(wave)
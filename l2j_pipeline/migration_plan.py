@@ -0,0 +1,287 @@
+"""
+Plano de Migração Compacto
+Formato binário do plano gerado por map_dependencies: classes e arquivos, ordem,
+ondas e o grafo de dependências em CSR, carregado uma vez por processo.
+
+Formato `<plano>.plan` (ao lado do migration_plan.json):
+    magic (8 bytes) | tamanho do header (uint64) | header JSON | arrays int32 (little-endian)
+
+O header traz "classes" e "files" (alinhados pelo id da classe), "stats" e o tamanho
+de cada array. Os arrays, nesta ordem:
+    order        ids na ordem de migração
+    wave_offsets onda w = wave_members[wave_offsets[w]:wave_offsets[w + 1]]
+    wave_members ids agrupados por onda
+    indptr       dependências de i = indices[indptr[i]:indptr[i + 1]] (CSR)
+    indices      ids das dependências
+    weights      peso de cada aresta (alinhado com indices)
+"""
+import os
+import sys
+import json
+import struct
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+PLAN_MAGIC = b"L2JPLAN\x01"
+PLAN_FORMAT_VERSION = 1
+PLAN_ARRAYS = ("order", "wave_offsets", "wave_members", "indptr", "indices", "weights")
+DEFAULT_PLAN_PATH = "data/migration_plan.json"
+
+
+def plan_binary_path_for(plan_path: str) -> str:
+    """Caminho do plano compacto, ao lado do plano JSON."""
+    base, _ = os.path.splitext(plan_path)
+    return base + ".plan"
+
+
+def _int_array(values) -> array:
+    result = array('i', values)
+    if sys.byteorder != 'little':
+        result.byteswap()
+    return result
+
+
+def write_plan(path: str, G, migration_order: List[str], migration_waves: List[List[str]],
+               stats: Optional[Dict] = None) -> Dict[str, int]:
+    """
+    Salva o plano compacto (escrita atômica).
+
+    Args:
+        G: Grafo de map_dependencies (nós com "file_path"; arestas com "weight")
+        migration_order: Ordem de migração (analyze_migration_order)
+        migration_waves: Ondas (compute_migration_waves)
+        stats: Estatísticas copiadas para o header
+    """
+    classes = sorted(G.nodes())
+    ids = {name: i for i, name in enumerate(classes)}
+    files = [G.nodes[name].get("file_path", "") for name in classes]
+
+    indptr = array('i', [0])
+    indices = array('i')
+    weights = array('i')
+    for name in classes:
+        targets = sorted((ids[target], data.get("weight", 1)) for target, data in G[name].items())
+        for target, weight in targets:
+            indices.append(target)
+            weights.append(weight)
+        indptr.append(len(indices))
+
+    wave_offsets = array('i', [0])
+    wave_members = array('i')
+    for wave in migration_waves:
+        wave_members.extend(ids[name] for name in wave)
+        wave_offsets.append(len(wave_members))
+
+    arrays = {
+        "order": array('i', (ids[name] for name in migration_order)),
+        "wave_offsets": wave_offsets,
+        "wave_members": wave_members,
+        "indptr": indptr,
+        "indices": indices,
+        "weights": weights
+    }
+    header = {
+        "version": PLAN_FORMAT_VERSION,
+        "stats": stats or {},
+        "classes": classes,
+        "files": files,
+        "lengths": {name: len(arrays[name]) for name in PLAN_ARRAYS}
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PLAN_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name in PLAN_ARRAYS:
+            _int_array(arrays[name]).tofile(f)
+    os.replace(tmp_path, path)
+    return {"classes": len(classes), "edges": len(indices), "bytes": os.path.getsize(path)}
+
+
+class MigrationPlan:
+    """
+    Plano de migração em memória: lookup classe -> arquivo em O(1) e vizinhança
+    de cada classe por fatia do CSR.
+    """
+
+    def __init__(self, classes: List[str], files: List[str], arrays: Dict[str, array],
+                 stats: Optional[Dict] = None):
+        self.classes = classes
+        self.files = files
+        self.stats = stats or {}
+        self.class_ids = {name: i for i, name in enumerate(classes)}
+        self.order = arrays["order"]
+        self.wave_offsets = arrays["wave_offsets"]
+        self.wave_members = arrays["wave_members"]
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.weights = arrays["weights"]
+
+    @classmethod
+    def load(cls, path: str) -> "MigrationPlan":
+        """Lê um plano compacto (write_plan)."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(PLAN_MAGIC)] != PLAN_MAGIC:
+            raise ValueError(f"Plano compacto inválido (magic): {path}")
+        header_len = struct.unpack_from('<Q', data, len(PLAN_MAGIC))[0]
+        offset = len(PLAN_MAGIC) + 8
+        header = json.loads(data[offset:offset + header_len])
+        if header.get("version") != PLAN_FORMAT_VERSION:
+            raise ValueError(f"{path}: plano compacto v{header.get('version')}, esperado v{PLAN_FORMAT_VERSION}")
+        offset += header_len
+
+        arrays = {}
+        for name in PLAN_ARRAYS:
+            size = 4 * header["lengths"][name]
+            values = array('i')
+            values.frombytes(data[offset:offset + size])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            arrays[name] = values
+            offset += size
+        return cls(header["classes"], header["files"], arrays, header.get("stats"))
+
+    @classmethod
+    def from_json(cls, plan: Dict) -> "MigrationPlan":
+        """Converte um plano JSON (node_link_data) para o formato em memória."""
+        graph = plan.get("graph_data", {})
+        classes = sorted(node["id"] for node in graph.get("nodes", []))
+        ids = {name: i for i, name in enumerate(classes)}
+        files = [""] * len(classes)
+        for node in graph.get("nodes", []):
+            files[ids[node["id"]]] = node.get("file_path", "")
+
+        adjacency: List[List[Tuple[int, int]]] = [[] for _ in classes]
+        for edge in graph.get("edges", graph.get("links", [])):
+            adjacency[ids[edge["source"]]].append((ids[edge["target"]], edge.get("weight", 1)))
+        indptr, indices, weights = array('i', [0]), array('i'), array('i')
+        for targets in adjacency:
+            for target, weight in sorted(targets):
+                indices.append(target)
+                weights.append(weight)
+            indptr.append(len(indices))
+
+        waves = plan.get("migration_waves") or [[name] for name in plan.get("migration_order", [])]
+        wave_offsets, wave_members = array('i', [0]), array('i')
+        for wave in waves:
+            wave_members.extend(ids[name] for name in wave)
+            wave_offsets.append(len(wave_members))
+
+        arrays = {
+            "order": array('i', (ids[name] for name in plan.get("migration_order", []))),
+            "wave_offsets": wave_offsets,
+            "wave_members": wave_members,
+            "indptr": indptr,
+            "indices": indices,
+            "weights": weights
+        }
+        return cls(classes, files, arrays, plan.get("stats"))
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    @property
+    def num_waves(self) -> int:
+        return len(self.wave_offsets) - 1
+
+    def file_for(self, class_name: str) -> Optional[str]:
+        """Arquivo Java da classe (None se não estiver no plano)."""
+        class_id = self.class_ids.get(class_name)
+        return self.files[class_id] if class_id is not None else None
+
+    def migration_order(self, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        """Janela da ordem de migração."""
+        end = len(self.order) if limit is None else offset + limit
+        return [self.classes[i] for i in self.order[offset:end]]
+
+    def wave(self, index: int) -> List[str]:
+        start, end = self.wave_offsets[index], self.wave_offsets[index + 1]
+        return [self.classes[i] for i in self.wave_members[start:end]]
+
+    def waves(self) -> Iterator[List[str]]:
+        for index in range(self.num_waves):
+            yield self.wave(index)
+
+    def dependencies(self, class_name: str) -> List[Tuple[str, int]]:
+        """(classe, peso) das dependências diretas de uma classe."""
+        class_id = self.class_ids[class_name]
+        start, end = self.indptr[class_id], self.indptr[class_id + 1]
+        return [(self.classes[target], weight)
+                for target, weight in zip(self.indices[start:end], self.weights[start:end])]
+
+    def window(self, offset: int = 0, limit: Optional[int] = None, graph: bool = False) -> Dict:
+        """
+        Janela do plano para a API: ordem de migração paginada e, com graph=True,
+        os nós da janela e suas arestas de saída (para a visualização do grafo).
+        """
+        order = self.migration_order(offset, limit)
+        result = {
+            "stats": self.stats,
+            "total": len(self.order),
+            "offset": offset,
+            "limit": limit,
+            "waves": self.num_waves,
+            "migration_order": order
+        }
+        if graph:
+            result["nodes"] = [{"id": name, "file_path": self.file_for(name)} for name in order]
+            result["edges"] = [
+                {"source": name, "target": target, "weight": weight}
+                for name in order for target, weight in self.dependencies(name)
+            ]
+        return result
+
+
+def load_plan_file(plan_path: str) -> MigrationPlan:
+    """Plano compacto ao lado do JSON, se existir e não for mais antigo; senão, o JSON."""
+    binary_path = plan_binary_path_for(plan_path)
+    if os.path.exists(binary_path) and (
+        not os.path.exists(plan_path) or os.path.getmtime(binary_path) >= os.path.getmtime(plan_path)
+    ):
+        return MigrationPlan.load(binary_path)
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        return MigrationPlan.from_json(json.load(f))
+
+
+# Uma instância por processo (ver process_state)
+_plans: Dict[str, Tuple[Tuple, MigrationPlan]] = process_singleton("migration_plan.plans", dict)
+_plans_lock = process_singleton("migration_plan.plans_lock", threading.Lock)
+
+
+def _plan_signature(plan_path: str) -> Tuple:
+    signature = []
+    for path in (plan_path, plan_binary_path_for(plan_path)):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_migration_plan(plan_path: str = DEFAULT_PLAN_PATH) -> Optional[MigrationPlan]:
+    """
+    Plano carregado uma vez por processo e recarregado só quando o arquivo muda
+    (mtime/tamanho do JSON e do compacto). None se não houver plano.
+    """
+    key = os.path.abspath(plan_path)
+    signature = _plan_signature(plan_path)
+    if signature == (None, None):
+        return None
+    with _plans_lock:
+        cached = _plans.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        plan = load_plan_file(plan_path)
+        _plans[key] = (signature, plan)
+        return plan
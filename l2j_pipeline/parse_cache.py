@@ -0,0 +1,144 @@
+"""
+Cache de Parse do EnterpriseJavaParser
+sha256 do código-fonte -> AST estruturado (package, imports, c_structure).
+
+Dois níveis:
+    memória -> LRU por processo (AST_PARSE_CACHE_SIZE entradas, padrão 512)
+    disco   -> opcional, um JSON por hash em `<dir>/<2 primeiros hex>/<hash>.json`
+               (AST_PARSE_CACHE_DIR ou o parâmetro `directory`)
+
+A chave inclui AST_SCHEMA_VERSION: mudanças no formato extraído invalidam o cache
+sem precisar apagá-lo. O `file_path` não faz parte do valor em cache (o mesmo
+conteúdo em caminhos diferentes compartilha a entrada).
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+# Versão do formato produzido por EnterpriseJavaParser.parse_source
+AST_SCHEMA_VERSION = 4
+DEFAULT_MEMORY_ENTRIES = 512
+
+
+def source_key(source: bytes) -> str:
+    """Chave do cache: versão do schema + hash do conteúdo."""
+    h = hashlib.sha256(f"ast-v{AST_SCHEMA_VERSION}\0".encode('ascii'))
+    h.update(source)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    Cache thread-safe de ASTs estruturados.
+
+    get() devolve cópias: quem recebe o AST pode alterá-lo sem afetar o cache.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MEMORY_ENTRIES, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "disk_errors": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """AST em cache (memória, depois disco) ou None."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+
+        if self.directory:
+            try:
+                with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except FileNotFoundError:
+                value = None
+            except (OSError, ValueError):
+                value = None
+                with self._lock:
+                    self._stats["disk_errors"] += 1
+            if value is not None:
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                    self._remember(key, value)
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: Dict):
+        """Guarda o AST na memória e, se configurado, no disco (escrita atômica)."""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, value)
+        if self.directory:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(value, f, separators=(',', ':'))
+                os.replace(tmp_path, path)
+            except OSError:
+                with self._lock:
+                    self._stats["disk_errors"] += 1
+
+    def _remember(self, key: str, value: Dict):
+        """Insere no LRU em memória (com lock)."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hits por nível, misses e taxa de acerto."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["directory"] = self.directory
+        return stats
+
+    def clear(self):
+        """Esvazia o nível em memória (o disco é mantido)."""
+        with self._lock:
+            self._memory.clear()
+
+
+# Uma instância por processo (ver process_state)
+_shared = process_singleton("parse_cache.shared", lambda: {"cache": None})
+_shared_lock = process_singleton("parse_cache.shared_lock", threading.Lock)
+
+
+def get_parse_cache() -> ParseCache:
+    """
+    Retorna o cache compartilhado do processo.
+
+    Configuração: AST_PARSE_CACHE_SIZE (entradas em memória) e AST_PARSE_CACHE_DIR
+    (liga o nível em disco).
+    """
+    with _shared_lock:
+        if _shared["cache"] is None:
+            size = int(os.getenv("AST_PARSE_CACHE_SIZE", DEFAULT_MEMORY_ENTRIES))
+            _shared["cache"] = ParseCache(size, os.getenv("AST_PARSE_CACHE_DIR") or None)
+        return _shared["cache"]
@@ -5,11 +5,13 @@ Gera dados de treino para o modelo HRM aprender a dar orientação arquitetural.
 import json
 import os
 from pathlib import Path
-from typing import Dict, List
-from openai import OpenAI
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from ast_parser import EnterpriseJavaParser
+from ast_corpus import AstCorpus, load_ast_corpus
 from domain_orchestrator import DomainOrchestrator
+from llm_client import get_llm_client
+from llm_cache import open_llm_cache, format_stats
 
 load_dotenv()
 
@@ -19,24 +21,30 @@ class GuidanceDatasetGenerator:
     Output: Triplas (Java + AST) -> Architectural Guidance
     """
     
-    def __init__(self, model: str = "qwen/qwen3-coder"):
+    def __init__(self, model: str = "qwen/qwen3-coder", ast_corpus: Optional[AstCorpus] = None,
+                 use_llm_cache: bool = True):
         self.model = model
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=os.getenv("OPENROUTER_API_KEY")
-        )
+        self.client = get_llm_client(os.getenv("OPENROUTER_API_KEY"))
+        self.llm_cache = open_llm_cache(use_llm_cache)
         self.parser = EnterpriseJavaParser()
+        self.ast_corpus = ast_corpus
         self.orchestrator = DomainOrchestrator()
+
+    def parse_ast(self, java_code: str, file_path: str) -> Dict:
+        """AST do corpus (se houver e o conteúdo bater) ou parse com cache por hash."""
+        if self.ast_corpus is not None:
+            return self.ast_corpus.parse(self.parser, java_code, file_path)
+        return self.parser.parse_source(java_code, file_path)
     
     def generate_guidance(self, java_code: str, file_path: str) -> Dict:
         """
         Usa LLM para gerar guidance arquitetural de alto nível.
         """
-        # Parse AST
-        ast_data = self.parser.parse_file(file_path)
+        # Parse AST (cache por hash do conteúdo: prepare_dataset reaproveita este parse)
+        ast_data = self.parse_ast(java_code, file_path)
         
         # Classificar domínio
-        domain = self.orchestrator.classify_file(file_path, ast_data)
+        domain = self.orchestrator.classify_file(file_path, ast_data.get('package', ''))
         
         # Prompt para guidance
         prompt = f"""You are an expert software architect for MMORPG servers.
@@ -52,8 +60,8 @@ JAVA CLASS:
 
 AST CONTEXT:
 - Package: {ast_data.get('package', 'unknown')}
-- Classes: {len(ast_data.get('classes', []))}
-- Methods: {sum(len(c.get('methods', [])) for c in ast_data.get('classes', []))}
+- Classes: {len(ast_data.get('c_structure', []))}
+- Methods: {sum(len(c.get('methods', [])) for c in ast_data.get('c_structure', []))}
 
 Provide guidance in JSON format:
 {{
@@ -66,14 +74,13 @@ Provide guidance in JSON format:
 }}
 """
         
-        response = self.client.chat.completions.create(
+        content = self.client.chat(
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.1
+            temperature=0.1,
+            cache=self.llm_cache
         )
         
-        content = response.choices[0].message.content
-        
         # Extrair JSON
         try:
             # Procurar bloco JSON
@@ -136,7 +143,7 @@ Provide guidance in JSON format:
                     "java_code": java_code,
                     "file_path": file_path,
                     "class_name": class_name,
-                    "ast": self.parser.parse_file(file_path)
+                    "ast": self.parse_ast(java_code, file_path)
                 },
                 "output": {
                     "guidance": guidance
@@ -157,6 +164,8 @@ Provide guidance in JSON format:
         
         print(f"✅ Generated {len(dataset)} guidance examples")
         print(f"   Saved to: {output_dir}")
+        if self.llm_cache is not None:
+            print(f"   Cache do LLM: {format_stats(self.llm_cache.stats())}")
         
         return dataset
 
@@ -169,8 +178,11 @@ if __name__ == "__main__":
     parser.add_argument("--output", default="data/hrm_guidance_dataset")
     parser.add_argument("--limit", type=int, default=50)
     parser.add_argument("--model", default="qwen/qwen3-coder")
+    parser.add_argument("--ast-corpus", default=None, help="Corpus AST (ast_parser.py --parse-repo)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Ignora o cache de respostas do LLM")
     
     args = parser.parse_args()
     
-    generator = GuidanceDatasetGenerator(model=args.model)
+    generator = GuidanceDatasetGenerator(model=args.model, ast_corpus=load_ast_corpus(args.ast_corpus),
+                                         use_llm_cache=not args.no_llm_cache)
     generator.prepare_dataset(args.plan, args.output, args.limit)
@@ -0,0 +1,41 @@
+"""
+Estado Compartilhado do Processo
+Os módulos do pipeline são importados pelo nome simples (scripts em l2j_pipeline/,
+migration_api após sys.path.append) e como l2j_pipeline.<módulo> (API), e cada forma
+carrega uma cópia própria do módulo. Registries, caches e pools obtidos com
+process_singleton() existem uma única vez por processo, qualquer que seja a cópia
+(inclusive deste módulo) que os pediu.
+"""
+import sys
+import types
+import threading
+from typing import Any, Callable
+
+# Namespace registrado em sys.modules: o mesmo objeto para todas as cópias deste módulo
+_NAMESPACE = "_l2j_pipeline_process_state"
+
+
+def _namespace() -> types.ModuleType:
+    namespace = sys.modules.get(_NAMESPACE)
+    if namespace is None:
+        candidate = types.ModuleType(_NAMESPACE)
+        candidate.values = {}
+        candidate.lock = threading.RLock()
+        # setdefault é atômico: duas threads criando ao mesmo tempo ficam com o mesmo
+        namespace = sys.modules.setdefault(_NAMESPACE, candidate)
+    return namespace
+
+
+def process_singleton(name: str, factory: Callable[[], Any]) -> Any:
+    """
+    Valor único do processo para `name`, criado com factory() no primeiro pedido.
+
+    Args:
+        name: Chave estável, independente do nome de import (ex.: "llm_cache.caches")
+        factory: Cria o valor (ex.: dict, threading.Lock, RetrieverRegistry)
+    """
+    namespace = _namespace()
+    with namespace.lock:
+        if name not in namespace.values:
+            namespace.values[name] = factory()
+        return namespace.values[name]
@@ -5,15 +5,30 @@ Gerencia múltiplos repositórios para indexação e retrieval.
 import os
 import json
 import subprocess
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 
+try:
+    from l2j_pipeline.index_store import load_index_metadata
+except ImportError:
+    from index_store import load_index_metadata
+
+
+L2J_INDEX_COMMAND = [".venv/bin/python", "l2j_pipeline/index_l2j_repo.py"]
+
+
+def _run_command(cmd: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(cmd, check=True, capture_output=True, text=True)
+
 
 class RepositoryManager:
     """Gerenciador de repositórios para RLCoder."""
     
-    def __init__(self, config_path: str = "data/rlcoder_repos.json"):
+    def __init__(self, config_path: str = "data/rlcoder_repos.json",
+                 run_command: Optional[Callable[[List[str]], subprocess.CompletedProcess]] = None):
         self.config_path = config_path
+        # git clone / indexação (um job da fila passa ctx.run_command: cancelável)
+        self.run_command = run_command or _run_command
         self.repos_dir = "l2j_pipeline/temp_repos"
         self.index_dir = "data/rlcoder_index"
         self._ensure_directories()
@@ -37,6 +52,23 @@ class RepositoryManager:
         with open(self.config_path, 'w') as f:
             json.dump(self.config, f, indent=2)
     
+    def _notify_retrievers(self, index_path: Optional[str], activate: bool = False):
+        """Avisa o registry de retrieval deste processo para trocar/recarregar o índice."""
+        try:
+            from retriever_registry import notify_index_changed
+        except ImportError:
+            from l2j_pipeline.retriever_registry import notify_index_changed
+        try:
+            notify_index_changed(index_path, activate=activate)
+        except Exception as e:
+            print(f"[!] Falha ao recarregar índice em memória: {e}")
+    
+    def _active_index_path(self) -> Optional[str]:
+        active = self.get_active_repo()
+        if active and active["indexed"]:
+            return active["index_path"]
+        return None
+    
     def list_repos(self) -> Dict:
         """Lista todos os repositórios."""
         return {
@@ -59,16 +91,15 @@ class RepositoryManager:
             raise ValueError(f"Repositório '{name}' já existe")
         
         local_path = os.path.join(self.repos_dir, name)
+        if os.path.exists(local_path):
+            # Clone interrompido (job cancelado ou worker morto): recomeça do zero
+            import shutil
+            shutil.rmtree(local_path)
         
         # Clonar repositório
         print(f"[*] Clonando {url}...")
         try:
-            subprocess.run(
-                ["git", "clone", url, local_path],
-                check=True,
-                capture_output=True,
-                text=True
-            )
+            self.run_command(["git", "clone", url, local_path])
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Erro ao clonar repositório: {e.stderr}")
         
@@ -92,48 +123,65 @@ class RepositoryManager:
         self._save_config()
         return repo_info
     
-    def index_repo(self, name: str) -> Dict:
+    def index_repo(self, name: str, incremental: bool = True, ann_type: Optional[str] = None,
+                   streaming: Optional[bool] = None) -> Dict:
         """
         Indexa um repositório.
         
         Args:
             name: Nome do repositório
+            incremental: Reprocessa apenas arquivos alterados desde a última
+                         indexação (manifesto por hash de conteúdo)
+            ann_type: Tipo do índice FAISS ("auto", "flat", "ivf_flat", "hnsw",
+                      "ivf_pq"); fica salvo no repositório para as próximas indexações
+            streaming: Indexação em lotes com memória limitada (repos maiores que
+                       a RAM); também fica salvo no repositório
             
         Returns:
-            Stats da indexação
+            Stats da indexação (inclui arquivos reaproveitados/recalculados)
         """
         if name not in self.config["repositories"]:
             raise ValueError(f"Repositório '{name}' não encontrado")
         
         repo = self.config["repositories"][name]
         index_path = os.path.join(self.index_dir, f"{name}.json")
+        if ann_type:
+            repo["ann_type"] = ann_type
+        if streaming is not None:
+            repo["streaming"] = streaming
         
         # Executar indexação
         print(f"[*] Indexando {name}...")
+        cmd = [
+            ".venv/bin/python",
+            "l2j_pipeline/index_l2j_repo.py",
+            "--repo", repo["local_path"],
+            "--output", index_path,
+            "--ann", repo.get("ann_type", "auto")
+        ]
+        if incremental:
+            cmd.append("--incremental")
+        if repo.get("streaming"):
+            cmd.append("--streaming")
         try:
-            result = subprocess.run(
-                [
-                    ".venv/bin/python",
-                    "l2j_pipeline/index_l2j_repo.py",
-                    "--repo", repo["local_path"],
-                    "--output", index_path
-                ],
-                check=True,
-                capture_output=True,
-                text=True
-            )
+            result = self.run_command(cmd)
             print(result.stdout)
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Erro na indexação: {e.stderr}")
         
-        # Carregar stats do índice
-        with open(index_path, 'r') as f:
-            index_data = json.load(f)
+        # Carregar stats do índice (apenas metadados)
+        metadata = load_index_metadata(index_path)
         
+        last_build = metadata.get("last_build", {})
         stats = {
-            "files": index_data["metadata"]["total_files"],
-            "lines": index_data["metadata"]["total_lines"],
-            "classes": len(index_data["class_map"])
+            "files": metadata["total_files"],
+            "lines": metadata["total_lines"],
+            "classes": metadata["classes"],
+            "mode": last_build.get("mode", "full"),
+            "reused": last_build.get("reused", 0),
+            "recomputed": last_build.get("recomputed", metadata["total_files"]),
+            "deleted": last_build.get("deleted", 0),
+            "semantic_index": (metadata.get("semantic_index") or {}).get("type")
         }
         
         # Atualizar configuração
@@ -142,6 +190,8 @@ class RepositoryManager:
         self.config["repositories"][name]["stats"] = stats
         self._save_config()
         
+        self._notify_retrievers(index_path, activate=(self.config["active_repo"] == name))
+        
         return stats
     
     def activate_repo(self, name: str):
@@ -151,6 +201,7 @@ class RepositoryManager:
         
         self.config["active_repo"] = name
         self._save_config()
+        self._notify_retrievers(self._active_index_path(), activate=True)
     
     def delete_repo(self, name: str):
         """
@@ -169,15 +220,27 @@ class RepositoryManager:
             import shutil
             shutil.rmtree(repo["local_path"])
         
-        # Remover índice
-        if repo["index_path"] and os.path.exists(repo["index_path"]):
-            os.remove(repo["index_path"])
+        # Remover índice (e artefatos derivados: conteúdo, compacto, manifesto, FAISS)
+        if repo["index_path"]:
+            base = repo["index_path"]
+            for path in (
+                base,
+                base.replace('.json', '.content'),
+                base.replace('.json', '.legacy.json'),
+                base.replace('.json', '_compact.json'),
+                base.replace('.json', '_manifest.json'),
+                base.replace('.json', '.faiss'),
+                base.replace('.json', '.bm25'),
+            ):
+                if os.path.exists(path):
+                    os.remove(path)
         
         # Remover da configuração
         del self.config["repositories"][name]
         
         # Se era o ativo, limpar
-        if self.config["active_repo"] == name:
+        was_active = self.config["active_repo"] == name
+        if was_active:
             # Ativar outro repo se houver
             if self.config["repositories"]:
                 self.config["active_repo"] = list(self.config["repositories"].keys())[0]
@@ -185,6 +248,11 @@ class RepositoryManager:
                 self.config["active_repo"] = None
         
         self._save_config()
+        if repo["index_path"]:
+            # Índice removido do disco: descarta o snapshot em memória
+            self._notify_retrievers(repo["index_path"])
+        if was_active:
+            self._notify_retrievers(self._active_index_path(), activate=True)
     
     def get_active_repo(self) -> Optional[Dict]:
         """Retorna informações do repositório ativo."""
@@ -192,3 +260,52 @@ class RepositoryManager:
         if active_name and active_name in self.config["repositories"]:
             return self.config["repositories"][active_name]
         return None
+
+
+# ==================== Jobs da fila (job_queue) ====================
+
+def run_add_repo_job(ctx) -> Dict:
+    """Job "repo_add": clona e cadastra params["name"] / params["url"]."""
+    name = ctx.params["name"]
+    manager = RepositoryManager(run_command=ctx.run_command)
+    if ctx.is_done("clone") and name in manager.config["repositories"]:
+        return manager.config["repositories"][name]
+    ctx.set_total(1)
+    ctx.set_message(f"Clonando {ctx.params['url']}")
+    repo_info = manager.add_repo(name, ctx.params["url"])
+    ctx.item_done("clone")
+    print(f"[✅] Repositório {name} adicionado com sucesso!")
+    return repo_info
+
+
+def run_index_repo_job(ctx) -> Dict:
+    """
+    Job "repo_index": indexa params["name"] (ann_type/streaming opcionais).
+
+    A indexação é sempre incremental: retomar um job interrompido reaproveita os
+    arquivos que já estão no manifesto.
+    """
+    name = ctx.params["name"]
+    manager = RepositoryManager(run_command=ctx.run_command)
+    ctx.set_total(1)
+    ctx.set_message(f"Indexando {name}")
+    stats = manager.index_repo(name, ann_type=ctx.params.get("ann_type"),
+                               streaming=ctx.params.get("streaming"))
+    ctx.item_done(name)
+    print(f"[✅] Repositório {name} indexado com sucesso!")
+    print(f"   Stats: {stats}")
+    return stats
+
+
+def run_index_l2j_job(ctx) -> Dict:
+    """Job "index_l2j": indexa o repositório L2J padrão (index_l2j_repo.py)."""
+    ctx.set_total(1)
+    ctx.set_message("Indexando repositório L2J")
+    try:
+        result = ctx.run_command(L2J_INDEX_COMMAND)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Erro na indexação: {e.stderr}")
+    print(result.stdout)
+    ctx.item_done("l2j")
+    print("[✅] Indexação concluída!")
+    return {"index_path": "data/rlcoder_index/l2j_index.json"}
@@ -0,0 +1,253 @@
+"""
+Registry de Retrieval do RLCoder (por processo)
+Carrega cada índice (tabela + blob + FAISS) e cada encoder uma única vez por processo
+e troca o índice de forma atômica quando o repositório ativo muda ou é reindexado.
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+try:
+    from index_store import (
+        index_needs_conversion, load_index_metadata, load_file_table, open_content_store
+    )
+except ImportError:
+    from l2j_pipeline.index_store import (
+        index_needs_conversion, load_index_metadata, load_file_table, open_content_store
+    )
+
+try:
+    from keyword_index import open_keyword_index
+except ImportError:
+    from l2j_pipeline.keyword_index import open_keyword_index
+
+try:
+    from process_state import process_singleton
+except ImportError:
+    from l2j_pipeline.process_state import process_singleton
+
+try:
+    from sentence_transformers import SentenceTransformer
+    import faiss
+    try:
+        from ann_index import apply_search_params
+    except ImportError:
+        from l2j_pipeline.ann_index import apply_search_params
+    try:
+        from embedding_cache import opened_cache_stats
+    except ImportError:
+        from l2j_pipeline.embedding_cache import opened_cache_stats
+    HAS_SEMANTIC = True
+except ImportError:
+    HAS_SEMANTIC = False
+
+DEFAULT_ENCODER = 'all-MiniLM-L6-v2'
+
+
+class LoadedIndex:
+    """Snapshot imutável de um índice carregado (compartilhado entre adapters)."""
+
+    def __init__(self, index_path: str, version: Optional[int]):
+        self.index_path = index_path
+        self.faiss_path = index_path.replace('.json', '.faiss')
+        self.version = version  # mtime_ns do JSON de metadados (None = índice ausente)
+        self.needs_conversion = False  # índice v1: só a conversão explícita o torna legível
+        self.index_data = None
+        self.content_store = None
+        self.vector_rows = {}
+        self.chunk_rows = {}
+        self.keyword_index = None
+        self.class_rows = {}
+        self.semantic_index = None
+
+
+class RetrieverRegistry:
+    """
+    Cache thread-safe de índices e encoders.
+
+    get_index() devolve sempre o snapshot mais recente: se o JSON de metadados
+    mudou em disco (reindexação em outro processo), o índice é recarregado e
+    trocado sob lock; adapters que ainda usam o snapshot anterior não são afetados.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._indexes: Dict[str, LoadedIndex] = {}
+        self._encoders: Dict[str, object] = {}
+        self.active_index_path: Optional[str] = None
+        self._stats = {
+            "index_loads": 0,
+            "index_hits": 0,
+            "index_reloads": 0,
+            "encoder_loads": 0,
+            "encoder_hits": 0
+        }
+
+    @staticmethod
+    def _current_version(index_path: str) -> Optional[int]:
+        try:
+            return os.stat(index_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get_index(self, index_path: str) -> LoadedIndex:
+        """Retorna o índice carregado para index_path (carrega na primeira vez)."""
+        key = os.path.abspath(index_path)
+        version = self._current_version(index_path)
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is not None and cached.version == version:
+                self._stats["index_hits"] += 1
+                return cached
+
+        # Carregamento fora do lock principal: leitores de outros índices não esperam
+        with self._load_lock:
+            with self._lock:
+                cached = self._indexes.get(key)
+                if cached is not None and cached.version == self._current_version(index_path):
+                    self._stats["index_hits"] += 1
+                    return cached
+            loaded = self._load_index(index_path)
+            with self._lock:
+                if key in self._indexes:
+                    self._stats["index_reloads"] += 1
+                self._stats["index_loads"] += 1
+                self._indexes[key] = loaded
+            return loaded
+
+    def get_encoder(self, model_name: str = DEFAULT_ENCODER):
+        """Retorna o SentenceTransformer compartilhado (carrega na primeira vez)."""
+        with self._lock:
+            model = self._encoders.get(model_name)
+            if model is not None:
+                self._stats["encoder_hits"] += 1
+                return model
+        with self._load_lock:
+            with self._lock:
+                model = self._encoders.get(model_name)
+                if model is not None:
+                    self._stats["encoder_hits"] += 1
+                    return model
+            model = SentenceTransformer(model_name)
+            with self._lock:
+                self._encoders[model_name] = model
+                self._stats["encoder_loads"] += 1
+            return model
+
+    def reload(self, index_path: str) -> LoadedIndex:
+        """Força a recarga de um índice (ex.: após reindexação neste processo)."""
+        with self._lock:
+            self._indexes.pop(os.path.abspath(index_path), None)
+        return self.get_index(index_path)
+
+    def set_active(self, index_path: Optional[str], preload: bool = True):
+        """Define o índice ativo; adapters existentes passam a usá-lo na próxima busca."""
+        self.active_index_path = index_path
+        if index_path and preload and os.path.exists(index_path):
+            self.reload(index_path)
+
+    def invalidate(self, index_path: Optional[str] = None):
+        """Remove um índice (ou todos) do cache."""
+        with self._lock:
+            if index_path is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(os.path.abspath(index_path), None)
+
+    def stats(self) -> Dict:
+        """Contadores de carga/hit e índices em cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_indexes"] = [
+                loaded.index_path for loaded in self._indexes.values() if loaded.index_data is not None
+            ]
+            stats["legacy_indexes"] = [
+                loaded.index_path for loaded in self._indexes.values() if loaded.needs_conversion
+            ]
+            stats["cached_encoders"] = list(self._encoders)
+            stats["active_index_path"] = self.active_index_path
+        # Hits/misses dos caches de embeddings usados neste processo (queries e documentos)
+        stats["embedding_caches"] = opened_cache_stats() if HAS_SEMANTIC else []
+        return stats
+
+    def _load_index(self, index_path: str) -> LoadedIndex:
+        """Carrega tabela de arquivos, blob (mmap), BM25 e FAISS de um índice."""
+        if not os.path.exists(index_path):
+            return LoadedIndex(index_path, None)
+
+        print(f"[RLCoder] Carregando índice: {index_path}")
+        loaded = LoadedIndex(index_path, self._current_version(index_path))
+        # Índice JSON legado (conteúdo embutido): leitores não reescrevem arquivos
+        if index_needs_conversion(index_path):
+            print(f"[RLCoder] ⚠️  Índice no formato legado (v1). Converta com "
+                  f"`python l2j_pipeline/index_store.py convert {index_path}` ou reindexe o repositório.")
+            loaded.needs_conversion = True
+            return loaded
+
+        # Apenas a tabela de arquivos; o conteúdo fica no blob (mmap)
+        files, manifest = load_file_table(index_path)
+        loaded.content_store = open_content_store(index_path, manifest)
+        if loaded.content_store is None:
+            print(f"[RLCoder] ⚠️  Conteúdo do índice ausente/inconsistente. Reindexe o repositório.")
+            return loaded
+
+        loaded.index_data = {
+            "metadata": load_index_metadata(index_path),
+            "files": files
+        }
+
+        # vector_id (FAISS) -> posição em files
+        loaded.vector_rows = {
+            f.get('vector_id', i): i
+            for i, f in enumerate(files)
+        }
+
+        # id FAISS do chunk -> (posição em files, chunk); vazio em índices anteriores aos
+        # chunks, cujo FAISS usa o vector_id do arquivo
+        for row, f in enumerate(files):
+            for chunk in f.get('chunks', []):
+                loaded.chunk_rows[chunk['id']] = (row, chunk)
+
+        # Nome de classe -> posições em files (match léxico exato da busca híbrida)
+        for row, f in enumerate(files):
+            for class_name in f.get('classes', []):
+                loaded.class_rows.setdefault(class_name, []).append(row)
+
+        # Índice BM25 (ausente em índices construídos antes dele existir)
+        loaded.keyword_index = open_keyword_index(index_path)
+
+        if HAS_SEMANTIC and os.path.exists(loaded.faiss_path):
+            try:
+                print(f"[RLCoder] 🧠 Carregando índice semântico: {loaded.faiss_path}")
+                loaded.semantic_index = faiss.read_index(loaded.faiss_path)
+                # nprobe/efSearch ajustados na indexação (IVF/HNSW)
+                semantic_info = (loaded.index_data["metadata"] or {}).get("semantic_index") or {}
+                apply_search_params(loaded.semantic_index, semantic_info.get("params"))
+            except Exception as e:
+                print(f"[!] Falha ao carregar busca semântica: {e}")
+        return loaded
+
+
+# Uma única instância por processo (ver process_state)
+REGISTRY: RetrieverRegistry = process_singleton("retriever_registry.registry", RetrieverRegistry)
+
+
+def get_registry() -> RetrieverRegistry:
+    """Retorna o registry compartilhado do processo."""
+    return REGISTRY
+
+
+def notify_index_changed(index_path: Optional[str], activate: bool = False):
+    """
+    Hook chamado pelo RepositoryManager quando um índice é reconstruído ou ativado.
+
+    Recarrega o índice apenas se este processo já o usa (ou se for o novo ativo).
+    """
+    if activate:
+        REGISTRY.set_active(index_path)
+    elif index_path and (
+        os.path.abspath(index_path) in {os.path.abspath(p) for p in REGISTRY.stats()["cached_indexes"]}
+        or index_path == REGISTRY.active_index_path
+    ):
+        REGISTRY.reload(index_path)
@@ -4,95 +4,205 @@ Integrates RLRetriever (ICSE 2025) for intelligent code retrieval during transcr
 """
 import os
 import json
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from pathlib import Path
 
+try:
+    from retriever_registry import get_registry, DEFAULT_ENCODER
+except ImportError:
+    from l2j_pipeline.retriever_registry import get_registry, DEFAULT_ENCODER
+
+try:
+    from keyword_index import IDENTIFIER_RE
+except ImportError:
+    from l2j_pipeline.keyword_index import IDENTIFIER_RE
+
 try:
     from sentence_transformers import SentenceTransformer
     import faiss
     import numpy as np
+    try:
+        from embedding_cache import cached_encode
+    except ImportError:
+        from l2j_pipeline.embedding_cache import cached_encode
     HAS_SEMANTIC = True
 except ImportError:
     HAS_SEMANTIC = False
 
+# Reciprocal Rank Fusion: score = soma de 1 / (RRF_K + rank) sobre as listas
+RRF_K = 60
+# Candidatos por lista na busca híbrida (limita a latência independente do top_k)
+HYBRID_CANDIDATES = 50
+# Tamanho máximo do trecho retornado: método/tipo inteiro vs. prefixo do arquivo
+CHUNK_SNIPPET_CHARS = 2000
+FILE_SNIPPET_CHARS = 800
+# Arquivos cujo contexto é buscado de uma vez nos loops de migração em lote
+DEFAULT_PREFETCH = 8
+
+
 class RLCoderAdapter:
     """
     Adaptador para integrar o RLRetriever ao pipeline HRM.
     Permite busca inteligente de código relevante no repositório L2J.
+    
+    Índice, FAISS e encoder vêm do registry do processo: criar vários
+    adapters (ex.: um por request) não recarrega nada do disco.
     """
     
-    def __init__(self, index_path: Optional[str] = None):
+    def __init__(self, index_path: Optional[str] = None, retrieval_mode: str = "auto"):
         """
         Inicializa o adaptador RLCoder.
         
         Args:
             index_path: Caminho para o índice pré-construído do repositório.
                        Se None, será usado o caminho padrão.
+            retrieval_mode: "auto" (híbrido quando há FAISS + BM25), "hybrid",
+                            "semantic" ou "keyword"
         """
-        self.index_path = index_path or "data/rlcoder_index/l2j_index.json"
+        self.retrieval_mode = retrieval_mode
         self.index_path = index_path or "data/rlcoder_index/l2j_index.json"
         self.faiss_path = self.index_path.replace('.json', '.faiss')
         self.retriever = None
+        self.registry = get_registry()
+        self._loaded = None
+        self.index_data = None
+        self.content_store = None
         self.semantic_index = None
         self.model = None
+        self._vector_rows = {}
+        self._chunk_rows = {}
+        self.keyword_index = None
+        self._class_rows = {}
         self._load_retriever()
         
     def _load_semantic_model(self):
-        """Carrega modelo e índice FAISS se disponíveis."""
-        if not HAS_SEMANTIC: 
+        """Obtém o encoder compartilhado se houver índice FAISS."""
+        if not HAS_SEMANTIC or self.semantic_index is None:
+            self.model = None
             return
             
-        if os.path.exists(self.faiss_path):
-            try:
-                print(f"[RLCoder] 🧠 Carregando índice semântico: {self.faiss_path}")
-                self.semantic_index = faiss.read_index(self.faiss_path)
-                self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            except Exception as e:
-                print(f"[!] Falha ao carregar busca semântica: {e}")
+        try:
+            self.model = self.registry.get_encoder(DEFAULT_ENCODER)
+        except Exception as e:
+            print(f"[!] Falha ao carregar busca semântica: {e}")
+            self.semantic_index = None
+            self.model = None
 
     
     def _load_retriever(self):
         """Carrega o RLRetriever ou cria um mock se o índice não existir."""
-        # Tentar carregar repositório ativo
-        try:
-            from repo_manager import RepositoryManager
-            manager = RepositoryManager()
-            active_repo = manager.get_active_repo()
-            
-            if active_repo and active_repo['indexed'] and active_repo['index_path']:
-                self.index_path = active_repo['index_path']
-                print(f"[RLCoder] Usando repositório ativo: {active_repo['name']}")
-        except Exception as e:
-            print(f"[RLCoder] Erro ao carregar repo ativo: {e}")
-            # Fallback para caminho padrão
-            pass
-        
-        if os.path.exists(self.index_path):
-            print(f"[RLCoder] Carregando índice: {self.index_path}")
-            with open(self.index_path, 'r') as f:
-                self.index_data = json.load(f)
-            
-            # Tentar carregar semântico também
-            self._load_semantic_model()
+        # Repositório ativo já conhecido pelo registry (trocado por activate_repo/index_repo)
+        if self.registry.active_index_path:
+            self.index_path = self.registry.active_index_path
         else:
+            # Tentar carregar repositório ativo
+            try:
+                from repo_manager import RepositoryManager
+                manager = RepositoryManager()
+                active_repo = manager.get_active_repo()
+                
+                if active_repo and active_repo['indexed'] and active_repo['index_path']:
+                    self.index_path = active_repo['index_path']
+                    self.registry.set_active(self.index_path, preload=False)
+                    print(f"[RLCoder] Usando repositório ativo: {active_repo['name']}")
+            except Exception as e:
+                print(f"[RLCoder] Erro ao carregar repo ativo: {e}")
+                # Fallback para caminho padrão
+                pass
+        
+        self._bind(self.registry.get_index(self.index_path))
+        if self.index_data is None and not os.path.exists(self.index_path):
             print(f"[RLCoder] ⚠️  Índice não encontrado. Usando modo simulado.")
             print(f"[RLCoder] Acesse Config e adicione um repositório")
-            self.index_data = None
     
-    def retrieve_context(self, query_code: str, top_k: int = 5) -> Dict:
+    def _bind(self, loaded):
+        """Aponta o adapter para um snapshot do registry."""
+        self._loaded = loaded
+        self.index_path = loaded.index_path
+        self.faiss_path = loaded.faiss_path
+        self.index_data = loaded.index_data
+        self.content_store = loaded.content_store
+        self._vector_rows = loaded.vector_rows
+        self._chunk_rows = loaded.chunk_rows
+        self.keyword_index = loaded.keyword_index
+        self._class_rows = loaded.class_rows
+        self.semantic_index = loaded.semantic_index
+        self._load_semantic_model()
+    
+    def _refresh(self):
+        """Troca para o snapshot atual se o índice ativo mudou ou foi reindexado."""
+        index_path = self.registry.active_index_path or self.index_path
+        loaded = self.registry.get_index(index_path)
+        if loaded is not self._loaded:
+            self._bind(loaded)
+    
+    def retrieve_context(self, query_code: str, top_k: int = 5, mode: Optional[str] = None) -> Dict:
         """
         Busca código relevante usando RLRetriever.
         
         Args:
             query_code: Código Java que será traduzido
             top_k: Número de snippets relevantes a retornar
+            mode: Sobrescreve o retrieval_mode do adapter nesta chamada
             
         Returns:
             Dict com:
-                - relevant_code: Lista de snippets relevantes
+                - relevant_code: Lista de snippets relevantes (o método/tipo
+                  que casou quando o índice tem chunks)
                 - file_paths: Caminhos dos arquivos de origem
                 - similarity_scores: Scores de similaridade
+                - locations: Chunk de cada snippet (name, kind, start_line,
+                  end_line) ou None quando o snippet é o início do arquivo
         """
+        self._refresh()
+        self._require_index()
+        
+        mode = self._resolve_mode(mode or self.retrieval_mode)
+        
+        # Usar índice real para retrieval
+        try:
+            if mode == "hybrid":
+                 results = self._hybrid_retrieval(query_code, top_k)
+            elif mode == "semantic":
+                 results = self._semantic_retrieval(query_code, top_k)
+            else:
+                 results = self._keyword_retrieval(query_code, top_k)
+            return results
+        except Exception as e:
+            print(f"[!] Erro no retrieval (fallback para keyword): {e}")
+            return self._keyword_retrieval(query_code, top_k)
+    
+    def retrieve_context_batch(self, query_codes: Sequence[str], top_k: int = 5,
+                               mode: Optional[str] = None) -> List[Dict]:
+        """
+        Versão em lote de retrieve_context.
+        
+        Todas as queries são codificadas em um único forward do encoder e o FAISS
+        recebe uma única busca com a matriz de embeddings; BM25 e nomes de classe
+        continuam por query (já são O(termos da query)).
+        
+        Returns:
+            Um dict no formato de retrieve_context por query, na mesma ordem
+        """
+        if not query_codes:
+            return []
+        self._refresh()
+        self._require_index()
+        
+        mode = self._resolve_mode(mode or self.retrieval_mode)
+        try:
+            if mode in ("hybrid", "semantic"):
+                limit = max(top_k, HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+                semantic = self._semantic_candidates_batch(query_codes, limit)
+                if mode == "hybrid":
+                    return [self._hybrid_retrieval(q, top_k, s) for q, s in zip(query_codes, semantic)]
+                return [self._semantic_retrieval(q, top_k, s) for q, s in zip(query_codes, semantic)]
+            return [self._keyword_retrieval(q, top_k) for q in query_codes]
+        except Exception as e:
+            print(f"[!] Erro no retrieval em lote (fallback para keyword): {e}")
+            return [self._keyword_retrieval(q, top_k) for q in query_codes]
+    
+    def _require_index(self):
         if self.index_data is None:
             # ERRO EXPLICITO - Nunca usar simulado!
             raise RuntimeError(
@@ -103,40 +213,171 @@ class RLCoderAdapter:
                 "3. Click 'Index' (or wait for auto-indexing)\n"
                 "Context is REQUIRED for accurate migration."
             )
+    
+    def _resolve_mode(self, mode: str) -> str:
+        """Escolhe o modo efetivo conforme os índices disponíveis."""
+        has_semantic = self.semantic_index is not None and self.model is not None
+        if mode in ("auto", "hybrid"):
+            if has_semantic:
+                return "hybrid"
+            return "keyword"
+        if mode == "semantic" and not has_semantic:
+            return "keyword"
+        return mode
+    
+    def _semantic_candidates(self, query_code: str, limit: int) -> List:
+        """(row, score, chunk) do FAISS por similaridade de cosseno (chunk=None em índices por arquivo)."""
+        return self._semantic_candidates_batch([query_code], limit)[0]
+    
+    def _semantic_candidates_batch(self, query_codes: Sequence[str], limit: int) -> List[List]:
+        """Candidatos semânticos de várias queries: um encode em lote e uma busca FAISS."""
+        # Gerar embeddings das queries (usar apenas primeiros 1024 chars para velocidade);
+        # queries já vistas (mesmo arquivo em outra execução) saem do cache em disco
+        query_embeddings = cached_encode(self.model, DEFAULT_ENCODER, [q[:1024] for q in query_codes],
+                                         batch_size=32)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        faiss.normalize_L2(query_embeddings)
         
-        # Usar índice real para retrieval
-        try:
-            if self.semantic_index:
-                 results = self._semantic_retrieval(query_code, top_k)
-            else:
-                 results = self._keyword_retrieval(query_code, top_k)
-            return results
-        except Exception as e:
-            print(f"[!] Erro no retrieval (fallback para keyword): {e}")
-            return self._keyword_retrieval(query_code, top_k)
+        # Buscar no FAISS (matriz: uma linha por query)
+        scores, indices = self.semantic_index.search(query_embeddings, limit)
+        
+        results = []
+        for query_scores, query_indices in zip(scores, indices):
+            candidates = []
+            for score, idx in zip(query_scores, query_indices):
+                if self._chunk_rows:
+                    hit = self._chunk_rows.get(int(idx))
+                    if hit is not None:
+                        candidates.append((hit[0], float(score), hit[1]))
+                else:
+                    row = self._vector_rows.get(int(idx))
+                    if row is not None:
+                        candidates.append((row, float(score), None))
+            results.append(candidates)
+        return results
     
-    def _semantic_retrieval(self, query_code: str, top_k: int) -> Dict:
-        """Retrieval usando Embeddings + FAISS."""
-        # Gerar embedding da query (usar apenas primeiros 512 chars para velocidade)
-        query_embedding = self.model.encode([query_code[:1024]])
-        faiss.normalize_L2(query_embedding)
+    def _keyword_candidates(self, query_code: str, limit: int) -> List:
+        """(row, score) do índice BM25."""
+        if self.keyword_index is None:
+            return []
+        candidates = []
+        for vector_id, score in self.keyword_index.search(query_code, limit):
+            row = self._vector_rows.get(vector_id)
+            if row is not None:
+                candidates.append((row, score))
+        return candidates
+    
+    def _class_name_candidates(self, query_code: str, limit: int) -> List:
+        """(row, ocorrências) de arquivos que declaram classes citadas na query."""
+        mentions = {}
+        for match in IDENTIFIER_RE.finditer(query_code):
+            name = match.group(0)
+            if name[0].isupper() and name in self._class_rows:
+                mentions[name] = mentions.get(name, 0) + 1
+        
+        candidates = {}
+        for name, count in mentions.items():
+            for row in self._class_rows[name]:
+                candidates[row] = candidates.get(row, 0) + count
+        ranked = sorted(candidates.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+    
+    def _hybrid_retrieval(self, query_code: str, top_k: int, semantic_candidates: Optional[List] = None) -> Dict:
+        """
+        Fusão semântico (FAISS) + léxico (BM25 e nomes de classe) via Reciprocal Rank Fusion.
+        
+        Cada lista contribui com no máximo HYBRID_CANDIDATES candidatos; o score final
+        é normalizado para [0, 1] (1 = primeiro lugar em todas as listas).
+        semantic_candidates permite reaproveitar a busca FAISS feita em lote.
+        """
+        limit = max(top_k, HYBRID_CANDIDATES)
+        if semantic_candidates is None:
+            semantic_candidates = self._semantic_candidates(query_code, limit)
         
-        # Buscar no FAISS
-        scores, indices = self.semantic_index.search(query_embedding, top_k)
+        # A fusão é por arquivo; cada arquivo guarda o chunk semântico mais bem colocado
+        semantic = []
+        best_chunks = {}
+        for row, score, chunk in semantic_candidates:
+            if row not in best_chunks:
+                best_chunks[row] = chunk
+                semantic.append((row, score))
         
+        rankings = [
+            semantic,
+            self._keyword_candidates(query_code, limit),
+            self._class_name_candidates(query_code, limit)
+        ]
+        rankings = [r for r in rankings if r]
+        
+        fused = {}
+        for ranking in rankings:
+            for rank, (row, _) in enumerate(ranking, 1):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank)
+        
+        best_possible = len(rankings) / (RRF_K + 1) if rankings else 1.0
+        top = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
         relevant_files = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.index_data['files']):
-                file_info = self.index_data['files'][idx]
-                relevant_files.append({
-                    'file_info': file_info,
-                    'score': float(score)
-                })
-                
+        for row, score in top:
+            file_info = self.index_data['files'][row]
+            chunk = best_chunks.get(row) or self._lexical_chunk(file_info, query_code)
+            relevant_files.append({'file_info': file_info, 'score': score / best_possible, 'chunk': chunk})
+        return self._format_results(relevant_files, "hybrid")
+    
+    def _lexical_chunk(self, file_info: Dict, query_code: str, header_fallback: bool = True) -> Optional[Dict]:
+        """
+        Chunk de um arquivo encontrado só pela busca léxica.
+        
+        Prefere o método/construtor cujo nome aparece na query; senão o cabeçalho do
+        primeiro tipo (ou None se header_fallback=False). None quando o arquivo não
+        tem chunks (índice antigo).
+        """
+        chunks = file_info.get('chunks')
+        if not chunks:
+            return None
+        identifiers = set(IDENTIFIER_RE.findall(query_code))
+        for chunk in chunks:
+            if chunk['kind'] in ('method', 'constructor') and chunk['name'].rsplit('.', 1)[-1] in identifiers:
+                return chunk
+        if not header_fallback:
+            return None
+        for chunk in chunks:
+            if chunk['kind'] == 'type':
+                return chunk
+        return chunks[0]
+    
+    def _semantic_retrieval(self, query_code: str, top_k: int, semantic_candidates: Optional[List] = None) -> Dict:
+        """Retrieval usando Embeddings + FAISS (um resultado por chunk: o método que casou)."""
+        if semantic_candidates is None:
+            semantic_candidates = self._semantic_candidates(query_code, top_k)
+        relevant_files = [
+            {'file_info': self.index_data['files'][row], 'score': score, 'chunk': chunk}
+            for row, score, chunk in semantic_candidates[:top_k]
+        ]
         return self._format_results(relevant_files, "semantic")
 
     def _keyword_retrieval(self, query_code: str, top_k: int) -> Dict:
-        """Retrieval legado usando Keywords (Backup)."""
+        """Retrieval por keywords (BM25 no índice invertido)."""
+        if self.keyword_index is None:
+            return self._linear_keyword_retrieval(query_code, top_k)
+        
+        # Método citado na query -> retorna o corpo dele; senão o início do arquivo
+        relevant_files = []
+        for row, score in self._keyword_candidates(query_code, top_k):
+            file_info = self.index_data['files'][row]
+            chunk = self._lexical_chunk(file_info, query_code, header_fallback=False)
+            relevant_files.append({'file_info': file_info, 'score': score, 'chunk': chunk})
+        
+        # Se não encontrou nada relevante, pegar os primeiros arquivos
+        if not relevant_files:
+            relevant_files = [
+                {'file_info': f, 'score': 0.5}
+                for f in self.index_data['files'][:top_k]
+            ]
+        
+        return self._format_results(relevant_files, "keyword")
+    
+    def _linear_keyword_retrieval(self, query_code: str, top_k: int) -> Dict:
+        """Retrieval legado usando Keywords (índices sem BM25)."""
         # Extrair palavras-chave do código de consulta
         keywords = set()
         for word in query_code.split():
@@ -148,7 +389,7 @@ class RLCoderAdapter:
         relevant_files = []
         for file_info in self.index_data['files'][:top_k * 2]:  # Pegar mais arquivos para filtrar
             score = 0.0
-            content = file_info['content']
+            content = self._read_content(file_info)
             
             # Calcular score baseado em keywords
             for keyword in keywords:
@@ -174,10 +415,31 @@ class RLCoderAdapter:
         
         return self._format_results(relevant_files, "keyword")
         
+    def _read_content(self, file_info: Dict, max_chars: Optional[int] = None) -> str:
+        """Lê o conteúdo de um arquivo do blob (só as páginas necessárias)."""
+        return self.content_store.read(file_info['offset'], file_info['length'], max_chars)
+    
+    def _read_snippet(self, file_info: Dict, chunk: Optional[Dict]) -> str:
+        """Trecho exato do chunk no blob; sem chunk (ou chunk do arquivo inteiro), o início do arquivo."""
+        if chunk is None or chunk['kind'] == 'file':
+            return self._read_content(file_info, max_chars=FILE_SNIPPET_CHARS) + "..."
+        length = chunk['end_byte'] - chunk['start_byte']
+        text = self.content_store.read(file_info['offset'] + chunk['start_byte'], length,
+                                       max_chars=CHUNK_SNIPPET_CHARS + 1)
+        if len(text) > CHUNK_SNIPPET_CHARS:
+            return text[:CHUNK_SNIPPET_CHARS] + "..."
+        return text
+    
+    @staticmethod
+    def _location(chunk: Optional[Dict]) -> Optional[Dict]:
+        if chunk is None:
+            return None
+        return {k: chunk[k] for k in ('name', 'kind', 'start_line', 'end_line')}
+    
     def _format_results(self, relevant_files: List, mode: str) -> Dict:
         return {
             "relevant_code": [
-                f['file_info']['content'][:800] + "..."  
+                self._read_snippet(f['file_info'], f.get('chunk'))
                 for f in relevant_files
             ],
             "file_paths": [
@@ -188,6 +450,10 @@ class RLCoderAdapter:
                 f['score']
                 for f in relevant_files
             ],
+            "locations": [
+                self._location(f.get('chunk'))
+                for f in relevant_files
+            ],
             "mode": mode
         }
     
@@ -226,18 +492,54 @@ class RLCoderAdapter:
         elif context.get('mode') == 'real':
             lines.insert(1, "✅ [Usando índice real do repositório L2J]\n")
         
-        for i, (code, path, score) in enumerate(zip(
+        locations = context.get('locations') or [None] * len(context['relevant_code'])
+        for i, (code, path, score, location) in enumerate(zip(
             context['relevant_code'],
             context['file_paths'],
-            context['similarity_scores']
+            context['similarity_scores'],
+            locations
         ), 1):
-            lines.append(f"\n[{i}] Arquivo: {path} (similaridade: {score:.2f})")
+            if location and location['kind'] != 'file':
+                lines.append(f"\n[{i}] Arquivo: {path}:{location['start_line']}-{location['end_line']} "
+                             f"({location['name']}, similaridade: {score:.2f})")
+            else:
+                lines.append(f"\n[{i}] Arquivo: {path} (similaridade: {score:.2f})")
             lines.append(f"```java\n{code}\n```\n")
         
         return "\n".join(lines)
 
 
 # Utility functions for external use
+def prefetch_contexts(adapter: RLCoderAdapter, items: Sequence, load_code: Callable,
+                      window: int = DEFAULT_PREFETCH, top_k: int = 3) -> Iterator[Tuple]:
+    """
+    Itera itens de um loop de migração já com o contexto RLCoder de cada um.
+    
+    O contexto dos próximos `window` itens é buscado de uma vez com
+    retrieve_context_batch (um encode + uma busca FAISS por janela).
+    
+    Args:
+        adapter: Adapter RLCoder
+        items: Itens na ordem de processamento (ex.: migration_order)
+        load_code: item -> código Java, ou None para pular o item
+        window: Itens por lote de retrieval
+        top_k: Snippets por item
+        
+    Yields:
+        (item, java_code, context)
+    """
+    window = max(1, window)
+    for start in range(0, len(items), window):
+        batch = []
+        for item in items[start:start + window]:
+            code = load_code(item)
+            if code is not None:
+                batch.append((item, code))
+        contexts = adapter.retrieve_context_batch([code for _, code in batch], top_k)
+        for (item, code), context in zip(batch, contexts):
+            yield item, code, context
+
+
 def create_default_adapter() -> RLCoderAdapter:
     """Cria uma instância padrão do adaptador."""
     return RLCoderAdapter()
@@ -0,0 +1,167 @@
+"""
+Manifesto de Execução (migração em lote)
+Registro append-only (JSONL) de cada arquivo processado por uma execução de
+migração: status, tentativas, tokens e tempo, gravado assim que o arquivo termina.
+
+Uma execução nova (ou retomada após uma queda) pula os arquivos cujo último
+registro é "done" com o mesmo hash do fonte e cuja saída ainda existe; os demais
+(falhos, alterados, sem saída) são refeitos. Como a ordem do plano é fixa, isso
+retoma exatamente de onde a execução anterior parou.
+
+Linhas do arquivo:
+    {"event": "run_start", "run_id": ..., "params": {...}, "time": ...}
+    {"event": "file", "run_id": ..., "source_file": ..., "source_sha256": ...,
+     "status": "done" | "failed" | "error", "output": ..., "attempts": ...,
+     "prompt_tokens": ..., "completion_tokens": ..., "wall_time": ..., "time": ...}
+    {"event": "run_end", "run_id": ..., "summary": {...}, "time": ...}
+
+Uma linha truncada no fim (queda no meio da escrita) é ignorada na leitura.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from typing import Dict, Optional
+
+MANIFEST_DIR = "runs"
+
+
+def source_sha256(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def manifest_path_for(output_dir: str, pipeline: str) -> str:
+    """Manifesto de um pipeline dentro do diretório de saída (<saída>/runs/<pipeline>.jsonl)."""
+    return os.path.join(output_dir, MANIFEST_DIR, f"{pipeline}.jsonl")
+
+
+class RunManifest:
+    """
+    Manifesto de um diretório de saída; thread-safe (record() pode ser chamado pelos
+    workers de uma onda).
+    """
+
+    def __init__(self, path: str, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Dict] = {}
+        self._run = {"done": 0, "failed": 0, "error": 0, "skipped": 0,
+                     "prompt_tokens": 0, "completion_tokens": 0, "wall_time": 0.0}
+        self._load()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() and not self._ends_with_newline():
+            # Linha truncada por uma queda: a próxima começa numa linha nova
+            self._file.write("\n")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        """Último registro de cada arquivo em execuções anteriores."""
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("event") == "file":
+                    self._latest[record["source_file"]] = record
+
+    def _append(self, record: Dict):
+        """Grava uma linha e força para o disco (sobrevive a uma queda logo depois)."""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def start_run(self, params: Optional[Dict] = None):
+        self._append({"event": "run_start", "run_id": self.run_id, "params": params or {}, "time": time.time()})
+
+    def last_record(self, source_file: str) -> Optional[Dict]:
+        return self._latest.get(source_file)
+
+    def is_complete(self, source_file: str, sha256: str) -> bool:
+        """Arquivo já migrado com este mesmo fonte e com a saída ainda em disco."""
+        record = self._latest.get(source_file)
+        return bool(
+            record and record.get("status") == "done" and record.get("source_sha256") == sha256
+            and record.get("output") and os.path.exists(record["output"])
+        )
+
+    def skip(self):
+        """Conta um arquivo pulado (já concluído) nesta execução."""
+        with self._lock:
+            self._run["skipped"] += 1
+
+    def record(self, source_file: str, status: str, sha256: str, output: Optional[str] = None,
+               attempts: int = 1, usage: Optional[Dict] = None, wall_time: float = 0.0,
+               error: Optional[str] = None, **extra) -> Dict:
+        """
+        Registra um arquivo processado.
+
+        Args:
+            status: "done" (saída gravada), "failed" (não passou na validação) ou
+                    "error" (exceção)
+            usage: Tokens gastos no arquivo (llm_client.track_usage)
+            **extra: Campos adicionais (ex.: class_name, reward)
+        """
+        usage = usage or {}
+        record = {
+            "event": "file",
+            "run_id": self.run_id,
+            "source_file": source_file,
+            "source_sha256": sha256,
+            "status": status,
+            "output": output,
+            "attempts": attempts,
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "cache_hits": int(usage.get("cache_hits") or 0),
+            "wall_time": round(wall_time, 3),
+            "error": error,
+            "time": time.time(),
+            **extra
+        }
+        self._append(record)
+        with self._lock:
+            self._latest[source_file] = record
+            self._run[status] = self._run.get(status, 0) + 1
+            self._run["prompt_tokens"] += record["prompt_tokens"]
+            self._run["completion_tokens"] += record["completion_tokens"]
+            self._run["wall_time"] += wall_time
+        return record
+
+    def summary(self) -> Dict:
+        """Contadores desta execução."""
+        with self._lock:
+            summary = dict(self._run)
+        summary["wall_time"] = round(summary["wall_time"], 3)
+        summary["run_id"] = self.run_id
+        return summary
+
+    def end_run(self) -> Dict:
+        summary = self.summary()
+        self._append({"event": "run_end", "run_id": self.run_id, "summary": summary, "time": time.time()})
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def format_summary(summary: Dict) -> str:
+    """Resumo de uma linha para logs."""
+    return (f"run {summary['run_id']} | ok: {summary['done']} | falhas: {summary['failed'] + summary['error']} | "
+            f"pulados: {summary['skipped']} | tokens: {summary['prompt_tokens'] + summary['completion_tokens']:,} | "
+            f"tempo somado: {summary['wall_time']:.1f}s")
@@ -0,0 +1,283 @@
+"""
+Executor de Pipeline em Estágios
+Tarefas (dicts) passam por uma sequência de estágios ligados por filas limitadas;
+cada estágio tem seus próprios workers, então estágios diferentes trabalham em
+tarefas diferentes ao mesmo tempo (enquanto a tarefa N compila, a N+1 está no LLM
+e a N+2 no retrieval).
+
+Modos de estágio:
+    async    fn(task) é uma coroutine (I/O: chamadas ao LLM com llm_client.achat)
+    thread   fn(task) roda em um pool de threads do estágio (subprocessos, FAISS)
+    process  fn(task) roda em um pool de processos (CPU puro, ex.: parse do AST);
+             fn deve ser uma função de módulo e a tarefa, picklável. Os processos
+             saem do forkserver (não herdam threads/locks do processo principal) e
+             o pool é reaproveitado entre chamadas de run() até close()
+
+Roteamento: fn devolve None (segue para o próximo estágio), DONE (tarefa concluída)
+ou o nome de um estágio (ex.: volta para "generate" num retry). Voltar para um
+estágio anterior não espera vaga na fila (evita deadlock entre estágios cheios).
+Uma exceção em fn conclui a tarefa com task["error"].
+
+stats() mostra, por estágio, itens, tempo ocupado, espera na fila e utilização
+(tempo ocupado / workers / tempo total): o estágio mais utilizado é o gargalo.
+"""
+import time
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, List, Optional
+
+DONE = "__done__"
+STAGE_MODES = ("async", "thread", "process")
+# fork copiaria o estado do processo principal (threads do event loop, locks, clientes)
+PROCESS_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class Stage:
+    """Um estágio: nome, função, modo, número de workers e tamanho da fila de entrada."""
+
+    def __init__(self, name: str, fn: Callable, mode: str = "thread", workers: int = 1,
+                 queue_size: Optional[int] = None):
+        if mode not in STAGE_MODES:
+            raise ValueError(f"Modo de estágio inválido: {mode}")
+        self.name = name
+        self.fn = fn
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or 2 * self.workers
+
+
+class _BoundedQueue:
+    """Fila asyncio limitada em que put(force=True) ignora o limite (retries)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.max_depth = 0
+        self._cond = asyncio.Condition()
+
+    async def put(self, item, force: bool = False):
+        async with self._cond:
+            while not force and len(self.items) >= self.maxsize:
+                await self._cond.wait()
+            self.items.append(item)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self._cond.notify_all()
+
+    async def get(self):
+        async with self._cond:
+            while not self.items:
+                await self._cond.wait()
+            item = self.items.popleft()
+            self._cond.notify_all()
+            return item
+
+
+def _call_in_process(fn: Callable, task: Dict):
+    """Roda no processo worker: devolve a tarefa alterada junto com a rota."""
+    route = fn(task)
+    return task, route
+
+
+class StagePipeline:
+    """
+    Executa tarefas através dos estágios. Os contadores de stats() e os pools de
+    processos acumulam entre chamadas de run() (ex.: uma por onda de migração);
+    close() (ou `with`) encerra os pools.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("Pipeline sem estágios")
+        self.stages = stages
+        self.index = {stage.name: i for i, stage in enumerate(stages)}
+        self._stats = {stage.name: {"items": 0, "errors": 0, "busy": 0.0, "wait": 0.0, "max_queue": 0}
+                       for stage in stages}
+        self._stats_total = {"tasks": 0, "wall": 0.0}
+        self._process_pools: Dict[str, ProcessPoolExecutor] = {}
+
+    def _process_pool(self, stage: Stage) -> ProcessPoolExecutor:
+        """Pool do estágio em processo (criado no primeiro run())."""
+        pool = self._process_pools.get(stage.name)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=stage.workers,
+                                       mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+            self._process_pools[stage.name] = pool
+        return pool
+
+    def close(self):
+        """Encerra os pools de processos (um run() seguinte cria novos)."""
+        pools, self._process_pools = self._process_pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def run(self, items: Iterable[Dict], on_result: Optional[Callable[[Dict], None]] = None,
+            stop: Optional[Callable[[], bool]] = None) -> List[Dict]:
+        """
+        Processa `items` (iterável de dicts; pode ser um gerador lento, consumido sob
+        demanda conforme a primeira fila libera vaga).
+
+        Args:
+            on_result: Chamado (em uma thread) com cada tarefa assim que ela termina
+            stop: () -> bool; se verdadeiro, nenhuma tarefa nova entra (as em
+                  andamento terminam)
+
+        Returns:
+            Tarefas concluídas, na ordem de entrada
+        """
+        return asyncio.run(self.arun(items, on_result, stop))
+
+    async def arun(self, items: Iterable[Dict], on_result: Optional[Callable[[Dict], None]] = None,
+                   stop: Optional[Callable[[], bool]] = None) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        queues = [_BoundedQueue(stage.queue_size) for stage in self.stages]
+        # Um pool por estágio síncrono: threads encerradas no fim da execução,
+        # processos reaproveitados pelo próximo run()
+        executors: Dict[str, Executor] = {}
+        for stage in self.stages:
+            if stage.mode == "thread":
+                executors[stage.name] = ThreadPoolExecutor(max_workers=stage.workers)
+            elif stage.mode == "process":
+                executors[stage.name] = self._process_pool(stage)
+        # Leitura de `items` e callbacks fora do event loop
+        io_executor = ThreadPoolExecutor(max_workers=2)
+
+        finished: Dict[int, Dict] = {}
+        state = {"pending": 0, "fed": False}
+        all_done = asyncio.Event()
+
+        async def complete(seq: int, task: Dict):
+            finished[seq] = task
+            if on_result is not None:
+                try:
+                    await loop.run_in_executor(io_executor, on_result, task)
+                except Exception as e:
+                    print(f"   ❌ on_result: {type(e).__name__}: {e}")
+            state["pending"] -= 1
+            if state["fed"] and state["pending"] == 0:
+                all_done.set()
+
+        async def worker(position: int):
+            stage = self.stages[position]
+            stats = self._stats[stage.name]
+            while True:
+                job = await queues[position].get()
+                if job is None:
+                    return
+                seq, task, enqueued = job
+                started = time.perf_counter()
+                stats["wait"] += started - enqueued
+                try:
+                    if stage.mode == "async":
+                        route = await stage.fn(task)
+                    elif stage.mode == "thread":
+                        route = await loop.run_in_executor(executors[stage.name], stage.fn, task)
+                    else:
+                        updated, route = await loop.run_in_executor(
+                            executors[stage.name], _call_in_process, stage.fn, task)
+                        task.clear()
+                        task.update(updated)
+                    if route not in (None, DONE) and route not in self.index:
+                        raise ValueError(f"estágio desconhecido: {route}")
+                except Exception as e:
+                    broken = isinstance(e, BrokenProcessPool)
+                    if broken and self._process_pools.get(stage.name) is executors[stage.name]:
+                        # Worker morto: o próximo run() cria um pool novo
+                        del self._process_pools[stage.name]
+                        executors[stage.name].shutdown(wait=False)
+                    stats["errors"] += 1
+                    task["error"] = f"{stage.name}: {type(e).__name__}: {e}"
+                    route = DONE
+                stats["busy"] += time.perf_counter() - started
+                stats["items"] += 1
+
+                if route == DONE or (route is None and position + 1 == len(self.stages)):
+                    await complete(seq, task)
+                    continue
+                target = position + 1 if route is None else self.index[route]
+                # Para trás (retry) não espera vaga: o estágio de destino pode estar
+                # esperando vaga na fila deste
+                await queues[target].put((seq, task, time.perf_counter()), force=target <= position)
+
+        async def feed():
+            iterator = iter(items)
+            seq = 0
+            while not (stop is not None and stop()):
+                task = await loop.run_in_executor(io_executor, next, iterator, None)
+                if task is None:
+                    break
+                state["pending"] += 1
+                await queues[0].put((seq, task, time.perf_counter()))
+                seq += 1
+            state["fed"] = True
+            if state["pending"] == 0:
+                all_done.set()
+
+        start = time.perf_counter()
+        workers = [asyncio.create_task(worker(position))
+                   for position, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        try:
+            await feed()
+            await all_done.wait()
+        finally:
+            for position, stage in enumerate(self.stages):
+                for _ in range(stage.workers):
+                    await queues[position].put(None, force=True)
+            await asyncio.gather(*workers, return_exceptions=True)
+            for stage in self.stages:
+                if stage.mode == "thread":
+                    executors[stage.name].shutdown(wait=True)
+            io_executor.shutdown(wait=True)
+            for stage, queue in zip(self.stages, queues):
+                self._stats[stage.name]["max_queue"] = max(self._stats[stage.name]["max_queue"], queue.max_depth)
+            self._stats_total["wall"] += time.perf_counter() - start
+            self._stats_total["tasks"] += len(finished)
+        return [finished[seq] for seq in sorted(finished)]
+
+    def stats(self) -> Dict:
+        """Por estágio: itens, erros, tempo ocupado/espera, itens/s e utilização; e o gargalo."""
+        wall = self._stats_total["wall"]
+        stages = {}
+        for stage in self.stages:
+            raw = self._stats[stage.name]
+            stages[stage.name] = {
+                "mode": stage.mode,
+                "workers": stage.workers,
+                "items": raw["items"],
+                "errors": raw["errors"],
+                "busy_s": round(raw["busy"], 3),
+                "wait_s": round(raw["wait"], 3),
+                "avg_ms": round(1000 * raw["busy"] / raw["items"], 1) if raw["items"] else 0.0,
+                "items_per_s": round(raw["items"] / wall, 2) if wall else 0.0,
+                "utilization": round(raw["busy"] / (stage.workers * wall), 3) if wall else 0.0,
+                "max_queue": raw["max_queue"]
+            }
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if wall else None
+        return {
+            "tasks": self._stats_total["tasks"],
+            "wall_s": round(wall, 3),
+            "tasks_per_s": round(self._stats_total["tasks"] / wall, 2) if wall else 0.0,
+            "bottleneck": bottleneck,
+            "stages": stages
+        }
+
+
+def format_stats(stats: Dict) -> str:
+    """Tabela de vazão por estágio para logs."""
+    lines = [f"{stats['tasks']} tarefa(s) em {stats['wall_s']:.1f}s ({stats['tasks_per_s']:.2f}/s) | "
+             f"gargalo: {stats['bottleneck']}"]
+    for name, stage in stats["stages"].items():
+        lines.append(
+            f"      {name:10s} {stage['mode']:7s} x{stage['workers']:<3d} itens: {stage['items']:5d} | "
+            f"média: {stage['avg_ms']:8.1f}ms | {stage['items_per_s']:6.2f}/s | "
+            f"utilização: {stage['utilization']:6.1%} | fila máx.: {stage['max_queue']}"
+        )
+    return "\n".join(lines)
@@ -6,22 +6,25 @@ import os
 import json
 import argparse
 from typing import Dict, Optional
-from openai import OpenAI
 from dotenv import load_dotenv
+try:
+    from llm_client import get_llm_client
+    from llm_cache import open_llm_cache
+except ImportError:
+    from l2j_pipeline.llm_client import get_llm_client
+    from l2j_pipeline.llm_cache import open_llm_cache
 
 load_dotenv()
 
 class TestGenerator:
-    def __init__(self, model: str = "qwen/qwen3-coder"):
+    def __init__(self, model: str = "qwen/qwen3-coder", use_llm_cache: bool = True):
         self.model = model
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable not found")
             
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
+        self.client = get_llm_client(self.api_key)
+        self.llm_cache = open_llm_cache(use_llm_cache)
 
     def generate_test(self, go_code: str, original_java: str, filename: str) -> str:
         """Generates a _test.go file for the given Go code."""
@@ -50,16 +53,15 @@ Write the `package` declaration matching the source.
 """
 
         try:
-            response = self.client.chat.completions.create(
+            content = self.client.chat(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.2
+                temperature=0.2,
+                cache=self.llm_cache
             )
-            
-            content = response.choices[0].message.content
             test_code = self._extract_code(content)
             return test_code
             
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos do pipeline se importam pelo nome simples (python l2j_pipeline/<script>.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from ann_index import HAS_FAISS, StreamingExactNeighbours, drop_self_matches, measure
+
+
+def unit_vectors(count, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class SelfOnlyIndex:
+    """Índice "ruim": acha a própria consulta e, no resto, ids que não são vizinhos."""
+
+    def __init__(self, query_ids):
+        self.query_ids = query_ids
+
+    def search(self, queries, k):
+        found = np.full((len(queries), k), 10_000, dtype='int64')
+        found[:, 1:] += np.arange(1, k)
+        found[:, 0] = self.query_ids
+        return None, found
+
+
+def test_drop_self_matches_keeps_k_other_ids():
+    rows = np.array([[5, 1, 2], [3, 5, 4], [7, 8, 9]])
+    assert drop_self_matches(rows, np.array([5, 5, 6]), 2).tolist() == [[1, 2], [3, 4], [7, 8]]
+
+
+def test_self_match_does_not_count_as_recall():
+    query_ids = np.array([0, 1, 2], dtype='int64')
+    queries = np.zeros((3, 4), 'float32')
+    index = SelfOnlyIndex(query_ids)
+    # Verdade com a própria consulta: metade do recall vem só de achá-la
+    with_self = np.array([[0, 10], [1, 12], [2, 14]], dtype='int64')
+    assert measure(index, queries, with_self, 2)[0] == 0.5
+    # Sem ela, o índice não acha nenhum vizinho de verdade
+    without_self = np.array([[10, 11], [12, 13], [14, 15]], dtype='int64')
+    assert measure(index, queries, without_self, 2, query_ids)[0] == 0.0
+
+
+def test_streaming_truth_excludes_the_query_itself():
+    embeddings = unit_vectors(50)
+    ids = np.arange(100, 150, dtype='int64')
+    rows = [3, 17, 42]
+    truth = StreamingExactNeighbours(embeddings[rows], 5, ids[rows])
+    for start in range(0, 50, 16):
+        truth.update(embeddings[start:start + 16], ids[start:start + 16])
+
+    scores = embeddings[rows] @ embeddings.T
+    scores[np.arange(3), rows] = -np.inf
+    expected = ids[np.argsort(-scores, axis=1)[:, :5]]
+    assert truth.truth_ids().tolist() == expected.tolist()
+    assert not any(ids[row] in found for row, found in zip(rows, truth.truth_ids().tolist()))
+
+
+@pytest.mark.skipif(not HAS_FAISS, reason="faiss não instalado")
+def test_tuned_recall_matches_held_out_queries():
+    from ann_index import build_ann_index, exact_neighbours, tune_search_params
+
+    data = unit_vectors(4200, dim=16, seed=1)
+    embeddings, held_out = data[:4000], data[4000:]
+    ids = np.arange(4000, dtype='int64')
+    index, index_type, params = build_ann_index(embeddings, ids, "ivf_flat", {"nlist": 64})
+    tuned = tune_search_params(index, index_type, params, embeddings, ids, target_recall=0.9, num_queries=200)
+
+    # O recall do ajuste deve valer para consultas que não estão no índice
+    truth = ids[exact_neighbours(embeddings, held_out, tuned["tune_k"])]
+    recall, _ = measure(index, held_out, truth, tuned["tune_k"])
+    assert recall >= tuned["recall_at_k"] - 0.05
@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+import compiler_service
+from compiler_service import GoCompiler
+
+GOOD = 'package main\n\nimport "fmt"\n\nfunc main() { fmt.Println("ok") }\n'
+MISSING_MODULE = 'package main\n\nimport "github.com/foo/bar"\n\nfunc main() { bar.Run() }\n'
+TYPE_ERROR = 'package main\n\nvar x int = "s"\n\nfunc main() {}\n'
+NO_MAIN = 'package main\n\nfunc helper() {}\n'
+LIBRARY = 'package model\n\ntype Item struct{ ID int }\n'
+
+
+class FakeGo:
+    """
+    Stands in for the go command. go list -e reports each package on its own;
+    go vet stops at package loading when any package imports a missing module
+    (only that package gets a diagnostic), like the real toolchain does.
+    """
+
+    def __init__(self, working_dir):
+        self.working_dir = working_dir
+        self.commands = []
+
+    def _code(self, rel_dir):
+        return open(os.path.join(self.working_dir, rel_dir, "candidate.go")).read()
+
+    def _errors(self, rel_dir):
+        code = self._code(rel_dir)
+        if "github.com/foo/bar" in code:
+            return [f"{rel_dir}/candidate.go:3:8: no required module provides package github.com/foo/bar"]
+        if 'int = "s"' in code:
+            return [f"# l2j_migration_sandbox/{rel_dir}",
+                    f'{rel_dir}/candidate.go:3:13: cannot use "s" (untyped string constant) as int value']
+        return []
+
+    def _list(self, rel_dir):
+        code = self._code(rel_dir)
+        info = {"ImportPath": f"l2j_migration_sandbox/{rel_dir}", "Name": code.split()[1]}
+        if "github.com/foo/bar" in code:
+            info["DepsErrors"] = [{"Pos": f"{rel_dir}/candidate.go:3:8",
+                                   "Err": "no required module provides package github.com/foo/bar"}]
+        elif 'int = "s"' in code:
+            info["Error"] = {"Err": "\n".join(self._errors(rel_dir)) + "\n"}
+        else:
+            info["Export"] = "/cache/export"
+        return json.dumps(info, indent="\t")
+
+    def __call__(self, cmd, cwd):
+        self.commands.append(cmd)
+        if cmd[0] != "go":
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+        target = cmd[-1]
+        if target.endswith("/..."):
+            base = target[2:-4]
+            dirs = sorted(f"{base}/{name}" for name in os.listdir(os.path.join(self.working_dir, base)))
+            if cmd[1] == "list":
+                return subprocess.CompletedProcess(cmd, 0, "\n".join(self._list(d) for d in dirs) + "\n", "")
+            load_errors = [line for d in dirs if "github.com/foo/bar" in self._code(d) for line in self._errors(d)]
+            lines = load_errors or [line for d in dirs for line in self._errors(d)]
+        else:
+            lines = self._errors(target[2:])
+            if not lines and "func main" not in self._code(target[2:]):
+                lines = ["runtime.main_main·f: function main is undeclared in the main package"]
+        return subprocess.CompletedProcess(cmd, 1 if lines else 0, "", "".join(line + "\n" for line in lines))
+
+
+def batch_commands(fake):
+    return [cmd for cmd in fake.commands if cmd[0] == "go" and cmd[-1].endswith("/...")]
+
+
+@pytest.fixture
+def compiler(tmp_path):
+    (tmp_path / "go.mod").write_text("module l2j_migration_sandbox\n")
+    return GoCompiler(working_dir=str(tmp_path))
+
+
+def test_batch_gives_each_candidate_its_own_verdict(compiler):
+    fake = FakeGo(compiler.working_dir)
+    compiler._run = fake
+    results = compiler.validate_many([GOOD, MISSING_MODULE, TYPE_ERROR, NO_MAIN, LIBRARY])
+
+    assert [result["success"] for result in results] == [True, False, False, False, True]
+    assert results[1]["stderr"] == "candidate.go:3:8: no required module provides package github.com/foo/bar\n"
+    assert "candidate.go:3:13: cannot use" in results[2]["stderr"]
+    assert "function main is undeclared" in results[3]["stderr"]
+    # One go list (compile, no link) and nothing rebuilt afterwards
+    assert [cmd[:4] for cmd in fake.commands if cmd[0] == "go"] == [["go", "list", "-e", "-export"]]
+
+
+def test_vet_batch_load_error_does_not_hide_other_failures(compiler):
+    compiler.check = "vet"
+    fake = FakeGo(compiler.working_dir)
+    compiler._run = fake
+    results = compiler.validate_many([GOOD, MISSING_MODULE, TYPE_ERROR])
+
+    assert [result["success"] for result in results] == [True, False, False]
+    assert "github.com/foo/bar" in results[1]["stderr"]
+    assert "candidate.go:3:13" in results[2]["stderr"]
+    # The second vet leaves out the package that failed to load
+    assert len(batch_commands(fake)) == 2
+
+
+def test_batch_success_and_cleanup(compiler):
+    compiler._run = FakeGo(compiler.working_dir)
+    results = compiler.validate_many([GOOD, GOOD, TYPE_ERROR, GOOD])
+
+    assert [result["success"] for result in results] == [True, True, False, True]
+    assert os.path.exists(results[2]["filepath"])
+    workspaces = os.path.join(compiler.working_dir, "workspaces")
+    assert all(not os.listdir(os.path.join(workspaces, name)) for name in os.listdir(workspaces))
+
+
+def test_batch_timeout_splits_instead_of_failing_everyone(compiler):
+    fake = FakeGo(compiler.working_dir)
+
+    def slow_for_big_batches(cmd, cwd):
+        if cmd[0] == "go" and cmd[-1].endswith("/...") and len(os.listdir(os.path.join(cwd, cmd[-1][2:-4]))) > 2:
+            raise subprocess.TimeoutExpired(cmd, compiler_service.GO_TIMEOUT)
+        return fake(cmd, cwd)
+
+    compiler._run = slow_for_big_batches
+    results = compiler.validate_many([GOOD, GOOD, TYPE_ERROR, GOOD, GOOD])
+    assert [result["success"] for result in results] == [True, True, False, True, True]
+
+
+def test_no_verdict_checks_each_candidate(compiler):
+    def broken_module(cmd, cwd):
+        if cmd[0] == "go" and cmd[-1].endswith("/..."):
+            return subprocess.CompletedProcess(cmd, 1, "", "go: updates to go.mod needed\n")
+        return FakeGo(compiler.working_dir)(cmd, cwd)
+
+    compiler._run = broken_module
+    results = compiler.validate_many([GOOD, TYPE_ERROR])
+    assert [result["success"] for result in results] == [True, False]
+
+
+def fake_go_env(gocache, calls):
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        if cmd[:2] == ["go", "env"]:
+            return subprocess.CompletedProcess(cmd, 0, f"{gocache}\n/home/u/go/pkg/mod\n", "")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+    return run
+
+
+def test_user_build_cache_is_kept(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(compiler_service.subprocess, "run", fake_go_env("/home/u/.cache/go-build", calls))
+    monkeypatch.delenv("GOCACHE", raising=False)
+    compiler = GoCompiler(working_dir=str(tmp_path))
+    assert "GOCACHE" not in compiler.env and "GOMODCACHE" not in compiler.env
+    assert ["go", "build", "std"] not in calls
+
+
+def test_disabled_build_cache_moves_into_the_sandbox_and_is_warmed_once(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(compiler_service.subprocess, "run", fake_go_env("off", calls))
+    compiler = GoCompiler(working_dir=str(tmp_path))
+    assert compiler.env["GOCACHE"] == str(tmp_path / ".cache" / "go-build")
+    assert calls.count(["go", "build", "std"]) == 1
+
+    os.makedirs(compiler.env["GOCACHE"])
+    GoCompiler(working_dir=str(tmp_path))
+    assert calls.count(["go", "build", "std"]) == 1
+
+
+def test_split_diagnostics():
+    stderr = (
+        "# l2j_migration_sandbox/workspaces/p1-w1/c10\n"
+        "workspaces/p1-w1/c10/candidate.go:4:2: undefined: fmt\n"
+        "\tnote: continuation\n"
+        "# l2j_migration_sandbox/other\n"
+        "other/x.go:1:1: unrelated\n"
+        "workspaces/p1-w1/c1/candidate.go:2:1: syntax error\n"
+        "workspaces/p1-w1/c99/candidate.go:1:1: out of range\n"
+    )
+    diagnostics, unattributed = GoCompiler._split_diagnostics(stderr, "workspaces/p1-w1", 11)
+
+    assert diagnostics[10] == ["# l2j_migration_sandbox/workspaces/p1-w1/c10",
+                               "candidate.go:4:2: undefined: fmt", "\tnote: continuation"]
+    # c99 is not part of the batch: it stays with the last candidate seen (c1)
+    assert diagnostics[1] == ["candidate.go:2:1: syntax error",
+                              "workspaces/p1-w1/c99/candidate.go:1:1: out of range"]
+    assert not any(diagnostics[i] for i in range(11) if i not in (1, 10))
+    assert unattributed == ["# l2j_migration_sandbox/other", "other/x.go:1:1: unrelated"]
+
+
+@pytest.mark.skipif(shutil.which("go") is None, reason="go toolchain not installed")
+def test_batch_matches_single_validation_with_real_go(tmp_path):
+    compiler = GoCompiler(working_dir=str(tmp_path))
+    candidates = [GOOD, MISSING_MODULE, TYPE_ERROR, NO_MAIN, LIBRARY]
+    batch = [result["success"] for result in compiler.validate_many(candidates)]
+    single = [compiler.validate_code(code)["success"] for code in candidates]
+    assert batch == single == [True, False, False, False, True]
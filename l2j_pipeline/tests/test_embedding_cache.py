@@ -0,0 +1,68 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, cached_encode, text_key
+
+
+class CountingModel:
+    """Encoder determinístico (vetor = comprimento e soma dos códigos) que registra cada lote."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        return np.array([[len(text), sum(map(ord, text)), 1.0, 0.0] for text in texts], dtype='float32')
+
+
+def test_encode_only_calls_the_model_for_missing_texts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    model = CountingModel()
+    first = cache.encode(model, "m", ["a", "bb", "a"])
+    second = cache.encode(model, "m", ["bb", "ccc"])
+
+    assert model.batches == [["a", "bb"], ["ccc"]]  # "a" repetido vai uma vez; "bb" vem do cache
+    np.testing.assert_array_equal(first[1], second[0])
+    np.testing.assert_array_equal(first, model.encode(["a", "bb", "a"]))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 3)
+    cache.close()
+
+
+def test_vectors_survive_reopen_and_are_keyed_by_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path)
+    cache.encode(CountingModel(), "m", ["class A {}"])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    model = CountingModel()
+    reopened.encode(model, "m", ["class A {}"])
+    reopened.encode(model, "other-model", ["class A {}"])
+    assert model.batches == [["class A {}"]]
+    assert reopened.stats()["bytes"] == 2 * 4 * 4
+    reopened.close()
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_bytes=50)  # 16 bytes por vetor
+    model = CountingModel()
+    for order, text in enumerate(["a", "b", "c"]):
+        cache.encode(model, "m", [text])
+        cache._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (order, text_key("m", text)))
+    cache._conn.execute("UPDATE embeddings SET last_used = 10 WHERE key = ?", (text_key("m", "a"),))
+    cache._conn.commit()
+
+    cache.encode(model, "m", ["d"])  # 64 bytes > 50: despeja até 45
+    assert set(cache.get_many([text_key("m", text) for text in "abcd"])) == {text_key("m", t) for t in "ad"}
+    stats = cache.stats()
+    assert (stats["evictions"], stats["bytes"]) == (2, 32)
+    cache.close()
+
+
+def test_cached_encode_falls_back_when_the_cache_fails(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    cache.close()  # operações seguintes levantam sqlite3.ProgrammingError
+    model = CountingModel()
+    vectors = cached_encode(model, "m", ["a", "bb"], cache=cache)
+    assert vectors.shape == (2, 4)
+    assert model.batches == [["a", "bb"]]
@@ -0,0 +1,151 @@
+import os
+
+import pytest
+
+import index_l2j_repo
+from index_l2j_repo import build_simple_index, finalize_index, save_index, scan_java_files_incremental
+
+SOURCES = {
+    "com/l2j/Item.java": "package com.l2j;\n\npublic class Item {\n    int id;\n}\n",
+    "com/l2j/Npc.java": "package com.l2j;\n\npublic class Npc {\n    String name;\n}\n",
+    "com/l2j/Skill.java": "package com.l2j;\n\npublic class Skill {\n    int level;\n}\n",
+}
+
+
+def write(repo, rel_path, content):
+    path = repo / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "repo"
+    for rel_path, content in SOURCES.items():
+        write(repo, rel_path, content)
+    return repo
+
+
+@pytest.fixture
+def read_paths(monkeypatch):
+    """Arquivos que o scan realmente abriu (os demais vieram do índice anterior)."""
+    paths = []
+    scan_paths = index_l2j_repo.scan_paths
+
+    def recording(repo_path, rel_paths, *args, **kwargs):
+        paths.extend(rel_paths)
+        return scan_paths(repo_path, rel_paths, *args, **kwargs)
+
+    monkeypatch.setattr(index_l2j_repo, "scan_paths", recording)
+    return paths
+
+
+def index_repo(repo, output_path, reuse=True):
+    """Como o main() sem FAISS: scan, índice, save e finalize."""
+    java_files, manifest, changes = scan_java_files_incremental(str(repo), output_path, reuse=reuse)
+    index = build_simple_index(java_files)
+    save_index(index, manifest, output_path)
+    finalize_index(index, manifest, output_path)
+    return java_files, manifest, changes
+
+
+def test_unchanged_files_are_reused_without_reading(tmp_path, repo, read_paths):
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    _, first, changes = index_repo(repo, output_path)
+    assert changes["rebuild"] and sorted(changes["added"]) == sorted(SOURCES)
+
+    read_paths.clear()
+    java_files, manifest, changes = index_repo(repo, output_path)
+    assert (changes["reused"], changes["added"], changes["changed"], changes["deleted"]) == (3, [], [], [])
+    assert read_paths == []
+    assert manifest["files"] == first["files"]
+    assert {f["path"]: f["content"] for f in java_files} == SOURCES
+
+
+def test_touched_file_is_reused_by_content_hash(tmp_path, repo, read_paths):
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    _, first, _ = index_repo(repo, output_path)
+    path = repo / "com/l2j/Npc.java"
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    read_paths.clear()
+    _, manifest, changes = index_repo(repo, output_path)
+    assert read_paths == ["com/l2j/Npc.java"]
+    assert changes["reused"] == 3 and changes["changed"] == [] and changes["stale_chunk_ids"] == []
+    entry = manifest["files"]["com/l2j/Npc.java"]
+    assert entry["mtime"] == stat.st_mtime_ns + 10 ** 9
+    assert entry["vector_id"] == first["files"]["com/l2j/Npc.java"]["vector_id"]
+
+
+def test_changed_added_and_deleted_files(tmp_path, repo):
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    _, first, _ = index_repo(repo, output_path)
+    write(repo, "com/l2j/Npc.java", SOURCES["com/l2j/Npc.java"].replace("name", "title"))
+    (repo / "com/l2j/Skill.java").unlink()
+    write(repo, "com/l2j/Quest.java", "package com.l2j;\n\npublic class Quest {\n    int step;\n}\n")
+
+    java_files, manifest, changes = index_repo(repo, output_path)
+    old = first["files"]
+    assert changes["changed"] == ["com/l2j/Npc.java"]
+    assert changes["deleted"] == ["com/l2j/Skill.java"]
+    assert changes["added"] == ["com/l2j/Quest.java"]
+    assert changes["reused"] == 1
+    assert changes["deleted_vector_ids"] == [old["com/l2j/Skill.java"]["vector_id"]]
+    # Alterado mantém o vector_id; os chunks antigos dele e do removido saem do FAISS
+    assert manifest["files"]["com/l2j/Npc.java"]["vector_id"] == old["com/l2j/Npc.java"]["vector_id"]
+    stale = [chunk["id"] for path in ("com/l2j/Npc.java", "com/l2j/Skill.java") for chunk in old[path]["chunks"]]
+    assert changes["stale_chunk_ids"] == stale
+    # Ids novos nunca reaproveitam os antigos
+    assert manifest["files"]["com/l2j/Quest.java"]["vector_id"] == first["next_vector_id"]
+    new_chunk_ids = [chunk["id"] for chunk in manifest["files"]["com/l2j/Npc.java"]["chunks"]]
+    assert min(new_chunk_ids) >= first["next_chunk_id"]
+    assert "title" in {f["path"]: f["content"] for f in java_files}["com/l2j/Npc.java"]
+
+
+def test_reuse_false_rebuilds_everything(tmp_path, repo, read_paths):
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    index_repo(repo, output_path)
+    read_paths.clear()
+    _, manifest, changes = index_repo(repo, output_path, reuse=False)
+    assert changes["rebuild"] and changes["reused"] == 0
+    assert sorted(read_paths) == sorted(SOURCES)
+    assert sorted(entry["vector_id"] for entry in manifest["files"].values()) == [0, 1, 2]
+
+
+class FakeFaiss:
+    """faiss.write_index que grava o próprio "índice" (bytes) no caminho pedido."""
+
+    @staticmethod
+    def write_index(index, path):
+        with open(path, "wb") as f:
+            f.write(index)
+
+
+def test_faiss_is_only_replaced_by_finalize(tmp_path, repo, monkeypatch):
+    monkeypatch.setattr(index_l2j_repo, "faiss", FakeFaiss, raising=False)
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    java_files, manifest, _ = scan_java_files_incremental(str(repo), output_path)
+    index = build_simple_index(java_files)
+    save_index(index, manifest, output_path)
+    faiss_path = output_path.replace(".json", ".faiss")
+    with open(faiss_path, "wb") as f:
+        f.write(b"old")
+
+    index_l2j_repo._write_pending_faiss(b"new", output_path)
+    assert open(faiss_path, "rb").read() == b"old"  # queda aqui: o índice anterior segue inteiro
+
+    index["metadata"]["semantic_index"] = {"type": "flat"}
+    finalize_index(index, manifest, output_path)
+    assert open(faiss_path, "rb").read() == b"new"
+    assert not os.path.exists(faiss_path + ".tmp")
+
+
+def test_finalize_without_semantic_index_discards_a_stale_faiss(tmp_path, repo, monkeypatch):
+    monkeypatch.setattr(index_l2j_repo, "faiss", FakeFaiss, raising=False)
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    os.makedirs(os.path.dirname(output_path))
+    index_l2j_repo._write_pending_faiss(b"stale", output_path)
+    index_repo(repo, output_path)
+    assert not os.path.exists(output_path.replace(".json", ".faiss"))
+    assert not os.path.exists(output_path.replace(".json", ".faiss") + ".tmp")
@@ -0,0 +1,109 @@
+import os
+import json
+
+from index_store import (
+    ContentStoreWriter, content_store_path_for, load_index_files, manifest_path_for, open_content_store,
+    pending_content_path_for, save_manifest, write_content_and_table, write_index_metadata
+)
+
+
+def build(index_path, contents):
+    """Grava uma geração do blob para `contents` ({path: texto}) e devolve o manifesto."""
+    manifest = {"version": 1, "next_vector_id": 0, "files": {}}
+    files = []
+    for vector_id, (path, content) in enumerate(contents.items()):
+        manifest["files"][path] = {"mtime": 0, "size": len(content), "sha256": "", "vector_id": vector_id}
+        files.append({"path": path, "content": content, "lines": 1, "package": "p", "classes": []})
+    write_content_and_table(files, manifest, index_path)
+    return manifest
+
+
+def publish(manifest, index_path):
+    """Como finalize_index: manifesto (publica o blob) e depois metadados."""
+    save_manifest(manifest, index_path)
+    write_index_metadata({"total_files": len(manifest["files"])}, index_path)
+
+
+def read_all(index_path, manifest):
+    store = open_content_store(index_path, manifest)
+    assert store is not None
+    with store:
+        return {path: store.read(entry["offset"], entry["length"]) for path, entry in manifest["files"].items()}
+
+
+def test_new_generation_is_published_with_the_manifest(tmp_path):
+    index_path = str(tmp_path / "l2j_index.json")
+    old = build(index_path, {"A.java": "class A {}"})
+    publish(old, index_path)
+
+    new = build(index_path, {"A.java": "class A { int x; }", "B.java": "class B {}"})
+    # Antes do manifesto: a geração anterior continua publicada e legível
+    assert read_all(index_path, old) == {"A.java": "class A {}"}
+    assert load_index_files(index_path)[0]["content"] == "class A {}"
+    # e a nova já pode ser lida pelo builder (semântico) pela geração
+    assert read_all(index_path, new)["B.java"] == "class B {}"
+
+    publish(new, index_path)
+    assert read_all(index_path, new) == {"A.java": "class A { int x; }", "B.java": "class B {}"}
+    assert not os.path.exists(pending_content_path_for(index_path, new["content_generation"]))
+    # O manifesto antigo não casa mais com o blob publicado
+    assert open_content_store(index_path, old) is None
+
+
+def test_interrupted_build_keeps_previous_index(tmp_path):
+    index_path = str(tmp_path / "l2j_index.json")
+    old = build(index_path, {"A.java": "class A {}"})
+    publish(old, index_path)
+
+    # Queda depois do blob e antes do finalize: o manifesto em disco é o antigo
+    crashed = build(index_path, {"A.java": "class A { broken }"})
+    assert [f["content"] for f in load_index_files(index_path)] == ["class A {}"]
+
+    # A próxima indexação publica a sua geração e descarta a abandonada
+    new = build(index_path, {"A.java": "class A { int y; }"})
+    publish(new, index_path)
+    assert not os.path.exists(pending_content_path_for(index_path, crashed["content_generation"]))
+    assert [f["content"] for f in load_index_files(index_path)] == ["class A { int y; }"]
+
+
+def test_manifest_saved_before_rename_still_readable(tmp_path):
+    # Janela entre a troca do manifesto e a do blob: o leitor acha a geração pelo nome
+    index_path = str(tmp_path / "l2j_index.json")
+    publish(build(index_path, {"A.java": "old"}), index_path)
+    new = build(index_path, {"A.java": "new"})
+    with open(manifest_path_for(index_path), 'w', encoding='utf-8') as f:
+        json.dump(new, f)
+    assert [f["content"] for f in load_index_files(index_path)] == ["new"]
+
+
+def test_aborted_writer_leaves_nothing(tmp_path):
+    path = content_store_path_for(str(tmp_path / "l2j_index.json"))
+    writer = ContentStoreWriter(path)
+    writer.append("class A {}")
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_registry_reports_legacy_index_without_rewriting_it(tmp_path):
+    from index_store import convert_legacy_index
+    from retriever_registry import RetrieverRegistry
+
+    index_path = str(tmp_path / "l2j_index.json")
+    legacy = {"metadata": {"total_files": 1, "packages": ["p"]}, "class_map": {"A": "A.java"},
+              "files": [{"path": "A.java", "content": "class A {}", "lines": 1, "package": "p", "classes": ["A"]}]}
+    with open(index_path, "w") as f:
+        json.dump(legacy, f)
+    before = sorted(os.listdir(tmp_path))
+
+    registry = RetrieverRegistry()
+    loaded = registry.get_index(index_path)
+    assert loaded.needs_conversion and loaded.index_data is None
+    assert registry.stats()["legacy_indexes"] == [index_path]
+    assert sorted(os.listdir(tmp_path)) == before
+
+    # Conversão explícita (CLI `index_store.py convert`): o próximo get_index recarrega
+    assert convert_legacy_index(index_path)
+    loaded = registry.get_index(index_path)
+    assert not loaded.needs_conversion
+    assert [f["path"] for f in loaded.index_data["files"]] == ["A.java"]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
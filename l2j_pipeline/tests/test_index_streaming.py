@@ -0,0 +1,52 @@
+import os
+
+from index_l2j_repo import finalize_index, save_index_streaming, stream_scan_to_store
+from index_store import load_file_table, load_index_files, open_content_store
+
+SOURCES = {
+    "com/l2j/Item.java": "package com.l2j;\n\npublic class Item {\n    int id;\n}\n",
+    "com/l2j/Npc.java": "package com.l2j;\n\npublic class Npc {\n    String name;\n}\n",
+    "com/l2j/Skill.java": "package com.l2j;\n\npublic class Skill {\n    int level;\n}\n",
+}
+
+
+def write_repo(repo, sources):
+    for rel_path, content in sources.items():
+        path = repo / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def build(repo, output_path, reuse):
+    index, manifest, changes = stream_scan_to_store(str(repo), output_path, reuse=reuse)
+    save_index_streaming(index, manifest, output_path)
+    return index, manifest, changes
+
+
+def contents(output_path):
+    return {f["path"]: f["content"] for f in load_index_files(output_path)}
+
+
+def test_interrupted_streaming_build_keeps_index_readable(tmp_path):
+    repo = tmp_path / "repo"
+    output_path = str(tmp_path / "index" / "l2j_index.json")
+    write_repo(repo, SOURCES)
+    index, manifest, changes = build(repo, output_path, reuse=False)
+    finalize_index(index, manifest, output_path)
+    assert changes["rebuild"] and len(changes["added"]) == 3
+
+    # Segunda execução altera um arquivo e "cai" antes do finalize (ex.: no FAISS)
+    (repo / "com/l2j/Npc.java").write_text(SOURCES["com/l2j/Npc.java"].replace("name", "title"))
+    build(repo, output_path, reuse=True)
+    files, published = load_file_table(output_path)
+    store = open_content_store(output_path, published)
+    assert store is not None
+    store.close()
+    assert contents(output_path) == SOURCES
+
+    # A próxima execução incremental ainda reaproveita os arquivos inalterados
+    index, manifest, changes = build(repo, output_path, reuse=True)
+    assert changes["reused"] == 2 and changes["changed"] == ["com/l2j/Npc.java"]
+    finalize_index(index, manifest, output_path)
+    assert "title" in contents(output_path)["com/l2j/Npc.java"]
+    assert [name for name in os.listdir(tmp_path / "index") if name.startswith("l2j_index.content.")] == []
@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+import multiprocessing
+
+import pytest
+
+import job_queue
+from job_queue import (
+    JobQueue, pool_pid_path, pool_running, run_job, run_worker_pool, start_worker_pool, stop_worker_pool
+)
+
+
+def dead_pid():
+    """Pid de um processo que já terminou."""
+    out = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    return int(out.stdout)
+
+
+def checkpointed_handler(ctx):
+    """Três itens; o primeiro pede o cancelamento do job (como a API faria no meio da execução)."""
+    resumed = ctx.resumed_items
+    for item in ("a", "b", "c"):
+        if ctx.is_done(item):
+            continue
+        ctx.check_cancelled()
+        ctx.item_done(item)
+        if ctx.params.get("cancel_after_first"):
+            ctx.queue.cancel(ctx.job_id)
+    return {"resumed": resumed}
+
+
+def endless_handler(ctx):
+    """Só termina por cancelamento (ou encerramento do worker)."""
+    while True:
+        ctx.check_cancelled()
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test", "test_job_queue:checkpointed_handler")
+    monkeypatch.setattr(job_queue, "CANCEL_POLL_INTERVAL", 0.0)
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    yield queue
+    queue.close()
+
+
+def test_cancel_queued_job_leaves_the_queue(queue):
+    first, second = queue.enqueue("test"), queue.enqueue("test")
+    assert queue.cancel(first)["state"] == "cancelled"
+    claimed = queue.claim_next(os.getpid())
+    assert claimed["id"] == second and claimed["attempts"] == 1
+    assert queue.claim_next(os.getpid()) is None
+
+
+def test_unknown_kind_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue("nope")
+
+
+def test_cancel_running_job_stops_at_next_item_and_resume_skips_done(queue):
+    job_id = queue.enqueue("test", {"cancel_after_first": True})
+    run_job(queue, queue.claim_next(os.getpid()))
+    job = queue.get(job_id)
+    assert (job["state"], job["done"], job["worker_pid"]) == ("cancelled", 1, None)
+    assert queue.completed_items(job_id) == {"a"}
+
+    assert queue.resume(job_id)["state"] == "queued"
+    queue.update(job_id, params='{}')
+    run_job(queue, queue.claim_next(os.getpid()))
+    job = queue.get(job_id)
+    assert (job["state"], job["done"], job["attempts"]) == ("done", 3, 2)
+    assert job["result"] == {"resumed": 1}
+
+
+def test_worker_shutdown_requeues_the_running_job(queue):
+    stopping = threading.Event()
+    stopping.set()
+    requeued, cancelled = queue.enqueue("test"), queue.enqueue("test")
+    run_job(queue, queue.claim_next(os.getpid()), stopping)
+    assert (queue.get(requeued)["state"], queue.get(requeued)["worker_pid"]) == ("queued", None)
+
+    # Cancelamento pedido antes do encerramento continua valendo
+    job = queue.claim_next(os.getpid())
+    assert job["id"] == requeued
+    queue.cancel(requeued)
+    run_job(queue, job, stopping)
+    assert queue.get(requeued)["state"] == "cancelled"
+    assert queue.get(cancelled)["state"] == "queued"
+
+
+def test_orphaned_jobs_are_requeued(queue):
+    orphan, alive, cancelling = queue.enqueue("test"), queue.enqueue("test"), queue.enqueue("test")
+    queue.claim_next(dead_pid())
+    queue.claim_next(os.getpid())
+    queue.claim_next(dead_pid())
+    queue.cancel(cancelling)
+
+    assert queue.requeue_orphans() == 1
+    assert [queue.get(job_id)["state"] for job_id in (orphan, alive, cancelling)] == ["queued", "running", "cancelled"]
+    assert queue.get(orphan)["worker_pid"] is None
+    assert queue.claim_next(os.getpid())["id"] == orphan
+    assert queue.get(orphan)["attempts"] == 2
+
+
+def test_stop_worker_pool_terminates_the_supervisor(tmp_path):
+    db_path = str(tmp_path / "jobs" / "jobs.sqlite")
+    pid = start_worker_pool(1, db_path)
+    assert pid
+    deadline = time.time() + 30
+    while not pool_running(db_path) and time.time() < deadline:
+        time.sleep(0.1)
+    assert pool_running(db_path)
+    assert start_worker_pool(1, db_path) is None  # já há um pool
+
+    assert stop_worker_pool(pid, timeout=30)
+    assert not os.path.exists(pool_pid_path(db_path))
+    assert stop_worker_pool(dead_pid())
+
+
+def test_pool_stops_running_jobs_before_removing_its_pid(tmp_path, monkeypatch):
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "endless", "test_job_queue:endless_handler")
+    db_path = str(tmp_path / "jobs.sqlite")
+    queue = JobQueue(db_path)
+    job_id = queue.enqueue("endless")
+    # fork: o supervisor e seus workers herdam o JOB_HANDLERS alterado
+    supervisor = multiprocessing.get_context("fork").Process(target=run_worker_pool, args=(1, db_path))
+    supervisor.start()
+    deadline = time.time() + 30
+    while queue.get(job_id)["state"] != "running" and time.time() < deadline:
+        time.sleep(0.05)
+    worker_pid = queue.get(job_id)["worker_pid"]
+    assert worker_pid
+
+    os.kill(supervisor.pid, signal.SIGTERM)
+    supervisor.join(timeout=30)
+    assert supervisor.exitcode is not None
+    assert not os.path.exists(pool_pid_path(db_path))
+    assert not job_queue._pid_alive(worker_pid)
+    assert (queue.get(job_id)["state"], queue.get(job_id)["worker_pid"]) == ("queued", None)
+    queue.close()
@@ -0,0 +1,78 @@
+import math
+from collections import Counter
+
+import pytest
+
+from keyword_index import KeywordIndex, build_keyword_index, keyword_index_path_for, open_keyword_index, tokenize
+
+DOCS = {
+    0: "public class PlayerInventory { void addItem(Item item) { items.add(item); } }",
+    1: "public class NpcSpawn { void spawn(Npc npc) { npc.spawnMe(); } }",
+    2: "class ItemTable { Item getItem(int itemId) { return items.get(itemId); } }",
+    3: "class SkillTable { Skill getSkill(int id, int level) { return skills.get(id); } }",
+}
+
+
+def reference_bm25(query, docs, k1=1.2, b=0.75):
+    """BM25 por varredura linear (como o _keyword_retrieval antigo), para comparação."""
+    tokens = {doc_id: Counter(tokenize(text)) for doc_id, text in docs.items()}
+    avgdl = sum(sum(counts.values()) for counts in tokens.values()) / len(docs)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for counts in tokens.values() if term in counts)
+        if not df:
+            continue
+        idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+        for doc_id, counts in tokens.items():
+            tf = counts.get(term, 0)
+            if tf:
+                norm = k1 * (1.0 - b + b * sum(counts.values()) / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+    return scores
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = keyword_index_path_for(str(tmp_path / "l2j_index.json"))
+    stats = build_keyword_index(DOCS.items(), path)
+    assert stats["documents"] == 4
+    index = KeywordIndex(path)
+    yield index
+    index.close()
+
+
+def test_tokenize_drops_java_keywords_and_short_tokens():
+    assert tokenize("public static void addItem(int x, Item item_2)") == ["additem", "item", "item_2"]
+
+
+def test_scores_match_linear_bm25(index):
+    query = "Item getItem items"
+    expected = reference_bm25(query, DOCS)
+    results = index.search(query, top_k=10)
+    assert [doc_id for doc_id, _ in results] == sorted(expected, key=expected.get, reverse=True)
+    for doc_id, score in results:
+        assert score == pytest.approx(expected[doc_id], rel=1e-5)
+
+
+def test_rarest_terms_first_and_unknown_terms_ignored(index):
+    assert index.query_terms("items spawnme unknownterm") == ["spawnme", "items"]
+    assert index.search("nothing matches here") == []
+
+
+def test_postings_are_truncated_to_the_highest_impacts(tmp_path):
+    docs = {doc_id: "item " * (doc_id + 1) + "filler " * 10 for doc_id in range(6)}
+    path = str(tmp_path / "small.bm25")
+    build_keyword_index(docs.items(), path, max_postings=2)
+    index = KeywordIndex(path)
+    expected = reference_bm25("item", docs)
+    assert [doc_id for doc_id, _ in index.search("item", top_k=10)] == \
+        sorted(expected, key=expected.get, reverse=True)[:2]
+    index.close()
+
+
+def test_open_keyword_index_missing_or_invalid(tmp_path):
+    index_path = str(tmp_path / "l2j_index.json")
+    assert open_keyword_index(index_path) is None
+    with open(keyword_index_path_for(index_path), "wb") as f:
+        f.write(b"not an index at all")
+    assert open_keyword_index(index_path) is None
@@ -0,0 +1,121 @@
+import asyncio
+
+from llm_cache import LLMCache, prompt_key
+from hybrid_migration_engine import HybridMigrationEngine
+
+
+def open_cache(tmp_path, **kwargs):
+    return LLMCache(str(tmp_path / "responses.sqlite"), **kwargs)
+
+
+def test_key_ignores_line_endings_and_trailing_spaces():
+    a = prompt_key("m", [{"role": "user", "content": "class A {}\r\nint x;  \n"}], {"temperature": 0.1})
+    b = prompt_key("m", [{"role": "user", "content": "class A {}\nint x;"}], {"temperature": 0.1})
+    assert a == b
+    assert a != prompt_key("m", [{"role": "user", "content": "class A {}\nint x;"}], {"temperature": 0.2})
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = open_cache(tmp_path, ttl_days=1)
+    cache.put("old", "m", "antiga")
+    cache.put("new", "m", "nova")
+    cache._conn.execute("UPDATE responses SET created = created - ? WHERE key = 'old'", (2 * 86400,))
+    cache._conn.commit()
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "nova"
+    stats = cache.stats()
+    assert (stats["expired"], stats["entries"], stats["bytes"]) == (1, 1, len("nova"))
+    cache.close()
+
+
+def test_least_recently_used_are_evicted_past_max_bytes(tmp_path):
+    cache = open_cache(tmp_path, max_bytes=100)
+    for order, key in enumerate(["a", "b", "c"]):
+        cache.put(key, "m", key * 30)
+        cache._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (order, key))
+    # "a" usada por último: "b" passa a ser a menos recente
+    cache._conn.execute("UPDATE responses SET last_used = 10 WHERE key = 'a'")
+    cache._conn.commit()
+
+    cache.put("d", "m", "d" * 30)  # 120 bytes > 100: despeja até 90
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a" * 30, "c" * 30, "d" * 30]
+    stats = cache.stats()
+    assert (stats["evictions"], stats["bytes"]) == (1, 90)
+    cache.close()
+
+
+def test_delete_keeps_size_accounting(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put("k", "m", "resposta")
+    assert cache.delete("k") is True
+    assert cache.delete("k") is False
+    assert cache.get("k") is None
+    assert cache.stats()["bytes"] == 0
+    cache.close()
+
+
+class FakeClient:
+    """Como LLMClient._chat: lê/grava o cache com prompt_key(model, messages, kwargs)."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.cached_calls = []
+
+    async def achat(self, model, messages, cache=None, **kwargs):
+        self.cached_calls.append(cache is not None)
+        key = prompt_key(model, messages, kwargs)
+        if cache is not None:
+            content = cache.get(key)
+            if content is not None:
+                return content
+        content = self.responses.pop(0)
+        if cache is not None:
+            cache.put(key, model, content)
+        return content
+
+
+def make_engine(cache, client):
+    engine = HybridMigrationEngine.__new__(HybridMigrationEngine)
+    engine.model = "m"
+    engine.llm_cache = cache
+    engine.llm_client = client
+    return engine
+
+
+def make_task():
+    return {"messages": [{"role": "user", "content": "Migrate A.java"}], "attempt": 0, "max_retries": 3,
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0, "cache_hits": 0}}
+
+
+def test_retries_bypass_the_cache(tmp_path):
+    cache = open_cache(tmp_path)
+    client = FakeClient(["sem bloco", "ainda sem bloco", "<code>package main</code>"])
+    engine = make_engine(cache, client)
+    task = make_task()
+
+    # Sem <code> o prompt não muda; um retry lido do cache repetiria a mesma resposta
+    assert asyncio.run(engine._stage_generate(task)) == "generate"
+    assert asyncio.run(engine._stage_generate(task)) == "generate"
+    assert asyncio.run(engine._stage_generate(task)) is None
+    assert task["code"] == "package main"
+    assert client.cached_calls == [True, False, False]
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+
+def test_failed_file_does_not_replay_from_cache(tmp_path):
+    cache = open_cache(tmp_path)
+    client = FakeClient(["sem bloco", "<code>package main</code>"])
+    engine = make_engine(cache, client)
+    task = make_task()
+    asyncio.run(engine._stage_generate(task))
+    assert cache.get(task["cache_key"]) == "sem bloco"
+
+    engine._discard_cached_response(task)  # arquivo terminou com falha
+    # Retomada: a 1ª tentativa chama o modelo de novo
+    resumed = make_task()
+    assert asyncio.run(engine._stage_generate(resumed)) is None
+    assert resumed["code"] == "package main"
+    cache.close()
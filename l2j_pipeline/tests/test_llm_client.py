@@ -0,0 +1,139 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from openai import APIConnectionError, BadRequestError, RateLimitError
+
+import llm_client
+from llm_client import BACKOFF_MAX, LLMClient, RateLimiter
+
+
+def http_response(status, headers=None):
+    """Resposta mínima para construir os erros do openai (sem rede)."""
+    return SimpleNamespace(status_code=status, headers=headers or {}, request=None)
+
+
+def rate_limited(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    return RateLimitError("429", response=http_response(429, headers), body=None)
+
+
+def completion(content):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(model_dump=lambda: {"prompt_tokens": 3, "completion_tokens": 2})
+    )
+
+
+class FakeAsyncOpenAI:
+    """
+    chat.completions.create falso: levanta os erros de `errors` em ordem e depois
+    responde "ok" após `latency` s; registra modelo, instante e concorrência.
+    """
+
+    def __init__(self, errors=(), latency=0.0):
+        self.errors = list(errors)
+        self.latency = latency
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls.append((model, time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.errors:
+                raise self.errors.pop(0)
+            return completion("ok")
+        finally:
+            self.in_flight -= 1
+
+
+def make_client(fake, max_concurrency=4, **kwargs):
+    """Cliente com o AsyncOpenAI falso e backoff registrado (sem dormir)."""
+    client = LLMClient("key", "http://stub", max_concurrency=max_concurrency, **kwargs)
+    client._client = fake
+    client._semaphore = asyncio.Semaphore(max_concurrency)
+    client.waits = []
+    client.backoff = lambda attempt, error=None: client.waits.append((attempt, error)) or 0.0
+    return client
+
+
+MESSAGES = [{"role": "user", "content": "oi"}]
+
+
+def test_retryable_errors_are_retried_until_success():
+    errors = [rate_limited(), APIConnectionError(request=None)]
+    client = make_client(FakeAsyncOpenAI(errors), rate_limits={}, max_retries=3)
+    assert client.chat("m", MESSAGES) == "ok"
+    assert [attempt for attempt, _ in client.waits] == [1, 2]
+    assert [type(error) for _, error in client.waits] == [RateLimitError, APIConnectionError]
+    stats = client.stats()
+    assert (stats["requests"], stats["retries"], stats["errors"], stats["in_flight"]) == (3, 2, 0, 0)
+
+
+def test_gives_up_after_max_retries():
+    client = make_client(FakeAsyncOpenAI([rate_limited() for _ in range(5)]), rate_limits={}, max_retries=2)
+    with pytest.raises(RateLimitError):
+        client.chat("m", MESSAGES)
+    stats = client.stats()
+    assert (stats["requests"], stats["retries"], stats["errors"]) == (3, 2, 1)
+
+
+def test_non_retryable_error_is_raised_at_once():
+    error = BadRequestError("400", response=http_response(400), body=None)
+    client = make_client(FakeAsyncOpenAI([error]), rate_limits={}, max_retries=5)
+    with pytest.raises(BadRequestError):
+        client.chat("m", MESSAGES)
+    assert client.waits == []
+    assert (client.stats()["requests"], client.stats()["errors"]) == (1, 1)
+
+
+def test_backoff_uses_retry_after_or_capped_exponential(monkeypatch):
+    client = LLMClient("key", "http://stub", rate_limits={})
+    assert client.backoff(1, rate_limited("7")) == 7.0
+    assert client.backoff(1, rate_limited(str(10 * BACKOFF_MAX))) == BACKOFF_MAX
+    # Sem Retry-After (ou inválido): jitter uniforme em [0, base * 2^(n-1)], limitado
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: high)
+    assert client.backoff(3, rate_limited("soon")) == llm_client.BACKOFF_BASE * 4
+    assert client.backoff(30) == BACKOFF_MAX
+
+
+def test_semaphore_limits_requests_in_flight():
+    fake = FakeAsyncOpenAI(latency=0.05)
+    client = make_client(fake, max_concurrency=2, rate_limits={})
+
+    async def burst():
+        return await asyncio.gather(*(client.achat("m", MESSAGES) for _ in range(6)))
+
+    assert asyncio.run(burst()) == ["ok"] * 6
+    assert fake.max_in_flight == 2
+
+
+def test_rate_limit_spaces_requests_per_model():
+    fake = FakeAsyncOpenAI()
+    client = make_client(fake, max_concurrency=8, rate_limits={"slow": 600})  # 1 a cada 0,1s
+
+    async def burst():
+        await asyncio.gather(*(client.achat(model, MESSAGES) for model in ("slow", "fast") * 3))
+
+    asyncio.run(burst())
+    slow = [at for model, at in fake.calls if model == "slow"]
+    fast = [at for model, at in fake.calls if model == "fast"]
+    assert all(later - earlier >= 0.09 for earlier, later in zip(slow, slow[1:]))
+    assert fast[-1] - fast[0] < 0.05  # modelo sem limite não espera
+
+
+def test_rate_limiter_without_limit_does_not_wait():
+    limiter = RateLimiter(0)
+
+    async def burst():
+        await asyncio.gather(*(limiter.acquire() for _ in range(100)))
+
+    start = time.monotonic()
+    asyncio.run(burst())
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,94 @@
+import pytest
+
+from map_dependencies import (
+    HAS_AST, REFERENCE_WEIGHTS, build_dependency_graph, build_package_index, edge_weight, reference_targets,
+    resolve_reference
+)
+
+CLASSES = [
+    "com.l2j.model.Item", "com.l2j.model.Npc", "com.l2j.model.Skill",
+    "com.l2j.util.Rnd", "com.l2j.util.Config", "com.l2j.other.Item", "com.l2j.other.Quest",
+]
+CLASS_MAP = {name: name.replace('.', '/') + ".java" for name in CLASSES}
+PACKAGE_INDEX = build_package_index(CLASS_MAP)
+
+
+def analysis(references, imports=(), local_types=(), package="com.l2j.model"):
+    """Análise de um arquivo como a de EnterpriseJavaParser.extract_references."""
+    return {"package": package, "imports": list(imports), "local_types": list(local_types),
+            "references": references}
+
+
+def resolve(name, single_imports=None, wildcards=(), local_types=(), package="com.l2j.model"):
+    return resolve_reference(name, package, single_imports or {}, list(wildcards), set(local_types),
+                             CLASS_MAP, PACKAGE_INDEX)
+
+
+def test_local_type_shadows_every_other_scope():
+    # Tipo declarado no arquivo (ex.: classe aninhada Item) esconde import, pacote e qualificado
+    assert resolve("Item", {"Item": "com.l2j.other.Item"}, ["com.l2j.other"], local_types=["Item"]) is None
+    assert resolve("Item.Grade", local_types=["Item"]) is None
+
+
+def test_scope_order_qualified_single_import_same_package_wildcard():
+    # Nome qualificado vale mesmo com outro Item visível
+    assert resolve("com.l2j.other.Item", {"Item": "com.l2j.model.Item"}) == "com.l2j.other.Item"
+    # Import explícito vence o próprio pacote
+    assert resolve("Item", {"Item": "com.l2j.other.Item"}) == "com.l2j.other.Item"
+    # Mesmo pacote vence o wildcard
+    assert resolve("Item", wildcards=["com.l2j.other"]) == "com.l2j.model.Item"
+    # Só o wildcard enxerga a classe
+    assert resolve("Quest", wildcards=["com.l2j.other"]) == "com.l2j.other.Quest"
+    assert resolve("Quest") is None
+
+
+def test_qualified_members_and_nested_types_resolve_to_the_owner():
+    assert resolve("com.l2j.util.Config.MAX_LEVEL") == "com.l2j.util.Config"
+    # Outer.Inner: a cabeça resolve pelos escopos normais
+    assert resolve("Npc.Template") == "com.l2j.model.Npc"
+    assert resolve("Config.MAX_LEVEL", {"Config": "com.l2j.util.Config"}) == "com.l2j.util.Config"
+
+
+def test_member_wildcard_imports_depend_on_the_class():
+    targets = reference_targets(analysis(
+        {"Rnd": {"static": 1}},
+        imports=["com.l2j.util.Config.*", "com.l2j.util.*", "java.util.*", "com.l2j.util.Missing.*"]
+    ), CLASS_MAP, PACKAGE_INDEX)
+    # a.b.C.* -> C; a.b.* -> só as classes citadas; java.* e classes inexistentes ignorados
+    assert targets == {"com.l2j.util.Config": {"import": 1}, "com.l2j.util.Rnd": {"static": 1}}
+
+
+def test_occurrences_are_summed_per_kind_and_weighted():
+    targets = reference_targets(analysis(
+        {"Npc": {"extends": 1, "type": 2}, "com.l2j.util.Rnd.get": {"static": 3}, "Skill": {"annotation": 1}},
+        imports=["com.l2j.model.Npc", "com.l2j.util.Rnd"]
+    ), CLASS_MAP, PACKAGE_INDEX)
+    assert targets["com.l2j.model.Npc"] == {"import": 1, "extends": 1, "type": 2}
+    assert targets["com.l2j.util.Rnd"] == {"import": 1, "static": 3}
+    assert edge_weight(targets["com.l2j.model.Npc"]) == REFERENCE_WEIGHTS["import"] + REFERENCE_WEIGHTS["extends"] \
+        + 2 * REFERENCE_WEIGHTS["type"]
+    assert edge_weight(targets["com.l2j.util.Rnd"]) == 1 + 3 * REFERENCE_WEIGHTS["static"]
+    assert edge_weight({"unknown": 2}) == 2
+
+
+@pytest.mark.skipif(not HAS_AST, reason="tree-sitter não instalado")
+def test_reference_graph_from_sources(tmp_path):
+    sources = {
+        "com/l2j/model/Item.java": "package com.l2j.model;\n\npublic class Item {\n}\n",
+        "com/l2j/model/Weapon.java": (
+            "package com.l2j.model;\n\nimport com.l2j.other.*;\n\n"
+            "public class Weapon extends Item {\n    Quest quest;\n    Quest owner;\n}\n"
+        ),
+        "com/l2j/other/Quest.java": "package com.l2j.other;\n\npublic class Quest {\n}\n",
+        "com/l2j/other/Item.java": "package com.l2j.other;\n\npublic class Item {\n}\n",
+    }
+    for rel_path, content in sources.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    graph = build_dependency_graph(str(tmp_path), references=True)
+    # Item do próprio pacote (não o do wildcard); Quest só pelo wildcard
+    assert set(graph.successors("com.l2j.model.Weapon")) == {"com.l2j.model.Item", "com.l2j.other.Quest"}
+    assert graph["com.l2j.model.Weapon"]["com.l2j.model.Item"]["weight"] == REFERENCE_WEIGHTS["extends"]
+    assert graph["com.l2j.model.Weapon"]["com.l2j.other.Quest"]["kinds"] == {"type": 2}
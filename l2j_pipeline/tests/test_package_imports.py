@@ -0,0 +1,24 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Módulos importáveis como l2j_pipeline.<módulo> (ex.: pelo api.py) sem torch
+MODULES = [
+    "ann_index", "ast_corpus", "compiler_service", "embedding_cache", "index_l2j_repo",
+    "index_store", "job_queue", "jobs_api", "keyword_index", "llm_cache", "llm_client",
+    "map_dependencies", "migration_api", "migration_plan", "parse_cache", "repo_manager",
+    "retriever_registry", "rlcoder_adapter", "run_manifest", "stage_pipeline", "test_generator",
+]
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_through_package_path(module):
+    # Processo separado: o conftest coloca l2j_pipeline/ no sys.path, o que esconderia
+    # imports sem o fallback l2j_pipeline.<módulo>
+    result = subprocess.run([sys.executable, "-c", f"import l2j_pipeline.{module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
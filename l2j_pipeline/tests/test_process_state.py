@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+import importlib.util
+
+from process_state import process_singleton
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_singleton_created_once():
+    calls = []
+    first = process_singleton("tests.created_once", lambda: calls.append(1) or {})
+    second = process_singleton("tests.created_once", dict)
+    assert first is second
+    assert calls == [1]
+
+
+def test_shared_between_copies_of_process_state():
+    # Uma segunda cópia do módulo (como `l2j_pipeline.process_state`) vê o mesmo estado
+    spec = importlib.util.spec_from_file_location(
+        "copy_of_process_state", os.path.join(REPO_ROOT, "l2j_pipeline", "process_state.py"))
+    copy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(copy)
+    assert copy.process_singleton("tests.shared", dict) is process_singleton("tests.shared", dict)
+
+
+def test_modules_imported_both_ways_share_instances():
+    # Como a API: primeiro l2j_pipeline.<módulo>, depois sys.path.append + nome simples
+    code = (
+        "import sys\n"
+        "import l2j_pipeline.llm_cache as a, l2j_pipeline.job_queue as qa, l2j_pipeline.retriever_registry as ra\n"
+        "sys.path.append('l2j_pipeline')\n"
+        "import llm_cache as b, job_queue as qb, retriever_registry as rb\n"
+        "assert a is not b\n"
+        "assert a._caches is b._caches and a._caches_lock is b._caches_lock\n"
+        "assert qa._queues is qb._queues\n"
+        "assert ra.get_registry() is rb.get_registry()\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
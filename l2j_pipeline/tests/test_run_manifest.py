@@ -0,0 +1,61 @@
+import json
+import time
+
+from run_manifest import RunManifest, source_sha256
+from hybrid_migration_engine import HybridMigrationEngine
+
+
+def test_resume_after_truncated_last_line(tmp_path):
+    path = str(tmp_path / "runs" / "hybrid.jsonl")
+    output = tmp_path / "A_java.json"
+    output.write_text("{}")
+    sha_a, sha_b = source_sha256("class A {}"), source_sha256("class B {}")
+
+    first = RunManifest(path)
+    first.start_run()
+    first.record("A.java", "done", sha_a, output=str(output))
+    first.close()
+    # Queda no meio da escrita do registro de B.java
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "file", "source_file": "B.java", "status": "do')
+
+    resumed = RunManifest(path)
+    assert resumed.is_complete("A.java", sha_a)
+    assert resumed.last_record("B.java") is None
+    assert not resumed.is_complete("A.java", source_sha256("class A { int x; }"))
+    resumed.record("B.java", "error", sha_b, error="generate: RuntimeError: boom")
+    summary = resumed.end_run()
+    resumed.close()
+    assert (summary["done"], summary["error"], summary["failed"]) == (0, 1, 0)
+
+    # O registro novo começa numa linha própria; só a linha truncada é perdida
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    parsed = []
+    for line in lines:
+        try:
+            parsed.append(json.loads(line))
+        except json.JSONDecodeError:
+            parsed.append(None)
+    assert parsed.count(None) == 1
+    assert RunManifest(path).last_record("B.java")["status"] == "error"
+
+
+def test_missing_output_is_not_complete(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    sha = source_sha256("class A {}")
+    manifest.record("A.java", "done", sha, output=str(tmp_path / "gone.json"))
+    assert not manifest.is_complete("A.java", sha)
+    manifest.record("A.java", "failed", sha)
+    assert not manifest.is_complete("A.java", sha)
+    manifest.close()
+
+
+def test_stage_exception_is_marked_apart_from_validation_failure():
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0, "cache_hits": 0}
+    crashed = HybridMigrationEngine._task_result(
+        {"error": "compile: OSError: disk full", "usage": usage, "started": time.time()})
+    failed = HybridMigrationEngine._task_result(
+        {"result": {"success": False, "error": "Max retries exceeded"}, "usage": usage, "started": time.time()})
+    assert crashed["exception"] is True and crashed["error"] == "compile: OSError: disk full"
+    assert not failed.get("exception")
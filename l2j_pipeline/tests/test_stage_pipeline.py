@@ -0,0 +1,173 @@
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+from stage_pipeline import DONE, Stage, StagePipeline, _BoundedQueue
+
+
+def mark(name):
+    def fn(task):
+        task.setdefault("trail", []).append(name)
+    return fn
+
+
+def square(task):
+    """Estágio em processo: função de módulo, a tarefa volta alterada."""
+    task["square"] = task["n"] * task["n"]
+    task["pid"] = os.getpid()
+
+
+def run(pipeline, items, timeout=20, **kwargs):
+    """run() com limite de tempo (um deadlock falha o teste em vez de travá-lo)."""
+    results = []
+    runner = threading.Thread(target=lambda: results.extend(pipeline.run(items, **kwargs)), daemon=True)
+    runner.start()
+    runner.join(timeout)
+    assert not runner.is_alive(), "pipeline travou"
+    return results
+
+
+def test_routes_none_done_and_named_stage():
+    def first(task):
+        mark("first")(task)
+        if task["n"] == 1:
+            return DONE
+        if task["n"] == 2:
+            return "third"
+
+    pipeline = StagePipeline([Stage("first", first), Stage("second", mark("second")),
+                              Stage("third", mark("third"))])
+    results = pipeline.run({"n": n} for n in range(3))
+    assert [task["trail"] for task in results] == [
+        ["first", "second", "third"], ["first"], ["first", "third"]]
+
+
+def test_results_keep_input_order():
+    async def slow_first(task):
+        # Os primeiros terminam por último
+        await asyncio.sleep(0.01 * (5 - task["n"]))
+
+    pipeline = StagePipeline([Stage("llm", slow_first, "async", workers=5), Stage("tail", mark("tail"), workers=2)])
+    finished = []
+    results = pipeline.run(({"n": n} for n in range(5)), on_result=lambda task: finished.append(task["n"]))
+    assert [task["n"] for task in results] == list(range(5))
+    assert finished != list(range(5))
+
+
+def test_retry_back_edge_does_not_deadlock_with_full_queues():
+    attempts = {}
+
+    def generate(task):
+        attempts[task["n"]] = attempts.get(task["n"], 0) + 1
+
+    def compile_(task):
+        # Duas voltas a "generate" por tarefa, com as filas de tamanho 1 cheias
+        time.sleep(0.001)
+        if attempts[task["n"]] < 3:
+            return "generate"
+
+    pipeline = StagePipeline([Stage("generate", generate, queue_size=1),
+                              Stage("compile", compile_, queue_size=1)])
+    results = run(pipeline, ({"n": n} for n in range(20)))
+    assert len(results) == 20 and all("error" not in task for task in results)
+    assert set(attempts.values()) == {3}
+    assert pipeline.stats()["stages"]["generate"]["items"] == 60
+
+
+def test_forced_put_ignores_the_limit():
+    async def scenario():
+        queue = _BoundedQueue(1)
+        await queue.put("a")
+        await asyncio.wait_for(queue.put("retry", force=True), 1)
+        blocked = asyncio.ensure_future(queue.put("b"))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert [await queue.get(), await queue.get()] == ["a", "retry"]
+        await asyncio.wait_for(blocked, 1)
+        return queue.max_depth
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_exception_finishes_task_with_error():
+    def explode(task):
+        if task["n"] == 1:
+            raise RuntimeError("boom")
+
+    pipeline = StagePipeline([Stage("compile", explode), Stage("tests", mark("tests"))])
+    results = pipeline.run({"n": n} for n in range(3))
+    assert results[1]["error"] == "compile: RuntimeError: boom"
+    assert "trail" not in results[1]
+    assert [task["trail"] for task in (results[0], results[2])] == [["tests"], ["tests"]]
+    assert pipeline.stats()["stages"]["compile"]["errors"] == 1
+
+
+def test_unknown_route_is_an_error():
+    pipeline = StagePipeline([Stage("only", lambda task: "nowhere")])
+    [task] = pipeline.run([{}])
+    assert task["error"] == "only: ValueError: estágio desconhecido: nowhere"
+
+
+def test_stop_keeps_new_tasks_out_and_finishes_started_ones():
+    fed = []
+    stopped = threading.Event()
+
+    def items():
+        for n in range(10):
+            fed.append(n)
+            yield {"n": n}
+
+    def work(task):
+        time.sleep(0.02)
+        mark("work")(task)
+
+    def on_result(task):
+        stopped.set()
+
+    pipeline = StagePipeline([Stage("work", work, queue_size=1)])
+    results = run(pipeline, items(), on_result=on_result, stop=stopped.is_set)
+    # Só entram as tarefas lidas antes do primeiro resultado (a fila tem uma vaga)
+    assert 1 <= len(results) <= 4
+    assert all(task["trail"] == ["work"] for task in results)
+    assert len(fed) == len(results)
+
+
+def test_on_result_exception_does_not_stop_the_run():
+    seen = []
+
+    def on_result(task):
+        seen.append(task["n"])
+        if task["n"] == 0:
+            raise RuntimeError("callback")
+
+    results = StagePipeline([Stage("work", mark("work"))]).run(({"n": n} for n in range(3)), on_result=on_result)
+    assert [task["n"] for task in results] == [0, 1, 2]
+    assert sorted(seen) == [0, 1, 2]
+
+
+def test_process_stage_returns_updated_task():
+    with StagePipeline([Stage("ast", square, "process", workers=2), Stage("next", mark("next"))]) as pipeline:
+        results = pipeline.run({"n": n} for n in range(4))
+    assert [(task["square"], task["trail"]) for task in results] == [(n * n, ["next"]) for n in range(4)]
+
+
+def test_process_pool_is_reused_across_runs():
+    pipeline = StagePipeline([Stage("ast", square, "process", workers=2)])
+    first = {task["pid"] for task in pipeline.run({"n": n} for n in range(6))}
+    second = {task["pid"] for task in pipeline.run({"n": n} for n in range(6))}
+    assert os.getpid() not in first
+    assert len(first | second) <= 2  # os mesmos workers nas duas ondas
+    pipeline.close()
+    assert pipeline._process_pools == {}
+    assert [task["square"] for task in pipeline.run({"n": n} for n in range(2))] == [0, 1]
+    pipeline.close()
+
+
+def test_invalid_stage_definitions():
+    with pytest.raises(ValueError):
+        Stage("x", mark("x"), mode="gpu")
+    with pytest.raises(ValueError):
+        StagePipeline([])
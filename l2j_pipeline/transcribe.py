@@ -2,6 +2,10 @@ import os
 import json
 import argparse
 from typing import List, Dict
+try:
+    from llm_client import get_llm_client
+except ImportError:
+    from l2j_pipeline.llm_client import get_llm_client
 
 # Simulação de integração com componentes externos enquanto o ambiente CUDA é configurado
 class HRMTranscriber:
@@ -27,12 +31,7 @@ class HRMTranscriber:
 class OpenRouterClient:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        # lazy import to avoid dependency issues during setup
-        from openai import OpenAI
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
+        self.client = get_llm_client(api_key)
 
     def transcribe(self, java_code: str, plan: List[str], target_lang: str, model: str = "anthropic/claude-3.5-sonnet"):
         plan_str = "\n".join([f"- {step}" for step in plan])
@@ -55,11 +54,10 @@ Por favor, siga rigorosamente o plano de tradução acima para reescrever o cód
         if self.api_key == "SK-MOCK":
             return f"[MOCK] Transcrição para {target_lang} usando {model} baseada no plano HRM.\n\nControlling Java boilerplate conversion..."
 
-        response = self.client.chat.completions.create(
+        return self.client.chat(
             model=model,
             messages=[{"role": "user", "content": prompt}]
         )
-        return response.choices[0].message.content
 
 def main():
     parser = argparse.ArgumentParser(description="L2J Transcription Engine via HRM & OpenRouter")